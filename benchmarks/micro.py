@@ -0,0 +1,229 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Microbenchmarks for the pure Python hot path of the clients.
+
+Each benchmark times one small operation, such as building a request message or constructing
+a Lock, without any network I/O. The client_* benchmarks run a full client call against an
+in-memory stub, which measures the per-operation overhead the client adds on top of gRPC.
+
+Each run also times a reference loop of plain Python, and results are recorded as multiples of
+it, so that a baseline recorded on one machine can be checked on another. Results are compared
+with the baseline in micro_baseline.json. The run fails if a benchmark is slower than its
+baseline by more than the threshold and by more than a small absolute margin, which keeps the
+fastest benchmarks from failing on timer noise, or slower than its budget, if it has one.
+
+Usage:
+    python benchmarks/micro.py [--threshold FRACTION] [--update-baseline] [BENCHMARK ...]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+from typing import Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position,protected-access
+from ldlm import AsyncClient, Client, exceptions
+from ldlm.base_client import PreparedRenew
+from ldlm.client import Lock
+from ldlm.client_aio import AsyncLock
+from ldlm.protos import ldlm_pb2 as pb
+
+BASELINE = os.path.join(os.path.dirname(__file__), "micro_baseline.json")
+
+
+class _InMemoryStub:
+    """
+    A stub which answers TryLock and Unlock with prebuilt responses.
+    """
+
+    def __init__(self) -> None:
+        self._locked = pb.LockResponse(name="bench", key="key", locked=True)
+        self._unlocked = pb.UnlockResponse(name="bench", unlocked=True)
+
+    def TryLock(self, request, metadata=None):  # pylint: disable=invalid-name,unused-argument
+        """TryLock RPC."""
+        return self._locked
+
+    def Unlock(self, request, metadata=None):  # pylint: disable=invalid-name,unused-argument
+        """Unlock RPC."""
+        return self._unlocked
+
+
+def reference() -> int:
+    """
+    The reference loop, which only runs plain Python bytecode.
+    """
+    total = 0
+    for i in range(100):
+        total += i * i
+    return total
+
+
+def benchmarks() -> dict[str, Callable[[], object]]:
+    """
+    Returns the benchmarks by name.
+    """
+    password = "secret"
+    client = Client("localhost:1", password=password, auto_renew_locks=False)
+    aclient = AsyncClient("localhost:1", auto_renew_locks=False)
+    response = pb.LockResponse(name="bench", key="key", locked=True)
+    error = pb.Error(code=pb.ErrorCode.InvalidLockSize, message="bench")
+
+    renewed = pb.LockResponse(name="bench", key="key",
+                              locked=True).SerializeToString()
+    prepared = PreparedRenew("bench", "key", 60)
+
+    def renew_message():
+        pb.RenewRequest(name="bench", key="key",
+                        lock_timeout_seconds=60).SerializeToString()
+        pb.LockResponse.FromString(renewed)
+
+    def renew_prepared():
+        prepared.parse(renewed)
+
+    overhead_client = Client("localhost:1", auto_renew_locks=False)
+    overhead_client._stub = _InMemoryStub()
+
+    def try_lock_unlock():
+        overhead_client.try_lock("bench").unlock()
+
+    return {
+        "lock_request": lambda: client._lock_request("bench", 10, 60, 0),
+        "try_lock_request": lambda: client._try_lock_request("bench", None, 0),
+        "stub_dispatch": lambda: getattr(client._stub, "TryLock"),
+        "metadata": lambda: (("authorization", password),),
+        "lock_construct": lambda: Lock(client, response),
+        "async_lock_construct": lambda: AsyncLock(aclient, response),
+        "from_rpc_error": lambda: exceptions.from_rpc_error(error),
+        "renew_message": renew_message,
+        "renew_prepared": renew_prepared,
+        "client_try_lock_unlock": try_lock_unlock,
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int = 20) -> tuple[float, float]:
+    """
+    Returns the fastest time per call of fn and of the reference loop in nanoseconds over
+    many short runs. The runs of both alternate, so that they see the same machine load and
+    CPU frequency.
+    """
+    timers = [timeit.Timer(fn), timeit.Timer(reference)]
+    numbers = [max(timer.autorange()[0] // 4, 1) for timer in timers]
+    best = [float("inf"), float("inf")]
+    for _ in range(repeat):
+        for i, timer in enumerate(timers):
+            best[i] = min(best[i], timer.timeit(numbers[i]) / numbers[i] * 1e9)
+    return best[0], best[1]
+
+
+def main() -> None:
+    """
+    Command line entry point.
+    """
+    all_benchmarks = benchmarks()
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("benchmarks",
+                        nargs="*",
+                        help="benchmarks to run: " + ", ".join(all_benchmarks) +
+                        " (default: all)")
+    parser.add_argument("--threshold",
+                        type=float,
+                        default=0.25,
+                        help="allowed slowdown relative to the baseline "
+                        "(default: 0.25)")
+    parser.add_argument("--min-delta",
+                        type=float,
+                        default=50,
+                        help="slowdowns of at most this many nanoseconds on "
+                        "this machine are ignored (default: 50)")
+    parser.add_argument("--baseline",
+                        default=BASELINE,
+                        help="baseline file (default: micro_baseline.json)")
+    parser.add_argument("--update-baseline",
+                        action="store_true",
+                        help="record the results as the new baseline; "
+                        "budgets are kept")
+    args = parser.parse_args()
+    for name in args.benchmarks:
+        if name not in all_benchmarks:
+            parser.error(f"unknown benchmark: {name}")
+
+    try:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {"results": {}, "budgets": {}}
+
+    def check(name: str, ns: float, ref_ns: float) -> list[str]:
+        """
+        Returns the reasons a benchmark failed, if it did.
+        """
+        ratio = ns / ref_ns
+        base = baseline["results"].get(name)
+        budget = baseline["budgets"].get(name)
+        failed = []
+        if base and ratio > base * (1 + args.threshold) and (ns - base * ref_ns
+                                                             > args.min_delta):
+            failed.append(f"{name}: {ratio:.4f}x the reference is more than "
+                          f"{args.threshold:.0%} slower than the baseline of "
+                          f"{base}x")
+        if budget and ratio > budget:
+            failed.append(f"{name}: {ratio:.4f}x the reference is over its "
+                          f"budget of {budget}x")
+        return failed
+
+    results = {}
+    failures = []
+    for name in args.benchmarks or all_benchmarks:
+        ns, ref_ns = measure(all_benchmarks[name])
+        if not args.update_baseline and check(name, ns, ref_ns):
+            # Measure again so that a burst of noise does not fail the run
+            ns, ref_ns = min((ns, ref_ns),
+                             measure(all_benchmarks[name]),
+                             key=lambda m: m[0] / m[1])
+        # Time relative to the reference loop
+        ratio = ns / ref_ns
+        results[name] = round(ratio, 4)
+        base = baseline["results"].get(name)
+        change = f"{(ratio / base - 1) * 100:+7.1f}%" if base else "      -"
+        print(f"{name:<24} {ns:>10.1f} ns  {ratio:>8.4f}x  "
+              f"baseline {base or '-':>8}x  {change}")
+        if not args.update_baseline:
+            failures.extend(check(name, ns, ref_ns))
+
+    if args.update_baseline:
+        baseline["results"].update(results)
+        baseline["python"] = platform.python_version()
+        baseline["machine"] = platform.machine()
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {args.baseline}")
+        return
+
+    if failures:
+        print("\n".join(failures), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
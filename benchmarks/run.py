@@ -0,0 +1,385 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Throughput and latency benchmarks for Client and AsyncClient.
+
+By default the benchmarks run against an ldlm.testing.Server started in a separate process so
+that it does not compete with the client for the GIL. Use --address to run against another
+LDLM server instead.
+
+Usage:
+    python benchmarks/run.py [--duration SECONDS] [--output FILE] [--address ADDRESS]
+                             [--transport unary session] [WORKLOAD ...]
+
+Results are printed as a table and, with --output, written as JSON so that runs can be
+compared across commits.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, Optional
+
+import grpc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+# pylint: disable=wrong-import-position
+from ldlm import AsyncClient, Client
+from ldlm.testing import Server
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """
+    Returns the q-th quantile (0 < q <= 1) of a sorted list using the nearest-rank method.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)]
+
+
+def summarize(name: str, client: str, concurrency: int, duration: float,
+              latencies: list[float]) -> dict:
+    """
+    Summarizes the latencies, in seconds, of the operations of a benchmark run.
+    """
+    latencies.sort()
+    return {
+        "name": name,
+        "client": client,
+        "concurrency": concurrency,
+        "duration_seconds": round(duration, 3),
+        "ops": len(latencies),
+        "ops_per_second": round(len(latencies) / duration, 1),
+        "latency_ms": {
+            "mean": round(1000 * sum(latencies) / max(len(latencies), 1), 4),
+            "p50": round(1000 * percentile(latencies, 0.5), 4),
+            "p99": round(1000 * percentile(latencies, 0.99), 4),
+            "p999": round(1000 * percentile(latencies, 0.999), 4),
+            "max": round(1000 * (latencies[-1] if latencies else 0), 4),
+        },
+    }
+
+
+def zipf_sampler(num_keys: int, s: float,
+                 rng: random.Random) -> Callable[[], str]:
+    """
+    Returns a function that samples lock names from a Zipf distribution over num_keys names.
+    """
+    cum_weights = list(
+        itertools.accumulate(1 / (k**s) for k in range(1, num_keys + 1)))
+    total = cum_weights[-1]
+
+    def sample() -> str:
+        return f"zipf-{bisect.bisect(cum_weights, rng.random() * total)}"
+
+    return sample
+
+
+def run_threads(concurrency: int, duration: float,
+                op: Callable[[int], None]) -> tuple[float, list[float]]:
+    """
+    Runs op(worker_id) in a loop on `concurrency` threads for `duration` seconds.
+
+    Returns:
+        tuple[float, list[float]]: The elapsed time and the latency of each op.
+    """
+    latencies: list[list[float]] = [[] for _ in range(concurrency)]
+    stop = threading.Event()
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def worker(i: int) -> None:
+        lat = latencies[i]
+        start_barrier.wait()
+        while not stop.is_set():
+            t = time.perf_counter()
+            op(i)
+            lat.append(time.perf_counter() - t)
+
+    threads = [
+        threading.Thread(target=worker, args=(i,)) for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start, list(itertools.chain(*latencies))
+
+
+async def run_tasks(concurrency: int, duration: float,
+                    op: Callable) -> tuple[float, list[float]]:
+    """
+    Runs `await op(worker_id)` in a loop on `concurrency` tasks for `duration` seconds.
+
+    Returns:
+        tuple[float, list[float]]: The elapsed time and the latency of each op.
+    """
+    latencies: list[float] = []
+    deadline = time.perf_counter() + duration
+
+    async def worker(i: int) -> None:
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            await op(i)
+            latencies.append(time.perf_counter() - t)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return time.perf_counter() - start, latencies
+
+
+def bench_uncontended(address: str, duration: float, concurrency: int,
+                      transport: str) -> list[dict]:
+    """
+    Lock and unlock a lock name owned by each worker, with sync threads and asyncio tasks.
+    """
+    client = Client(address, retries=0, transport=transport)
+
+    def op(i: int) -> None:
+        client.lock(f"uncontended-{i}").unlock()
+
+    elapsed, latencies = run_threads(concurrency, duration, op)
+    client.close()
+    results = [
+        summarize("uncontended_lock_unlock", "sync", concurrency, elapsed,
+                  latencies)
+    ]
+
+    async def run_async() -> tuple[float, list[float]]:
+        aclient = AsyncClient(address, retries=0, transport=transport)
+
+        async def aop(i: int) -> None:
+            await (await aclient.lock(f"uncontended-{i}")).unlock()
+
+        try:
+            return await run_tasks(concurrency, duration, aop)
+        finally:
+            await aclient.close()
+
+    elapsed, latencies = asyncio.run(run_async())
+    results.append(
+        summarize("uncontended_lock_unlock", "async", concurrency, elapsed,
+                  latencies))
+    return results
+
+
+def bench_try_lock_storm(address: str, duration: float, concurrency: int,
+                         transport: str) -> list[dict]:
+    """
+    Many workers repeatedly try_lock a handful of names, releasing the ones they get.
+    """
+    client = Client(address, retries=0, transport=transport)
+    acquired = [0] * concurrency
+
+    def op(i: int) -> None:
+        lock = client.try_lock(f"storm-{i % 4}")
+        if lock:
+            acquired[i] += 1
+            lock.unlock()
+
+    elapsed, latencies = run_threads(concurrency, duration, op)
+    client.close()
+    result = summarize("try_lock_storm", "sync", concurrency, elapsed,
+                       latencies)
+    result["success_rate"] = round(sum(acquired) / max(len(latencies), 1), 4)
+    return [result]
+
+
+def bench_zipf(address: str, duration: float, concurrency: int,
+               transport: str) -> list[dict]:
+    """
+    Workers lock and unlock names drawn from a Zipf distribution (s=1.1) over 1000 names, so
+    that a few hot names see most of the contention.
+    """
+    client = Client(address, retries=0, transport=transport)
+    samplers = [
+        zipf_sampler(1000, 1.1, random.Random(i)) for i in range(concurrency)
+    ]
+
+    def op(i: int) -> None:
+        client.lock(samplers[i]()).unlock()
+
+    elapsed, latencies = run_threads(concurrency, duration, op)
+    client.close()
+    return [summarize("zipf_hot_keys", "sync", concurrency, elapsed, latencies)]
+
+
+def bench_renew_heavy(address: str,
+                      duration: float,
+                      concurrency: int,
+                      transport: str,
+                      leases: int = 5000) -> list[dict]:
+    """
+    Holds thousands of leases and renews them round robin as fast as possible.
+    """
+    client = Client(address,
+                    retries=0,
+                    auto_renew_locks=False,
+                    transport=transport)
+    held = client.try_lock_any([f"lease-{i}" for i in range(leases)],
+                               k=leases,
+                               lock_timeout_seconds=300,
+                               max_concurrency=64)
+    counter = itertools.count()
+
+    def op(_: int) -> None:
+        lock = held[next(counter) % len(held)]
+        client.renew(lock.name, lock.key, 300)
+
+    elapsed, latencies = run_threads(concurrency, duration, op)
+    client.unlock_many(held)
+    client.close()
+    result = summarize("renew_heavy", "sync", concurrency, elapsed, latencies)
+    result["leases"] = len(held)
+    return [result]
+
+
+WORKLOADS: dict[str, Callable[[str, float, int, str], list[dict]]] = {
+    "uncontended": bench_uncontended,
+    "try_lock_storm": bench_try_lock_storm,
+    "zipf": bench_zipf,
+    "renew_heavy": bench_renew_heavy,
+}
+
+
+def _serve(conn) -> None:
+    """
+    Runs an ldlm.testing.Server in a child process until the parent closes the pipe.
+    """
+    with Server() as server:
+        conn.send(server.address)
+        try:
+            conn.recv()
+        except EOFError:
+            pass
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(__file__),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n", maxsplit=1)[0])
+    parser.add_argument("workloads",
+                        nargs="*",
+                        help="workloads to run: " + ", ".join(WORKLOADS) +
+                        " (default: all)")
+    parser.add_argument("--duration",
+                        type=float,
+                        default=5,
+                        help="seconds to run each workload (default: 5)")
+    parser.add_argument("--concurrency",
+                        type=int,
+                        nargs="+",
+                        default=[1, 16],
+                        help="worker counts to run each workload with "
+                        "(default: 1 16)")
+    parser.add_argument("--address",
+                        help="address of an LDLM server to benchmark "
+                        "(default: start a local ldlm.testing server)")
+    parser.add_argument("--transport",
+                        nargs="+",
+                        choices=["unary", "session"],
+                        default=["unary"],
+                        help="client transports to run each workload with; "
+                        "pass both to compare them (default: unary)")
+    parser.add_argument("--output", help="write JSON results to this file")
+    args = parser.parse_args()
+    for name in args.workloads:
+        if name not in WORKLOADS:
+            parser.error(f"unknown workload: {name}")
+
+    server_proc = None
+    address = args.address
+    if address is None:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        server_proc = multiprocessing.Process(target=_serve,
+                                              args=(child_conn,),
+                                              daemon=True)
+        server_proc.start()
+        address = parent_conn.recv()
+
+    results = []
+    try:
+        for name in args.workloads or WORKLOADS:
+            for concurrency, transport in itertools.product(
+                    args.concurrency, args.transport):
+                for result in WORKLOADS[name](address, args.duration,
+                                              concurrency, transport):
+                    result["transport"] = transport
+                    results.append(result)
+                    lat = result["latency_ms"]
+                    print(f"{result['name']:<24} {result['client']:<6} "
+                          f"{transport:<8} c={concurrency:<4} "
+                          f"{result['ops_per_second']:>10} "
+                          f"ops/s  p50={lat['p50']:.3f}ms "
+                          f"p99={lat['p99']:.3f}ms p999={lat['p999']:.3f}ms")
+    finally:
+        if server_proc is not None:
+            parent_conn.close()
+            server_proc.join(timeout=5)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "commit":
+                        _git_commit(),
+                    "timestamp":
+                        time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "python":
+                        platform.python_version(),
+                    "grpc":
+                        grpc.__version__,
+                    "server":
+                        args.address or "ldlm.testing",
+                    "results":
+                        results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
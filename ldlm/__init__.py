@@ -13,9 +13,44 @@
 # limitations under the License.
 """
 Common exports for the ldlm package.
+
+The exports are loaded on first access so that `import ldlm` stays cheap and code which only
+uses the synchronous client never imports the asyncio client, and vice versa.
 """
-from .client import Client, Lock
-from .client_aio import AsyncClient, AsyncLock
-from .base_client import TLSConfig
+from __future__ import annotations
+
+import importlib
+
+# typing.TYPE_CHECKING without importing typing, which is slow to import
+TYPE_CHECKING = False
+if TYPE_CHECKING:  # pragma: no cover
+    from .client import Client, Lock
+    from .client_aio import AsyncClient, AsyncLock
+    from .base_client import LockHandle, TLSConfig
+
+__all__ = [
+    "Client", "AsyncClient", "TLSConfig", "Lock", "AsyncLock", "LockHandle"
+]
+
+# Module which defines each export
+_EXPORTS = {
+    "Client": ".client",
+    "Lock": ".client",
+    "AsyncClient": ".client_aio",
+    "AsyncLock": ".client_aio",
+    "TLSConfig": ".base_client",
+    "LockHandle": ".base_client",
+}
+
+
+def __getattr__(name: str) -> object:
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ["Client", "AsyncClient", "TLSConfig", "Lock", "AsyncLock"]
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -11,21 +11,85 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# pylint: disable=too-many-lines
 """
 Base client class for interacting with the LDLM gRPC server and TLSConfig class for
 LDLM client TLS configuration.
+
+Clients log to the "ldlm" logger. Messages are formatted lazily and each record carries
+structured fields, set as attributes of the `logging.LogRecord`, for use by structured log
+formatters:
+
+* `ldlm_event`: a stable event name, e.g. "lock.wait", "lock.response", "unlock",
+  "renew.failed", "rpc.retry"
+* `ldlm_lock_name`: the lock name, if the event concerns a single lock
+* `ldlm_locked`, `ldlm_unlocked`, `ldlm_count`, `ldlm_error`, `ldlm_interval_seconds`,
+  `ldlm_rpc_method`, `ldlm_retry`: event specific values
+
+Requests for many locks, e.g. :py:meth:`ldlm.Client.unlock_many`, are sent in batch RPCs of up
+to `max_batch_size` requests. If the server does not implement a batch RPC, the client falls
+back to concurrent unary RPCs.
+
+A client created with `lease_timeout_seconds` attaches the locks it acquires to a lease and
+keeps all of them with a single keepalive per lease, instead of renewing each lock. The lease is
+granted when the first lock is requested, and a new one is granted if it is lost. If the server
+does not implement leases, the client falls back to renewing each lock.
+
+Waiting for a lock to become free, e.g. with :py:meth:`ldlm.Client.wait_until_free`, uses the
+Watch RPC, which does not queue a waiter on the server. If the server does not implement Watch,
+the client waits with a Lock request and releases the lock as soon as it is granted.
+
+Timeouts may be fractional seconds or a `datetime.timedelta`. A timeout which is not a whole
+number of seconds is sent in milliseconds, along with the timeout rounded up to a whole second
+for servers which do not support millisecond timeouts. On such servers, the client stops
+waiting for a Lock request with a sub-second wait timeout shortly after the wait timeout, and
+releases the lock if it is granted to the abandoned request later.
+
+A client created with `sidecar=True` connects to the local sidecar (see :py:mod:`ldlm.sidecar`)
+instead of the server if the sidecar's Unix socket exists and is owned by the user of the
+process, or by the user whose id is set in the `LDLM_SIDECAR_UID` environment variable. The
+socket path is read from the `LDLM_SIDECAR_SOCKET` environment variable, or defaults to
+`ldlm-sidecar.sock` in `$XDG_RUNTIME_DIR`, or in `/run/ldlm` if that is not set. The password
+of such a client is not sent to the sidecar, which authenticates with its own.
+
+A lock can be handed over to another client, e.g. in another process, without releasing it:
+`handoff()` of the lock returns a serializable :py:class:`LockHandle`, and `adopt()` of the
+receiving client takes the lock over and renews it from then on.
+
+A client created with a `journal` (see :py:mod:`ldlm.journal`) records the locks it holds in
+it. After a crash, `recover_locks()` releases or adopts the locks recorded by the previous
+process.
+
+Closing a client stops renewing its locks and releases the locks it still holds, in batch RPCs,
+within a grace period, so that they do not stay locked until their lock timeout expires.
 """
 from __future__ import annotations
 
 import abc
+from contextlib import AbstractContextManager, nullcontext
 from dataclasses import dataclass
+from datetime import timedelta
 import logging
-from typing import Optional, Any
+import math
+import os
+import stat
+import time
+from typing import TYPE_CHECKING, Optional, Any, Union
 
 import grpc
+from grpc._channel import _InactiveRpcError
 
+from ldlm import exceptions
+from ldlm.protos import ldlm_pb2 as pb
 from ldlm.protos import ldlm_pb2_grpc as ldlm_grpc
 
+# Imported where their feature is used, so that clients which do not use it do not import
+# them
+if TYPE_CHECKING:  # pragma: no cover
+    from ldlm import tracing
+    from ldlm.journal import JournalEntry, LockJournal
+    from ldlm.metrics import MetricsSink
+
 
 def readfile(file_path: Optional[str] = None) -> bytes | None:
     """
@@ -45,6 +109,315 @@ def readfile(file_path: Optional[str] = None) -> bytes | None:
         return f.read()
 
 
+# Environment variable which sets the path of the Unix socket of the local sidecar
+SIDECAR_SOCKET_ENV = "LDLM_SIDECAR_SOCKET"
+
+# Environment variable which sets the id of the user who must own the socket of the local
+# sidecar, if it is not the user of the process
+SIDECAR_UID_ENV = "LDLM_SIDECAR_UID"
+
+# Directory of the Unix socket of the local sidecar if neither SIDECAR_SOCKET_ENV nor
+# XDG_RUNTIME_DIR is set
+DEFAULT_SIDECAR_DIR = "/run/ldlm"
+
+# File name of the Unix socket of the local sidecar if SIDECAR_SOCKET_ENV is not set
+SIDECAR_SOCKET_NAME = "ldlm-sidecar.sock"
+
+
+def sidecar_socket_path() -> str:
+    """
+    Returns the path of the Unix socket of the local sidecar. It defaults to a private runtime
+    directory, which other users can not create a socket in.
+
+    Returns:
+        str: The path.
+    """
+    if path := os.environ.get(SIDECAR_SOCKET_ENV):
+        return path
+    return os.path.join(
+        os.environ.get("XDG_RUNTIME_DIR") or DEFAULT_SIDECAR_DIR,
+        SIDECAR_SOCKET_NAME)
+
+
+def find_sidecar(uid: Optional[int] = None) -> Optional[str]:
+    """
+    Returns the address of the local sidecar if its socket exists. A socket owned by another
+    user is ignored, because a client would send its requests to a process of that user.
+
+    Args:
+        uid (int, optional): The id of the user who must own the socket. Defaults to the id
+            set in the `LDLM_SIDECAR_UID` environment variable, or the user of the process.
+
+    Returns:
+        str: The address, e.g. "unix:/run/user/1000/ldlm-sidecar.sock", or None if there is no
+            sidecar.
+    """
+    if uid is None:
+        env_uid = os.environ.get(SIDECAR_UID_ENV)
+        uid = int(env_uid) if env_uid else os.getuid()
+    path = sidecar_socket_path()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISSOCK(st.st_mode):
+        return None
+    if st.st_uid != uid:
+        logging.getLogger("ldlm").warning(
+            "Ignoring the LDLM sidecar socket %s which is owned by uid %d",
+            path,
+            st.st_uid,
+            extra=log_extra("sidecar.untrusted", path=path, uid=st.st_uid))
+        return None
+    return f"unix:{path}"
+
+
+# A timeout in seconds, which may be fractional, or a timedelta
+Timeout = Union[int, float, timedelta]
+
+
+def to_seconds(timeout: Timeout) -> float:
+    """
+    Returns a timeout in seconds.
+
+    Args:
+        timeout (Timeout): The timeout in seconds or a timedelta.
+
+    Returns:
+        float: The timeout in seconds.
+    """
+    if isinstance(timeout, timedelta):
+        return timeout.total_seconds()
+    return timeout
+
+
+def _split_timeout(seconds: float) -> tuple[int, Optional[int]]:
+    """
+    Returns a timeout in whole seconds, rounded up, and in milliseconds, or None instead of
+    the milliseconds if the timeout is a whole number of seconds.
+    """
+    if float(seconds).is_integer():
+        return int(seconds), None
+    return math.ceil(seconds), max(1, round(seconds * 1000))
+
+
+def set_lock_timeout(rpc_msg: Union[pb.LockRequest, pb.TryLockRequest,
+                                    pb.RenewRequest], timeout: Timeout) -> None:
+    """
+    Sets the lock timeout of a request.
+
+    Args:
+        rpc_msg (Union[pb.LockRequest, pb.TryLockRequest, pb.RenewRequest]): The request.
+        timeout (Timeout): The lock timeout.
+
+    Returns:
+        None
+    """
+    rpc_msg.lock_timeout_seconds, ms = _split_timeout(to_seconds(timeout))
+    if ms is not None:
+        rpc_msg.lock_timeout_ms = ms
+
+
+def lock_timeout(
+    rpc_msg: Union[pb.LockRequest, pb.TryLockRequest,
+                   pb.RenewRequest]) -> float:
+    """
+    Returns the lock timeout of a request in seconds.
+
+    Args:
+        rpc_msg (Union[pb.LockRequest, pb.TryLockRequest, pb.RenewRequest]): The request.
+
+    Returns:
+        float: The lock timeout, or 0 if it has none.
+    """
+    if rpc_msg.HasField("lock_timeout_ms"):
+        return rpc_msg.lock_timeout_ms / 1000
+    return rpc_msg.lock_timeout_seconds
+
+
+# Time in seconds by which the deadlines of a Lock request with a sub-second wait timeout
+# exceed the wait timeout, so that servers which enforce the wait timeout answer first
+WAIT_DEADLINE_SLACK_SECONDS = 0.25
+
+
+def wait_deadline(rpc_msg: pb.LockRequest) -> Optional[float]:
+    """
+    Returns the time in seconds after which the client stops waiting for the response to a
+    Lock request, which enforces its wait timeout on servers which do not support millisecond
+    timeouts. The request itself is not cancelled then, see :py:func:`rpc_deadline`.
+
+    Args:
+        rpc_msg (pb.LockRequest): The request.
+
+    Returns:
+        float: The deadline, or None if the wait timeout is a whole number of seconds, which
+            every server enforces.
+    """
+    if rpc_msg.HasField("wait_timeout_ms"):
+        return rpc_msg.wait_timeout_ms / 1000 + WAIT_DEADLINE_SLACK_SECONDS
+    return None
+
+
+def rpc_deadline(rpc_msg: pb.LockRequest) -> Optional[float]:
+    """
+    Returns the gRPC deadline in seconds of a Lock request with a sub-second wait timeout. It
+    exceeds the wait timeout rounded up to a whole second, which every server enforces, so
+    it only expires if the server does not answer.
+
+    Args:
+        rpc_msg (pb.LockRequest): The request.
+
+    Returns:
+        float: The deadline, or None if the wait timeout is a whole number of seconds.
+    """
+    if rpc_msg.HasField("wait_timeout_ms"):
+        return rpc_msg.wait_timeout_seconds + WAIT_DEADLINE_SLACK_SECONDS
+    return None
+
+
+def log_extra(event: str,
+              lock_name: Optional[str] = None,
+              **fields: Any) -> dict[str, Any]:
+    """
+    Returns the structured fields of a log event, for the `extra` parameter of a logging call.
+    Only call this after checking that the logger is enabled for the event's level so that
+    disabled logging costs nothing.
+
+    Args:
+        event (str): The event name.
+        lock_name (str, optional): The lock name.
+        **fields: Other event fields. Each is prefixed with `ldlm_`.
+
+    Returns:
+        dict[str, Any]: The fields.
+    """
+    extra = {f"ldlm_{k}": v for k, v in fields.items()}
+    extra["ldlm_event"] = event
+    if lock_name is not None:
+        extra["ldlm_lock_name"] = lock_name
+    return extra
+
+
+class ClientStub(ldlm_grpc.LDLMStub):  # pylint: disable=too-few-public-methods
+    """
+    LDLMStub with an additional `RenewRaw` method which sends a serialized RenewRequest and
+    returns the serialized response without parsing it.
+    """
+
+    def __init__(self, channel: Any):
+        """
+        Args:
+            channel (grpc.Channel | grpc.aio.Channel): The channel.
+        """
+        super().__init__(channel)
+        # Without serializers, requests and responses are passed through as bytes
+        self.RenewRaw = channel.unary_unary(  # pylint: disable=invalid-name
+            "/ldlm.LDLM/Renew",
+            _registered_method=True,
+        )
+
+
+# The response returned by PreparedRenew.parse() for a successful renew. Its name and key are
+# not set.
+_RENEWED = pb.LockResponse(locked=True)
+
+
+class PreparedRenew:
+    """
+    The renew request of a lock, serialized once so that renewing a lock repeatedly does not
+    build and serialize a new message each time.
+    """
+
+    __slots__ = ("name", "request", "_renewed")
+
+    def __init__(self, name: str, key: str, lock_timeout_seconds: Timeout):
+        """
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the lock.
+            lock_timeout_seconds (Timeout): The lock timeout to renew the lock with.
+        """
+        self.name = name
+        request = pb.RenewRequest(name=name, key=key)
+        set_lock_timeout(request, lock_timeout_seconds)
+        self.request: bytes = request.SerializeToString()
+
+        # The response the server sends when the renew succeeds. A response with these exact
+        # bytes does not need to be parsed.
+        self._renewed: bytes = pb.LockResponse(name=name, key=key,
+                                               locked=True).SerializeToString()
+
+    def message(self) -> pb.RenewRequest:
+        """
+        Returns the request as a message, for stubs which do not accept serialized requests.
+
+        Returns:
+            pb.RenewRequest: The request.
+        """
+        return pb.RenewRequest.FromString(self.request)
+
+    def parse(self, data: bytes) -> pb.LockResponse:
+        """
+        Parses a serialized response to the request.
+
+        Args:
+            data (bytes): The response.
+
+        Returns:
+            pb.LockResponse: The response. The name and key of a successful renew are not set.
+        """
+        if data == self._renewed:
+            return _RENEWED
+        return pb.LockResponse.FromString(data)
+
+
+# Errors of renew requests for locks which no longer exist or are no longer held by the client
+LOST_LOCK_ERRORS = (
+    exceptions.LockDoesNotExistError,
+    exceptions.InvalidLockKeyError,
+    exceptions.NotLockedError,
+    exceptions.LockDoesNotExistOrInvalidKeyError,
+)
+
+# Request message of the batch variant of each RPC
+_BATCH_REQUESTS: dict[str, Any] = {
+    "Lock": pb.BatchLockRequest,
+    "TryLock": pb.BatchTryLockRequest,
+    "Renew": pb.BatchRenewRequest,
+    "Unlock": pb.BatchUnlockRequest,
+}
+
+# Names of the batch RPCs
+BATCH_RPCS = frozenset(f"Batch{rpc_func}" for rpc_func in _BATCH_REQUESTS)
+
+# RPCs which the client stops using if the server does not implement them. They are not
+# retried if they fail with UNIMPLEMENTED.
+OPTIONAL_RPCS = BATCH_RPCS | {"GrantLease"}
+
+
+def rpc_error_code(e: BaseException) -> str:
+    """
+    Returns the name of the gRPC status code of a failed RPC, or the exception type name if
+    it is not a gRPC error.
+
+    Args:
+        e (BaseException): The exception the RPC failed with.
+
+    Returns:
+        str: The code name, e.g. "UNAVAILABLE".
+    """
+    code = getattr(e, "code", None)
+    if isinstance(e, grpc.RpcError) and callable(code):
+        status = code()
+        if isinstance(status, grpc.StatusCode):
+            return status.name
+    # pylint: disable=import-outside-toplevel
+    import asyncio
+    if isinstance(e, asyncio.CancelledError):
+        return grpc.StatusCode.CANCELLED.name
+    return type(e).__name__
+
+
 @dataclass
 class TLSConfig:
     """
@@ -62,6 +435,32 @@ class TLSConfig:
     """Path to the CA certificate file"""
 
 
+@dataclass(frozen=True)
+class LockHandle:
+    """
+    A serializable handle of a held lock, used to hand the lock over to another client, e.g. in
+    another process or pipeline stage. It is returned by `handoff()` of a lock and passed to
+    `adopt()` of the receiving client. Handles can be pickled or converted to a dict with
+    `dataclasses.asdict()`.
+    """
+
+    name: str
+    """name of the lock"""
+
+    key: str
+    """key of the lock"""
+
+    size: int = 0
+    """size of the lock, or 0 if unspecified"""
+
+    lock_timeout_seconds: float = 0.0
+    """timeout in seconds after which the lock expires unless it is renewed, or 0 for none"""
+
+    deadline: Optional[float] = None
+    """`time.time()` at which the lock expires unless it is renewed, or None if it is unknown
+    or the lock has no timeout"""
+
+
 class BaseClient(abc.ABC):  # pylint: disable=too-few-public-methods,too-many-instance-attributes
     """
     Base client class for interacting with the LDLM gRPC server.
@@ -73,7 +472,10 @@ class BaseClient(abc.ABC):  # pylint: disable=too-few-public-methods,too-many-in
     min_renew_interval_seconds: int = 10
     """minimum time between lock renews in seconds"""
 
-    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+    max_batch_size: int = 1000
+    """maximum number of requests sent in a single batch RPC"""
+
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals
         self,
         address: str,
         password: Optional[str] = None,
@@ -81,7 +483,13 @@ class BaseClient(abc.ABC):  # pylint: disable=too-few-public-methods,too-many-in
         retries: int = -1,
         retry_delay_seconds: int = 5,
         auto_renew_locks: bool = True,
-        lock_timeout_seconds: int = 0,
+        lock_timeout_seconds: Timeout = 0,
+        metrics: Optional[MetricsSink] = None,
+        tracer: Optional[tracing.Tracer] = None,
+        transport: str = "unary",
+        lease_timeout_seconds: int = 0,
+        sidecar: bool = False,
+        journal: Optional[LockJournal] = None,
     ):
         """
         Args:
@@ -93,8 +501,34 @@ class BaseClient(abc.ABC):  # pylint: disable=too-few-public-methods,too-many-in
             retry_delay_seconds (int, optional): The delay in seconds between retry attempts.
             auto_renew_locks (bool, optional): Automatically renew locks using a background
                 thread or asyncio task
-            lock_timeout (int, optional): The lock timeout to use for all lock operations
+            lock_timeout (Timeout, optional): The lock timeout to use for all lock operations
+            metrics (ldlm.metrics.MetricsSink, optional): Receives RPC and lock metrics.
+                Defaults to None (no metrics).
+            tracer (ldlm.tracing.Tracer, optional): Creates spans for lock operations.
+                Defaults to None (no tracing).
+            transport (str, optional): "unary" (default) to send each request in its own
+                RPC, or "session" to send Lock, TryLock, Renew and Unlock requests on one
+                long-lived stream. See :py:mod:`ldlm.session`.
+            lease_timeout_seconds (int, optional): If set, locks are attached to a lease with
+                this timeout which the client keeps alive, instead of being renewed one by one.
+                The server releases the locks if the lease expires, e.g. because the client
+                process died. Defaults to 0 (no lease).
+            sidecar (bool, optional): Connect to the local sidecar instead of `address` if
+                it is running. The sidecar connects to the server with its own credentials, so
+                `password` and `tls` are not used. Defaults to False.
+            journal (ldlm.journal.LockJournal, optional): Records held locks so that they
+                can be recovered after a crash with `recover_locks()`. Defaults to None (no
+                journal).
+
+        Raises:
+            ValueError: If `transport` is not valid.
         """
+        if transport not in ("unary", "session"):
+            raise ValueError(f"invalid transport: {transport}")
+
+        sidecar_address = find_sidecar() if sidecar else None
+        if sidecar_address is not None:
+            address, password, tls = sidecar_address, None, None
 
         if tls is not None:
             creds = grpc.ssl_channel_credentials(
@@ -105,8 +539,9 @@ class BaseClient(abc.ABC):  # pylint: disable=too-few-public-methods,too-many-in
         else:
             creds = None
 
-        self._channel: Optional[grpc.Channel] = self._create_channel(
-            address, creds)
+        # Address and credentials used when creating channels
+        self._address: str = address
+        self._creds: Optional[grpc.ChannelCredentials] = creds
 
         # Number of times to retry each request in case of failure
         self._retries: int = retries
@@ -117,24 +552,632 @@ class BaseClient(abc.ABC):  # pylint: disable=too-few-public-methods,too-many-in
         # Need password for RPC calls
         self._password: Optional[str] = password
 
-        # Hold ref to client for gRPC calls
-        self._stub: ldlm_grpc.LDLMStub = ldlm_grpc.LDLMStub(self._channel)
+        # gRPC call metadata, built once rather than on every RPC
+        self._metadata: Optional[tuple[tuple[str, str], ...]] = ((
+            "authorization", password),) if password is not None else None
 
-        # Hold ref to lock timers so they can be canceled when unlocking
-        self._lock_timers: dict[str, Any] = {}
+        # Hold ref to lock timers so they can be canceled when unlocking. Keyed by (name, key)
+        # like _held, as a client may hold a lock of size > 1 more than once.
+        self._lock_timers: dict[tuple[str, str], Any] = {}
 
         # Flag to indicate if the client is closed
         self._closed: bool = False
 
+        # Set when the client starts closing. Locks acquired from then on are not renewed and
+        # are released by close() along with the others
+        self._closing: bool = False
+
+        # Locks held by this client, keyed by (name, key), which are released when the client
+        # is closed
+        self._held: dict[tuple[str, str], Any] = {}
+
         # setup logger
         self._logger = logging.getLogger("ldlm")
+        if sidecar_address is not None:
+            self._logger.info("Using the LDLM sidecar at %s",
+                              sidecar_address,
+                              extra=log_extra("sidecar.found"))
 
         # Forced lock timeout
-        self._lock_timeout_seconds = lock_timeout_seconds
+        self._lock_timeout_seconds: Timeout = lock_timeout_seconds
 
         # Delay between retry attempts
         self._retry_delay_seconds = retry_delay_seconds
 
+        # Metrics sink. Checked before any timing work so that disabled metrics cost nothing.
+        self._metrics: Optional[MetricsSink] = metrics
+
+        # Tracer. None when tracing is disabled.
+        self._tracer: Optional[tracing.Tracer] = tracer
+
+        # Journal of held locks. None when journaling is disabled.
+        self._journal: Optional[LockJournal] = journal
+
+        # When each lock acquired by this client was acquired, keyed by (name, key). Only
+        # populated when metrics are enabled.
+        self._acquired_at: dict[tuple[str, str], float] = {}
+
+        # RPCs whose batch variant the server does not implement. Requests of these RPCs are
+        # sent as unary RPCs.
+        self._unsupported_batch_rpcs: set[str] = set()
+
+        # "unary" or "session"
+        self._transport: str = transport
+
+        # Errors of a failed RPC attempt, which are retried
+        self._rpc_errors: tuple[type[grpc.RpcError], ...] = (_InactiveRpcError,)
+        if transport == "session":
+            # pylint: disable=import-outside-toplevel
+            from ldlm.session import SessionError
+            self._rpc_errors += (SessionError,)
+
+        # Timeout of the client's lease, or 0 if locks are not attached to a lease
+        self._lease_timeout_seconds: int = lease_timeout_seconds
+
+        # The client's lease. Only valid while its keepalive is running.
+        self._lease_id: Optional[str] = None
+
+        # False once the server is found not to implement Watch
+        self._watch_supported: bool = True
+
+        self._init_channel()
+
+    def _init_channel(self) -> None:
+        """
+        Creates the gRPC channel and the stub used for RPC calls. Subclasses which create
+        channels on demand override this.
+
+        Returns:
+            None
+        """
+        self._channel = self._create_channel(self._address, self._creds)
+
+        # Hold ref to client for gRPC calls
+        self._stub: ldlm_grpc.LDLMStub = ClientStub(self._channel)
+        if self._transport == "session":
+            # pylint: disable=import-outside-toplevel
+            from ldlm.session import SessionStub
+            self._stub = SessionStub(self._channel, self._metadata)
+
+    def _lock_request(
+        self,
+        name: str,
+        wait_timeout_seconds: Optional[Timeout],
+        lock_timeout_seconds: Optional[Timeout],
+        size: int,
+    ) -> pb.LockRequest:
+        """
+        Builds a LockRequest message, applying the client's lock timeout if none is specified.
+
+        Args:
+            name (str): The name of the lock to acquire.
+            wait_timeout_seconds (Timeout, optional): The timeout to wait for the lock.
+            lock_timeout_seconds (Timeout, optional): The lock timeout.
+            size (int): The size of the lock.
+
+        Returns:
+            pb.LockRequest: The request message.
+        """
+        rpc_msg: pb.LockRequest = pb.LockRequest(name=name)
+        if wait_timeout_seconds:
+            rpc_msg.wait_timeout_seconds, ms = _split_timeout(
+                to_seconds(wait_timeout_seconds))
+            if ms is not None:
+                rpc_msg.wait_timeout_ms = ms
+        if lock_timeout_seconds:
+            set_lock_timeout(rpc_msg, lock_timeout_seconds)
+        elif lock_timeout_seconds is None and self._lock_timeout_seconds:
+            set_lock_timeout(rpc_msg, self._lock_timeout_seconds)
+        if size > 0:
+            rpc_msg.size = size
+        if self._lease_id is not None:
+            rpc_msg.lease_id = self._lease_id
+        return rpc_msg
+
+    def _try_lock_request(
+        self,
+        name: str,
+        lock_timeout_seconds: Optional[Timeout],
+        size: int,
+    ) -> pb.TryLockRequest:
+        """
+        Builds a TryLockRequest message, applying the client's lock timeout if none is
+        specified.
+
+        Args:
+            name (str): The name of the lock to acquire.
+            lock_timeout_seconds (Timeout, optional): The lock timeout.
+            size (int): The size of the lock.
+
+        Returns:
+            pb.TryLockRequest: The request message.
+        """
+        rpc_msg: pb.TryLockRequest = pb.TryLockRequest(name=name)
+        if lock_timeout_seconds:
+            set_lock_timeout(rpc_msg, lock_timeout_seconds)
+        elif lock_timeout_seconds is None and self._lock_timeout_seconds:
+            set_lock_timeout(rpc_msg, self._lock_timeout_seconds)
+        if size > 0:
+            rpc_msg.size = size
+        if self._lease_id is not None:
+            rpc_msg.lease_id = self._lease_id
+        return rpc_msg
+
+    def _rpc_callable(self, rpc_func: str,
+                      rpc_message: Any) -> tuple[Any, Any, Any]:
+        """
+        Returns the stub method to call for an RPC, the request to call it with and a function
+        which parses its response, or None if the response is already parsed.
+
+        Args:
+            rpc_func (str): The RPC method.
+            rpc_message (Any): The request message or a :py:class:`PreparedRenew`.
+
+        Returns:
+            tuple[Callable, Any, Optional[Callable[[bytes], Any]]]: The method, request and
+                parser.
+        """
+        stub = self._stub
+        if not isinstance(rpc_message, PreparedRenew):
+            return getattr(stub, rpc_func), rpc_message, None
+        if isinstance(stub, ClientStub):
+            return stub.RenewRaw, rpc_message.request, rpc_message.parse
+        # Other stubs, e.g. test doubles, only accept messages
+        return stub.Renew, rpc_message.message(), None
+
+    def _use_batch(self, rpc_func: str) -> bool:
+        """
+        Returns whether requests of an RPC should be sent with its batch variant. Only
+        :py:class:`ClientStub` stubs are sent batch RPCs; other stubs, e.g. test doubles, get
+        unary RPCs.
+
+        Args:
+            rpc_func (str): The unary RPC method, e.g. "Unlock".
+
+        Returns:
+            bool: Whether to use the batch RPC.
+        """
+        return (rpc_func not in self._unsupported_batch_rpcs and
+                isinstance(self._stub, ClientStub))
+
+    def _batch_messages(self, rpc_func: str,
+                        requests: list[Any]) -> list[tuple[str, Any]]:
+        """
+        Splits requests into batch request messages of at most `max_batch_size` requests.
+
+        Args:
+            rpc_func (str): The unary RPC method, e.g. "Unlock".
+            requests (list[Any]): The unary request messages.
+
+        Returns:
+            list[tuple[str, Any]]: The batch RPC method and message of each batch.
+        """
+        batch_type = _BATCH_REQUESTS[rpc_func]
+        size = self.max_batch_size
+        return [(f"Batch{rpc_func}", batch_type(requests=requests[i:i + size]))
+                for i in range(0, len(requests), size)]
+
+    def _batch_unsupported(self, rpc_func: str, e: BaseException) -> bool:
+        """
+        Checks whether a batch RPC failed because the server does not implement it. If so,
+        requests of the RPC are sent as unary RPCs from then on.
+
+        Args:
+            rpc_func (str): The unary RPC method, e.g. "Unlock".
+            e (BaseException): The exception the batch RPC failed with.
+
+        Returns:
+            bool: Whether the server does not implement the batch RPC.
+        """
+        if rpc_error_code(e) != grpc.StatusCode.UNIMPLEMENTED.name:
+            return False
+        self._unsupported_batch_rpcs.add(rpc_func)
+        self._logger.info("Server does not support Batch%s; using %s RPCs",
+                          rpc_func,
+                          rpc_func,
+                          extra=log_extra("batch.unsupported",
+                                          rpc_method=f"Batch{rpc_func}"))
+        return True
+
+    def _renew_interval(self, timeout_seconds: float) -> float:
+        """
+        Returns the time in seconds between renews of a lock or keepalives of a lease.
+
+        Args:
+            timeout_seconds (float): The lock or lease timeout in seconds.
+
+        Returns:
+            float: The interval. Timeouts shorter than `min_renew_interval_seconds` are renewed
+                at half their length.
+        """
+        interval = max(timeout_seconds - 30, self.min_renew_interval_seconds)
+        if interval > timeout_seconds:
+            return timeout_seconds / 2
+        return interval
+
+    def _keep_alive_interval(self) -> float:
+        """
+        Returns the time in seconds between keepalives of the client's lease.
+
+        Returns:
+            float: The interval.
+        """
+        return self._renew_interval(self._lease_timeout_seconds)
+
+    def _lease_unsupported(self, e: BaseException) -> bool:
+        """
+        Checks whether GrantLease failed because the server does not implement it. If so,
+        the client renews each lock from then on.
+
+        Args:
+            e (BaseException): The exception GrantLease failed with.
+
+        Returns:
+            bool: Whether the server does not implement leases.
+        """
+        if rpc_error_code(e) != grpc.StatusCode.UNIMPLEMENTED.name:
+            return False
+        self._lease_timeout_seconds = 0
+        self._logger.info("Server does not support leases; renewing each lock",
+                          extra=log_extra("lease.unsupported",
+                                          rpc_method="GrantLease"))
+        return True
+
+    def _watch_unsupported(self, e: BaseException) -> bool:
+        """
+        Checks whether Watch failed because the server does not implement it. If so, the
+        client waits for locks with Lock requests from then on.
+
+        Args:
+            e (BaseException): The exception Watch failed with.
+
+        Returns:
+            bool: Whether the server does not implement Watch.
+        """
+        if rpc_error_code(e) != grpc.StatusCode.UNIMPLEMENTED.name:
+            return False
+        self._watch_supported = False
+        self._logger.info("Server does not support Watch; using Lock RPCs",
+                          extra=log_extra("watch.unsupported",
+                                          rpc_method="Watch"))
+        return True
+
+    def _lease_lost(self, lease_id: str, e: BaseException) -> None:
+        """
+        Reports a lease whose keepalive failed. The locks attached to it are lost; a new lease
+        is granted when the next lock is requested.
+
+        Args:
+            lease_id (str): The id of the lease.
+            e (BaseException): The exception the keepalive failed with.
+
+        Returns:
+            None
+        """
+        self._logger.error(
+            "Failed to keep lease %s alive; its locks are lost: %r",
+            lease_id,
+            e,
+            extra=log_extra("lease.lost", error=repr(e)))
+        for name, key in list(self._held):
+            self._record_lost(name, key)
+
+    @staticmethod
+    def _batch_result(response: Any) -> Any:
+        """
+        Returns a response of a batch, or the exception it describes if it is an error.
+
+        Args:
+            response (Any): A LockResponse or UnlockResponse.
+
+        Returns:
+            Any: The response or an exception.
+        """
+        if response.HasField("error"):
+            return exceptions.from_rpc_error(response.error)
+        return response
+
+    @property
+    def metrics(self) -> Optional[MetricsSink]:
+        """
+        The metrics sink of the client, or None if metrics are disabled. It may be changed at
+        any time, e.g. to enable a profiler while the client is in use.
+        """
+        return self._metrics
+
+    @metrics.setter
+    def metrics(self, metrics: Optional[MetricsSink]) -> None:
+        self._metrics = metrics
+
+    def _span(self, name: str, lock_name: str,
+              **attributes: Any) -> AbstractContextManager:
+        """
+        Returns a context manager which traces its body as a span named `name`, or does
+        nothing if tracing is disabled.
+
+        Args:
+            name (str): The span name.
+            lock_name (str): The name of the lock the span is for.
+            **attributes: Additional span attributes, prefixed with "ldlm.lock.".
+
+        Returns:
+            AbstractContextManager: The context manager. Its value is the span, or None if
+                tracing is disabled.
+        """
+        if self._tracer is None:
+            return nullcontext()
+        # pylint: disable=import-outside-toplevel
+        from ldlm import tracing
+        attrs = {"ldlm.lock.name": lock_name}
+        for key, value in attributes.items():
+            attrs[f"ldlm.lock.{key}"] = value
+        return tracing.start_as_current_span(self._tracer, name, attrs)
+
+    def _start_rpc_span(self, rpc_func: str, rpc_message: Any,
+                        attempt: int) -> Optional[tracing.Span]:
+        """
+        Starts the span for an RPC attempt if tracing is enabled.
+
+        Args:
+            rpc_func (str): The RPC method.
+            rpc_message (Any): The request message.
+            attempt (int): The attempt number, starting at 1.
+
+        Returns:
+            tracing.Span: The span, or None if tracing is disabled.
+        """
+        if self._tracer is None:
+            return None
+        # pylint: disable=import-outside-toplevel
+        from ldlm import tracing
+        attributes: dict[str, Any] = {
+            "ldlm.rpc.method": rpc_func,
+            "ldlm.rpc.attempt": attempt,
+        }
+        if (requests := getattr(rpc_message, "requests", None)) is not None:
+            attributes["ldlm.rpc.batch_size"] = len(requests)
+        elif hasattr(rpc_message, "name"):
+            attributes["ldlm.lock.name"] = rpc_message.name
+        return self._tracer.start_span(f"ldlm.rpc.{rpc_func}",
+                                       tracing.current_span(), attributes)
+
+    def _rpc_attempt_done(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        rpc_func: str,
+        started: float,
+        span: Optional[tracing.Span],
+        code: str,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """
+        Reports an RPC attempt to the metrics sink and ends its span.
+
+        Args:
+            rpc_func (str): The RPC method.
+            started (float): The time.perf_counter() value when the attempt started.
+            span (tracing.Span, optional): The span of the attempt.
+            code (str): "OK", a gRPC status code name or an LDLM error code name.
+            error (BaseException, optional): The error the attempt failed with.
+
+        Returns:
+            None
+        """
+        if self._metrics is not None:
+            self._metrics.rpc_completed(rpc_func,
+                                        time.perf_counter() - started, code)
+        if span is not None:
+            span.set_attribute("ldlm.rpc.code", code)
+            if error is not None:
+                span.record_exception(error)
+            span.end()
+
+    def _record_acquire(self,
+                        r: pb.LockResponse,
+                        started: float,
+                        try_lock: bool = False) -> None:
+        """
+        Reports the outcome of a Lock or TryLock request to the metrics sink.
+
+        Args:
+            r (pb.LockResponse): The response.
+            started (float): The time.perf_counter() value when the request started.
+            try_lock (bool, optional): Whether the request was a TryLock request.
+
+        Returns:
+            None
+        """
+        if (metrics := self._metrics) is None:
+            return
+        now = time.perf_counter()
+        if r.locked:
+            self._acquired_at[r.name, r.key] = now
+            metrics.lock_acquired(r.name, now - started, try_lock)
+        else:
+            metrics.lock_not_acquired(r.name, now - started, try_lock)
+
+    def _track(self, lock: Any) -> None:
+        """
+        Records a lock acquired by this client, if it is locked, as held and in the journal.
+
+        Args:
+            lock (Lock | AsyncLock): The lock.
+
+        Returns:
+            None
+        """
+        if not lock.locked:
+            return
+        self._held[lock.name, lock.key] = lock
+        if self._journal is not None:
+            self._journal.add(lock.name, lock.key, lock.size,
+                              lock.lock_timeout_seconds)
+
+    def _forget(self, name: str, key: str) -> None:
+        """
+        Removes a lock which is no longer held from the held locks and the journal.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the lock.
+
+        Returns:
+            None
+        """
+        self._held.pop((name, key), None)
+        if self._journal is not None:
+            self._journal.remove(name, key)
+
+    def _record_release(self, name: str, key: str) -> None:
+        """
+        Reports an unlocked lock to the metrics sink and forgets it.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the lock.
+
+        Returns:
+            None
+        """
+        self._forget(name, key)
+        if (metrics := self._metrics) is None:
+            return
+        acquired_at = self._acquired_at.pop((name, key), None)
+        if acquired_at is not None:
+            metrics.lock_released(name, time.perf_counter() - acquired_at)
+
+    def _record_lost(self, name: str, key: str) -> None:
+        """
+        Reports a lock whose renew failed to the metrics sink and forgets it.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the lock.
+
+        Returns:
+            None
+        """
+        self._forget(name, key)
+        if (metrics := self._metrics) is None:
+            return
+        if self._acquired_at.pop((name, key), None) is not None:
+            metrics.lock_lost(name)
+
+    def _check_handoff(self) -> None:
+        """
+        Raises:
+            RuntimeError: If the client attaches locks to a lease, which can not be handed over
+                to another client.
+        """
+        if self._lease_timeout_seconds:
+            raise RuntimeError(
+                "locks of a client with a lease can not be handed off or adopted"
+            )
+
+    @staticmethod
+    def _lock_handle(lock: Any, renewed_at: Optional[float]) -> LockHandle:
+        """
+        Returns the handle of a lock.
+
+        Args:
+            lock (Lock | AsyncLock): The lock.
+            renewed_at (float, optional): `time.time()` when the lock was last renewed, or None
+                if it is unknown.
+
+        Returns:
+            LockHandle: The handle.
+        """
+        deadline = None
+        if lock.lock_timeout_seconds and renewed_at is not None:
+            deadline = renewed_at + lock.lock_timeout_seconds
+        return LockHandle(lock.name, lock.key, lock.size,
+                          lock.lock_timeout_seconds, deadline)
+
+    def _adopt_renew_due(self, handle: LockHandle) -> bool:
+        """
+        Returns whether an adopted lock must be renewed before its renew timer is started,
+        because it would expire before its first scheduled renew or with less than half of
+        the usual margin.
+
+        Args:
+            handle (LockHandle): The handle of the lock.
+
+        Returns:
+            bool: Whether the lock must be renewed.
+        """
+        timeout = handle.lock_timeout_seconds
+        if not timeout:
+            return False
+        if handle.deadline is None:
+            return True
+        interval = self._renew_interval(timeout)
+        return handle.deadline - time.time() < interval + (timeout -
+                                                           interval) / 2
+
+    def _recovery_requests(
+        self, adopt: bool
+    ) -> tuple[list[JournalEntry], list[Union[pb.RenewRequest,
+                                              pb.UnlockRequest]]]:
+        """
+        Returns the journaled locks and the Renew requests which adopt them or the Unlock
+        requests which release them.
+
+        Args:
+            adopt (bool): Whether to adopt the locks.
+
+        Raises:
+            RuntimeError: If the client has no journal.
+
+        Returns:
+            tuple[list[JournalEntry], list]: The entries and a request for each.
+        """
+        if self._journal is None:
+            raise RuntimeError("client has no lock journal")
+        entries = self._journal.entries()
+        requests: list[Union[pb.RenewRequest, pb.UnlockRequest]] = []
+        for entry in entries:
+            if adopt:
+                request = pb.RenewRequest(name=entry.name, key=entry.key)
+                if entry.lock_timeout_seconds:
+                    set_lock_timeout(request, entry.lock_timeout_seconds)
+                requests.append(request)
+            else:
+                requests.append(pb.UnlockRequest(name=entry.name,
+                                                 key=entry.key))
+        return entries, requests
+
+    def _recovered(
+        self, entries: list[JournalEntry], results: list
+    ) -> tuple[list[tuple[JournalEntry, pb.LockResponse]], Optional[Exception]]:
+        """
+        Processes the results of recovery requests. Entries of locks which were released or no
+        longer exist are removed from the journal; entries whose request failed are kept so
+        that recovery can be retried.
+
+        Args:
+            entries (list[JournalEntry]): The journaled locks.
+            results (list): The result of the request for each entry.
+
+        Returns:
+            tuple[list[tuple[JournalEntry, pb.LockResponse]], Optional[Exception]]: The
+                entries of adopted locks with their Renew responses, and the first error.
+        """
+        assert self._journal is not None
+        adopted: list[tuple[JournalEntry, pb.LockResponse]] = []
+        error: Optional[Exception] = None
+        for entry, r in zip(entries, results):
+            if isinstance(r, pb.LockResponse) and r.locked:
+                adopted.append((entry, r))
+                continue
+            if isinstance(r, Exception) and not isinstance(r, LOST_LOCK_ERRORS):
+                error = error or r
+                continue
+            self._journal.remove(entry.name, entry.key)
+        self._logger.info("Recovered %d journaled lock(s)",
+                          len(entries),
+                          extra=log_extra("journal.recover",
+                                          count=len(entries)))
+        return adopted, error
+
     @abc.abstractmethod
     def _create_channel(
         self,
@@ -0,0 +1,547 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Load generator for capacity testing an LDLM server.
+
+Run `python -m ldlm.bench --help` for options. Workers repeatedly pick a lock name, acquire it
+with `lock()` or `try_lock()`, hold it for a while and release it. Throughput and latency are
+printed every `--interval` seconds and a final report is printed and optionally written as JSON.
+
+Example:
+    python -m ldlm.bench --address ldlm.internal:3144 --concurrency 200 --keys 10000 \\
+        --distribution zipf --hold-ms 20 --hold-distribution exponential --duration 60 \\
+        --output report.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import bisect
+from dataclasses import asdict, dataclass, field
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from typing import Callable, Optional, TextIO
+
+from .base_client import TLSConfig
+from .client import Client
+from .client_aio import AsyncClient
+from .metrics import LatencyHistogram
+
+
+@dataclass
+class BenchConfig:  # pylint: disable=too-many-instance-attributes
+    """
+    Load generator configuration.
+    """
+
+    address: str = "localhost:3144"
+    """address of the LDLM server"""
+
+    password: Optional[str] = None
+    """password to use for authentication"""
+
+    tls: Optional[TLSConfig] = None
+    """TLS configuration"""
+
+    mode: str = "threads"
+    """'threads' to run workers as threads sharing a Client, 'asyncio' to run them as tasks
+    sharing an AsyncClient"""
+
+    concurrency: int = 16
+    """number of workers"""
+
+    duration_seconds: float = 10.0
+    """how long to generate load"""
+
+    interval_seconds: float = 1.0
+    """time between live reports. 0 disables them"""
+
+    keys: int = 1000
+    """number of distinct lock names"""
+
+    key_prefix: str = "ldlm-bench-"
+    """prefix of lock names"""
+
+    distribution: str = "uniform"
+    """how lock names are picked: 'uniform' or 'zipf'"""
+
+    zipf_s: float = 1.1
+    """Zipf exponent. Larger values concentrate load on fewer names"""
+
+    hold_ms: float = 0.0
+    """mean time to hold each lock in milliseconds"""
+
+    hold_distribution: str = "fixed"
+    """distribution of hold times: 'fixed', 'uniform' (0 to 2 x mean) or 'exponential'"""
+
+    lock_timeout_seconds: Optional[int] = None
+    """lease length of acquired locks. None uses the client default"""
+
+    wait_timeout_seconds: int = 5
+    """maximum time a lock() call waits"""
+
+    try_lock_ratio: float = 0.0
+    """fraction of acquisitions that use try_lock() instead of lock()"""
+
+    size: int = 0
+    """lock size. 0 uses the server default"""
+
+    retries: int = 0
+    """client retries per RPC"""
+
+    auto_renew_locks: bool = True
+    """whether the client renews held locks"""
+
+    seed: Optional[int] = None
+    """random seed"""
+
+
+@dataclass
+class _Stats:
+    """
+    Counters and histograms of a single worker, or merged across workers.
+    """
+
+    acquire: LatencyHistogram = field(default_factory=LatencyHistogram)
+    release: LatencyHistogram = field(default_factory=LatencyHistogram)
+    acquired: int = 0
+    not_acquired: int = 0
+    errors: dict[str, int] = field(default_factory=dict)
+
+    def error(self, e: Exception) -> None:
+        """
+        Counts an exception by type.
+        """
+        name = type(e).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    @classmethod
+    def collect(cls, workers: list[_Stats]) -> _Stats:
+        """
+        Returns the stats of all workers merged.
+        """
+        totals = cls()
+        for w in workers:
+            totals.acquire.merge(w.acquire)
+            totals.release.merge(w.release)
+            totals.acquired += w.acquired
+            totals.not_acquired += w.not_acquired
+            for name, n in list(w.errors.items()):
+                totals.errors[name] = totals.errors.get(name, 0) + n
+        return totals
+
+    @property
+    def error_count(self) -> int:
+        """
+        The total number of errors.
+        """
+        return sum(self.errors.values())
+
+
+class _Workload:
+    """
+    Picks lock names, hold times and acquisition methods according to a BenchConfig.
+    """
+
+    def __init__(self, config: BenchConfig, rng: random.Random):
+        self._config = config
+        self._rng = rng
+        if config.distribution == "zipf":
+            self._cum_weights: Optional[list[float]] = list(
+                itertools.accumulate(
+                    1 / (k**config.zipf_s) for k in range(1, config.keys + 1)))
+        elif config.distribution == "uniform":
+            self._cum_weights = None
+        else:
+            raise ValueError(f"unknown key distribution: {config.distribution}")
+        if config.hold_distribution not in ("fixed", "uniform", "exponential"):
+            raise ValueError(
+                f"unknown hold distribution: {config.hold_distribution}")
+
+    def name(self) -> str:
+        """
+        Picks a lock name.
+        """
+        if self._cum_weights is None:
+            i = self._rng.randrange(self._config.keys)
+        else:
+            i = min(
+                bisect.bisect(self._cum_weights,
+                              self._rng.random() * self._cum_weights[-1]),
+                self._config.keys - 1)
+        return f"{self._config.key_prefix}{i}"
+
+    def hold_seconds(self) -> float:
+        """
+        Picks how long to hold a lock.
+        """
+        mean = self._config.hold_ms / 1000
+        if mean <= 0 or self._config.hold_distribution == "fixed":
+            return max(mean, 0)
+        if self._config.hold_distribution == "uniform":
+            return self._rng.uniform(0, 2 * mean)
+        return self._rng.expovariate(1 / mean)
+
+    def use_try_lock(self) -> bool:
+        """
+        Picks whether to acquire with try_lock() rather than lock().
+        """
+        return self._rng.random() < self._config.try_lock_ratio
+
+
+def _run_threads(config: BenchConfig, workers: list[_Stats],
+                 on_interval: Callable[[float], None]) -> float:
+    """
+    Runs workers as threads sharing a Client.
+
+    Returns:
+        float: The elapsed time in seconds.
+    """
+    client = Client(
+        config.address,
+        password=config.password,
+        tls=config.tls,
+        retries=config.retries,
+        auto_renew_locks=config.auto_renew_locks,
+    )
+    stop = threading.Event()
+    seeds = random.Random(config.seed)
+
+    def worker(stats: _Stats, workload: _Workload) -> None:
+        while not stop.is_set():
+            name = workload.name()
+            start = time.perf_counter()
+            try:
+                if workload.use_try_lock():
+                    lock = client.try_lock(
+                        name,
+                        lock_timeout_seconds=config.lock_timeout_seconds,
+                        size=config.size)
+                else:
+                    lock = client.lock(
+                        name,
+                        wait_timeout_seconds=config.wait_timeout_seconds,
+                        lock_timeout_seconds=config.lock_timeout_seconds,
+                        size=config.size)
+                stats.acquire.record(time.perf_counter() - start)
+                if not lock.locked:
+                    stats.not_acquired += 1
+                    continue
+                stats.acquired += 1
+                hold = workload.hold_seconds()
+                if hold:
+                    time.sleep(hold)
+                start = time.perf_counter()
+                lock.unlock()
+                stats.release.record(time.perf_counter() - start)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                stats.error(e)
+                # Avoid spinning when the server is unreachable
+                stop.wait(0.1)
+
+    threads = [
+        threading.Thread(target=worker,
+                         args=(stats,
+                               _Workload(config,
+                                         random.Random(seeds.random()))),
+                         daemon=True) for stats in workers
+    ]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    deadline = start + config.duration_seconds
+    while (now := time.perf_counter()) < deadline:
+        if config.interval_seconds > 0:
+            stop.wait(min(config.interval_seconds, deadline - now))
+            on_interval(time.perf_counter() - start)
+        else:
+            stop.wait(deadline - now)
+    stop.set()
+    elapsed = time.perf_counter() - start
+    for t in threads:
+        t.join(config.wait_timeout_seconds + 5)
+    client.close()
+    return elapsed
+
+
+async def _run_tasks(config: BenchConfig, workers: list[_Stats],
+                     on_interval: Callable[[float], None]) -> float:
+    """
+    Runs workers as asyncio tasks sharing an AsyncClient.
+
+    Returns:
+        float: The elapsed time in seconds.
+    """
+    client = AsyncClient(
+        config.address,
+        password=config.password,
+        tls=config.tls,
+        retries=config.retries,
+        auto_renew_locks=config.auto_renew_locks,
+    )
+    stop = asyncio.Event()
+    seeds = random.Random(config.seed)
+
+    async def worker(stats: _Stats, workload: _Workload) -> None:
+        while not stop.is_set():
+            name = workload.name()
+            start = time.perf_counter()
+            try:
+                if workload.use_try_lock():
+                    lock = await client.try_lock(
+                        name,
+                        lock_timeout_seconds=config.lock_timeout_seconds,
+                        size=config.size)
+                else:
+                    lock = await client.lock(
+                        name,
+                        wait_timeout_seconds=config.wait_timeout_seconds,
+                        lock_timeout_seconds=config.lock_timeout_seconds,
+                        size=config.size)
+                stats.acquire.record(time.perf_counter() - start)
+                if not lock.locked:
+                    stats.not_acquired += 1
+                    continue
+                stats.acquired += 1
+                hold = workload.hold_seconds()
+                if hold:
+                    await asyncio.sleep(hold)
+                start = time.perf_counter()
+                await lock.unlock()
+                stats.release.record(time.perf_counter() - start)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                stats.error(e)
+                await asyncio.sleep(0.1)
+
+    tasks = [
+        asyncio.ensure_future(
+            worker(stats, _Workload(config, random.Random(seeds.random()))))
+        for stats in workers
+    ]
+    start = time.perf_counter()
+    deadline = start + config.duration_seconds
+    while (now := time.perf_counter()) < deadline:
+        if config.interval_seconds > 0:
+            await asyncio.sleep(min(config.interval_seconds, deadline - now))
+            on_interval(time.perf_counter() - start)
+        else:
+            await asyncio.sleep(deadline - now)
+    stop.set()
+    elapsed = time.perf_counter() - start
+    _, pending = await asyncio.wait(tasks,
+                                    timeout=config.wait_timeout_seconds + 5)
+    for t in pending:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await client.close()
+    return elapsed
+
+
+def run(config: BenchConfig, out: Optional[TextIO] = sys.stdout) -> dict:
+    """
+    Generates load against an LDLM server as described by `config`.
+
+    Args:
+        config (BenchConfig): The load to generate.
+        out (TextIO, optional): Where to print live and final reports. Defaults to stdout.
+            None disables printing.
+
+    Returns:
+        dict: The final report.
+
+    Examples:
+        >>> from ldlm.bench import BenchConfig, run
+        >>> report = run(BenchConfig(address="localhost:3144", concurrency=50,
+        ...                          duration_seconds=30, distribution="zipf"))
+        >>> report["throughput"]["acquired_per_second"]
+        8211.4
+    """
+    # Validate before starting any workers
+    _Workload(config, random.Random())
+
+    workers = [_Stats() for _ in range(config.concurrency)]
+    last: list[tuple[float, _Stats]] = [(0.0, _Stats())]
+
+    def on_interval(elapsed: float) -> None:
+        if out is None:
+            return
+        totals = _Stats.collect(workers)
+        prev_elapsed, prev = last[0]
+        last[0] = (elapsed, totals)
+        span = max(elapsed - prev_elapsed, 1e-9)
+        acquire = totals.acquire.since(prev.acquire)
+        print(
+            f"[{elapsed:7.1f}s] "
+            f"{acquire.count / span:9.1f} ops/s "
+            f"{(totals.acquired - prev.acquired) / span:9.1f} acquired/s  "
+            f"acquire p50={acquire.percentile(0.5) * 1000:.2f}ms "
+            f"p99={acquire.percentile(0.99) * 1000:.2f}ms "
+            f"p999={acquire.percentile(0.999) * 1000:.2f}ms  "
+            f"errors={totals.error_count - prev.error_count}",
+            file=out,
+            flush=True)
+
+    if config.mode == "threads":
+        elapsed = _run_threads(config, workers, on_interval)
+    elif config.mode == "asyncio":
+        elapsed = asyncio.run(_run_tasks(config, workers, on_interval))
+    else:
+        raise ValueError(f"unknown mode: {config.mode}")
+
+    totals = _Stats.collect(workers)
+    config_dict = asdict(config)
+    config_dict.pop("password")
+    report = {
+        "config": config_dict,
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput": {
+            "ops_per_second": round(totals.acquire.count / elapsed, 1),
+            "acquired_per_second": round(totals.acquired / elapsed, 1),
+        },
+        "acquired": totals.acquired,
+        "not_acquired": totals.not_acquired,
+        "errors": totals.errors,
+        "acquire_latency": totals.acquire.summary(),
+        "release_latency": totals.release.summary(),
+        "acquire_histogram_ms": totals.acquire.buckets(),
+        "release_histogram_ms": totals.release.buckets(),
+    }
+
+    if out is not None:
+        print(_format_report(report), file=out, flush=True)
+    return report
+
+
+def _format_report(report: dict) -> str:
+    lines = [
+        "",
+        f"elapsed:      {report['elapsed_seconds']}s",
+        f"throughput:   {report['throughput']['ops_per_second']} ops/s, "
+        f"{report['throughput']['acquired_per_second']} acquired/s",
+        f"acquired:     {report['acquired']}",
+        f"not acquired: {report['not_acquired']}",
+        f"errors:       {report['errors'] or 0}",
+    ]
+    for kind in ("acquire", "release"):
+        s = report[f"{kind}_latency"]
+        lines.append(f"{kind + ' latency:':<17} mean={s['mean_ms']}ms "
+                     f"p50={s['p50_ms']}ms p90={s['p90_ms']}ms "
+                     f"p99={s['p99_ms']}ms p999={s['p999_ms']}ms "
+                     f"max={s['max_ms']}ms")
+    return "\n".join(lines)
+
+
+def _parse_args(argv: Optional[list[str]]) -> tuple[BenchConfig, Optional[str]]:
+    defaults = BenchConfig()
+    parser = argparse.ArgumentParser(
+        prog="python -m ldlm.bench",
+        description="Generate lock load against an LDLM server.")
+    add = parser.add_argument
+    add("--address", default=defaults.address, help="server address")
+    add("--password", help="server password")
+    add("--tls-ca-file", help="CA certificate file. Enables TLS")
+    add("--tls-cert-file", help="client certificate file. Enables TLS")
+    add("--tls-key-file", help="client key file. Enables TLS")
+    add("--mode", choices=["threads", "asyncio"], default=defaults.mode)
+    add("--concurrency", type=int, default=defaults.concurrency)
+    add("--duration", type=float, default=defaults.duration_seconds)
+    add("--interval",
+        type=float,
+        default=defaults.interval_seconds,
+        help="seconds between live reports. 0 disables them")
+    add("--keys",
+        type=int,
+        default=defaults.keys,
+        help="number of distinct lock names")
+    add("--key-prefix", default=defaults.key_prefix)
+    add("--distribution",
+        choices=["uniform", "zipf"],
+        default=defaults.distribution)
+    add("--zipf-s", type=float, default=defaults.zipf_s)
+    add("--hold-ms",
+        type=float,
+        default=defaults.hold_ms,
+        help="mean lock hold time")
+    add("--hold-distribution",
+        choices=["fixed", "uniform", "exponential"],
+        default=defaults.hold_distribution)
+    add("--lock-timeout",
+        type=int,
+        help="lease length of acquired locks in seconds")
+    add("--wait-timeout", type=int, default=defaults.wait_timeout_seconds)
+    add("--try-lock-ratio",
+        type=float,
+        default=defaults.try_lock_ratio,
+        help="fraction of acquisitions that use try_lock()")
+    add("--size", type=int, default=defaults.size)
+    add("--retries", type=int, default=defaults.retries)
+    add("--no-auto-renew", action="store_true")
+    add("--seed", type=int)
+    add("--output", help="write the final report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    tls = None
+    if args.tls_ca_file or args.tls_cert_file or args.tls_key_file:
+        tls = TLSConfig(ca_file=args.tls_ca_file,
+                        cert_file=args.tls_cert_file,
+                        key_file=args.tls_key_file)
+
+    config = BenchConfig(
+        address=args.address,
+        password=args.password,
+        tls=tls,
+        mode=args.mode,
+        concurrency=args.concurrency,
+        duration_seconds=args.duration,
+        interval_seconds=args.interval,
+        keys=args.keys,
+        key_prefix=args.key_prefix,
+        distribution=args.distribution,
+        zipf_s=args.zipf_s,
+        hold_ms=args.hold_ms,
+        hold_distribution=args.hold_distribution,
+        lock_timeout_seconds=args.lock_timeout,
+        wait_timeout_seconds=args.wait_timeout,
+        try_lock_ratio=args.try_lock_ratio,
+        size=args.size,
+        retries=args.retries,
+        auto_renew_locks=not args.no_auto_renew,
+        seed=args.seed,
+    )
+    return config, args.output
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """
+    Command line entry point.
+
+    Args:
+        argv (list[str], optional): Command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        None
+    """
+    config, output = _parse_args(argv)
+    report = run(config)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -11,22 +11,33 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# pylint: disable=too-many-lines
 """
 Client class and helpers for the LDLM service.
 """
 from __future__ import annotations
 
+import atexit
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+import contextvars
+import functools
+import signal
 import time
 import logging
+import queue
+import weakref
 from contextlib import contextmanager
-from typing import Optional, Iterator, Union
-from threading import Timer
+from typing import Any, Callable, Optional, Iterable, Iterator, Union
+from threading import Lock as ThreadLock, Thread, Timer, current_thread
 
 import grpc
-from grpc._channel import _InactiveRpcError
 
 from ldlm import exceptions
-from ldlm.base_client import BaseClient
+from ldlm.base_client import (LockHandle, OPTIONAL_RPCS, BaseClient,
+                              PreparedRenew, LOST_LOCK_ERRORS, Timeout,
+                              lock_timeout, log_extra, rpc_deadline,
+                              rpc_error_code, set_lock_timeout, to_seconds,
+                              wait_deadline)
 from ldlm.protos import ldlm_pb2 as pb
 
 
@@ -35,13 +46,21 @@ class Lock:
     A lock returned by LDLM Client lock methods.
     """
 
-    __slots__ = ("name", "key", "locked", "_client")
+    __slots__ = ("name", "key", "locked", "size", "lock_timeout_seconds",
+                 "_client")
 
-    def __init__(self, client: Client, lock: pb.LockResponse):
+    def __init__(self,
+                 client: Client,
+                 lock: pb.LockResponse,
+                 size: int = 0,
+                 lock_timeout_seconds: float = 0.0):
         """
         Args:
             client (Client): The client object.
             lock (pb.LockResponse): An LDLM lock response object.
+            size (int, optional): The size of the lock, or 0 if unspecified.
+            lock_timeout_seconds (float, optional): The lock timeout in seconds, or 0 if the
+                lock has none.
         """
         self._client: Optional[Client] = client if lock.locked else None
 
@@ -54,6 +73,13 @@ class Lock:
         self.locked: bool = lock.locked
         """whether the lock is locked or not"""
 
+        self.size: int = size
+        """size of the lock, or 0 if unspecified"""
+
+        self.lock_timeout_seconds: float = lock_timeout_seconds
+        """timeout in seconds after which the lock expires unless it is renewed, or 0 for
+        none"""
+
     def __bool__(self) -> bool:
         """
         Returns whether the lock is locked or not.
@@ -78,12 +104,12 @@ class Lock:
 
         self._client.unlock(self.name, self.key)
 
-    def renew(self, lock_timeout_seconds: int) -> None:
+    def renew(self, lock_timeout_seconds: Timeout) -> None:
         """
         Renews the lock.
 
         Args:
-            lock_timeout_seconds (int): The timeout in seconds after which the lock will
+            lock_timeout_seconds (Timeout): The timeout in seconds after which the lock will
                 expire.
 
         Returns:
@@ -97,6 +123,25 @@ class Lock:
         lock: Lock = self._client.renew(self.name, self.key,
                                         lock_timeout_seconds)
         self.locked = lock.locked
+        self.lock_timeout_seconds = to_seconds(lock_timeout_seconds)
+
+    def handoff(self) -> LockHandle:
+        """
+        Hands the lock over to another client, e.g. in another process, without releasing it.
+        This client stops renewing the lock and the lock object is no longer `locked`.
+
+        Returns:
+            LockHandle: A serializable handle to pass to `adopt()` of the receiving client.
+
+        Raises:
+            RuntimeError: If the lock is not locked
+        """
+        if not self.locked or self._client is None:
+            raise RuntimeError("handoff() called on unlocked lock")
+        handle = self._client.handoff(self)
+        self.locked = False
+        self._client = None
+        return handle
 
 
 class _RenewTimer(Timer):
@@ -104,50 +149,177 @@ class _RenewTimer(Timer):
     threading.Timer implementation for renewing a lock
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self,
         lock: Lock,
-        lock_timeout_seconds: int,
-        interval: int,
+        renew: Callable[[], object],
+        interval: float,
         logger: logging.Logger,
+        on_renewed: Optional[Callable[[float], None]] = None,
+        on_lost: Optional[Callable[[], None]] = None,
     ):
         """
         Initializes a new instance of the class.
 
         Args:
             lock (Lock): The lock to renew.
-            lock_timeout_seconds (int): The timeout in seconds after which the lock will
-                expire
-            interval (int): The interval in seconds between renew attempts
+            renew (Callable[[], object]): Renews the lock
+            interval (float): The interval in seconds between renew attempts
             logger (logging.Logger): The logger to use for logging
+            on_renewed (Callable[[float], None], optional): Called after each successful
+                renew with the seconds from when the renew was due until it completed
+            on_lost (Callable[[], None], optional): Called if a renew fails
 
         Returns:
             None
         """
-        logger.debug(
-            f"Renew timer renewing lock {lock.name} every {interval} seconds.")
-        super().__init__(
-            interval,
-            lock.renew,
-            args=(lock_timeout_seconds,),
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Renew timer renewing lock %s every %s seconds.",
+                         lock.name,
+                         interval,
+                         extra=log_extra("renew.start",
+                                         lock.name,
+                                         interval_seconds=interval))
+        super().__init__(interval, renew)
+        self._lock_name = lock.name
+
+        # time.time() when the lock was last renewed, or the timer was started
+        self.renewed_at: float = time.time()
+
+        self._logger = logger
+        self._on_renewed = on_renewed
+        self._on_lost = on_lost
+
+        # Renew in the context of the thread which acquired the lock so that renew spans
+        # have the same parent as the lock's other spans.
+        self._context = contextvars.copy_context()
+
+    def run(self):
+        """
+        Start the timer thread. The timer stops if renewing the lock fails.
+
+        Returns:
+            None
+        """
+        self._context.run(self._run)
+
+    def _run(self) -> None:
+        due = time.perf_counter() + self.interval
+        while not self.finished.wait(self.interval):
+            started = time.time()
+            try:
+                self.function(*self.args, **self.kwargs)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._logger.error(
+                    "Failed to renew lock `%s`; no longer renewing: %r",
+                    self._lock_name,
+                    e,
+                    extra=log_extra("renew.failed",
+                                    self._lock_name,
+                                    error=repr(e)))
+                if self._on_lost is not None:
+                    self._on_lost()
+                return
+            self.renewed_at = started
+            now = time.perf_counter()
+            if self._on_renewed is not None:
+                self._on_renewed(now - due)
+            due = now + self.interval
+
+    def stop(self) -> None:
+        """
+        Cancels the timer and waits for an in-progress renew to complete.
+
+        Returns:
+            None
+        """
+        self.cancel()
+        if self is not current_thread() and self.is_alive():
+            self.join()
+
+
+class _KeepAliveTimer(Timer):
+    """
+    threading.Timer implementation for keeping a lease alive. It runs in a daemon thread so
+    that it does not keep the process alive; the lease expires when the process exits.
+    """
+
+    def __init__(self, keep_alive: Callable[[], object], interval: float,
+                 on_lost: Callable[[BaseException], None]):
+        """
+        Args:
+            keep_alive (Callable[[], object]): Keeps the lease alive
+            interval (float): The interval in seconds between keepalives
+            on_lost (Callable[[BaseException], None]): Called with the exception if a keepalive
+                fails
+        """
+        super().__init__(interval, keep_alive)
+        self.daemon = True
+        self._on_lost = on_lost
+        self._context = contextvars.copy_context()
 
     def run(self):
         """
-        Start the timer thread
+        Start the timer thread. The timer stops if a keepalive fails.
 
         Returns:
             None
         """
+        self._context.run(self._run)
+
+    def _run(self) -> None:
         while not self.finished.wait(self.interval):
-            self.function(*self.args, **self.kwargs)
+            try:
+                self.function()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._on_lost(e)
+                return
+
+    def stop(self) -> None:
+        """
+        Cancels the timer and waits for an in-progress keepalive to complete.
+
+        Returns:
+            None
+        """
+        self.cancel()
+        if self is not current_thread() and self.is_alive():
+            self.join()
+
+
+def _close_at_exit(ref: weakref.ref[Client], grace_seconds: float) -> None:
+    """
+    Closes a client registered with :py:meth:`Client.close_at_exit`, if it still exists.
+
+    Args:
+        ref (weakref.ref[Client]): A weak reference to the client.
+        grace_seconds (float): Passed to :py:meth:`Client.close`.
+
+    Returns:
+        None
+    """
+    if (client := ref()) is not None:
+        client.close(grace_seconds)
 
 
 class Client(BaseClient):
     """
-    Client class for interacting with the LDLM server.
+    Client class for interacting with the LDLM server. A single instance may be shared by many
+    threads.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Guards _lock_timers, which is accessed from caller threads and renew timer threads.
+        # Only held for dict operations; never while waiting on an RPC or a thread.
+        self._lock_timers_lock = ThreadLock()
+
+        # Keeps the client's lease alive. Held while granting a lease so that threads
+        # acquiring their first locks concurrently share one lease.
+        self._lease_keeper: Optional[_KeepAliveTimer] = None
+        self._lease_lock = ThreadLock()
+
     def _create_channel(
         self,
         address: str,
@@ -175,8 +347,8 @@ class Client(BaseClient):
     def lock(
         self,
         name: str,
-        wait_timeout_seconds: int = 0,
-        lock_timeout_seconds: Optional[int] = None,
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> Lock:
         """
@@ -188,9 +360,9 @@ class Client(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            wait_timeout_seconds (int, optional): The timeout in seconds to wait for the
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for the
                 lock to be acquired. Defaults to 0 (wait indefinitely).
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to None (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -241,27 +413,45 @@ class Client(BaseClient):
             ...     print("Released lock")
             >>> Released lock
         """
-        rpc_msg: pb.LockRequest = pb.LockRequest(name=name)
-        if wait_timeout_seconds:
-            rpc_msg.wait_timeout_seconds = wait_timeout_seconds
-        if lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = lock_timeout_seconds
-        elif lock_timeout_seconds is None and self._lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = self._lock_timeout_seconds
-        if size > 0:
-            rpc_msg.size = size
-
-        try:
-            self._logger.info(f"Waiting to acquire lock `{name}`")
-            r: pb.LockResponse = self._rpc_with_retry("Lock", rpc_msg)
-        except exceptions.LockWaitTimeoutError:
-            r = pb.LockResponse(name=name, locked=False)
-
-        self._logger.info(f"Lock response from server: {r}")
-
-        lock: Lock = Lock(self, r)
+        self._lease()
+        rpc_msg: pb.LockRequest = self._lock_request(
+            name,
+            wait_timeout_seconds,
+            lock_timeout_seconds,
+            size,
+        )
+        started = time.perf_counter() if self._metrics is not None else 0.0
+        with self._span("ldlm.acquire", name, size=size, method="lock") as span:
+            try:
+                if self._logger.isEnabledFor(logging.INFO):
+                    self._logger.info("Waiting to acquire lock `%s`",
+                                      name,
+                                      extra=log_extra("lock.wait", name))
+                r: pb.LockResponse = self._lock_rpc(rpc_msg)
+            except exceptions.LockWaitTimeoutError:
+                r = pb.LockResponse(name=name, locked=False)
+            except grpc.RpcError as e:
+                if wait_deadline(rpc_msg) is None or rpc_error_code(
+                        e) != grpc.StatusCode.DEADLINE_EXCEEDED.name:
+                    raise
+                r = pb.LockResponse(name=name, locked=False)
+            if span is not None:
+                span.set_attribute("ldlm.lock.acquired", r.locked)
+
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Lock response from server for `%s`: locked=%s",
+                              name,
+                              r.locked,
+                              extra=log_extra("lock.response",
+                                              name,
+                                              locked=r.locked))
+        if self._metrics is not None:
+            self._record_acquire(r, started)
+
+        lock: Lock = Lock(self, r, size, lock_timeout(rpc_msg))
+        self._track(lock)
         if lock.locked and lock_timeout_seconds and self._auto_renew_locks:
-            self._start_renew(lock, rpc_msg.lock_timeout_seconds)
+            self._start_renew(lock, lock_timeout(rpc_msg))
 
         return lock
 
@@ -269,8 +459,8 @@ class Client(BaseClient):
     def lock_context(
         self,
         name: str,
-        wait_timeout_seconds: int = 0,
-        lock_timeout_seconds: Optional[int] = None,
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> Iterator[Lock]:
         """
@@ -283,9 +473,9 @@ class Client(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            wait_timeout_seconds (int, optional): The timeout in seconds to wait for the
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for the
                 lock to be acquired. Defaults to 0 (wait indefinitely).
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to None (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -319,23 +509,26 @@ class Client(BaseClient):
             Doing work with lock...
             Done
         """
-        lock = self.lock(
-            name,
-            wait_timeout_seconds=wait_timeout_seconds,
-            lock_timeout_seconds=lock_timeout_seconds,
-            size=size,
-        )
+        with self._span("ldlm.lock", name, size=size) as span:
+            lock = self.lock(
+                name,
+                wait_timeout_seconds=wait_timeout_seconds,
+                lock_timeout_seconds=lock_timeout_seconds,
+                size=size,
+            )
+            if span is not None:
+                span.set_attribute("ldlm.lock.acquired", lock.locked)
 
-        try:
-            yield lock
-        finally:
-            if lock.locked:
-                lock.unlock()
+            try:
+                yield lock
+            finally:
+                if lock.locked:
+                    lock.unlock()
 
     def try_lock(
         self,
         name: str,
-        lock_timeout_seconds: Optional[int] = None,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> Lock:
         """
@@ -349,7 +542,7 @@ class Client(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to None (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -384,22 +577,38 @@ class Client(BaseClient):
             Doing work with lock
             Released lock
         """
-        rpc_msg: pb.TryLockRequest = pb.TryLockRequest(name=name,)
-        if lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = lock_timeout_seconds
-        elif lock_timeout_seconds is None and self._lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = self._lock_timeout_seconds
-        if size > 0:
-            rpc_msg.size = size
-
-        self._logger.info(f"Attempting to acquire lock `{name}`")
-        r: pb.LockResponse = self._rpc_with_retry("TryLock", rpc_msg)
-        self._logger.info(f"Lock response from server: {r}")
+        self._lease()
+        rpc_msg: pb.TryLockRequest = self._try_lock_request(
+            name,
+            lock_timeout_seconds,
+            size,
+        )
 
-        lock: Lock = Lock(self, r)
+        started = time.perf_counter() if self._metrics is not None else 0.0
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Attempting to acquire lock `%s`",
+                              name,
+                              extra=log_extra("try_lock.attempt", name))
+        with self._span("ldlm.acquire", name, size=size,
+                        method="try_lock") as span:
+            r: pb.LockResponse = self._rpc_with_retry("TryLock", rpc_msg)
+            if span is not None:
+                span.set_attribute("ldlm.lock.acquired", r.locked)
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Lock response from server for `%s`: locked=%s",
+                              name,
+                              r.locked,
+                              extra=log_extra("lock.response",
+                                              name,
+                                              locked=r.locked))
+        if self._metrics is not None:
+            self._record_acquire(r, started, try_lock=True)
+
+        lock: Lock = Lock(self, r, size, lock_timeout(rpc_msg))
+        self._track(lock)
 
         if lock.locked and lock_timeout_seconds and self._auto_renew_locks:
-            self._start_renew(lock, rpc_msg.lock_timeout_seconds)
+            self._start_renew(lock, lock_timeout(rpc_msg))
 
         return lock
 
@@ -407,7 +616,7 @@ class Client(BaseClient):
     def try_lock_context(
         self,
         name: str,
-        lock_timeout_seconds: Optional[int] = None,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> Iterator[Lock]:
         """
@@ -421,7 +630,7 @@ class Client(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to 0 (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -454,19 +663,399 @@ class Client(BaseClient):
             Doing work with lock...
             Done
         """
-        lock = self.try_lock(
-            name,
-            lock_timeout_seconds=lock_timeout_seconds,
-            size=size,
-        )
+        with self._span("ldlm.lock", name, size=size) as span:
+            lock = self.try_lock(
+                name,
+                lock_timeout_seconds=lock_timeout_seconds,
+                size=size,
+            )
+            if span is not None:
+                span.set_attribute("ldlm.lock.acquired", lock.locked)
+
+            try:
+                yield lock
+            finally:
+                if lock.locked:
+                    lock.unlock()
+
+    def try_lock_any(  # pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-locals, too-many-branches, too-many-statements
+        self,
+        names: Iterable[str],
+        k: int = 1,
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+        max_concurrency: int = 32,
+    ) -> list[Lock]:
+        """
+        Attempts to acquire up to `k` locks from a set of candidate names. TryLock RPCs are
+        issued concurrently, with up to `max_concurrency` outstanding at a time, and no new
+        attempts are started once `k` locks are held. Locks acquired by attempts that were
+        already outstanding at that point are released before returning.
+
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, the returned locks will be automatically renewed at an appropriate interval
+        using a background thread.
+
+        Args:
+            names (Iterable[str]): The names of the candidate locks.
+            k (int, optional): The number of locks to acquire. Defaults to 1.
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+            max_concurrency (int, optional): The maximum number of outstanding TryLock RPCs.
+                Defaults to 32.
+
+        Returns:
+            list[Lock]: The acquired locks. There are fewer than `k` if not enough of the
+                candidate locks were available.
+
+        Raises:
+            grpc.RpcError: If a TryLock RPC fails. RPCs are retried like those of
+                :py:meth:`try_lock`. Any locks acquired are released before the error is
+                raised.
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
+
+        Examples:
+            >>> from ldlm import Client
+            >>> 
+            >>> client = Client("ldlm-server:3144")
+            >>> 
+            >>> partitions = [f"partition-{i}" for i in range(1000)]
+            >>> locks = client.try_lock_any(partitions, k=4, lock_timeout_seconds=600)
+            >>> print([lock.name for lock in locks])
+            ['partition-0', 'partition-2', 'partition-5', 'partition-6']
+        """
+        self._lease()
+        candidates = iter(dict.fromkeys(names))
+        completed: queue.SimpleQueue = queue.SimpleQueue()
+        held: list[Lock] = []
+        extra: list[Lock] = []
+        error: Optional[Exception] = None
+        if lock_timeout_seconds is None:
+            lock_timeout_seconds = self._lock_timeout_seconds
+        lock_timeout_seconds = to_seconds(lock_timeout_seconds)
+
+        def submit() -> bool:
+            name = next(candidates, None)
+            if name is None:
+                return False
+            future = self._rpc_future(
+                "TryLock",
+                self._try_lock_request(name, lock_timeout_seconds, size))
+            future.add_done_callback(completed.put)
+            return True
+
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Attempting to acquire %d lock(s)",
+                              k,
+                              extra=log_extra("try_lock_any.attempt", count=k))
+        started = time.perf_counter() if self._metrics is not None else 0.0
+        in_flight = 0
+        while in_flight < max_concurrency and k > 0 and submit():
+            in_flight += 1
+
+        while in_flight:
+            future = completed.get()
+            in_flight -= 1
+            try:
+                r: pb.LockResponse = future.result()
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                error = error or e
+                continue
+
+            if self._metrics is not None:
+                self._record_acquire(r, started, try_lock=True)
+            if r.locked:
+                if len(held) < k and error is None:
+                    held.append(Lock(self, r, size, lock_timeout_seconds))
+                    self._track(held[-1])
+                else:
+                    extra.append(Lock(self, r))
+
+            if len(held) < k and error is None and submit():
+                in_flight += 1
+
+        if error is not None:
+            extra.extend(held)
+            held = []
+
+        if extra:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Releasing %d extra lock(s)",
+                                   len(extra),
+                                   extra=log_extra("try_lock_any.release",
+                                                   count=len(extra)))
+            self._unlock_all(extra)
+
+        if error is not None:
+            raise error
+
+        if lock_timeout_seconds and self._auto_renew_locks:
+            for lock in held:
+                self._start_renew(lock, lock_timeout_seconds)
+
+        return held
+
+    def lock_many(
+        self,
+        names: Iterable[str],
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+    ) -> list[Lock]:
+        """
+        Acquires many locks with a single RPC per `max_batch_size` locks. The locks are waited
+        for concurrently, each up to `wait_timeout_seconds`. If a lock can not be requested,
+        the locks which were acquired are released before the error is raised.
+
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, the locks will be automatically renewed at an appropriate interval using
+        background threads.
+
+        Args:
+            names (Iterable[str]): The names of the locks to acquire. Duplicates are ignored.
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for each
+                lock to be acquired. Defaults to 0 (wait indefinitely).
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+
+        Returns:
+            list[Lock]: A lock object for each name, in order. Locks which could not be
+                acquired within `wait_timeout_seconds` are not locked.
+
+        Raises:
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
+
+        Examples:
+            >>> from ldlm import Client
+            >>> 
+            >>> client = Client("ldlm-server:3144")
+            >>> 
+            >>> locks = client.lock_many(["a", "b", "c"], wait_timeout_seconds=10)
+            >>> print([lock.locked for lock in locks])
+            [True, True, False]
+        """
+        self._lease()
+        requests = [
+            self._lock_request(name, wait_timeout_seconds, lock_timeout_seconds,
+                               size) for name in dict.fromkeys(names)
+        ]
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Waiting to acquire %d lock(s)",
+                              len(requests),
+                              extra=log_extra("lock_many.wait",
+                                              count=len(requests)))
+        return self._acquire_many("Lock", requests)
+
+    def try_lock_many(
+        self,
+        names: Iterable[str],
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+    ) -> list[Lock]:
+        """
+        Attempts to acquire many locks with a single RPC per `max_batch_size` locks, and
+        immediately returns whether each lock was acquired or not. If a lock can not be
+        requested, the locks which were acquired are released before the error is raised.
+
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, the locks will be automatically renewed at an appropriate interval using
+        background threads.
+
+        Args:
+            names (Iterable[str]): The names of the locks to acquire. Duplicates are ignored.
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+
+        Returns:
+            list[Lock]: A lock object for each name, in order.
+
+        Raises:
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
+
+        Examples:
+            >>> from ldlm import Client
+            >>> 
+            >>> client = Client("ldlm-server:3144")
+            >>> 
+            >>> locks = client.try_lock_many(["a", "b", "c"])
+            >>> print([lock.name for lock in locks if lock])
+            ['a', 'c']
+        """
+        self._lease()
+        requests = [
+            self._try_lock_request(name, lock_timeout_seconds, size)
+            for name in dict.fromkeys(names)
+        ]
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Attempting to acquire %d lock(s)",
+                              len(requests),
+                              extra=log_extra("try_lock_many.attempt",
+                                              count=len(requests)))
+        return self._acquire_many("TryLock", requests)
+
+    def watch(self, names: Iterable[str]) -> Iterator[str]:
+        """
+        Watches locks without queueing for them. Yields the name of each lock which is free
+        when watching starts, and then the name of a lock each time it is released and becomes
+        free. Another client may acquire a free lock before this client tries to. Closing the
+        iterator, e.g. by breaking out of a loop over it, stops watching.
+
+        Args:
+            names (Iterable[str]): The names of the locks to watch. Duplicates are ignored.
+
+        Yields:
+            str: The name of a free lock.
+
+        Raises:
+            grpc.RpcError: If watching fails, e.g. with UNIMPLEMENTED if the server does not
+                implement the Watch RPC.
 
+        Examples:
+            >>> from ldlm import Client
+            >>> 
+            >>> client = Client("ldlm-server:3144")
+            >>> 
+            >>> for name in client.watch(["a", "b"]):
+            ...     if lock := client.try_lock(name):
+            ...         break
+        """
+        call = self._stub.Watch(pb.WatchRequest(names=dict.fromkeys(names)),
+                                metadata=self._metadata)
         try:
-            yield lock
+            for event in call:
+                yield event.name
         finally:
-            if lock.locked:
-                lock.unlock()
+            call.cancel()
+
+    def wait_until_free(self,
+                        name: str,
+                        wait_timeout_seconds: Timeout = 0) -> bool:
+        """
+        Waits until a lock is free without acquiring it. Another client may acquire the lock
+        before this client tries to.
+
+        The wait uses the Watch RPC, which does not queue a waiter for the lock. If the server
+        does not implement Watch, a Lock request waits for the lock instead and the lock is
+        released as soon as it is granted.
+
+        Args:
+            name (str): The name of the lock.
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for the lock
+                to be free. Defaults to 0 (wait indefinitely).
+
+        Returns:
+            bool: True if the lock is free, or False if the timeout expired first.
+
+        Examples:
+            >>> from ldlm import Client
+            >>> 
+            >>> client = Client("ldlm-server:3144")
+            >>> 
+            >>> while not (lock := client.try_lock("my_lock")):
+            ...     client.wait_until_free("my_lock")
+        """
+        if self._watch_supported:
+            call = self._stub.Watch(pb.WatchRequest(names=[name]),
+                                    metadata=self._metadata,
+                                    timeout=to_seconds(wait_timeout_seconds) or
+                                    None)
+            try:
+                return next(call, None) is not None
+            except grpc.RpcError as e:
+                if rpc_error_code(e) == grpc.StatusCode.DEADLINE_EXCEEDED.name:
+                    return False
+                if not self._watch_unsupported(e):
+                    raise
+            finally:
+                call.cancel()
+
+        rpc_msg = self._lock_request(name, wait_timeout_seconds, None, 0)
+        try:
+            r: pb.LockResponse = self._lock_rpc(rpc_msg)
+        except exceptions.LockWaitTimeoutError:
+            r = pb.LockResponse(name=name, locked=False)
+        except grpc.RpcError as e:
+            if rpc_error_code(e) != grpc.StatusCode.DEADLINE_EXCEEDED.name:
+                raise
+            r = pb.LockResponse(name=name, locked=False)
+        if r.locked:
+            self._rpc_with_retry("Unlock", pb.UnlockRequest(name=name,
+                                                            key=r.key))
+        return r.locked
+
+    def _lock_rpc(self, rpc_msg: pb.LockRequest) -> pb.LockResponse:
+        """
+        Sends a Lock request. If its wait timeout is sub-second, which servers without
+        millisecond timeouts do not enforce, the client stops waiting for the response at its
+        :py:func:`ldlm.base_client.wait_deadline` and returns an unlocked response. The request
+        is left to complete rather than cancelled, because cancelling it could drop a grant
+        already on its way from the server, and a lock granted to it is released.
+
+        Args:
+            rpc_msg (pb.LockRequest): The request.
+
+        Returns:
+            pb.LockResponse: The response.
+        """
+        wait = wait_deadline(rpc_msg)
+        if wait is None:
+            return self._rpc_with_retry("Lock", rpc_msg)
+
+        result = self._rpc_future("Lock",
+                                  rpc_msg,
+                                  timeout=rpc_deadline(rpc_msg))
+        try:
+            return result.result(wait)
+        except FutureTimeoutError:
+            result.add_done_callback(self._release_late_grant)
+            return pb.LockResponse(name=rpc_msg.name, locked=False)
+
+    def _release_late_grant(self, future: Future) -> None:
+        """
+        Done callback of an abandoned Lock request. Releases the lock if it was granted after
+        the client stopped waiting for it. Errors are logged rather than raised.
 
-    def renew(self, name: str, key: str, lock_timeout_seconds: int) -> Lock:
+        Args:
+            future (Future): The future of the response.
+
+        Returns:
+            None
+        """
+        if future.exception() is not None:
+            return
+        r: pb.LockResponse = future.result()
+        if not r.locked:
+            return
+
+        self._logger.warning(
+            "Releasing lock `%s` which was granted after its request was "
+            "abandoned",
+            r.name,
+            extra=log_extra("lock.release_cancelled", r.name))
+        try:
+            self._rpc_with_retry("Unlock",
+                                 pb.UnlockRequest(name=r.name, key=r.key))
+        except grpc.RpcError as e:
+            self._logger.error("Failed to unlock `%s`: %s",
+                               r.name,
+                               e,
+                               extra=log_extra("unlock.failed",
+                                               r.name,
+                                               error=repr(e)))
+
+    def renew(self, name: str, key: str, lock_timeout_seconds: Timeout) -> Lock:
         """
         Renews a lock. It is much more concise to run this method on the :py:class:`ldlm.Lock`
         object returned by this client's lock methods.
@@ -474,7 +1063,7 @@ class Client(BaseClient):
         Args:
             name (str): The name of the lock to renew.
             key (str): The key associated with the lock to renew.
-            lock_timeout_seconds (int): The timeout in seconds for acquiring the lock.
+            lock_timeout_seconds (Timeout): The timeout in seconds for acquiring the lock.
 
         Returns:
             Lock: A lock object.
@@ -483,14 +1072,188 @@ class Client(BaseClient):
             ldlm.exceptions.LockDoesNotExistOrInvalidKeyError: If the lock does not exist or the
                 lock key is invalid.
         """
-        rpc_msg: pb.RenewRequest = (pb.RenewRequest(
-            name=name,
-            key=key,
-            lock_timeout_seconds=lock_timeout_seconds,
-        ))
+        rpc_msg: pb.RenewRequest = pb.RenewRequest(name=name, key=key)
+        set_lock_timeout(rpc_msg, lock_timeout_seconds)
+
+        with self._span("ldlm.renew", name):
+            lock = self._rpc_with_retry("Renew", rpc_msg)
+        return Lock(self,
+                    lock,
+                    lock_timeout_seconds=to_seconds(lock_timeout_seconds))
+
+    def renew_many(self, locks: Iterable[Lock],
+                   lock_timeout_seconds: Timeout) -> list[Lock]:
+        """
+        Renews many locks with a single RPC per `max_batch_size` locks.
+
+        Args:
+            locks (Iterable[Lock]): The locks to renew.
+            lock_timeout_seconds (Timeout): The timeout in seconds after which the locks will
+                expire.
+
+        Returns:
+            list[Lock]: The locks which were lost, e.g. because they expired, and could not be
+                renewed. They are no longer `locked` and their renew timers are stopped.
+
+        Raises:
+            grpc.RpcError: If a renew request fails. Other locks are still renewed.
+        """
+        locks = list(locks)
+        requests = [
+            pb.RenewRequest(name=lock.name, key=lock.key) for lock in locks
+        ]
+        for request in requests:
+            set_lock_timeout(request, lock_timeout_seconds)
+        results = self._batch("Renew", requests)
+
+        lost: list[Lock] = []
+        error: Optional[Exception] = None
+        for lock, r in zip(locks, results):
+            if isinstance(r, LOST_LOCK_ERRORS):
+                lost.append(lock)
+            elif isinstance(r, Exception):
+                error = error or r
+
+        if lost:
+            with self._lock_timers_lock:
+                timers = [
+                    self._lock_timers.pop((l.name, l.key), None) for l in lost
+                ]
+            for lock, timer in zip(lost, timers):
+                if timer is not None:
+                    timer.stop()
+                lock.locked = False
+                self._logger.warning("Lock `%s` could not be renewed",
+                                     lock.name,
+                                     extra=log_extra("renew.failed",
+                                                     lock.name,
+                                                     error="lost"))
+                self._record_lost(lock.name, lock.key)
+        if error is not None:
+            raise error
+        return lost
+
+    def recover_locks(self, adopt: bool = False) -> list[Lock]:
+        """
+        Releases or adopts the locks recorded in the client's journal, e.g. by a previous
+        process which crashed while holding them. Locks which no longer exist are removed from
+        the journal.
+
+        Args:
+            adopt (bool, optional): Renew the locks and return them instead of releasing them.
+                Adopted locks are renewed automatically if the client's `auto_renew_locks`
+                parameter is set. Defaults to False.
+
+        Returns:
+            list[Lock]: The adopted locks.
+
+        Raises:
+            RuntimeError: If the client has no journal.
+            grpc.RpcError: If a request fails. Its lock is kept in the journal and the other
+                locks are still recovered.
+
+        Examples:
+            >>> from ldlm import Client
+            >>> from ldlm.journal import LockJournal
+            >>>
+            >>> client = Client("ldlm-server:3144",
+            ...                 journal=LockJournal("/var/run/worker-1.journal"))
+            >>> locks = client.recover_locks(adopt=True)
+        """
+        entries, requests = self._recovery_requests(adopt)
+        results = self._batch("Renew" if adopt else "Unlock", requests)
+        adopted, error = self._recovered(entries, results)
+
+        locks: list[Lock] = []
+        for entry, r in adopted:
+            lock = Lock(self, r, entry.size, entry.lock_timeout_seconds)
+            self._track(lock)
+            locks.append(lock)
+            if entry.lock_timeout_seconds and self._auto_renew_locks:
+                self._start_renew(lock, entry.lock_timeout_seconds)
+        if error is not None:
+            raise error
+        return locks
+
+    def handoff(self, lock: Lock) -> LockHandle:
+        """
+        Stops renewing a lock held by this client, without releasing it, and returns a handle
+        with which another client, e.g. in another process, takes the lock over with
+        :py:meth:`adopt`. It is much more concise to run this method on the
+        :py:class:`ldlm.Lock` object.
+
+        Args:
+            lock (Lock): The lock to hand off.
+
+        Returns:
+            LockHandle: A serializable handle of the lock. Its deadline is when the lock
+                expires unless the receiving client renews it.
+
+        Raises:
+            RuntimeError: If the client attaches locks to a lease.
+        """
+        self._check_handoff()
+        with self._lock_timers_lock:
+            timer = self._lock_timers.pop((lock.name, lock.key), None)
+        if timer is not None:
+            timer.stop()
+        self._record_release(lock.name, lock.key)
+        return self._lock_handle(
+            lock, timer.renewed_at if timer is not None else None)
+
+    def adopt(self, handle: LockHandle) -> Lock:
+        """
+        Takes over a lock handed off by another client with :py:meth:`handoff`, without
+        releasing and acquiring it again. The lock is renewed by this client from now on if
+        the client's `auto_renew_locks` parameter is set, and first renewed immediately if its
+        deadline is too close for its renew schedule.
+
+        Args:
+            handle (LockHandle): The handle of the lock.
+
+        Returns:
+            Lock: The lock object.
+
+        Raises:
+            RuntimeError: If the client attaches locks to a lease.
+            ldlm.exceptions.LockDoesNotExistOrInvalidKeyError: If the lock had to be renewed
+                and it no longer exists, e.g. because it expired.
+
+        Examples:
+            >>> import pickle
+            >>> from ldlm import Client
+            >>>
+            >>> client = Client("ldlm-server:3144")
+            >>> lock = client.lock("my_lock", lock_timeout_seconds=600)
+            >>> data = pickle.dumps(lock.handoff())
+            >>>
+            >>> # In another process
+            >>> lock = Client("ldlm-server:3144").adopt(pickle.loads(data))
+        """
+        self._check_handoff()
+        if self._adopt_renew_due(handle):
+            self.renew(handle.name, handle.key, handle.lock_timeout_seconds)
+        lock = Lock(
+            self, pb.LockResponse(name=handle.name, key=handle.key,
+                                  locked=True), handle.size,
+            handle.lock_timeout_seconds)
+        self._track(lock)
+        if handle.lock_timeout_seconds and self._auto_renew_locks:
+            self._start_renew(lock, handle.lock_timeout_seconds)
+        return lock
 
-        lock = self._rpc_with_retry("Renew", rpc_msg)
-        return Lock(self, lock)
+    def _renew_prepared(self, prepared: PreparedRenew) -> None:
+        """
+        Renews a lock with a prepared request.
+
+        Args:
+            prepared (PreparedRenew): The request.
+
+        Returns:
+            None
+        """
+        with self._span("ldlm.renew", prepared.name):
+            self._rpc_with_retry("Renew", prepared)
 
     def unlock(self, name: str, key: str) -> None:
         """
@@ -509,29 +1272,272 @@ class Client(BaseClient):
         Returns:
             None
         """
-        if timer := self._lock_timers.pop(name, None):
-            self._logger.debug(f"Canceling lock renew for `{name}`")
-            timer.cancel()
-            timer.join()
+        with self._lock_timers_lock:
+            timer = self._lock_timers.pop((name, key), None)
+        if timer is not None:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Canceling lock renew for `%s`",
+                                   name,
+                                   extra=log_extra("renew.cancel", name))
+            timer.stop()
 
         rpc_msg: pb.UnlockRequest = pb.UnlockRequest(
             name=name,
             key=key,
         )
 
-        self._logger.debug(f"Unlocking `{name}`")
-        r: pb.UnlockResponse = self._rpc_with_retry("Unlock", rpc_msg)
-        self._logger.debug(f"Unlock response from server: {r}")
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("Unlocking `%s`",
+                               name,
+                               extra=log_extra("unlock", name))
+        with self._span("ldlm.release", name):
+            try:
+                r: pb.UnlockResponse = self._rpc_with_retry("Unlock", rpc_msg)
+            except LOST_LOCK_ERRORS:
+                self._forget(name, key)
+                raise
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                "Unlock response from server for `%s`: unlocked=%s",
+                name,
+                r.unlocked,
+                extra=log_extra("unlock.response", name, unlocked=r.unlocked))
         if not r.unlocked:  # pragma: no cover
             raise RuntimeError(f"Failed to unlock {name}")
+        self._record_release(name, key)
+
+    def unlock_many(self, locks: Iterable[Lock]) -> None:
+        """
+        Unlocks many locks with a single RPC per `max_batch_size` locks. All of the locks
+        are unlocked before the first error is raised.
+
+        Args:
+            locks (Iterable[Lock]): The locks to unlock.
+
+        Raises:
+            RuntimeError: If a lock cannot be unlocked.
+            ldlm.exceptions.LockDoesNotExistError: If a lock does not exist.
+            ldlm.exceptions.NotLockedError: If a lock is already unlocked.
+
+        Returns:
+            None
+        """
+        locks = list(locks)
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("Unlocking %d lock(s)",
+                               len(locks),
+                               extra=log_extra("unlock_many", count=len(locks)))
+        if (error := self._unlock_all(locks)) is not None:
+            raise error
+
+    def _unlock_all(self, locks: list[Lock]) -> Optional[Exception]:
+        """
+        Releases locks, in batch RPCs if the server supports them and concurrently otherwise,
+        and waits for all of them to complete. Errors are logged rather than raised.
+
+        Args:
+            locks (list[Lock]): The locks to release.
+
+        Returns:
+            Exception: The first error, or None if all of the locks were released.
+        """
+        with self._lock_timers_lock:
+            timers = [
+                self._lock_timers.pop((lock.name, lock.key), None)
+                for lock in locks
+            ]
+        for timer in timers:
+            if timer is not None:
+                timer.stop()
+
+        try:
+            results = self._batch("Unlock", [
+                pb.UnlockRequest(name=lock.name, key=lock.key) for lock in locks
+            ])
+        except grpc.RpcError as e:
+            results = [e] * len(locks)
+
+        error: Optional[Exception] = None
+        for lock, r in zip(locks, results):
+            if isinstance(r, pb.UnlockResponse) and r.unlocked:
+                self._record_release(lock.name, lock.key)
+                continue
+            if not isinstance(r, Exception):
+                r = RuntimeError(f"Failed to unlock {lock.name}")
+            self._logger.error("Failed to unlock `%s`: %s",
+                               lock.name,
+                               r,
+                               extra=log_extra("unlock.failed",
+                                               lock.name,
+                                               error=repr(r)))
+            error = error or r
+        return error
+
+    def _acquire_many(
+        self,
+        rpc_func: str,
+        requests: list[Union[pb.LockRequest, pb.TryLockRequest]],
+    ) -> list[Lock]:
+        """
+        Acquires locks with Lock or TryLock requests sent in batches and starts their renew
+        timers. If a request fails, the locks which were acquired are released.
+
+        Args:
+            rpc_func (str): "Lock" or "TryLock".
+            requests (list[Union[pb.LockRequest, pb.TryLockRequest]]): The requests.
+
+        Returns:
+            list[Lock]: A lock object for each request, in order.
+        """
+        started = time.perf_counter() if self._metrics is not None else 0.0
+        results = self._batch(rpc_func, requests)
+
+        locks: list[Lock] = []
+        error: Optional[Exception] = None
+        for request, r in zip(requests, results):
+            if isinstance(r, exceptions.LockWaitTimeoutError):
+                r = pb.LockResponse(name=request.name, locked=False)
+            elif isinstance(r, Exception):
+                error = error or r
+                continue
+            if self._metrics is not None:
+                self._record_acquire(r, started, try_lock=rpc_func == "TryLock")
+            locks.append(Lock(self, r, request.size, lock_timeout(request)))
+            self._track(locks[-1])
+
+        if error is not None:
+            if held := [lock for lock in locks if lock.locked]:
+                self._unlock_all(held)
+            raise error
+
+        if requests and (timeout := lock_timeout(
+                requests[0])) and self._auto_renew_locks:
+            for lock in locks:
+                if lock.locked:
+                    self._start_renew(lock, timeout)
+        return locks
+
+    def _batch(self, rpc_func: str, requests: list) -> list:
+        """
+        Sends requests of an RPC in batch RPCs, or as concurrent unary RPCs if the server
+        does not implement the batch RPC. Batch RPCs are retried like unary RPCs; unary RPCs
+        sent in their place are not.
+
+        Args:
+            rpc_func (str): The unary RPC method, e.g. "Unlock".
+            requests (list): The unary request messages.
+
+        Returns:
+            list: The response to each request, in order, or the exception it failed with.
+
+        Raises:
+            grpc.RpcError: If a batch RPC fails. Locks granted by previous batches of the
+                same call are released first.
+        """
+        results: list = []
+        if self._use_batch(rpc_func):
+            try:
+                for batch_func, message in self._batch_messages(
+                        rpc_func, requests):
+                    resp = self._rpc_with_retry(batch_func, message)
+                    results.extend(
+                        self._batch_result(r) for r in resp.responses)
+                return results
+            except BaseException as e:  # pylint: disable=broad-exception-caught
+                if not self._batch_unsupported(rpc_func, e):
+                    if granted := [
+                            Lock(self, r)
+                            for r in results
+                            if isinstance(r, pb.LockResponse) and r.locked
+                    ]:
+                        self._unlock_all(granted)
+                    raise
+
+        metadata = self._metadata
+        rpc_callable = getattr(self._stub, rpc_func)
+        futures = [
+            rpc_callable.future(request, metadata=metadata)
+            for request in requests[len(results):]
+        ]
+        for future in futures:
+            try:
+                results.append(self._batch_result(future.result()))
+            except grpc.RpcError as e:
+                results.append(e)
+        return results
+
+    def _lease(self) -> None:
+        """
+        Grants the client's lease and starts its keepalive if the client attaches locks to a
+        lease and does not hold one.
+
+        Returns:
+            None
+        """
+        if not self._lease_timeout_seconds or (self._lease_keeper is not None
+                                               and
+                                               self._lease_keeper.is_alive()):
+            return
+
+        with self._lease_lock:
+            if not self._lease_timeout_seconds or (
+                    self._lease_keeper is not None and
+                    self._lease_keeper.is_alive()):
+                return
+            try:
+                r: pb.LeaseResponse = self._rpc_with_retry(
+                    "GrantLease",
+                    pb.GrantLeaseRequest(
+                        lease_timeout_seconds=self._lease_timeout_seconds))
+            except grpc.RpcError as e:
+                if self._lease_unsupported(e):
+                    return
+                raise
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Granted lease %s",
+                                   r.lease_id,
+                                   extra=log_extra("lease.granted"))
+            self._lease_id = r.lease_id
+            self._lease_keeper = _KeepAliveTimer(
+                functools.partial(self._rpc_with_retry, "KeepAlive",
+                                  pb.KeepAliveRequest(lease_id=r.lease_id)),
+                interval=self._keep_alive_interval(),
+                on_lost=functools.partial(self._lease_lost, r.lease_id),
+            )
+            self._lease_keeper.start()
 
-    def _start_renew(self, lock: Lock, lock_timeout_seconds: int) -> None:
+    def _revoke_lease(self) -> None:
         """
-        Start the renew timer for a lock.
+        Stops the keepalive of the client's lease and revokes it, which releases the locks
+        attached to it. Errors are logged rather than raised.
+
+        Returns:
+            None
+        """
+        with self._lease_lock:
+            keeper, self._lease_keeper = self._lease_keeper, None
+        if keeper is None or not keeper.is_alive():
+            return
+        keeper.stop()
+        try:
+            self._stub.RevokeLease(
+                pb.RevokeLeaseRequest(lease_id=self._lease_id),
+                metadata=self._metadata)
+        except grpc.RpcError as e:
+            self._logger.warning("Failed to revoke lease %s: %r",
+                                 self._lease_id,
+                                 e,
+                                 extra=log_extra("lease.revoke_failed",
+                                                 error=repr(e)))
+
+    def _start_renew(self, lock: Lock, lock_timeout_seconds: float) -> None:
+        """
+        Start the renew timer for a lock. Locks attached to the client's lease are kept alive
+        by its keepalive instead.
 
         Args:
             lock (Lock): The lock to renew.
-            lock_timeout_seconds (int): The timeout in seconds after which the lock will
+            lock_timeout_seconds (float): The timeout in seconds after which the lock will
                 expire
 
         Raises:
@@ -540,21 +1546,38 @@ class Client(BaseClient):
         Returns:
             None
         """
-        if lock.name in self._lock_timers:  # pragma: no cover
-            raise RuntimeError(f"Lock `{lock.name}` already has a renew timer")
-
-        interval = max(lock_timeout_seconds - 30,
-                       self.min_renew_interval_seconds)
-
-        self._lock_timers[lock.name] = _RenewTimer(
+        if self._lease_timeout_seconds or self._closing:
+            return
+
+        interval = self._renew_interval(lock_timeout_seconds)
+        on_renewed = None
+        if self._metrics is not None:
+            on_renewed = functools.partial(self._metrics.lock_renewed,
+                                           lock.name)
+        on_lost = functools.partial(self._record_lost, lock.name, lock.key)
+        timer = _RenewTimer(
             lock,
-            lock_timeout_seconds,
+            functools.partial(
+                self._renew_prepared,
+                PreparedRenew(lock.name, lock.key, lock_timeout_seconds)),
             interval=interval,
             logger=self._logger,
+            on_renewed=on_renewed,
+            on_lost=on_lost,
         )
-        self._lock_timers[lock.name].start()
 
-    def _rpc_with_retry(
+        with self._lock_timers_lock:
+            if self._closing:
+                return
+            # A timer which stopped because its lock was lost can be replaced
+            existing = self._lock_timers.get((lock.name, lock.key))
+            if existing is not None and existing.is_alive():  # pragma: no cover
+                raise RuntimeError(
+                    f"Lock `{lock.name}` already has a renew timer")
+            self._lock_timers[lock.name, lock.key] = timer
+            timer.start()
+
+    def _rpc_with_retry(  # pylint: disable=too-many-branches, too-many-boolean-expressions
         self,
         rpc_func: str,
         rpc_message: Union[
@@ -562,56 +1585,271 @@ class Client(BaseClient):
             pb.TryLockRequest,
             pb.RenewRequest,
             pb.UnlockRequest,
+            PreparedRenew,
+            pb.BatchLockRequest,
+            pb.BatchTryLockRequest,
+            pb.BatchRenewRequest,
+            pb.BatchUnlockRequest,
+            pb.GrantLeaseRequest,
+            pb.KeepAliveRequest,
         ],
-    ) -> Union[pb.LockResponse, pb.UnlockResponse]:
+        timeout: Optional[float] = None,
+    ) -> Any:
         """
-        Executes an RPC call with retries in case of errors.
+        Executes an RPC call with retries in case of errors. Batch RPCs and GrantLease are not
+        retried if the server does not implement them, and RPCs are not retried if their
+        deadline expires.
 
         Args:
             rpc_func (str): The RPC function to call.
             rpc_message (Union[pb.LockRequest, pb.TryLockRequest, pb.RenewRequest,
-                pb.UnlockRequest]): The message to send in the RPC call.
+                pb.UnlockRequest, PreparedRenew, pb.BatchLockRequest, pb.BatchTryLockRequest,
+                pb.BatchRenewRequest, pb.BatchUnlockRequest, pb.GrantLeaseRequest,
+                pb.KeepAliveRequest]): The message to send in the RPC call.
+            timeout (float, optional): The deadline of each attempt in seconds. Defaults to
+                None (no deadline).
 
         Returns:
-            Union[LockResponse, UnlockResponse]: The response from the RPC call.
+            Union[LockResponse, UnlockResponse, BatchLockResponse, BatchUnlockResponse,
+                LeaseResponse]: The response from the RPC call.
         """
         num_retries = 0
-        if self._password is not None:
-            metadata = (("authorization", self._password),)
-        else:
-            metadata = None
+        metadata = self._metadata
 
-        rpc_callable = getattr(self._stub, rpc_func)
+        if isinstance(rpc_message, PreparedRenew):
+            rpc_callable, request, parse = self._rpc_callable(
+                rpc_func, rpc_message)
+        else:
+            rpc_callable = getattr(self._stub, rpc_func)
+            request, parse = rpc_message, None
+        instrumented = self._metrics is not None or self._tracer is not None
+        started = 0.0
+        span = None
         while True:
+            if instrumented:
+                started = time.perf_counter()
+                span = self._start_rpc_span(rpc_func, rpc_message,
+                                            num_retries + 1)
             try:
-                resp = rpc_callable(rpc_message, metadata=metadata)
-                if resp.HasField("error"):  # pragma: no cover
-                    raise exceptions.from_rpc_error(resp.error)
-                return resp
-            except _InactiveRpcError as e:
-                if self._retries > -1 and num_retries == self._retries:
+                if timeout is None:
+                    resp = rpc_callable(request, metadata=metadata)
+                else:
+                    resp = rpc_callable(request,
+                                        metadata=metadata,
+                                        timeout=timeout)
+                if parse is not None:
+                    resp = parse(resp)
+            except self._rpc_errors as e:
+                if instrumented:
+                    self._rpc_attempt_done(rpc_func, started, span,
+                                           rpc_error_code(e), e)
+                if self._closed or (
+                        self._retries > -1 and num_retries == self._retries
+                ) or (rpc_func in OPTIONAL_RPCS and
+                      e.code() == grpc.StatusCode.UNIMPLEMENTED) or (
+                          timeout is not None and
+                          e.code() == grpc.StatusCode.DEADLINE_EXCEEDED):
                     raise
                 num_retries += 1
+                if self._metrics is not None:
+                    self._metrics.rpc_retried(rpc_func)
                 self._logger.warning(
-                    f"Encountered error {e} while attempting rpc_call. "
-                    f"Retrying in {self._retry_delay_seconds} seconds "
-                    f"({num_retries} of {self._retries}).")
+                    "Encountered error %s while attempting rpc_call. "
+                    "Retrying in %s seconds (%d of %d).",
+                    e,
+                    self._retry_delay_seconds,
+                    num_retries,
+                    self._retries,
+                    extra=log_extra("rpc.retry",
+                                    rpc_method=rpc_func,
+                                    retry=num_retries,
+                                    error=repr(e)))
+            except BaseException as e:
+                if instrumented:
+                    self._rpc_attempt_done(rpc_func, started, span,
+                                           rpc_error_code(e), e)
+                raise
+            else:
+                error = None
+                if resp.HasField("error"):  # pragma: no cover
+                    error = exceptions.from_rpc_error(resp.error)
+                if instrumented:
+                    self._rpc_attempt_done(
+                        rpc_func,
+                        started,
+                        span,
+                        "OK" if error is None else pb.ErrorCode.Name(
+                            resp.error.code),
+                        error,
+                    )
+                if error is not None:  # pragma: no cover
+                    raise error
+                return resp
             time.sleep(self._retry_delay_seconds)
 
-    def close(self) -> None:
+    def _rpc_future(
+        self,
+        rpc_func: str,
+        rpc_message: Union[pb.LockRequest, pb.TryLockRequest],
+        timeout: Optional[float] = None,
+    ) -> Future:
+        """
+        Executes an RPC call with retries like :py:meth:`_rpc_with_retry` in a daemon thread.
+
+        Args:
+            rpc_func (str): The RPC function to call.
+            rpc_message (Union[pb.LockRequest, pb.TryLockRequest]): The message to send in the
+                RPC call.
+            timeout (float, optional): The deadline of each attempt in seconds. Defaults to
+                None (no deadline).
+
+        Returns:
+            Future: The future of the response.
+        """
+        result: Future = Future()
+
+        def run() -> None:
+            try:
+                result.set_result(
+                    self._rpc_with_retry(rpc_func, rpc_message, timeout))
+            except BaseException as e:  # pylint: disable=broad-exception-caught
+                result.set_exception(e)
+
+        # The thread runs in a copy of the caller's context, so that its spans have the
+        # caller's span as their parent
+        Thread(target=contextvars.copy_context().run, args=(run,),
+               daemon=True).start()
+        return result
+
+    def close(self, grace_seconds: float = 5) -> None:
         """
         Closes the LDLM gRPC channel.
 
         This method is used to close the LDLM gRPC channel and indicate that the client is no
         longer active. It is typically called when the client is no longer needed or when the
-        program is exiting.
+        program is exiting. Renewal of the client's locks stops first, and the locks it still
+        holds are released concurrently, in batch RPCs if the server supports them. Locks which
+        are not released within `grace_seconds`, e.g. because the server is unreachable, expire
+        after their lock timeout. If the client holds a lease, it is revoked, which releases
+        the locks attached to it.
+
+        Args:
+            grace_seconds (float, optional): The maximum time in seconds to wait for renews in
+                progress and for the locks to be released. Set to 0 to close the channel
+                without releasing the locks. Defaults to 5.
 
         Returns:
             None
         """
+        if self._closing:
+            return
+        deadline = time.monotonic() + grace_seconds
+        with self._lock_timers_lock:
+            self._closing = True
+            timers = list(self._lock_timers.values())
+            self._lock_timers.clear()
+        for timer in timers:
+            timer.cancel()
+        for timer in timers:
+            if timer is not current_thread() and timer.is_alive():
+                timer.join(max(deadline - time.monotonic(), 0))
+
+        held = list(self._held.values())
+        if held and (remaining := deadline - time.monotonic()) > 0:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Releasing %d lock(s) before closing",
+                                   len(held),
+                                   extra=log_extra("close.release",
+                                                   count=len(held)))
+            # Released in a daemon thread so that an unreachable server does not hold up
+            # closing, or exiting, for longer than the grace period.
+            releaser = Thread(target=self._release_held, daemon=True)
+            releaser.start()
+            releaser.join(remaining)
+            if releaser.is_alive():
+                self._logger.warning(
+                    "Timed out releasing %d lock(s) while closing",
+                    len(held),
+                    extra=log_extra("close.timeout", count=len(held)))
+
+        # Requests still in progress are not retried once the client is closed
+        self._closed = True
+        self._revoke_lease()
         if self._channel:
             self._channel.close()
-            self._closed = True
+
+    def _release_held(self) -> None:
+        """
+        Releases the locks held when the client is closed, including locks which other threads
+        acquire meanwhile. Errors are logged rather than raised.
+
+        Returns:
+            None
+        """
+        released: set[tuple[str, str]] = set()
+        try:
+            while locks := [
+                    lock for k, lock in list(self._held.items())
+                    if k not in released
+            ]:
+                released.update((lock.name, lock.key) for lock in locks)
+                self._unlock_all(locks)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # The channel was closed before the locks were released
+            self._logger.debug("Stopped releasing locks: %r",
+                               e,
+                               extra=log_extra("close.failed", error=repr(e)))
+
+    def close_at_exit(self,
+                      grace_seconds: float = 5,
+                      signals: Iterable[int] = ()) -> None:
+        """
+        Closes the client, releasing the locks it holds, when the interpreter exits or when the
+        process receives one of `signals`, e.g. the SIGTERM sent to stop a container. The
+        previous handler of a signal is restored and the signal raised again once the client
+        is closed, so a signal which terminated the process still does. Signal handlers can
+        only be set from the main thread.
+
+        The signal handler closes the client in another thread, because the code it interrupts
+        may hold locks of the client which closing waits for. It waits for the client to close
+        for at most about `grace_seconds`.
+
+        Args:
+            grace_seconds (float, optional): Passed to :py:meth:`close`. Defaults to 5.
+            signals (Iterable[int], optional): The signals which close the client. Defaults
+                to none.
+
+        Returns:
+            None
+
+        Examples:
+            >>> import signal
+            >>> from ldlm import Client
+            >>>
+            >>> client = Client("ldlm-server:3144")
+            >>> client.close_at_exit(signals=[signal.SIGTERM, signal.SIGINT])
+        """
+        # A weak reference, so that the client can still be garbage collected
+        ref = weakref.ref(self)
+        atexit.register(_close_at_exit, ref, grace_seconds)
+        for sig in signals:
+            # None if the previous handler was not set from Python
+            previous = signal.getsignal(sig) or signal.SIG_DFL
+
+            def handler(signum: int,
+                        _frame: Any,
+                        previous: Any = previous) -> None:
+                closer = Thread(target=_close_at_exit,
+                                args=(ref, grace_seconds),
+                                name="ldlm-close",
+                                daemon=True)
+                closer.start()
+                # Allows for closing the channel after the grace period
+                closer.join(grace_seconds + 1)
+                signal.signal(signum, previous)
+                signal.raise_signal(signum)
+
+            signal.signal(sig, handler)
 
     def __del__(self) -> None:
         """
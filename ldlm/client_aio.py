@@ -11,6 +11,7 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+# pylint: disable=too-many-lines
 """
 Python asyncio AsyncClient class and helpers for the LDLM service.
 """
@@ -19,16 +20,23 @@ from __future__ import annotations
 import asyncio
 import functools
 import logging
-from typing import Optional, Callable, AsyncIterator, Union
+import signal
+import threading
+import time
+from typing import Any, Optional, Awaitable, Callable, AsyncIterator, Iterable, Union
 from contextlib import asynccontextmanager
 
 import grpc
-from grpc._channel import _InactiveRpcError
 
 from ldlm import exceptions
-from ldlm.base_client import BaseClient
+from ldlm.base_client import (LockHandle, OPTIONAL_RPCS, BaseClient, ClientStub,
+                              PreparedRenew, LOST_LOCK_ERRORS, Timeout,
+                              lock_timeout, log_extra, rpc_deadline,
+                              rpc_error_code, set_lock_timeout, to_seconds,
+                              wait_deadline)
 
 from ldlm.protos import ldlm_pb2 as pb
+from ldlm.protos import ldlm_pb2_grpc as ldlm_grpc
 
 
 class AsyncLock:
@@ -36,13 +44,21 @@ class AsyncLock:
     A lock returned by LDLM AsyncClient lock methods.
     """
 
-    __slots__ = ("name", "key", "locked", "_client")
+    __slots__ = ("name", "key", "locked", "size", "lock_timeout_seconds",
+                 "_client")
 
-    def __init__(self, client: AsyncClient, lock: pb.LockResponse):
+    def __init__(self,
+                 client: AsyncClient,
+                 lock: pb.LockResponse,
+                 size: int = 0,
+                 lock_timeout_seconds: float = 0.0):
         """
         Args:
             client (Client): The client object.
             lock (pb.LockResponse): An LDLM lock response object.
+            size (int, optional): The size of the lock, or 0 if unspecified.
+            lock_timeout_seconds (float, optional): The lock timeout in seconds, or 0 if the
+                lock has none.
         """
         self._client: Optional[AsyncClient] = client if lock.locked else None
 
@@ -55,6 +71,13 @@ class AsyncLock:
         self.locked: bool = lock.locked
         """whether the lock is locked or not"""
 
+        self.size: int = size
+        """size of the lock, or 0 if unspecified"""
+
+        self.lock_timeout_seconds: float = lock_timeout_seconds
+        """timeout in seconds after which the lock expires unless it is renewed, or 0 for
+        none"""
+
     def __bool__(self) -> bool:
         """
         Returns whether the lock is locked or not.
@@ -79,12 +102,12 @@ class AsyncLock:
 
         await self._client.unlock(self.name, self.key)
 
-    async def renew(self, lock_timeout_seconds: int) -> None:
+    async def renew(self, lock_timeout_seconds: Timeout) -> None:
         """
         Renews the lock.
 
         Args:
-            lock_timeout_seconds (int): The timeout in seconds after which the lock will
+            lock_timeout_seconds (Timeout): The timeout in seconds after which the lock will
                 expire.
 
         Returns:
@@ -98,6 +121,49 @@ class AsyncLock:
         lock: AsyncLock = await self._client.renew(self.name, self.key,
                                                    lock_timeout_seconds)
         self.locked = lock.locked
+        self.lock_timeout_seconds = to_seconds(lock_timeout_seconds)
+
+    async def handoff(self) -> LockHandle:
+        """
+        Hands the lock over to another client, e.g. in another process, without releasing it.
+        This client stops renewing the lock and the lock object is no longer `locked`.
+
+        Returns:
+            LockHandle: A serializable handle to pass to `adopt()` of the receiving client.
+
+        Raises:
+            RuntimeError: If the lock is not locked
+        """
+        if not self.locked or self._client is None:
+            raise RuntimeError("handoff() called on unlocked lock")
+        handle = await self._client.handoff(self)
+        self.locked = False
+        self._client = None
+        return handle
+
+
+def _cancel_task(task: asyncio.Task) -> None:
+    """
+    Cancels a task if it is not done. A task of an event loop running in another thread is
+    cancelled in that thread, as tasks are not thread-safe.
+
+    Args:
+        task (asyncio.Task): The task.
+
+    Returns:
+        None
+    """
+    if task.done():
+        return
+    loop = task.get_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if loop is running:
+        task.cancel()
+    elif not loop.is_closed():
+        loop.call_soon_threadsafe(task.cancel)
 
 
 class _RenewTimer:
@@ -105,32 +171,45 @@ class _RenewTimer:
     Timer implementation for renewing a lock
     """
 
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
         self,
         lock: AsyncLock,
-        lock_timeout_seconds: int,
-        interval: int,
+        renew: Callable[[], Awaitable],
+        interval: float,
         logger: logging.Logger,
+        on_renewed: Optional[Callable[[float], None]] = None,
+        on_lost: Optional[Callable[[], None]] = None,
     ):
         """
         Initializes a new instance of _RenewTimer.
 
         Args:
             lock (Lock): The lock to renew.
-            lock_timeout_seconds (int): The timeout in seconds after which the lock will
-                expire
-            interval (int): The interval in seconds between renew attempts
+            renew (Callable[[], Awaitable]): Renews the lock
+            interval (float): The interval in seconds between renew attempts
             logger (logging.Logger): The logger to use for logging
+            on_renewed (Callable[[float], None], optional): Called after each successful
+                renew with the seconds from when the renew was due until it completed
+            on_lost (Callable[[], None], optional): Called if a renew fails
 
         Returns:
             None
         """
-        self.interval: int = interval
-        self.fn: Callable = functools.partial(lock.renew, lock_timeout_seconds)
+        self.interval: float = interval
+        self.fn: Callable[[], Awaitable] = renew
         self.task: asyncio.Task | None = None
-        logger.debug(
-            f"Renew timer renewing lock {lock.name} every {self.interval} seconds."
-        )
+        self.on_renewed = on_renewed
+        self.on_lost = on_lost
+
+        # time.time() when the lock was last renewed, or the timer was created
+        self.renewed_at: float = time.time()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Renew timer renewing lock %s every %s seconds.",
+                         lock.name,
+                         self.interval,
+                         extra=log_extra("renew.start",
+                                         lock.name,
+                                         interval_seconds=self.interval))
 
     async def start(self) -> None:
         """
@@ -154,26 +233,143 @@ class _RenewTimer:
             None
         """
         while True:
+            due = time.perf_counter() + self.interval
             await asyncio.sleep(self.interval)
-            await self.fn()
+            started = time.time()
+            try:
+                await self.fn()
+            except Exception:
+                if self.on_lost is not None:
+                    self.on_lost()
+                raise
+            self.renewed_at = started
+            if self.on_renewed is not None:
+                self.on_renewed(time.perf_counter() - due)
+
+    def is_alive(self) -> bool:
+        """
+        Returns whether the task is running, like `threading.Thread.is_alive()` for the renew
+        timers of :py:class:`ldlm.Client`.
+
+        Returns:
+            bool: True if the task was started and is not done.
+        """
+        return self.task is not None and not self.task.done()
 
     def cancel(self) -> None:
         """
-        Cancels the task if it is not done.
+        Cancels the task if it is not done. A task of an event loop running in another thread
+        is cancelled in that thread.
 
         Returns:
             None
         """
-        if self.task is not None and not self.task.done():
-            self.task.cancel()
+        if self.task is not None:
+            _cancel_task(self.task)
             self.task = None
 
 
-class AsyncClient(BaseClient):
+class AsyncClient(BaseClient):  # pylint: disable=too-many-public-methods,too-many-instance-attributes
     """
     asyncio client class for interacting with the LDLM server.
+
+    gRPC asyncio channels are bound to the event loop in which they are created, so the client
+    creates a channel the first time it is used in each event loop. An instance can therefore be
+    created outside of any event loop (e.g. at import time) and used from several event loops,
+    each running in its own thread.
     """
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Hold refs to fire-and-forget tasks (e.g. releasing orphaned locks) so they are not
+        # garbage collected before they complete
+        self._background_tasks: set[asyncio.Future] = set()
+
+        # Keeps the client's lease alive, in the event loop the lease was granted in
+        self._lease_keeper: Optional[asyncio.Task] = None
+
+        # Grants the client's lease. Shared by coroutines acquiring their first locks
+        # concurrently so that they share one lease.
+        self._lease_grant: Optional[asyncio.Future] = None
+
+    def _init_channel(self) -> None:
+        """
+        Sets up per event loop channel management. Channels are created on first use in each
+        event loop by _loop_channel().
+
+        Returns:
+            None
+        """
+        # Event loop -> (channel, stub). A channel references its event loop, so entries are
+        # not dropped when their event loop is garbage collected. Instead the channels of event
+        # loops found closed are closed and dropped when a channel is created or the client is
+        # closed.
+        self._loop_channels: dict[asyncio.AbstractEventLoop,
+                                  tuple[grpc.aio.Channel,
+                                        ldlm_grpc.LDLMStub]] = {}
+        self._loop_channels_lock = threading.Lock()
+        self._pinned_stub: Optional[ldlm_grpc.LDLMStub] = None
+
+    def _loop_channel(self) -> tuple[grpc.aio.Channel, ldlm_grpc.LDLMStub]:
+        """
+        Returns the channel and stub for the running event loop, creating them if this is the
+        first use of the client in the event loop.
+
+        Returns:
+            tuple[grpc.aio.Channel, LDLMStub]: The channel and stub.
+        """
+        loop = asyncio.get_running_loop()
+        if (entry := self._loop_channels.get(loop)) is not None:
+            return entry
+
+        with self._loop_channels_lock:
+            for closed in [l for l in self._loop_channels if l.is_closed()]:
+                self._close_idle_channel(self._loop_channels.pop(closed)[0])
+            if (entry := self._loop_channels.get(loop)) is None:
+                self._logger.debug("Creating channel for event loop")
+                channel = self._create_channel(self._address, self._creds)
+                stub: ldlm_grpc.LDLMStub
+                if self._transport == "unary":
+                    stub = ClientStub(channel)
+                else:
+                    # pylint: disable=import-outside-toplevel
+                    from ldlm.session import AsyncSessionStub
+                    stub = AsyncSessionStub(channel, self._metadata)
+                entry = (channel, stub)
+                self._loop_channels[loop] = entry
+            return entry
+
+    @staticmethod
+    def _close_idle_channel(channel: grpc.aio.Channel) -> None:
+        """
+        Closes the channel of an event loop which is not running, e.g. because it is closed.
+        grpc.aio.Channel.close() must run in the channel's event loop, so the underlying channel
+        is closed directly, as the channel's finalizer does. Calls can not be in progress
+        without a running event loop.
+
+        Args:
+            channel (grpc.aio.Channel): The channel.
+
+        Returns:
+            None
+        """
+        if not channel._channel.closed():  # pylint: disable=protected-access
+            channel._channel.close()  # pylint: disable=protected-access
+
+    @property
+    def _stub(self) -> ldlm_grpc.LDLMStub:
+        """
+        The stub for the running event loop. Assigning a stub pins it for every event loop.
+        """
+        if self._pinned_stub is not None:
+            return self._pinned_stub
+        return self._loop_channel()[1]
+
+    @_stub.setter
+    def _stub(self, stub: ldlm_grpc.LDLMStub) -> None:
+        self._pinned_stub = stub
+
     def _create_channel(
         self,
         address: str,
@@ -198,7 +394,7 @@ class AsyncClient(BaseClient):
             )
         return grpc.aio.insecure_channel(address)
 
-    async def _rpc_with_retry(
+    async def _rpc_with_retry(  # pylint: disable=too-many-branches, too-many-boolean-expressions, too-many-locals
         self,
         rpc_func: str,
         rpc_message: Union[
@@ -206,47 +402,239 @@ class AsyncClient(BaseClient):
             pb.TryLockRequest,
             pb.RenewRequest,
             pb.UnlockRequest,
+            PreparedRenew,
+            pb.BatchLockRequest,
+            pb.BatchTryLockRequest,
+            pb.BatchRenewRequest,
+            pb.BatchUnlockRequest,
+            pb.GrantLeaseRequest,
+            pb.KeepAliveRequest,
         ],
-    ) -> Union[pb.LockResponse, pb.UnlockResponse]:
+        timeout: Optional[float] = None,
+        attempts: Optional[list[Awaitable]] = None,
+    ) -> Any:
         """
-        Executes an RPC call with retries in case of connection loss.
+        Executes an RPC call with retries in case of connection loss. Batch RPCs and GrantLease
+        are not retried if the server does not implement them, and RPCs are not retried if
+        their deadline expires.
 
         Args:
             rpc_func (str): The RPC function to call.
-            rpc_message (Union[LockRequest, TryLockRequest, RenewRequest, UnlockRequest]):
-                The message to send in the RPC call.
+            rpc_message (Union[LockRequest, TryLockRequest, RenewRequest, UnlockRequest,
+                PreparedRenew, BatchLockRequest, BatchTryLockRequest, BatchRenewRequest,
+                BatchUnlockRequest, GrantLeaseRequest, KeepAliveRequest]): The message to send
+                in the RPC call.
+            timeout (float, optional): The deadline of each attempt in seconds. Defaults to
+                None (no deadline).
+            attempts (list[Awaitable], optional): Receives the call of each attempt, so that
+                the caller can cancel it. Defaults to None.
 
         Returns:
             The response from the RPC call.
         """
-        if self._password is not None:
-            metadata = (("authorization", self._password),)
-        else:
-            metadata = None
+        metadata = self._metadata
 
         num_retries = 0
-        rpc_func_callable = getattr(self._stub, rpc_func)
+        if isinstance(rpc_message, PreparedRenew):
+            rpc_func_callable, request, parse = self._rpc_callable(
+                rpc_func, rpc_message)
+        else:
+            rpc_func_callable = getattr(self._stub, rpc_func)
+            request, parse = rpc_message, None
+        instrumented = self._metrics is not None or self._tracer is not None
+        started = 0.0
+        span = None
         while True:
+            if instrumented:
+                started = time.perf_counter()
+                span = self._start_rpc_span(rpc_func, rpc_message,
+                                            num_retries + 1)
             try:
-                resp = await rpc_func_callable(rpc_message, metadata=metadata)
-                if resp.HasField("error"):  # pragma: no cover
-                    raise exceptions.from_rpc_error(resp.error)
-                return resp
-            except _InactiveRpcError as e:
-                if self._retries > -1 and num_retries == self._retries:
+                if timeout is None:
+                    call = rpc_func_callable(request, metadata=metadata)
+                else:
+                    call = rpc_func_callable(request,
+                                             metadata=metadata,
+                                             timeout=timeout)
+                if attempts is not None:
+                    attempts.append(call)
+                resp = await call
+                if parse is not None:
+                    resp = parse(resp)
+            except self._rpc_errors as e:
+                if instrumented:
+                    self._rpc_attempt_done(rpc_func, started, span,
+                                           rpc_error_code(e), e)
+                if self._closed or (
+                        self._retries > -1 and num_retries == self._retries
+                ) or (rpc_func in OPTIONAL_RPCS and
+                      e.code() == grpc.StatusCode.UNIMPLEMENTED) or (
+                          timeout is not None and
+                          e.code() == grpc.StatusCode.DEADLINE_EXCEEDED):
                     raise
                 num_retries += 1
+                if self._metrics is not None:
+                    self._metrics.rpc_retried(rpc_func)
                 self._logger.warning(
-                    f"Encountered error {e} while attempting rpc_call. "
-                    f"Retrying in {self._retry_delay_seconds} seconds "
-                    f"({num_retries} of {self._retries}).")
+                    "Encountered error %s while attempting rpc_call. "
+                    "Retrying in %s seconds (%d of %d).",
+                    e,
+                    self._retry_delay_seconds,
+                    num_retries,
+                    self._retries,
+                    extra=log_extra("rpc.retry",
+                                    rpc_method=rpc_func,
+                                    retry=num_retries,
+                                    error=repr(e)))
                 await asyncio.sleep(self._retry_delay_seconds)
+            except BaseException as e:
+                if instrumented:
+                    self._rpc_attempt_done(rpc_func, started, span,
+                                           rpc_error_code(e), e)
+                raise
+            else:
+                error = None
+                if resp.HasField("error"):  # pragma: no cover
+                    error = exceptions.from_rpc_error(resp.error)
+                if instrumented:
+                    self._rpc_attempt_done(
+                        rpc_func,
+                        started,
+                        span,
+                        "OK" if error is None else pb.ErrorCode.Name(
+                            resp.error.code),
+                        error,
+                    )
+                if error is not None:  # pragma: no cover
+                    raise error
+                return resp
+
+    async def _acquire(
+        self,
+        rpc_func: str,
+        rpc_message: Union[pb.LockRequest, pb.TryLockRequest],
+    ) -> pb.LockResponse:
+        """
+        Executes a Lock or TryLock RPC in a way that can not leak a lock if the caller is
+        cancelled.
+
+        The RPC runs in its own task which is shielded from the caller. If the caller is
+        cancelled while the RPC is outstanding, the RPC is cancelled, so that the server stops
+        queueing the request, and releases the lock if it granted it anyway. A response which
+        arrived as the RPC was cancelled is checked for a grant, which is released.
+
+        Likewise, if the wait timeout of a Lock request is sub-second, which servers without
+        millisecond timeouts do not enforce, the caller stops waiting for the response at its
+        :py:func:`ldlm.base_client.wait_deadline`, cancels the RPC and gets an unlocked
+        response.
+
+        Args:
+            rpc_func (str): The RPC function to call. Either "Lock" or "TryLock".
+            rpc_message (Union[LockRequest, TryLockRequest]): The message to send in the RPC call.
+
+        Returns:
+            LockResponse: The response from the RPC call.
+        """
+        wait = timeout = None
+        if isinstance(rpc_message, pb.LockRequest):
+            wait, timeout = wait_deadline(rpc_message), rpc_deadline(
+                rpc_message)
+        attempts: list[Awaitable] = []
+        rpc_task = asyncio.ensure_future(
+            self._rpc_with_retry(rpc_func, rpc_message, timeout, attempts))
+        try:
+            return await asyncio.wait_for(asyncio.shield(rpc_task), wait)
+        except asyncio.TimeoutError:
+            self._abandon(rpc_task, attempts)
+            return pb.LockResponse(name=rpc_message.name, locked=False)
+        except asyncio.CancelledError:
+            self._abandon(rpc_task, attempts)
+            raise
+
+    def _abandon(self, rpc_task: asyncio.Future,
+                 attempts: list[Awaitable]) -> None:
+        """
+        Cancels a Lock or TryLock RPC task whose caller stopped waiting for it. A call in
+        progress is cancelled rather than the task, so that a response which already arrived
+        is not dropped: the task then completes with it and the lock is released.
+
+        Args:
+            rpc_task (asyncio.Future): The RPC task.
+            attempts (list[Awaitable]): The calls of the task.
+
+        Returns:
+            None
+        """
+        rpc_task.add_done_callback(self._release_late_grant)
+        call = attempts[-1] if attempts else None
+        if isinstance(call,
+                      (grpc.aio.Call, asyncio.Future)) and not call.done():
+            call.cancel()
+        else:
+            rpc_task.cancel()
+
+    def _release_late_grant(self, rpc_task: asyncio.Future) -> None:
+        """
+        Done callback for an abandoned Lock or TryLock RPC task. Releases the lock if it was
+        granted after the caller stopped waiting for it.
+
+        Args:
+            rpc_task (asyncio.Future): The finished RPC task.
+
+        Returns:
+            None
+        """
+        if rpc_task.cancelled() or rpc_task.exception() is not None:
+            return
+
+        r: pb.LockResponse = rpc_task.result()
+        if not r.locked:
+            return
+
+        self._logger.warning(
+            "Releasing lock `%s` which was granted after its request was "
+            "cancelled",
+            r.name,
+            extra=log_extra("lock.release_cancelled", r.name))
+        self._run_in_background(self.unlock(r.name, r.key))
+
+    def _run_in_background(self, coro: Awaitable) -> None:
+        """
+        Runs an awaitable in a background task which is referenced by the client until it
+        completes. Errors are logged rather than raised.
+
+        Args:
+            coro (Awaitable): The awaitable to run.
+
+        Returns:
+            None
+        """
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+
+    def _background_task_done(self, task: asyncio.Future) -> None:
+        """
+        Done callback for tasks started by _run_in_background().
+
+        Args:
+            task (asyncio.Future): The finished task.
+
+        Returns:
+            None
+        """
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._logger.error("Background task failed: %r",
+                               task.exception(),
+                               extra=log_extra("background.failed",
+                                               error=repr(task.exception())))
 
     async def lock(
         self,
         name: str,
-        wait_timeout_seconds: int = 0,
-        lock_timeout_seconds: Optional[int] = None,
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> AsyncLock:
         """
@@ -258,9 +646,9 @@ class AsyncClient(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            wait_timeout_seconds (int, optional): The timeout in seconds to wait for the
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for the
                 lock to be acquired. Defaults to 0 (wait indefinitely).
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to None (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -293,27 +681,46 @@ class AsyncClient(BaseClient):
             Doing work with lock
             Released lock
         """
-        rpc_msg: pb.LockRequest = pb.LockRequest(name=name)
-        if wait_timeout_seconds:
-            rpc_msg.wait_timeout_seconds = wait_timeout_seconds
-        if lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = lock_timeout_seconds
-        elif lock_timeout_seconds is None and self._lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = self._lock_timeout_seconds
-        if size > 0:
-            rpc_msg.size = size
-
-        try:
-            self._logger.info(f"Waiting to acquire lock `{name}`")
-            r: pb.LockResponse = await self._rpc_with_retry("Lock", rpc_msg)
-        except exceptions.LockWaitTimeoutError:
-            r = pb.LockResponse(name=name, locked=False)
-
-        self._logger.info(f"Lock response from server: {r}")
-
-        lock: AsyncLock = AsyncLock(self, r)
-        if lock.locked and rpc_msg.lock_timeout_seconds and self._auto_renew_locks:
-            await self._start_renew(lock, rpc_msg.lock_timeout_seconds)
+        await self._lease()
+        rpc_msg: pb.LockRequest = self._lock_request(
+            name,
+            wait_timeout_seconds,
+            lock_timeout_seconds,
+            size,
+        )
+        started = time.perf_counter() if self._metrics is not None else 0.0
+        with self._span("ldlm.acquire", name, size=size, method="lock") as span:
+            try:
+                if self._logger.isEnabledFor(logging.INFO):
+                    self._logger.info("Waiting to acquire lock `%s`",
+                                      name,
+                                      extra=log_extra("lock.wait", name))
+                r: pb.LockResponse = await self._acquire("Lock", rpc_msg)
+            except exceptions.LockWaitTimeoutError:
+                r = pb.LockResponse(name=name, locked=False)
+            except grpc.RpcError as e:
+                if wait_deadline(rpc_msg) is None or rpc_error_code(
+                        e) != grpc.StatusCode.DEADLINE_EXCEEDED.name:
+                    raise
+                r = pb.LockResponse(name=name, locked=False)
+            if span is not None:
+                span.set_attribute("ldlm.lock.acquired", r.locked)
+
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Lock response from server for `%s`: locked=%s",
+                              name,
+                              r.locked,
+                              extra=log_extra("lock.response",
+                                              name,
+                                              locked=r.locked))
+        if self._metrics is not None:
+            self._record_acquire(r, started)
+
+        lock: AsyncLock = AsyncLock(self, r, size, lock_timeout(rpc_msg))
+        self._track(lock)
+        if lock.locked and (timeout :=
+                            lock_timeout(rpc_msg)) and self._auto_renew_locks:
+            await self._start_renew(lock, timeout)
 
         return lock
 
@@ -321,8 +728,8 @@ class AsyncClient(BaseClient):
     async def lock_context(
         self,
         name: str,
-        wait_timeout_seconds: int = 0,
-        lock_timeout_seconds: Optional[int] = None,
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> AsyncIterator[AsyncLock]:
         """
@@ -334,9 +741,9 @@ class AsyncClient(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            wait_timeout_seconds (int, optional): The timeout in seconds to wait for the
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for the
                 lock to be acquired. Defaults to 0 (wait indefinitely).
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to 0 (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -366,24 +773,135 @@ class AsyncClient(BaseClient):
             >>> asyncio.run(test_lock_context())
             Doing work with lock
         """
+        lock: Optional[AsyncLock] = None
+        with self._span("ldlm.lock", name, size=size) as span:
+            try:
+                lock = await self.lock(
+                    name,
+                    wait_timeout_seconds=wait_timeout_seconds,
+                    lock_timeout_seconds=lock_timeout_seconds,
+                    size=size,
+                )
+                if span is not None:
+                    span.set_attribute("ldlm.lock.acquired", lock.locked)
+                yield lock
+            finally:
+                if lock is not None and lock.locked:
+                    # Shielded so that a cancellation of the context body can not interrupt
+                    # the release
+                    await asyncio.shield(lock.unlock())
+
+    async def acquire_as_available(  # pylint: disable=too-many-arguments, too-many-positional-arguments, too-many-branches
+        self,
+        names: Iterable[str],
+        limit: Optional[int] = None,
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+    ) -> AsyncIterator[AsyncLock]:
+        """
+        An async iterator that waits for locks on all of the given names concurrently and yields
+        each lock as soon as it is acquired.
 
-        lock = await self.lock(
-            name,
-            wait_timeout_seconds=wait_timeout_seconds,
-            lock_timeout_seconds=lock_timeout_seconds,
-            size=size,
-        )
+        Once `limit` locks have been yielded, or when the consumer stops iterating, the remaining
+        waits are cancelled, which withdraws their requests from the server, and locks that
+        were acquired but not yielded are released. Locks that could not be acquired within
+        `wait_timeout_seconds` are not yielded. Use `contextlib.aclosing()` to make sure
+        outstanding waits are cancelled promptly when breaking out of the loop.
+
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, yielded locks will be automatically renewed at an appropriate interval
+        using a background asyncio task.
+
+        Args:
+            names (Iterable[str]): The names of the candidate locks.
+            limit (int, optional): The maximum number of locks to yield. Defaults to None (one
+                for each name).
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for each
+                lock to be acquired. Defaults to 0 (wait indefinitely).
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+
+        Yields:
+            AsyncLock: Acquired lock objects in the order in which they were acquired.
+
+        Raises:
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
 
+        Examples:
+            >>> import asyncio
+            >>> import contextlib
+            >>> from ldlm import AsyncClient
+            >>> 
+            >>> async def claim_partition():
+            ...     client = AsyncClient("ldlm-server:3144")
+            ...     partitions = [f"partition-{i}" for i in range(16)]
+            ...     async with contextlib.aclosing(
+            ...             client.acquire_as_available(partitions, limit=1)) as locks:
+            ...         async for lock in locks:
+            ...             print(f"Working on {lock.name}")
+            ...             await lock.unlock()
+            ... 
+            >>> asyncio.run(claim_partition())
+            Working on partition-3
+        """
+        pending: set[asyncio.Future] = {
+            asyncio.ensure_future(
+                self.lock(
+                    name,
+                    wait_timeout_seconds=wait_timeout_seconds,
+                    lock_timeout_seconds=lock_timeout_seconds,
+                    size=size,
+                )) for name in dict.fromkeys(names)
+        }
+        if limit is None:
+            limit = len(pending)
+
+        # Locks that have been acquired but not yet yielded
+        ready: list[AsyncLock] = []
+        yielded = 0
         try:
-            yield lock
+            while yielded < limit and (ready or pending):
+                if not ready:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED)
+                    error: Optional[BaseException] = None
+                    for task in done:
+                        if task.exception() is not None:
+                            error = error or task.exception()
+                        elif task.result().locked:
+                            ready.append(task.result())
+                    if error is not None:
+                        raise error
+                    continue
+
+                yielded += 1
+                yield ready.pop(0)
+
         finally:
-            if lock.locked:
-                await lock.unlock()
+            for task in pending:
+                task.cancel()
+            for result in await asyncio.gather(*pending,
+                                               return_exceptions=True):
+                if isinstance(result, AsyncLock) and result.locked:
+                    ready.append(result)
+            if ready:
+                if self._logger.isEnabledFor(logging.DEBUG):
+                    self._logger.debug(
+                        "Releasing %d lock(s) acquired but not yielded",
+                        len(ready),
+                        extra=log_extra("lock_each.release", count=len(ready)))
+                await asyncio.shield(
+                    asyncio.gather(*(lock.unlock() for lock in ready)))
 
     async def try_lock(
         self,
         name: str,
-        lock_timeout_seconds: Optional[int] = None,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> AsyncLock:
         """
@@ -397,7 +915,7 @@ class AsyncClient(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to None (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -430,25 +948,39 @@ class AsyncClient(BaseClient):
             Doing work with lock
             Released lock
         """
-        rpc_msg: pb.TryLockRequest = pb.TryLockRequest(name=name,)
-        if lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = lock_timeout_seconds
-        elif lock_timeout_seconds is None and self._lock_timeout_seconds:
-            rpc_msg.lock_timeout_seconds = self._lock_timeout_seconds
-        if size > 0:
-            rpc_msg.size = size
-
-        self._logger.info(f"Attempting to acquire lock `{name}`")
-        r: pb.LockResponse = await self._rpc_with_retry("TryLock", rpc_msg)
-        self._logger.info(f"Lock response from server: {r}")
-
-        lock: AsyncLock = AsyncLock(self, r)
+        await self._lease()
+        rpc_msg: pb.TryLockRequest = self._try_lock_request(
+            name,
+            lock_timeout_seconds,
+            size,
+        )
 
-        if lock.locked and rpc_msg.lock_timeout_seconds and self._auto_renew_locks:
-            await self._start_renew(
-                lock,
-                rpc_msg.lock_timeout_seconds,
-            )
+        started = time.perf_counter() if self._metrics is not None else 0.0
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Attempting to acquire lock `%s`",
+                              name,
+                              extra=log_extra("try_lock.attempt", name))
+        with self._span("ldlm.acquire", name, size=size,
+                        method="try_lock") as span:
+            r: pb.LockResponse = await self._acquire("TryLock", rpc_msg)
+            if span is not None:
+                span.set_attribute("ldlm.lock.acquired", r.locked)
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Lock response from server for `%s`: locked=%s",
+                              name,
+                              r.locked,
+                              extra=log_extra("lock.response",
+                                              name,
+                                              locked=r.locked))
+        if self._metrics is not None:
+            self._record_acquire(r, started, try_lock=True)
+
+        lock: AsyncLock = AsyncLock(self, r, size, lock_timeout(rpc_msg))
+        self._track(lock)
+
+        if lock.locked and (timeout :=
+                            lock_timeout(rpc_msg)) and self._auto_renew_locks:
+            await self._start_renew(lock, timeout)
 
         return lock
 
@@ -456,7 +988,7 @@ class AsyncClient(BaseClient):
     async def try_lock_context(
         self,
         name: str,
-        lock_timeout_seconds: Optional[int] = None,
+        lock_timeout_seconds: Optional[Timeout] = None,
         size: int = 0,
     ) -> AsyncIterator[AsyncLock]:
         """
@@ -470,7 +1002,7 @@ class AsyncClient(BaseClient):
 
         Args:
             name (str): The name of the lock to acquire.
-            lock_timeout_seconds (int, optional): The timeout in seconds after which the
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which the
                 lock will be released unless it is renewed. Defaults to None (no timeout).
             size (int, optional): The size of the lock. Defaults to 0 which translates to
                 unspecified. The server will use a size of 1 in this case.
@@ -496,17 +1028,377 @@ class AsyncClient(BaseClient):
             >>> asyncio.run(test_try_lock_context())
             Doing work with lock
         """
-        lock = await self.try_lock(
-            name,
-            lock_timeout_seconds=lock_timeout_seconds,
-            size=size,
-        )
+        lock: Optional[AsyncLock] = None
+        with self._span("ldlm.lock", name, size=size) as span:
+            try:
+                lock = await self.try_lock(
+                    name,
+                    lock_timeout_seconds=lock_timeout_seconds,
+                    size=size,
+                )
+                if span is not None:
+                    span.set_attribute("ldlm.lock.acquired", lock.locked)
+                yield lock
+            finally:
+                if lock is not None and lock.locked:
+                    # Shielded so that a cancellation of the context body can not interrupt
+                    # the release
+                    await asyncio.shield(lock.unlock())
+
+    async def try_lock_any(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        names: Iterable[str],
+        k: int = 1,
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+        max_concurrency: int = 32,
+    ) -> list[AsyncLock]:
+        """
+        Attempts to acquire up to `k` locks from a set of candidate names. TryLock RPCs are
+        issued concurrently, with up to `max_concurrency` outstanding at a time, and no new
+        attempts are started once `k` locks are held. Locks acquired by attempts that were
+        already outstanding at that point are released before returning.
 
-        try:
-            yield lock
-        finally:
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, the returned locks will be automatically renewed at an appropriate interval
+        using a background asyncio task.
+
+        Args:
+            names (Iterable[str]): The names of the candidate locks.
+            k (int, optional): The number of locks to acquire. Defaults to 1.
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+            max_concurrency (int, optional): The maximum number of outstanding TryLock RPCs.
+                Defaults to 32.
+
+        Returns:
+            list[AsyncLock]: The acquired locks. There are fewer than `k` if not enough of the
+                candidate locks were available.
+
+        Raises:
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
+
+        Examples:
+            >>> import asyncio
+            >>> from ldlm import AsyncClient
+            >>> 
+            >>> async def claim_partitions():
+            ...     client = AsyncClient("ldlm-server:3144")
+            ...     partitions = [f"partition-{i}" for i in range(1000)]
+            ...     locks = await client.try_lock_any(partitions, k=4)
+            ...     print([lock.name for lock in locks])
+            ... 
+            >>> asyncio.run(claim_partitions())
+            ['partition-0', 'partition-2', 'partition-5', 'partition-6']
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+        held: list[AsyncLock] = []
+        extra: list[AsyncLock] = []
+
+        async def attempt(name: str) -> None:
+            if len(held) >= k:
+                return
+            async with semaphore:
+                if len(held) >= k:
+                    return
+                lock = await self.try_lock(
+                    name,
+                    lock_timeout_seconds=lock_timeout_seconds,
+                    size=size,
+                )
             if lock.locked:
-                await lock.unlock()
+                (held if len(held) < k else extra).append(lock)
+
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Attempting to acquire %d lock(s)",
+                              k,
+                              extra=log_extra("try_lock_any.attempt", count=k))
+        try:
+            results = await asyncio.gather(
+                *(attempt(name) for name in dict.fromkeys(names)),
+                return_exceptions=True,
+            )
+        except BaseException:
+            # The caller was cancelled. Attempts which are still outstanding release their
+            # locks when their responses arrive.
+            if acquired := held + extra:
+                if self._logger.isEnabledFor(logging.DEBUG):
+                    self._logger.debug(
+                        "Releasing %d lock(s) after cancellation",
+                        len(acquired),
+                        extra=log_extra("try_lock_any.release",
+                                        count=len(acquired)))
+                self._run_in_background(self._unlock_all(acquired))
+            raise
+        error = next((r for r in results if isinstance(r, BaseException)), None)
+        if error is not None:
+            extra.extend(held)
+
+        if extra:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Releasing %d extra lock(s)",
+                                   len(extra),
+                                   extra=log_extra("try_lock_any.release",
+                                                   count=len(extra)))
+            # Shielded so that a cancellation of the caller can not interrupt the release
+            for lock, r in zip(
+                    extra, await asyncio.shield(
+                        asyncio.gather(*(lock.unlock() for lock in extra),
+                                       return_exceptions=True))):
+                if isinstance(r, Exception):
+                    self._logger.error("Failed to unlock `%s`: %r",
+                                       lock.name,
+                                       r,
+                                       extra=log_extra("unlock.failed",
+                                                       lock.name,
+                                                       error=repr(r)))
+
+        if error is not None:
+            raise error
+        return held
+
+    async def lock_many(
+        self,
+        names: Iterable[str],
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+    ) -> list[AsyncLock]:
+        """
+        Acquires many locks with a single RPC per `max_batch_size` locks. The locks are waited
+        for concurrently, each up to `wait_timeout_seconds`. If a lock can not be requested,
+        the locks which were acquired are released before the error is raised.
+
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, the locks will be automatically renewed at an appropriate interval using
+        background asyncio tasks.
+
+        Args:
+            names (Iterable[str]): The names of the locks to acquire. Duplicates are ignored.
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for each
+                lock to be acquired. Defaults to 0 (wait indefinitely).
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+
+        Returns:
+            list[AsyncLock]: A lock object for each name, in order. Locks which could not be
+                acquired within `wait_timeout_seconds` are not locked.
+
+        Raises:
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
+
+        Examples:
+            >>> import asyncio
+            >>> from ldlm import AsyncClient
+            >>> 
+            >>> async def lock_all():
+            ...     client = AsyncClient("ldlm-server:3144")
+            ...     locks = await client.lock_many(["a", "b", "c"], wait_timeout_seconds=10)
+            ...     print([lock.locked for lock in locks])
+            ... 
+            >>> asyncio.run(lock_all())
+            [True, True, False]
+        """
+        await self._lease()
+        requests = [
+            self._lock_request(name, wait_timeout_seconds, lock_timeout_seconds,
+                               size) for name in dict.fromkeys(names)
+        ]
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Waiting to acquire %d lock(s)",
+                              len(requests),
+                              extra=log_extra("lock_many.wait",
+                                              count=len(requests)))
+        return await self._acquire_many("Lock", requests)
+
+    async def try_lock_many(
+        self,
+        names: Iterable[str],
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+    ) -> list[AsyncLock]:
+        """
+        Attempts to acquire many locks with a single RPC per `max_batch_size` locks, and
+        immediately returns whether each lock was acquired or not. If a lock can not be
+        requested, the locks which were acquired are released before the error is raised.
+
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, the locks will be automatically renewed at an appropriate interval using
+        background asyncio tasks.
+
+        Args:
+            names (Iterable[str]): The names of the locks to acquire. Duplicates are ignored.
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+
+        Returns:
+            list[AsyncLock]: A lock object for each name, in order.
+
+        Raises:
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
+
+        Examples:
+            >>> import asyncio
+            >>> from ldlm import AsyncClient
+            >>> 
+            >>> async def try_lock_all():
+            ...     client = AsyncClient("ldlm-server:3144")
+            ...     locks = await client.try_lock_many(["a", "b", "c"])
+            ...     print([lock.name for lock in locks if lock])
+            ... 
+            >>> asyncio.run(try_lock_all())
+            ['a', 'c']
+        """
+        await self._lease()
+        requests = [
+            self._try_lock_request(name, lock_timeout_seconds, size)
+            for name in dict.fromkeys(names)
+        ]
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info("Attempting to acquire %d lock(s)",
+                              len(requests),
+                              extra=log_extra("try_lock_many.attempt",
+                                              count=len(requests)))
+        return await self._acquire_many("TryLock", requests)
+
+    async def _acquire_many(
+        self,
+        rpc_func: str,
+        requests: list[Union[pb.LockRequest, pb.TryLockRequest]],
+    ) -> list[AsyncLock]:
+        """
+        Acquires locks with Lock or TryLock requests sent in batches and starts their renew
+        tasks. If a request fails, the locks which were acquired are released. Like
+        _acquire(), locks can not be leaked if the caller is cancelled.
+
+        Args:
+            rpc_func (str): "Lock" or "TryLock".
+            requests (list[Union[pb.LockRequest, pb.TryLockRequest]]): The requests.
+
+        Returns:
+            list[AsyncLock]: A lock object for each request, in order.
+        """
+        started = time.perf_counter() if self._metrics is not None else 0.0
+        batch_task = asyncio.ensure_future(self._batch(rpc_func, requests))
+        try:
+            results = await asyncio.shield(batch_task)
+        except asyncio.CancelledError:
+            # Cancelling the RPCs would drop grants already on their way from the server
+            batch_task.add_done_callback(self._release_late_grants)
+            raise
+
+        locks: list[AsyncLock] = []
+        error: Optional[Exception] = None
+        for request, r in zip(requests, results):
+            if isinstance(r, exceptions.LockWaitTimeoutError):
+                r = pb.LockResponse(name=request.name, locked=False)
+            elif isinstance(r, Exception):
+                error = error or r
+                continue
+            if self._metrics is not None:
+                self._record_acquire(r, started, try_lock=rpc_func == "TryLock")
+            locks.append(AsyncLock(self, r, request.size,
+                                   lock_timeout(request)))
+            self._track(locks[-1])
+
+        if error is not None:
+            if held := [lock for lock in locks if lock.locked]:
+                await self._unlock_all(held)
+            raise error
+
+        if requests and (timeout := lock_timeout(
+                requests[0])) and self._auto_renew_locks:
+            for lock in locks:
+                if lock.locked:
+                    await self._start_renew(lock, timeout)
+        return locks
+
+    def _release_late_grants(self, batch_task: asyncio.Future) -> None:
+        """
+        Done callback for an abandoned batch of Lock or TryLock requests. Releases the locks
+        which were granted after the caller stopped waiting for them.
+
+        Args:
+            batch_task (asyncio.Future): The finished task.
+
+        Returns:
+            None
+        """
+        if batch_task.cancelled() or batch_task.exception() is not None:
+            return
+
+        granted = [
+            AsyncLock(self, r)
+            for r in batch_task.result()
+            if isinstance(r, pb.LockResponse) and r.locked
+        ]
+        if granted:
+            self._logger.warning(
+                "Releasing %d lock(s) which were granted after their request was "
+                "cancelled",
+                len(granted),
+                extra=log_extra("lock.release_cancelled", count=len(granted)))
+            self._run_in_background(self._unlock_all(granted))
+
+    async def _batch(self, rpc_func: str, requests: list) -> list:
+        """
+        Sends requests of an RPC in batch RPCs, or as concurrent unary RPCs if the server
+        does not implement the batch RPC. Batch RPCs are retried like unary RPCs; unary RPCs
+        sent in their place are not.
+
+        Args:
+            rpc_func (str): The unary RPC method, e.g. "Unlock".
+            requests (list): The unary request messages.
+
+        Returns:
+            list: The response to each request, in order, or the exception it failed with.
+
+        Raises:
+            grpc.RpcError: If a batch RPC fails. Locks granted by previous batches of the
+                same call are released first.
+        """
+        results: list = []
+        if self._use_batch(rpc_func):
+            try:
+                for batch_func, message in self._batch_messages(
+                        rpc_func, requests):
+                    resp = await self._rpc_with_retry(batch_func, message)
+                    results.extend(
+                        self._batch_result(r) for r in resp.responses)
+                return results
+            except BaseException as e:  # pylint: disable=broad-exception-caught
+                if not self._batch_unsupported(rpc_func, e):
+                    if granted := [
+                            AsyncLock(self, r)
+                            for r in results
+                            if isinstance(r, pb.LockResponse) and r.locked
+                    ]:
+                        self._run_in_background(self._unlock_all(granted))
+                    raise
+
+        metadata = self._metadata
+        rpc_callable = getattr(self._stub, rpc_func)
+        responses = await asyncio.gather(
+            *(rpc_callable(request, metadata=metadata)
+              for request in requests[len(results):]),
+            return_exceptions=True,
+        )
+        results.extend(
+            r if isinstance(r, BaseException) else self._batch_result(r)
+            for r in responses)
+        return results
 
     async def unlock(self, name: str, key: str) -> None:
         """
@@ -520,8 +1412,11 @@ class AsyncClient(BaseClient):
         Raises:
             RuntimeError: If the lock cannot be unlocked.
         """
-        if timer := self._lock_timers.pop(name, None):
-            self._logger.debug(f"Canceling lock renew for `{name}`")
+        if timer := self._lock_timers.pop((name, key), None):
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Canceling lock renew for `%s`",
+                                   name,
+                                   extra=log_extra("renew.cancel", name))
             timer.cancel()
 
         rpc_msg: pb.UnlockRequest = pb.UnlockRequest(
@@ -529,14 +1424,261 @@ class AsyncClient(BaseClient):
             key=key,
         )
 
-        self._logger.debug(f"Unlocking `{name}`")
-        r: pb.UnlockResponse = await self._rpc_with_retry("Unlock", rpc_msg)
-        self._logger.debug(f"Unlock response from server: {r}")
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("Unlocking `%s`",
+                               name,
+                               extra=log_extra("unlock", name))
+        with self._span("ldlm.release", name):
+            try:
+                r: pb.UnlockResponse = await self._rpc_with_retry(
+                    "Unlock", rpc_msg)
+            except LOST_LOCK_ERRORS:
+                self._forget(name, key)
+                raise
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(
+                "Unlock response from server for `%s`: unlocked=%s",
+                name,
+                r.unlocked,
+                extra=log_extra("unlock.response", name, unlocked=r.unlocked))
         if not r.unlocked:  # pragma: no cover
             raise RuntimeError(f"Failed to unlock `{name}`")
+        self._record_release(name, key)
+
+    async def unlock_many(self, locks: Iterable[AsyncLock]) -> None:
+        """
+        Unlocks many locks with a single RPC per `max_batch_size` locks. All of the locks
+        are unlocked before the first error is raised.
+
+        Args:
+            locks (Iterable[AsyncLock]): The locks to unlock.
+
+        Raises:
+            RuntimeError: If a lock cannot be unlocked.
+            ldlm.exceptions.LockDoesNotExistError: If a lock does not exist.
+            ldlm.exceptions.NotLockedError: If a lock is already unlocked.
+
+        Returns:
+            None
+        """
+        locks = list(locks)
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("Unlocking %d lock(s)",
+                               len(locks),
+                               extra=log_extra("unlock_many", count=len(locks)))
+        if (error := await self._unlock_all(locks)) is not None:
+            raise error
+
+    async def _unlock_all(self, locks: list[AsyncLock]) -> Optional[Exception]:
+        """
+        Releases locks, in batch RPCs if the server supports them and concurrently otherwise,
+        and waits for all of them to complete. Errors are logged rather than raised.
+
+        Args:
+            locks (list[AsyncLock]): The locks to release.
+
+        Returns:
+            Exception: The first error, or None if all of the locks were released.
+        """
+        for lock in locks:
+            if timer := self._lock_timers.pop((lock.name, lock.key), None):
+                timer.cancel()
+
+        try:
+            results = await self._batch("Unlock", [
+                pb.UnlockRequest(name=lock.name, key=lock.key) for lock in locks
+            ])
+        except grpc.RpcError as e:
+            results = [e] * len(locks)
+
+        error: Optional[Exception] = None
+        for lock, r in zip(locks, results):
+            if isinstance(r, pb.UnlockResponse) and r.unlocked:
+                self._record_release(lock.name, lock.key)
+                continue
+            if not isinstance(r, Exception):
+                r = RuntimeError(f"Failed to unlock `{lock.name}`")
+            self._logger.error("Failed to unlock `%s`: %s",
+                               lock.name,
+                               r,
+                               extra=log_extra("unlock.failed",
+                                               lock.name,
+                                               error=repr(r)))
+            error = error or r
+        return error
+
+    async def watch(self, names: Iterable[str]) -> AsyncIterator[str]:
+        """
+        An async iterator which watches locks without queueing for them. Yields the name of
+        each lock which is free when watching starts, and then the name of a lock each time it
+        is released and becomes free. Another client may acquire a free lock before this client
+        tries to. Closing the iterator stops watching.
+
+        Args:
+            names (Iterable[str]): The names of the locks to watch. Duplicates are ignored.
+
+        Yields:
+            str: The name of a free lock.
+
+        Raises:
+            grpc.RpcError: If watching fails, e.g. with UNIMPLEMENTED if the server does not
+                implement the Watch RPC.
+        """
+        call = self._stub.Watch(pb.WatchRequest(names=dict.fromkeys(names)),
+                                metadata=self._metadata)
+        try:
+            async for event in call:
+                yield event.name
+        finally:
+            call.cancel()
+
+    async def wait_until_free(self,
+                              name: str,
+                              wait_timeout_seconds: Timeout = 0) -> bool:
+        """
+        Waits until a lock is free without acquiring it. Another client may acquire the lock
+        before this client tries to.
+
+        The wait uses the Watch RPC, which does not queue a waiter for the lock. If the server
+        does not implement Watch, a Lock request waits for the lock instead and the lock is
+        released as soon as it is granted.
+
+        Args:
+            name (str): The name of the lock.
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for the lock
+                to be free. Defaults to 0 (wait indefinitely).
+
+        Returns:
+            bool: True if the lock is free, or False if the timeout expired first.
+        """
+        if self._watch_supported:
+            call = self._stub.Watch(pb.WatchRequest(names=[name]),
+                                    metadata=self._metadata,
+                                    timeout=to_seconds(wait_timeout_seconds) or
+                                    None)
+            try:
+                async for _ in call:
+                    return True
+                return False
+            except grpc.RpcError as e:
+                if rpc_error_code(e) == grpc.StatusCode.DEADLINE_EXCEEDED.name:
+                    return False
+                if not self._watch_unsupported(e):
+                    raise
+            finally:
+                call.cancel()
+
+        rpc_msg = self._lock_request(name, wait_timeout_seconds, None, 0)
+        try:
+            r: pb.LockResponse = await self._acquire("Lock", rpc_msg)
+        except exceptions.LockWaitTimeoutError:
+            r = pb.LockResponse(name=name, locked=False)
+        except grpc.RpcError as e:
+            if rpc_error_code(e) != grpc.StatusCode.DEADLINE_EXCEEDED.name:
+                raise
+            r = pb.LockResponse(name=name, locked=False)
+        if r.locked:
+            await self._rpc_with_retry("Unlock",
+                                       pb.UnlockRequest(name=name, key=r.key))
+        return r.locked
+
+    async def acquire_when_free(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        names: Iterable[str],
+        limit: Optional[int] = None,
+        wait_timeout_seconds: Timeout = 0,
+        lock_timeout_seconds: Optional[Timeout] = None,
+        size: int = 0,
+    ) -> AsyncIterator[AsyncLock]:
+        """
+        An async iterator which watches locks and yields each lock as soon as it is free and
+        acquired with a TryLock request. Unlike :py:meth:`acquire_as_available`, no waiter is
+        queued on the server for each lock, so many locks can be waited for cheaply, but a
+        released lock may be acquired by another client first. If the server does not
+        implement the Watch RPC, this falls back to :py:meth:`acquire_as_available`.
+
+        Iteration ends once `limit` locks have been yielded, every lock has been yielded, or
+        `wait_timeout_seconds` have passed.
+
+        If the client's `auto_renew_lock` parameter was set to True (the default) or left
+        unspecified, yielded locks will be automatically renewed at an appropriate interval
+        using a background asyncio task.
+
+        Args:
+            names (Iterable[str]): The names of the candidate locks.
+            limit (int, optional): The maximum number of locks to yield. Defaults to None (one
+                for each name).
+            wait_timeout_seconds (Timeout, optional): The timeout in seconds to wait for the locks.
+                Defaults to 0 (wait indefinitely).
+            lock_timeout_seconds (Timeout, optional): The timeout in seconds after which a
+                lock will be released unless it is renewed. Defaults to None (no timeout).
+            size (int, optional): The size of the locks. Defaults to 0 which translates to
+                unspecified. The server will use a size of 1 in this case.
+
+        Yields:
+            AsyncLock: Acquired lock objects in the order in which they were acquired.
+
+        Raises:
+            ldlm.exceptions.LockSizeMismatchError: If the lock size does not match the size
+                specified by a previous lock acquisition of a lock.
+            ldlm.exceptions.InvalidLockSizeError: If the lock size is invalid.
+
+        Examples:
+            >>> import asyncio
+            >>> from ldlm import AsyncClient
+            >>> 
+            >>> async def claim_partition():
+            ...     client = AsyncClient("ldlm-server:3144")
+            ...     partitions = [f"partition-{i}" for i in range(10000)]
+            ...     async for lock in client.acquire_when_free(partitions, limit=1):
+            ...         print(f"Working on {lock.name}")
+            ...         await lock.unlock()
+            ... 
+            >>> asyncio.run(claim_partition())
+            Working on partition-3
+        """
+        remaining = set(names := list(dict.fromkeys(names)))
+        if limit is None:
+            limit = len(remaining)
+        if self._watch_supported and limit > 0:
+            call = self._stub.Watch(pb.WatchRequest(names=names),
+                                    metadata=self._metadata,
+                                    timeout=to_seconds(wait_timeout_seconds) or
+                                    None)
+            try:
+                async for event in call:
+                    if event.name not in remaining:
+                        continue
+                    lock = await self.try_lock(
+                        event.name,
+                        lock_timeout_seconds=lock_timeout_seconds,
+                        size=size)
+                    if not lock:
+                        continue
+                    remaining.discard(event.name)
+                    limit -= 1
+                    yield lock
+                    if not limit or not remaining:
+                        return
+                return
+            except grpc.RpcError as e:
+                if rpc_error_code(e) == grpc.StatusCode.DEADLINE_EXCEEDED.name:
+                    return
+                if not self._watch_unsupported(e):
+                    raise
+            finally:
+                call.cancel()
+
+        locks = self.acquire_as_available(names, limit, wait_timeout_seconds,
+                                          lock_timeout_seconds, size)
+        try:
+            async for lock in locks:
+                yield lock
+        finally:
+            await locks.aclose()  # type: ignore[attr-defined]
 
     async def renew(self, name: str, key: str,
-                    lock_timeout_seconds: int) -> AsyncLock:
+                    lock_timeout_seconds: Timeout) -> AsyncLock:
         """
         Renews a lock. It is much more concise to run this method on the :py:class:`ldlm.AsyncLock`
         object returned by this client's lock methods.
@@ -544,32 +1686,290 @@ class AsyncClient(BaseClient):
         Args:
             name (str): The name of the lock to renew.
             key (str): The key associated with the lock to renew.
-            lock_timeout_seconds (int): The timeout in seconds for acquiring the lock.
+            lock_timeout_seconds (Timeout): The timeout in seconds for acquiring the lock.
 
         Returns:
             AsyncLock: A lock object.
         """
-        rpc_msg: pb.RenewRequest = (pb.RenewRequest(
-            name=name,
-            key=key,
-            lock_timeout_seconds=lock_timeout_seconds,
-        ))
+        rpc_msg: pb.RenewRequest = pb.RenewRequest(name=name, key=key)
+        set_lock_timeout(rpc_msg, lock_timeout_seconds)
 
-        resp: pb.LockResponse = await self._rpc_with_retry(
-            "Renew",
-            rpc_msg,
-        )
-        return AsyncLock(self, resp)
+        with self._span("ldlm.renew", name):
+            resp: pb.LockResponse = await self._rpc_with_retry(
+                "Renew",
+                rpc_msg,
+            )
+        return AsyncLock(self,
+                         resp,
+                         lock_timeout_seconds=to_seconds(lock_timeout_seconds))
+
+    async def renew_many(self, locks: Iterable[AsyncLock],
+                         lock_timeout_seconds: Timeout) -> list[AsyncLock]:
+        """
+        Renews many locks with a single RPC per `max_batch_size` locks.
+
+        Args:
+            locks (Iterable[AsyncLock]): The locks to renew.
+            lock_timeout_seconds (Timeout): The timeout in seconds after which the locks will
+                expire.
+
+        Returns:
+            list[AsyncLock]: The locks which were lost, e.g. because they expired, and could
+                not be renewed. They are no longer `locked` and their renew tasks are
+                cancelled.
+
+        Raises:
+            grpc.RpcError: If a renew request fails. Other locks are still renewed.
+        """
+        locks = list(locks)
+        requests = [
+            pb.RenewRequest(name=lock.name, key=lock.key) for lock in locks
+        ]
+        for request in requests:
+            set_lock_timeout(request, lock_timeout_seconds)
+        results = await self._batch("Renew", requests)
+
+        lost: list[AsyncLock] = []
+        error: Optional[Exception] = None
+        for lock, r in zip(locks, results):
+            if isinstance(r, LOST_LOCK_ERRORS):
+                lost.append(lock)
+            elif isinstance(r, Exception):
+                error = error or r
+
+        for lock in lost:
+            if timer := self._lock_timers.pop((lock.name, lock.key), None):
+                timer.cancel()
+            lock.locked = False
+            self._logger.warning("Lock `%s` could not be renewed",
+                                 lock.name,
+                                 extra=log_extra("renew.failed",
+                                                 lock.name,
+                                                 error="lost"))
+            self._record_lost(lock.name, lock.key)
+        if error is not None:
+            raise error
+        return lost
+
+    async def recover_locks(self, adopt: bool = False) -> list[AsyncLock]:
+        """
+        Releases or adopts the locks recorded in the client's journal, e.g. by a previous
+        process which crashed while holding them. Locks which no longer exist are removed from
+        the journal.
+
+        Args:
+            adopt (bool, optional): Renew the locks and return them instead of releasing them.
+                Adopted locks are renewed automatically if the client's `auto_renew_locks`
+                parameter is set. Defaults to False.
+
+        Returns:
+            list[AsyncLock]: The adopted locks.
+
+        Raises:
+            RuntimeError: If the client has no journal.
+            grpc.RpcError: If a request fails. Its lock is kept in the journal and the other
+                locks are still recovered.
+
+        Examples:
+            >>> from ldlm import AsyncClient
+            >>> from ldlm.journal import LockJournal
+            >>>
+            >>> client = AsyncClient("ldlm-server:3144",
+            ...                      journal=LockJournal("/var/run/worker-1.journal"))
+            >>> locks = await client.recover_locks(adopt=True)
+        """
+        entries, requests = self._recovery_requests(adopt)
+        results = await self._batch("Renew" if adopt else "Unlock", requests)
+        adopted, error = self._recovered(entries, results)
+
+        locks: list[AsyncLock] = []
+        for entry, r in adopted:
+            lock = AsyncLock(self, r, entry.size, entry.lock_timeout_seconds)
+            self._track(lock)
+            locks.append(lock)
+            if entry.lock_timeout_seconds and self._auto_renew_locks:
+                await self._start_renew(lock, entry.lock_timeout_seconds)
+        if error is not None:
+            raise error
+        return locks
+
+    async def handoff(self, lock: AsyncLock) -> LockHandle:
+        """
+        Stops renewing a lock held by this client, without releasing it, and returns a handle
+        with which another client, e.g. in another process, takes the lock over with
+        :py:meth:`adopt`. It is much more concise to run this method on the
+        :py:class:`ldlm.AsyncLock` object.
+
+        Args:
+            lock (AsyncLock): The lock to hand off.
+
+        Returns:
+            LockHandle: A serializable handle of the lock. Its deadline is when the lock
+                expires unless the receiving client renews it.
+
+        Raises:
+            RuntimeError: If the client attaches locks to a lease.
+        """
+        self._check_handoff()
+        timer = self._lock_timers.pop((lock.name, lock.key), None)
+        if timer is not None:
+            timer.cancel()
+        self._record_release(lock.name, lock.key)
+        return self._lock_handle(
+            lock, timer.renewed_at if timer is not None else None)
+
+    async def adopt(self, handle: LockHandle) -> AsyncLock:
+        """
+        Takes over a lock handed off by another client with :py:meth:`handoff`, without
+        releasing and acquiring it again. The lock is renewed by this client from now on if
+        the client's `auto_renew_locks` parameter is set, and first renewed immediately if its
+        deadline is too close for its renew schedule.
+
+        Args:
+            handle (LockHandle): The handle of the lock.
+
+        Returns:
+            AsyncLock: The lock object.
+
+        Raises:
+            RuntimeError: If the client attaches locks to a lease.
+            ldlm.exceptions.LockDoesNotExistOrInvalidKeyError: If the lock had to be renewed
+                and it no longer exists, e.g. because it expired.
+
+        Examples:
+            >>> import pickle
+            >>> from ldlm import AsyncClient
+            >>>
+            >>> client = AsyncClient("ldlm-server:3144")
+            >>> lock = await client.lock("my_lock", lock_timeout_seconds=600)
+            >>> data = pickle.dumps(await lock.handoff())
+            >>>
+            >>> # In another process
+            >>> lock = await AsyncClient("ldlm-server:3144").adopt(pickle.loads(data))
+        """
+        self._check_handoff()
+        if self._adopt_renew_due(handle):
+            await self.renew(handle.name, handle.key,
+                             handle.lock_timeout_seconds)
+        lock = AsyncLock(
+            self, pb.LockResponse(name=handle.name, key=handle.key,
+                                  locked=True), handle.size,
+            handle.lock_timeout_seconds)
+        self._track(lock)
+        if handle.lock_timeout_seconds and self._auto_renew_locks:
+            await self._start_renew(lock, handle.lock_timeout_seconds)
+        return lock
+
+    async def _renew_prepared(self, prepared: PreparedRenew) -> None:
+        """
+        Renews a lock with a prepared request.
+
+        Args:
+            prepared (PreparedRenew): The request.
+
+        Returns:
+            None
+        """
+        with self._span("ldlm.renew", prepared.name):
+            await self._rpc_with_retry("Renew", prepared)
+
+    async def _lease(self) -> None:
+        """
+        Grants the client's lease and starts its keepalive if the client attaches locks to a
+        lease and does not hold one.
+
+        Returns:
+            None
+        """
+        if not self._lease_timeout_seconds or (self._lease_keeper is not None
+                                               and
+                                               not self._lease_keeper.done()):
+            return
+
+        grant = self._lease_grant
+        if (grant is None or grant.done() or
+                grant.get_loop() is not asyncio.get_running_loop()):
+            grant = self._lease_grant = asyncio.ensure_future(
+                self._grant_lease())
+        await asyncio.shield(grant)
+
+    async def _grant_lease(self) -> None:
+        """
+        Grants the client's lease and starts its keepalive task.
+
+        Returns:
+            None
+        """
+        try:
+            r: pb.LeaseResponse = await self._rpc_with_retry(
+                "GrantLease",
+                pb.GrantLeaseRequest(
+                    lease_timeout_seconds=self._lease_timeout_seconds))
+        except grpc.RpcError as e:
+            if self._lease_unsupported(e):
+                return
+            raise
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("Granted lease %s",
+                               r.lease_id,
+                               extra=log_extra("lease.granted"))
+        self._lease_id = r.lease_id
+        self._lease_keeper = asyncio.create_task(self._keep_alive(r.lease_id))
+
+    async def _keep_alive(self, lease_id: str) -> None:
+        """
+        Keeps a lease alive until a keepalive fails or the task is cancelled.
+
+        Args:
+            lease_id (str): The id of the lease.
+
+        Returns:
+            None
+        """
+        interval = self._keep_alive_interval()
+        request = pb.KeepAliveRequest(lease_id=lease_id)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._rpc_with_retry("KeepAlive", request)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._lease_lost(lease_id, e)
+                return
+
+    async def _revoke_lease(self) -> None:
+        """
+        Stops the keepalive of the client's lease and revokes it, which releases the locks
+        attached to it. Errors are logged rather than raised.
+
+        Returns:
+            None
+        """
+        keeper, self._lease_keeper = self._lease_keeper, None
+        if keeper is None or keeper.done():
+            return
+        # The keepalive may run in the event loop of another thread
+        _cancel_task(keeper)
+        try:
+            await self._stub.RevokeLease(
+                pb.RevokeLeaseRequest(lease_id=self._lease_id),
+                metadata=self._metadata)
+        except grpc.RpcError as e:
+            self._logger.warning("Failed to revoke lease %s: %r",
+                                 self._lease_id,
+                                 e,
+                                 extra=log_extra("lease.revoke_failed",
+                                                 error=repr(e)))
 
     async def _start_renew(self, lock: AsyncLock,
-                           lock_timeout_seconds: int) -> None:
+                           lock_timeout_seconds: float) -> None:
         """
-        Start the renew timer for a lock.
+        Start the renew timer for a lock. Locks attached to the client's lease are kept alive
+        by its keepalive instead.
 
         Args:
             name (str): The name of the lock to renew.
             key (str): The key associated with the lock to renew.
-            lock_timeout_seconds (int): The timeout in seconds after which the lock will
+            lock_timeout_seconds (float): The timeout in seconds after which the lock will
                 expire
 
         Raises:
@@ -578,39 +1978,178 @@ class AsyncClient(BaseClient):
         Returns:
             None
         """
-        if lock.name in self._lock_timers:  # pragma: no cover
+        if self._lease_timeout_seconds or self._closing:
+            return
+
+        # A timer which stopped because its lock was lost can be replaced
+        existing = self._lock_timers.get((lock.name, lock.key))
+        if existing is not None and existing.is_alive():  # pragma: no cover
             raise RuntimeError(f"Lock `{lock.name}` already has a renew timer")
 
-        interval = max(lock_timeout_seconds - 30,
-                       self.min_renew_interval_seconds)
-        self._lock_timers[lock.name] = _RenewTimer(
+        interval = self._renew_interval(lock_timeout_seconds)
+        on_renewed = None
+        if self._metrics is not None:
+            on_renewed = functools.partial(self._metrics.lock_renewed,
+                                           lock.name)
+        on_lost = functools.partial(self._record_lost, lock.name, lock.key)
+        timer = self._lock_timers[lock.name, lock.key] = _RenewTimer(
             lock,
-            lock_timeout_seconds,
+            functools.partial(
+                self._renew_prepared,
+                PreparedRenew(lock.name, lock.key, lock_timeout_seconds)),
             interval=interval,
             logger=self._logger,
+            on_renewed=on_renewed,
+            on_lost=on_lost,
         )
-        await self._lock_timers[lock.name].start()
+        await timer.start()
 
-    async def close(self) -> None:
+    async def close(self, grace_seconds: float = 5) -> None:
         """
-        Closes the LDLM gRPC channel.
+        Closes the LDLM gRPC channels created by the client.
 
         This method is used to close the LDLM gRPC channel and indicate that the client is no
         longer active. It is typically called when the client is no longer needed or when the
-        program is exiting.
+        program is exiting. Renewal of the client's locks stops first, and the locks it still
+        holds are released concurrently, in batch RPCs if the server supports them. Locks which
+        are not released within `grace_seconds`, e.g. because the server is unreachable, expire
+        after their lock timeout. If the client holds a lease, it is revoked, which releases
+        the locks attached to it.
+
+        Args:
+            grace_seconds (float, optional): The maximum time in seconds to wait for the locks
+                to be released. Set to 0 to close the channels without releasing the locks.
+                Defaults to 5.
+
+        Returns:
+            None
+        """
+        if self._closing:
+            return
+        self._closing = True
+        for timer in self._lock_timers.values():
+            timer.cancel()
+        self._lock_timers.clear()
+
+        held = list(self._held.values())
+        if held and grace_seconds > 0:
+            if self._logger.isEnabledFor(logging.DEBUG):
+                self._logger.debug("Releasing %d lock(s) before closing",
+                                   len(held),
+                                   extra=log_extra("close.release",
+                                                   count=len(held)))
+            try:
+                await asyncio.wait_for(self._release_held(), grace_seconds)
+            except asyncio.TimeoutError:
+                self._logger.warning(
+                    "Timed out releasing %d lock(s) while closing",
+                    len(held),
+                    extra=log_extra("close.timeout", count=len(held)))
+
+        # Requests still in progress are not retried once the client is closed
+        self._closed = True
+        await self._revoke_lease()
+        current_loop = asyncio.get_running_loop()
+        with self._loop_channels_lock:
+            entries = list(self._loop_channels.items())
+            self._loop_channels.clear()
+
+        for loop, (channel, stub) in entries:
+            if loop is current_loop:
+                await self._close_channel(channel, stub)
+            elif loop.is_running():
+                # Channels must be closed in the event loop they were created in
+                await asyncio.wrap_future(
+                    asyncio.run_coroutine_threadsafe(
+                        self._close_channel(channel, stub), loop))
+            else:
+                self._close_idle_channel(channel)
+
+    async def _close_channel(self, channel: grpc.aio.Channel,
+                             stub: ldlm_grpc.LDLMStub) -> None:
+        """
+        Closes a channel and the Session stream of its stub, if it has one. Must run in the
+        channel's event loop.
+
+        Args:
+            channel (grpc.aio.Channel): The channel.
+            stub (LDLMStub): The stub of the channel.
 
         Returns:
             None
         """
-        if self._channel:
-            await self._channel.close()
-            self._closed = True
+        if self._transport == "session":
+            await stub.close()  # type: ignore[attr-defined]
+        await channel.close()
+
+    async def _release_held(self) -> None:
+        """
+        Releases the locks held when the client is closed, including locks which other tasks
+        acquire meanwhile. Errors are logged rather than raised.
 
-    async def aclose(self) -> None:
+        Returns:
+            None
+        """
+        released: set[tuple[str, str]] = set()
+        while locks := [
+                lock for k, lock in list(self._held.items())
+                if k not in released
+        ]:
+            released.update((lock.name, lock.key) for lock in locks)
+            await self._unlock_all(locks)
+
+    async def aclose(self, grace_seconds: float = 5) -> None:
         """
         Awaits self.close(). For compatibility with contextlib.aclosing().
 
+        Args:
+            grace_seconds (float, optional): Passed to :py:meth:`close`. Defaults to 5.
+
         Returns:
             None
         """
-        await self.close()
+        await self.close(grace_seconds)
+
+    def close_on_signals(
+        self,
+        signals: Iterable[int] = (signal.SIGTERM,),
+        grace_seconds: float = 5,
+    ) -> None:
+        """
+        Closes the client, releasing the locks it holds, when the process receives one of
+        `signals`, e.g. the SIGTERM sent to stop a container. The handlers are set on the
+        running event loop. Once the client is closed, the signal's default handler is restored
+        and the signal raised again, so a signal which terminates the process still does.
+
+        Args:
+            signals (Iterable[int], optional): The signals which close the client. Defaults
+                to SIGTERM.
+            grace_seconds (float, optional): Passed to :py:meth:`close`. Defaults to 5.
+
+        Returns:
+            None
+
+        Examples:
+            >>> from ldlm import AsyncClient
+            >>>
+            >>> async def main():
+            ...     client = AsyncClient("ldlm-server:3144")
+            ...     client.close_on_signals()
+        """
+        loop = asyncio.get_running_loop()
+        signals = list(signals)
+
+        async def close_and_raise(sig: int) -> None:
+            try:
+                await self.close(grace_seconds)
+            finally:
+                signal.raise_signal(sig)
+
+        def handler(sig: int) -> None:
+            # Restores the default handlers
+            for s in signals:
+                loop.remove_signal_handler(s)
+            self._run_in_background(close_and_raise(sig))
+
+        for sig in signals:
+            loop.add_signal_handler(sig, handler, sig)
@@ -15,7 +15,7 @@
 """
 Exception classes for the LDLM service.
 """
-from typing import Union
+from typing import Optional, Union
 from ldlm.protos import ldlm_pb2 as pb2
 
 
@@ -99,12 +99,35 @@ class InvalidLockSizeError(_BaseLDLMException):
     RPC_CODE = 7
 
 
+class LeaseDoesNotExistError(_BaseLDLMException):
+    """
+    Lease does not exist error. The lease expired, was revoked or was never granted.
+    """
+
+    RPC_CODE = 8
+
+
+class InvalidLeaseTimeoutError(_BaseLDLMException):
+    """
+    The lease timeout in the request is not a valid timeout (must be > 0).
+    """
+
+    RPC_CODE = 9
+
+
+# Exception classes by RPC error code
+_BY_RPC_CODE: dict[int, type[_BaseLDLMException]] = {
+    cls.RPC_CODE: cls for cls in _BaseLDLMException.__subclasses__()
+}
+
+
 def from_rpc_error(
     rpc_error: pb2.Error
 ) -> Union[LDLMError, LockDoesNotExistError, InvalidLockKeyError,
            LockWaitTimeoutError, NotLockedError,
            LockDoesNotExistOrInvalidKeyError, LockSizeMismatchError,
-           InvalidLockSizeError]:
+           InvalidLockSizeError, LeaseDoesNotExistError,
+           InvalidLeaseTimeoutError]:
     """
     Converts an LDLM error into a corresponding exception.
 
@@ -113,7 +136,21 @@ def from_rpc_error(
     Returns:
         An exception.
     """
-    for cls in _BaseLDLMException.__subclasses__():
-        if rpc_error.code == cls.RPC_CODE:  # type: ignore
-            return cls(rpc_error.message)  # type: ignore
-    return LDLMError(rpc_error.message)
+    return _BY_RPC_CODE.get(rpc_error.code,
+                            LDLMError)(rpc_error.message)  # type: ignore
+
+
+def to_rpc_error(error: BaseException) -> Optional[pb2.Error]:
+    """
+    Converts an exception raised by a client back into the LDLM error it was created from.
+
+    param error: The exception to convert.
+
+    Returns:
+        The LDLM error, or None if the exception is not an LDLM exception.
+    """
+    if not isinstance(error, _BaseLDLMException):
+        return None
+    return pb2.Error(
+        code=error.RPC_CODE,  # type: ignore[arg-type]
+        message=error.message)
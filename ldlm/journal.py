@@ -0,0 +1,238 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Crash-recovery journal of held locks. Pass a :py:class:`LockJournal` as the `journal`
+parameter of an LDLM client to record the name, key and size of each lock it acquires in a
+memory-mapped file, and remove them when the lock is released. Writes go to the page cache,
+so they survive the process crashing.
+
+When the process restarts, `recover_locks()` of a client using the same journal file releases
+the locks held by the previous process, or adopts them, so that they do not stay locked until
+their lock timeout expires.
+
+Examples:
+    >>> from ldlm import Client
+    >>> from ldlm.journal import LockJournal
+    >>>
+    >>> client = Client("ldlm-server:3144", journal=LockJournal("/var/run/worker-1.journal"))
+    >>> client.recover_locks()
+    []
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Iterator, Optional
+
+
+@dataclass
+class JournalEntry:
+    """
+    A lock recorded in a :py:class:`LockJournal`.
+    """
+
+    name: str
+    """name of the lock"""
+
+    key: str
+    """key of the lock"""
+
+    size: int
+    """size of the lock, or 0 if unspecified"""
+
+    lock_timeout_seconds: float
+    """lock timeout in seconds, or 0 if the lock has none"""
+
+
+class LockJournal:  # pylint: disable=too-many-instance-attributes
+    """
+    A memory-mapped journal of held locks, stored in fixed-size slots of a file. An entry is
+    written before the flag marking its slot in use, so a crash never leaves a partial entry.
+
+    A journal is used by one process at a time, which is enforced with a file lock. Processes
+    which fork workers should give each worker its own journal file, created after forking.
+    """
+
+    _MAGIC = b"LDLMJRNL"
+    _HEADER = struct.Struct("<8sII")
+    _HEADER_SIZE = 64
+
+    # In use flag, name length, key length, size, lock timeout
+    _SLOT = struct.Struct("<IHHid")
+
+    def __init__(self, path: str, capacity: int = 1024, slot_size: int = 512):
+        """
+        Opens the journal at `path`, creating it if it does not exist.
+
+        Args:
+            path (str): The journal file.
+            capacity (int, optional): The number of entries of a new journal. Defaults to
+                1024.
+            slot_size (int, optional): The size in bytes of the entries of a new journal.
+                The name and key of a lock must fit in it. Defaults to 512.
+
+        Raises:
+            ValueError: If the file exists and is not a journal.
+            RuntimeError: If the journal is in use by another process.
+        """
+        # pylint: disable=import-outside-toplevel
+        import fcntl
+
+        self.path: str = path
+        """path of the journal file"""
+
+        self._logger = logging.getLogger("ldlm")
+        self._lock = threading.Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            try:
+                fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError as e:
+                raise RuntimeError(
+                    f"{path} is in use by another process") from e
+
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, self._HEADER_SIZE + capacity * slot_size)
+                os.pwrite(self._fd,
+                          self._HEADER.pack(self._MAGIC, capacity, slot_size),
+                          0)
+            data = os.pread(self._fd, self._HEADER.size, 0)
+            if len(data) < self._HEADER.size or data[:8] != self._MAGIC:
+                raise ValueError(f"{path} is not an LDLM lock journal")
+            _, self._capacity, self._slot_size = self._HEADER.unpack(data)
+            size = self._HEADER_SIZE + self._capacity * self._slot_size
+            if os.fstat(self._fd).st_size < size:
+                raise ValueError(f"{path} is truncated")
+            self._mmap = mmap.mmap(self._fd, size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+        # Slot of each journaled lock by (name, key), as a lock of size > 1 may be held more
+        # than once, and unused slots
+        self._slots: dict[tuple[str, str], int] = {}
+        self._free: list[int] = []
+        for slot, entry in reversed(list(self._read())):
+            if entry is None:
+                self._free.append(slot)
+            else:
+                self._slots[entry.name, entry.key] = slot
+
+    def _offset(self, slot: int) -> int:
+        return self._HEADER_SIZE + slot * self._slot_size
+
+    def _read(self) -> Iterator[tuple[int, Optional[JournalEntry]]]:
+        """
+        Yields each slot with its entry, or None if it is unused.
+        """
+        for slot in range(self._capacity):
+            offset = self._offset(slot)
+            used, name_len, key_len, size, timeout = self._SLOT.unpack_from(
+                self._mmap, offset)
+            if not used:
+                yield slot, None
+                continue
+            start = offset + self._SLOT.size
+            data = self._mmap[start:start + name_len + key_len]
+            yield slot, JournalEntry(data[:name_len].decode(errors="replace"),
+                                     data[name_len:].decode(errors="replace"),
+                                     size, timeout)
+
+    def add(self, name: str, key: str, size: int,
+            lock_timeout_seconds: float) -> None:
+        """
+        Records a held lock, replacing any entry with the same name and key. A lock which does
+        not fit in a slot, or does not fit because the journal is full, is not recorded.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the lock.
+            size (int): The size of the lock, or 0 if unspecified.
+            lock_timeout_seconds (float): The lock timeout in seconds, or 0 for none.
+
+        Returns:
+            None
+        """
+        name_bytes = name.encode()
+        key_bytes = key.encode()
+        if len(name_bytes) + len(key_bytes) > self._slot_size - self._SLOT.size:
+            self._logger.warning("Lock `%s` is too long to journal", name)
+            return
+        with self._lock:
+            slot = self._slots.get((name, key))
+            if slot is None:
+                if not self._free:
+                    self._logger.warning(
+                        "Lock journal %s is full; not journaling lock `%s`",
+                        self.path, name)
+                    return
+                slot = self._free.pop()
+            else:
+                # Clear the old entry so that a crash does not leave a mix of both
+                self._mmap[self._offset(slot):self._offset(slot) + 4] = bytes(4)
+            offset = self._offset(slot)
+            start = offset + self._SLOT.size
+            self._mmap[start:start + len(name_bytes) +
+                       len(key_bytes)] = name_bytes + key_bytes
+            self._SLOT.pack_into(self._mmap, offset, 0, len(name_bytes),
+                                 len(key_bytes), size, lock_timeout_seconds)
+            self._mmap[offset:offset + 4] = struct.pack("<I", 1)
+            self._slots[name, key] = slot
+
+    def remove(self, name: str, key: str) -> None:
+        """
+        Removes the entry of a lock, if there is one.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the lock.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            slot = self._slots.pop((name, key), None)
+            if slot is None:
+                return
+            offset = self._offset(slot)
+            self._mmap[offset:offset + 4] = bytes(4)
+            self._free.append(slot)
+
+    def entries(self) -> list[JournalEntry]:
+        """
+        Returns the journaled locks.
+
+        Returns:
+            list[JournalEntry]: The entries.
+        """
+        with self._lock:
+            return [entry for _, entry in self._read() if entry is not None]
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def close(self) -> None:
+        """
+        Unmaps the journal and releases the file lock. Entries are kept.
+
+        Returns:
+            None
+        """
+        self._mmap.close()
+        os.close(self._fd)
@@ -0,0 +1,967 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Client metrics. Pass a :py:class:`MetricsSink` as the `metrics` parameter of an LDLM client
+to receive RPC latencies, retries, lock wait and hold times, renew lag and lost locks.
+:py:class:`InMemoryMetrics` aggregates them into histograms and counters which can be read
+with `snapshot()` or exported in the Prometheus text format. Processes on a host, e.g. the
+workers of a prefork server, can share a :py:class:`SharedMemoryMetrics` file which is
+aggregated without IPC.
+
+Examples:
+    >>> from ldlm import Client
+    >>> from ldlm.metrics import InMemoryMetrics, serve_prometheus
+    >>>
+    >>> metrics = InMemoryMetrics()
+    >>> client = Client("ldlm-server:3144", metrics=metrics)
+    >>> server = serve_prometheus(metrics, port=9464)
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Iterator, Optional, Sequence, Union
+
+
+class LatencyHistogram:
+    """
+    A log-linear histogram of durations with microsecond resolution and a relative error of
+    about 3% (16 linear sub-buckets per power of two). Recording is a few integer operations,
+    so one histogram per worker can be kept without locking and merged when reporting. Only
+    non-empty buckets are stored, so a histogram of similar durations is small.
+    """
+
+    _SUB_BITS = 4
+    _SUB = 1 << _SUB_BITS
+
+    # Durations longer than 2**40 microseconds (~12 days) are counted in the last bucket
+    _MAX_SHIFT = 40 - _SUB_BITS
+    _LAST = (_MAX_SHIFT + 2) * _SUB - 1
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self) -> None:
+        self.counts: dict[int, int] = {}
+        """count of values in each non-empty bucket, by bucket index"""
+
+        self.count: int = 0
+        """number of recorded values"""
+
+        self.total: float = 0.0
+        """sum of recorded values in seconds"""
+
+        self.max: float = 0.0
+        """largest recorded value in seconds"""
+
+    @classmethod
+    def _index(cls, micros: int) -> int:
+        if micros < 2 * cls._SUB:
+            return micros
+        shift = micros.bit_length() - cls._SUB_BITS - 1
+        if shift > cls._MAX_SHIFT:
+            return cls._LAST
+        return shift * cls._SUB + (micros >> shift)
+
+    @classmethod
+    def _bounds(cls, index: int) -> tuple[int, int]:
+        """
+        Returns the [lower, upper) bounds in microseconds of a bucket.
+        """
+        if index < 2 * cls._SUB:
+            return index, index + 1
+        shift = index // cls._SUB - 1
+        mantissa = index - shift * cls._SUB
+        return mantissa << shift, (mantissa + 1) << shift
+
+    def record(self, seconds: float) -> None:
+        """
+        Records a duration.
+
+        Args:
+            seconds (float): The duration in seconds.
+
+        Returns:
+            None
+        """
+        index = self._index(int(seconds * 1_000_000))
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other: LatencyHistogram) -> None:
+        """
+        Adds the values recorded in another histogram to this one.
+
+        Args:
+            other (LatencyHistogram): The histogram to merge.
+
+        Returns:
+            None
+        """
+        for index, c in list(other.counts.items()):
+            self.counts[index] = self.counts.get(index, 0) + c
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def since(self, earlier: LatencyHistogram) -> LatencyHistogram:
+        """
+        Returns a histogram of the values recorded since `earlier`, an older copy of this
+        histogram. The max of the result is the overall max.
+
+        Args:
+            earlier (LatencyHistogram): The older copy.
+
+        Returns:
+            LatencyHistogram: The difference.
+        """
+        h = LatencyHistogram()
+        for index, c in list(self.counts.items()):
+            if c != earlier.counts.get(index, 0):
+                h.counts[index] = c - earlier.counts.get(index, 0)
+        h.count = self.count - earlier.count
+        h.total = self.total - earlier.total
+        h.max = self.max
+        return h
+
+    def copy(self) -> LatencyHistogram:
+        """
+        Returns a copy of this histogram.
+        """
+        h = LatencyHistogram()
+        h.merge(self)
+        return h
+
+    def percentile(self, q: float) -> float:
+        """
+        Returns an estimate of the q-th quantile of the recorded values.
+
+        Args:
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimate in seconds. 0 if nothing was recorded.
+        """
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(q * self.count + 0.5))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                if index == self._LAST:
+                    return self.max
+                lower, upper = self._bounds(index)
+                return min((lower + upper) / 2_000_000, self.max)
+        return self.max
+
+    def mean(self) -> float:
+        """
+        Returns the mean of the recorded values in seconds. 0 if nothing was recorded.
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def summary(self) -> dict[str, float]:
+        """
+        Returns the count, mean, p50, p90, p99, p999 and max of the recorded values. Times are
+        in milliseconds.
+        """
+        return {
+            "count": self.count,
+            "mean_ms": round(self.mean() * 1000, 3),
+            "p50_ms": round(self.percentile(0.5) * 1000, 3),
+            "p90_ms": round(self.percentile(0.9) * 1000, 3),
+            "p99_ms": round(self.percentile(0.99) * 1000, 3),
+            "p999_ms": round(self.percentile(0.999) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+    def buckets(self) -> list[tuple[float, int]]:
+        """
+        Returns the non-empty buckets as (upper bound in milliseconds, count) pairs.
+        """
+        return [(self._bounds(i)[1] / 1000, self.counts[i])
+                for i in sorted(self.counts)]
+
+    def cumulative_counts(self, bounds: Sequence[float]) -> list[int]:
+        """
+        Returns the number of values less than or equal to each bound. A bound which falls
+        inside a bucket counts the whole bucket if the bound is at least the bucket's midpoint.
+
+        Args:
+            bounds (Sequence[float]): Increasing bounds in seconds.
+
+        Returns:
+            list[int]: The cumulative count for each bound.
+        """
+        result = []
+        seen = 0
+        indexes = sorted(self.counts)
+        i = 0
+        for bound in bounds:
+            micros = bound * 1_000_000
+            while i < len(indexes):
+                lower, upper = self._bounds(indexes[i])
+                if (lower + upper) / 2 > micros:
+                    break
+                seen += self.counts[indexes[i]]
+                i += 1
+            result.append(seen)
+        return result
+
+
+class MetricsSink:
+    """
+    Receives metrics from an LDLM client. Subclass this and override the methods of interest;
+    the default implementations do nothing.
+
+    Methods are called synchronously from the thread or event loop that performed the
+    operation, so they must be fast, must not block and must be thread-safe if the client is
+    shared by threads.
+    """
+
+    def rpc_completed(self, method: str, seconds: float, code: str) -> None:
+        """
+        Called after each RPC attempt, including attempts which are retried.
+
+        Args:
+            method (str): The RPC method, e.g. "Lock" or "Renew".
+            seconds (float): The duration of the attempt.
+            code (str): "OK", the name of the gRPC status code of a failed call, e.g.
+                "UNAVAILABLE", or the name of the LDLM error code returned by the server, e.g.
+                "LockWaitTimeout".
+        """
+
+    def rpc_retried(self, method: str) -> None:
+        """
+        Called when a failed RPC attempt is going to be retried.
+
+        Args:
+            method (str): The RPC method.
+        """
+
+    def lock_acquired(self,
+                      name: str,
+                      wait_seconds: float,
+                      try_lock: bool = False) -> None:
+        """
+        Called when a lock is acquired.
+
+        Args:
+            name (str): The name of the lock.
+            wait_seconds (float): Time from the start of the request, including retries, until
+                the lock was acquired.
+            try_lock (bool, optional): Whether the lock was acquired with a TryLock request
+                rather than a Lock request.
+        """
+
+    def lock_not_acquired(self,
+                          name: str,
+                          wait_seconds: float,
+                          try_lock: bool = False) -> None:
+        """
+        Called when a try_lock() finds a lock unavailable or a lock() wait times out.
+
+        Args:
+            name (str): The name of the lock.
+            wait_seconds (float): Time from the start of the request until the response.
+            try_lock (bool, optional): Whether the request was a TryLock request rather than a
+                Lock request which timed out.
+        """
+
+    def lock_released(self, name: str, held_seconds: float) -> None:
+        """
+        Called when a lock acquired by the client is unlocked.
+
+        Args:
+            name (str): The name of the lock.
+            held_seconds (float): Time since the lock was acquired.
+        """
+
+    def lock_renewed(self, name: str, lag_seconds: float) -> None:
+        """
+        Called when an automatic renew of a lock succeeds.
+
+        Args:
+            name (str): The name of the lock.
+            lag_seconds (float): Time from when the renew was due until the server confirmed
+                it.
+        """
+
+    def lock_lost(self, name: str) -> None:
+        """
+        Called when an automatic renew of a lock fails and the client stops renewing it.
+
+        Args:
+            name (str): The name of the lock.
+        """
+
+
+class MultiSink(MetricsSink):
+    """
+    A :py:class:`MetricsSink` which forwards metrics to several sinks.
+    """
+
+    def __init__(self, *sinks: MetricsSink):
+        """
+        Args:
+            *sinks (MetricsSink): The sinks to forward to.
+        """
+        self.sinks: tuple[MetricsSink, ...] = sinks
+        """sinks metrics are forwarded to"""
+
+    def rpc_completed(self, method: str, seconds: float, code: str) -> None:
+        for sink in self.sinks:
+            sink.rpc_completed(method, seconds, code)
+
+    def rpc_retried(self, method: str) -> None:
+        for sink in self.sinks:
+            sink.rpc_retried(method)
+
+    def lock_acquired(self,
+                      name: str,
+                      wait_seconds: float,
+                      try_lock: bool = False) -> None:
+        for sink in self.sinks:
+            sink.lock_acquired(name, wait_seconds, try_lock)
+
+    def lock_not_acquired(self,
+                          name: str,
+                          wait_seconds: float,
+                          try_lock: bool = False) -> None:
+        for sink in self.sinks:
+            sink.lock_not_acquired(name, wait_seconds, try_lock)
+
+    def lock_released(self, name: str, held_seconds: float) -> None:
+        for sink in self.sinks:
+            sink.lock_released(name, held_seconds)
+
+    def lock_renewed(self, name: str, lag_seconds: float) -> None:
+        for sink in self.sinks:
+            sink.lock_renewed(name, lag_seconds)
+
+    def lock_lost(self, name: str) -> None:
+        for sink in self.sinks:
+            sink.lock_lost(name)
+
+
+class InMemoryMetrics(MetricsSink):  # pylint: disable=too-many-instance-attributes
+    """
+    A thread-safe :py:class:`MetricsSink` which aggregates metrics in memory.
+    """
+
+    prometheus_buckets: tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01,
+                                             0.025, 0.05, 0.1, 0.25, 0.5, 1,
+                                             2.5, 5, 10, 30, 60, 300)
+    """histogram bucket bounds in seconds used for the Prometheus export"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rpc_latency: dict[str, LatencyHistogram] = {}
+        self._rpc_codes: dict[tuple[str, str], int] = {}
+        self._rpc_retries: dict[str, int] = {}
+        self._acquire_wait = LatencyHistogram()
+        self._not_acquired_wait = LatencyHistogram()
+        self._hold = LatencyHistogram()
+        self._renew_lag = LatencyHistogram()
+        self._locks_lost = 0
+        self._open_locks = 0
+
+    def rpc_completed(self, method: str, seconds: float, code: str) -> None:
+        with self._lock:
+            hist = self._rpc_latency.get(method)
+            if hist is None:
+                hist = self._rpc_latency[method] = LatencyHistogram()
+            hist.record(seconds)
+            self._rpc_codes[method, code] = self._rpc_codes.get(
+                (method, code), 0) + 1
+
+    def rpc_retried(self, method: str) -> None:
+        with self._lock:
+            self._rpc_retries[method] = self._rpc_retries.get(method, 0) + 1
+
+    def lock_acquired(self,
+                      name: str,
+                      wait_seconds: float,
+                      try_lock: bool = False) -> None:
+        with self._lock:
+            self._acquire_wait.record(wait_seconds)
+            self._open_locks += 1
+
+    def lock_not_acquired(self,
+                          name: str,
+                          wait_seconds: float,
+                          try_lock: bool = False) -> None:
+        with self._lock:
+            self._not_acquired_wait.record(wait_seconds)
+
+    def lock_released(self, name: str, held_seconds: float) -> None:
+        with self._lock:
+            self._hold.record(held_seconds)
+            self._open_locks -= 1
+
+    def lock_renewed(self, name: str, lag_seconds: float) -> None:
+        with self._lock:
+            self._renew_lag.record(lag_seconds)
+
+    def lock_lost(self, name: str) -> None:
+        with self._lock:
+            self._locks_lost += 1
+            self._open_locks -= 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns the current metrics. Latencies are summarized as in
+        :py:meth:`LatencyHistogram.summary`.
+
+        Returns:
+            dict: The metrics.
+        """
+        with self._lock:
+            rpc_codes: dict[str, dict[str, int]] = {}
+            for (method, code), n in self._rpc_codes.items():
+                rpc_codes.setdefault(method, {})[code] = n
+            return {
+                "rpc_latency": {
+                    method: hist.summary()
+                    for method, hist in self._rpc_latency.items()
+                },
+                "rpc_codes": rpc_codes,
+                "rpc_retries": dict(self._rpc_retries),
+                "acquire_wait": self._acquire_wait.summary(),
+                "not_acquired_wait": self._not_acquired_wait.summary(),
+                "hold": self._hold.summary(),
+                "renew_lag": self._renew_lag.summary(),
+                "locks_lost": self._locks_lost,
+                "open_locks": self._open_locks,
+            }
+
+    def prometheus_text(self, prefix: str = "ldlm_client") -> str:
+        """
+        Returns the metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix (str, optional): Prefix of metric names. Defaults to "ldlm_client".
+
+        Returns:
+            str: The metrics.
+        """
+        lines: list[str] = []
+
+        def histogram(name: str, help_text: str,
+                      series: Sequence[tuple[str, LatencyHistogram]]) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for labels, hist in series:
+                sep = "," if labels else ""
+                for bound, count in zip(
+                        self.prometheus_buckets,
+                        hist.cumulative_counts(self.prometheus_buckets)):
+                    lines.append(f'{prefix}_{name}_bucket{{{labels}{sep}'
+                                 f'le="{bound}"}} {count}')
+                lines.append(
+                    f'{prefix}_{name}_bucket{{{labels}{sep}le="+Inf"}} '
+                    f'{hist.count}')
+                braces = f"{{{labels}}}" if labels else ""
+                lines.append(f"{prefix}_{name}_sum{braces} {hist.total}")
+                lines.append(f"{prefix}_{name}_count{braces} {hist.count}")
+
+        def metric(name: str, kind: str, help_text: str,
+                   series: Sequence[tuple[str, float]]) -> None:
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} {kind}")
+            for labels, value in series:
+                braces = f"{{{labels}}}" if labels else ""
+                lines.append(f"{prefix}_{name}{braces} {value}")
+
+        with self._lock:
+            histogram("rpc_duration_seconds", "Duration of LDLM RPC attempts.",
+                      [(f'method="{method}"', hist)
+                       for method, hist in sorted(self._rpc_latency.items())])
+            metric("rpcs_total", "counter", "LDLM RPC attempts by result code.",
+                   [(f'method="{method}",code="{code}"', n)
+                    for (method, code), n in sorted(self._rpc_codes.items())])
+            metric("rpc_retries_total", "counter", "LDLM RPC retries.",
+                   [(f'method="{method}"', n)
+                    for method, n in sorted(self._rpc_retries.items())])
+            histogram("lock_wait_seconds", "Time to acquire a lock.", [
+                ('result="acquired"', self._acquire_wait),
+                ('result="not_acquired"', self._not_acquired_wait),
+            ])
+            histogram("lock_hold_seconds", "Time locks were held.",
+                      [("", self._hold)])
+            histogram("lock_renew_lag_seconds",
+                      "Time from when a renew was due until it completed.",
+                      [("", self._renew_lag)])
+            metric("locks_lost_total", "counter",
+                   "Locks whose automatic renew failed.",
+                   [("", self._locks_lost)])
+            metric("open_locks", "gauge", "Locks currently held.",
+                   [("", self._open_locks)])
+
+        return "\n".join(lines) + "\n"
+
+
+class SharedMemoryMetrics(MetricsSink):  # pylint: disable=too-many-instance-attributes
+    """
+    A :py:class:`MetricsSink` which stores metrics in a memory-mapped file shared by all
+    processes on a host, e.g. the workers of a prefork server. Each process writes to its own
+    fixed-size region of the file without locking other processes out, and
+    :py:meth:`aggregate` reads all regions directly, so reporting needs no IPC.
+
+    A process claims a free region the first time it records a metric, including a process
+    forked after the sink was created. Regions of processes which exited are reused and their
+    counters kept, so totals do not drop when a worker is replaced. Processes sharing a file
+    must share a PID namespace, which is used to tell whether the owner of a region is alive.
+
+    Method and result code names are stored in fixed tables of each region. Names beyond
+    their capacity are counted as "other".
+
+    Examples:
+        >>> # In the master process, before forking workers
+        >>> metrics = SharedMemoryMetrics("/tmp/ldlm-metrics")
+        >>> server = serve_prometheus(metrics, port=9464)
+        >>>
+        >>> # In each worker
+        >>> client = Client("ldlm-server:3144", metrics=metrics)
+    """
+
+    _MAGIC = b"LDLMMETR"
+    _HEADER_WORDS = 8
+    _NAME_WORDS = 4
+    _BUCKETS = LatencyHistogram._LAST + 1  # pylint: disable=protected-access
+    _HIST_WORDS = 3 + _BUCKETS
+
+    # Words of a region header
+    _SEQ, _PID, _LOST, _OPEN = range(4)
+    _LOCK_HISTS = 4
+
+    def __init__(self,
+                 path: str,
+                 processes: int = 64,
+                 methods: int = 16,
+                 codes: int = 32):
+        """
+        Opens the file at `path`, creating it if it does not exist.
+
+        Args:
+            path (str): The file to store metrics in.
+            processes (int, optional): The number of process regions of a new file. Defaults
+                to 64.
+            methods (int, optional): The number of RPC method names a region can hold.
+                Defaults to 16.
+            codes (int, optional): The number of result code names a region can hold.
+                Defaults to 32.
+
+        Raises:
+            ValueError: If the file exists and is not an LDLM metrics file.
+        """
+        self.path: str = path
+        """path of the metrics file"""
+
+        self._lock = threading.Lock()
+        self._pid = 0
+        self._region = -1
+        self._methods: dict[str, int] = {}
+        self._codes: dict[str, int] = {}
+
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self._file_lock(fd):
+                header = struct.Struct("<8s4Q")
+                if os.fstat(fd).st_size == 0:
+                    self._layout(processes, methods, codes)
+                    os.ftruncate(
+                        fd, self._base + processes * self._region_words * 8)
+                    os.pwrite(
+                        fd,
+                        header.pack(self._MAGIC, processes, methods, codes,
+                                    self._region_words), 0)
+                data = os.pread(fd, header.size, 0)
+                if len(data) < header.size or data[:8] != self._MAGIC:
+                    raise ValueError(f"{path} is not an LDLM metrics file")
+                _, processes, methods, codes, _ = header.unpack(data)
+                self._layout(processes, methods, codes)
+                size = self._base + processes * self._region_words * 8
+                if os.fstat(fd).st_size < size:
+                    raise ValueError(f"{path} is truncated")
+                self._mmap = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        self._words = memoryview(self._mmap).cast("q")
+        self._floats = memoryview(self._mmap).cast("d")
+
+    def _layout(self, processes: int, methods: int, codes: int) -> None:
+        self._processes = processes
+        self._method_slots = methods
+        self._code_slots = codes
+        self._method_names = self._HEADER_WORDS
+        self._code_names = self._method_names + methods * self._NAME_WORDS
+        self._code_counts = self._code_names + codes * self._NAME_WORDS
+        self._retry_counts = self._code_counts + methods * codes
+        self._hists = self._retry_counts + methods
+        words = self._hists + (self._LOCK_HISTS + methods) * self._HIST_WORDS
+        # Regions are page aligned so that processes do not write to the same pages
+        self._region_words = -(-words // 512) * 512
+        self._base = mmap.PAGESIZE
+
+    @staticmethod
+    @contextmanager
+    def _file_lock(fd: int) -> Iterator[None]:
+        # pylint: disable=import-outside-toplevel
+        import fcntl
+
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        if pid <= 0:
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _offset(self, region: int) -> int:
+        """
+        Returns the index of the first word of a region.
+        """
+        return self._base // 8 + region * self._region_words
+
+    def _claim(self) -> None:
+        """
+        Claims a region for this process, preferring the region of an exited process to an
+        unused one.
+        """
+        pid = os.getpid()
+        fd = os.open(self.path, os.O_RDWR)
+        try:
+            # The file lock also serializes threads claiming a region at the same time
+            with self._file_lock(fd):
+                if self._pid == pid:
+                    return
+                free = []
+                for region in range(self._processes):
+                    start = self._offset(region)
+                    owner = self._words[start + self._PID]
+                    if not self._alive(owner):
+                        free.append(
+                            (self._words[start + self._SEQ] == 0, region))
+                if not free:
+                    raise RuntimeError(
+                        f"all {self._processes} regions of {self.path} are in use"
+                    )
+                _, region = min(free)
+                start = self._offset(region)
+                w = self._words
+                w[start + self._PID] = pid
+                # A process which exited during an update left the sequence odd
+                w[start + self._SEQ] += w[start + self._SEQ] % 2
+                w[start + self._OPEN] = 0
+
+                self._methods = {}
+                self._codes = {}
+                for names, slots, table in ((self._method_names,
+                                             self._method_slots, self._methods),
+                                            (self._code_names, self._code_slots,
+                                             self._codes)):
+                    for i in range(slots):
+                        name = self._name_at(
+                            self._mmap, start + names + i * self._NAME_WORDS)
+                        if not name:
+                            break
+                        table[name] = i
+                # The lock may have been held by another thread when this process was forked
+                self._lock = threading.Lock()
+                self._region = region
+                self._pid = pid
+        finally:
+            os.close(fd)
+
+    def _name_at(self, data: Union[mmap.mmap, memoryview], word: int) -> str:
+        return bytes(data[word * 8:(word + self._NAME_WORDS) *
+                          8]).rstrip(b"\0").decode(errors="replace")
+
+    def _slot(self, table: dict[str, int], names: int, slots: int,
+              name: str) -> int:
+        """
+        Returns the slot of a name in a name table of this process's region, adding the name if
+        it is new.
+        """
+        slot = table.get(name)
+        if slot is not None:
+            return slot
+        if len(table) >= slots - 1:
+            name = "other"
+            slot = table.get(name)
+            if slot is not None:
+                return slot
+        slot = len(table)
+        offset = (self._offset(self._region) + names +
+                  slot * self._NAME_WORDS) * 8
+        size = self._NAME_WORDS * 8
+        self._mmap[offset:offset + size] = name.encode()[:size].ljust(
+            size, b"\0")
+        table[name] = slot
+        return slot
+
+    @contextmanager
+    def _update(self) -> Iterator[int]:
+        """
+        Locks this process's region for an update and yields the index of its first word.
+        Readers retry while the sequence number is odd or changes.
+        """
+        if self._pid != os.getpid():
+            self._claim()
+        with self._lock:
+            start = self._offset(self._region)
+            self._words[start] += 1
+            try:
+                yield start
+            finally:
+                self._words[start] += 1
+
+    def _record(self, hist: int, seconds: float) -> None:
+        index = LatencyHistogram._index(int(seconds * 1_000_000))  # pylint: disable=protected-access
+        self._words[hist] += 1
+        self._floats[hist + 1] += seconds
+        if seconds > self._floats[hist + 2]:
+            self._floats[hist + 2] = seconds
+        self._words[hist + 3 + index] += 1
+
+    def _lock_hist(self, start: int, which: int) -> int:
+        return start + self._hists + which * self._HIST_WORDS
+
+    def rpc_completed(self, method: str, seconds: float, code: str) -> None:
+        with self._update() as start:
+            m = self._slot(self._methods, self._method_names,
+                           self._method_slots, method)
+            c = self._slot(self._codes, self._code_names, self._code_slots,
+                           code)
+            self._words[start + self._code_counts + m * self._code_slots +
+                        c] += 1
+            self._record(self._lock_hist(start, self._LOCK_HISTS + m), seconds)
+
+    def rpc_retried(self, method: str) -> None:
+        with self._update() as start:
+            m = self._slot(self._methods, self._method_names,
+                           self._method_slots, method)
+            self._words[start + self._retry_counts + m] += 1
+
+    def lock_acquired(self,
+                      name: str,
+                      wait_seconds: float,
+                      try_lock: bool = False) -> None:
+        with self._update() as start:
+            self._record(self._lock_hist(start, 0), wait_seconds)
+            self._words[start + self._OPEN] += 1
+
+    def lock_not_acquired(self,
+                          name: str,
+                          wait_seconds: float,
+                          try_lock: bool = False) -> None:
+        with self._update() as start:
+            self._record(self._lock_hist(start, 1), wait_seconds)
+
+    def lock_released(self, name: str, held_seconds: float) -> None:
+        with self._update() as start:
+            self._record(self._lock_hist(start, 2), held_seconds)
+            self._words[start + self._OPEN] -= 1
+
+    def lock_renewed(self, name: str, lag_seconds: float) -> None:
+        with self._update() as start:
+            self._record(self._lock_hist(start, 3), lag_seconds)
+
+    def lock_lost(self, name: str) -> None:
+        with self._update() as start:
+            self._words[start + self._LOST] += 1
+            self._words[start + self._OPEN] -= 1
+
+    def _read_region(self, region: int) -> Optional[memoryview]:
+        """
+        Returns a consistent copy of a region as 8 byte words, or None if it was never used.
+        """
+        start = self._offset(region)
+        end = start + self._region_words
+        for _ in range(100):
+            seq = self._words[start]
+            if seq == 0:
+                return None
+            if seq % 2 == 0:
+                data = memoryview(bytes(self._mmap[start * 8:end * 8]))
+                if self._words[start] == seq:
+                    return data
+            time.sleep(0)
+        # The owner is stuck or exited during an update
+        return memoryview(bytes(self._mmap[start * 8:end * 8]))
+
+    def _histogram(self, words: memoryview, floats: memoryview[float],
+                   hist: int) -> Optional[LatencyHistogram]:
+        if words[hist] == 0:
+            return None
+        h = LatencyHistogram()
+        h.count = words[hist]
+        h.total = floats[hist + 1]
+        h.max = floats[hist + 2]
+        for index in range(self._BUCKETS):
+            c = words[hist + 3 + index]
+            if c:
+                h.counts[index] = c
+        return h
+
+    def aggregate(self) -> InMemoryMetrics:  # pylint: disable=too-many-locals
+        """
+        Returns the sum of the metrics of all processes which used the file. Only processes
+        which are still running contribute to the number of open locks.
+
+        Returns:
+            InMemoryMetrics: The aggregated metrics.
+        """
+        # pylint: disable=protected-access
+        result = InMemoryMetrics()
+        for region in range(self._processes):
+            data = self._read_region(region)
+            if data is None:
+                continue
+            words = data.cast("q")
+            floats = data.cast("d")
+            methods = [
+                self._name_at(data, self._method_names + i * self._NAME_WORDS)
+                for i in range(self._method_slots)
+            ]
+            codes = [
+                self._name_at(data, self._code_names + i * self._NAME_WORDS)
+                for i in range(self._code_slots)
+            ]
+            for m, method in enumerate(methods):
+                if not method:
+                    break
+                for c, code in enumerate(codes):
+                    if not code:
+                        break
+                    n = words[self._code_counts + m * self._code_slots + c]
+                    if n:
+                        result._rpc_codes[method, code] = result._rpc_codes.get(
+                            (method, code), 0) + n
+                retries = words[self._retry_counts + m]
+                if retries:
+                    result._rpc_retries[method] = result._rpc_retries.get(
+                        method, 0) + retries
+                hist = self._histogram(
+                    words, floats,
+                    self._hists + (self._LOCK_HISTS + m) * self._HIST_WORDS)
+                if hist is not None:
+                    result._rpc_latency.setdefault(
+                        method, LatencyHistogram()).merge(hist)
+            for which, target in enumerate(
+                (result._acquire_wait, result._not_acquired_wait, result._hold,
+                 result._renew_lag)):
+                hist = self._histogram(words, floats,
+                                       self._hists + which * self._HIST_WORDS)
+                if hist is not None:
+                    target.merge(hist)
+            result._locks_lost += words[self._LOST]
+            if self._alive(words[self._PID]):
+                result._open_locks += words[self._OPEN]
+        return result
+
+    def snapshot(self) -> dict:
+        """
+        Returns the aggregated metrics as in :py:meth:`InMemoryMetrics.snapshot`.
+
+        Returns:
+            dict: The metrics.
+        """
+        return self.aggregate().snapshot()
+
+    def prometheus_text(self, prefix: str = "ldlm_client") -> str:
+        """
+        Returns the aggregated metrics in the Prometheus text exposition format.
+
+        Args:
+            prefix (str, optional): Prefix of metric names. Defaults to "ldlm_client".
+
+        Returns:
+            str: The metrics.
+        """
+        return self.aggregate().prometheus_text(prefix)
+
+    def close(self) -> None:
+        """
+        Releases this process's region, keeping its counters, and unmaps the file.
+        """
+        if self._pid == os.getpid():
+            with self._lock:
+                self._words[self._offset(self._region) + self._PID] = 0
+        self._pid = 0
+        self._words.release()
+        self._floats.release()
+        self._mmap.close()
+
+
+def serve_prometheus(metrics: Union[InMemoryMetrics, SharedMemoryMetrics],
+                     port: int,
+                     addr: str = "",
+                     prefix: str = "ldlm_client"):
+    """
+    Serves metrics in the Prometheus text format over HTTP from a daemon thread.
+
+    Args:
+        metrics (InMemoryMetrics | SharedMemoryMetrics): The metrics to serve.
+        port (int): The port to listen on. 0 picks a free port.
+        addr (str, optional): The address to listen on. Defaults to all interfaces.
+        prefix (str, optional): Prefix of metric names. Defaults to "ldlm_client".
+
+    Returns:
+        http.server.ThreadingHTTPServer: The server. Call `shutdown()` to stop it.
+    """
+    # pylint: disable=import-outside-toplevel
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        """
+        Responds to every GET with the metrics.
+        """
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            """
+            Handles a GET request.
+            """
+            body = metrics.prometheus_text(prefix).encode()
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:  # pylint: disable=redefined-builtin
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,342 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Per lock name contention profiler. Attach a :py:class:`ContentionProfiler` to a running client
+to find the lock names with the most attempts, wait time, timeouts or try_lock failures.
+
+Memory is bounded: at most `capacity` lock names are tracked, chosen with the Space-Saving
+heavy hitters algorithm. A name which is seen often enough is always tracked; its attempt count
+may be overestimated by at most `attempts_error`, and its other stats only cover the time
+since it was last admitted to the table.
+
+Examples:
+    >>> from ldlm import Client
+    >>> from ldlm.profiler import ContentionProfiler
+    >>>
+    >>> client = Client("ldlm-server:3144")
+    >>> profiler = ContentionProfiler(capacity=500)
+    >>> profiler.attach(client)
+    >>> profiler.install_signal_handler()  # `kill -USR2 <pid>` prints a report to stderr
+    >>> ...
+    >>> print(profiler.format_report(n=10, sort_by="wait"))
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import signal
+import sys
+import threading
+from typing import Any, Callable, Optional, TextIO
+
+from .base_client import BaseClient
+from .metrics import LatencyHistogram, MetricsSink, MultiSink
+
+
+class _NameStats:  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    Stats of a single lock name.
+    """
+
+    __slots__ = ("attempts", "error", "acquired", "timeouts", "try_locks",
+                 "try_lock_failures", "lost", "wait", "hold")
+
+    def __init__(self, attempts: int, error: int):
+        self.attempts = attempts
+        self.error = error
+        self.acquired = 0
+        self.timeouts = 0
+        self.try_locks = 0
+        self.try_lock_failures = 0
+        self.lost = 0
+        self.wait = LatencyHistogram()
+        self.hold = LatencyHistogram()
+
+
+class ContentionProfiler(MetricsSink):
+    """
+    A :py:class:`ldlm.metrics.MetricsSink` which profiles contention per lock name.
+    """
+
+    sort_keys: dict[str, Callable[[_NameStats], float]] = {
+        "attempts": lambda s: s.attempts,
+        "wait": lambda s: s.wait.total,
+        "timeouts": lambda s: s.timeouts,
+        "try_lock_failures": lambda s: s.try_lock_failures,
+        "hold": lambda s: s.hold.total,
+    }
+    """report sort orders; each sorts by the largest value first"""
+
+    def __init__(self, capacity: int = 1000):
+        """
+        Args:
+            capacity (int, optional): The maximum number of lock names to track. Defaults to
+                1000.
+        """
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        self._table: dict[str, _NameStats] = {}
+
+        # Min-heap of (attempts, sequence, name) with one entry per tracked name. Entries
+        # are not updated when attempts are counted, so an entry's attempts may be stale
+        # (lower than the actual count); stale entries are fixed when they reach the top.
+        self._heap: list[tuple[int, int, str]] = []
+        self._sequence = itertools.count()
+
+    def _attempt(self, name: str) -> _NameStats:
+        """
+        Counts an acquire attempt for a lock name, admitting it to the table if necessary.
+        Must be called with self._lock held.
+        """
+        stats = self._table.get(name)
+        if stats is not None:
+            stats.attempts += 1
+            return stats
+
+        if len(self._table) < self._capacity:
+            stats = _NameStats(1, 0)
+        else:
+            # Evict the name with the fewest attempts; the new name inherits its count
+            while True:
+                attempts, _, evicted = self._heap[0]
+                actual = self._table[evicted].attempts
+                if actual == attempts:
+                    heapq.heappop(self._heap)
+                    break
+                heapq.heapreplace(self._heap,
+                                  (actual, next(self._sequence), evicted))
+            del self._table[evicted]
+            stats = _NameStats(attempts + 1, attempts)
+
+        self._table[name] = stats
+        heapq.heappush(self._heap, (stats.attempts, next(self._sequence), name))
+        return stats
+
+    def lock_acquired(self,
+                      name: str,
+                      wait_seconds: float,
+                      try_lock: bool = False) -> None:
+        with self._lock:
+            stats = self._attempt(name)
+            stats.acquired += 1
+            stats.wait.record(wait_seconds)
+            if try_lock:
+                stats.try_locks += 1
+
+    def lock_not_acquired(self,
+                          name: str,
+                          wait_seconds: float,
+                          try_lock: bool = False) -> None:
+        with self._lock:
+            stats = self._attempt(name)
+            stats.wait.record(wait_seconds)
+            if try_lock:
+                stats.try_locks += 1
+                stats.try_lock_failures += 1
+            else:
+                stats.timeouts += 1
+
+    def lock_released(self, name: str, held_seconds: float) -> None:
+        with self._lock:
+            stats = self._table.get(name)
+            if stats is not None:
+                stats.hold.record(held_seconds)
+
+    def lock_lost(self, name: str) -> None:
+        with self._lock:
+            stats = self._table.get(name)
+            if stats is not None:
+                stats.lost += 1
+
+    def attach(self, client: BaseClient) -> None:
+        """
+        Starts profiling a client. Metrics already being sent to another sink continue to be.
+
+        Args:
+            client (BaseClient): The client.
+
+        Returns:
+            None
+        """
+        current = client.metrics
+        if current is None:
+            client.metrics = self
+        elif current is not self and not (isinstance(current, MultiSink) and
+                                          self in current.sinks):
+            client.metrics = MultiSink(current, self)
+
+    def detach(self, client: BaseClient) -> None:
+        """
+        Stops profiling a client. Collected stats are kept.
+
+        Args:
+            client (BaseClient): The client.
+
+        Returns:
+            None
+        """
+        current = client.metrics
+        if current is self:
+            client.metrics = None
+        elif isinstance(current, MultiSink) and self in current.sinks:
+            others = [s for s in current.sinks if s is not self]
+            client.metrics = others[0] if len(others) == 1 else MultiSink(
+                *others)
+
+    def reset(self) -> None:
+        """
+        Discards all collected stats.
+
+        Returns:
+            None
+        """
+        with self._lock:
+            self._table.clear()
+            self._heap.clear()
+
+    def report(self,
+               n: int = 20,
+               sort_by: str = "wait") -> list[dict[str, Any]]:
+        """
+        Returns stats of the top lock names.
+
+        Args:
+            n (int, optional): The number of lock names. Defaults to 20.
+            sort_by (str, optional): "attempts", "wait" (total wait time), "timeouts",
+                "try_lock_failures" or "hold" (total hold time). Defaults to "wait".
+
+        Returns:
+            list[dict[str, Any]]: A dict of stats for each lock name, hottest first. Latencies
+                are summarized as in :py:meth:`ldlm.metrics.LatencyHistogram.summary`.
+
+        Raises:
+            ValueError: If `sort_by` is not valid.
+        """
+        try:
+            key = self.sort_keys[sort_by]
+        except KeyError:
+            raise ValueError(f"unknown sort key: {sort_by}") from None
+
+        with self._lock:
+            top = heapq.nlargest(n,
+                                 self._table.items(),
+                                 key=lambda i: key(i[1]))
+            return [{
+                "name":
+                    name,
+                "attempts":
+                    s.attempts,
+                "attempts_error":
+                    s.error,
+                "acquired":
+                    s.acquired,
+                "timeouts":
+                    s.timeouts,
+                "try_locks":
+                    s.try_locks,
+                "try_lock_failures":
+                    s.try_lock_failures,
+                "try_lock_failure_rate":
+                    round(s.try_lock_failures /
+                          s.try_locks, 4) if s.try_locks else 0.0,
+                "lost":
+                    s.lost,
+                "total_wait_seconds":
+                    round(s.wait.total, 6),
+                "wait":
+                    s.wait.summary(),
+                "hold":
+                    s.hold.summary(),
+            } for name, s in top]
+
+    def format_report(self, n: int = 20, sort_by: str = "wait") -> str:
+        """
+        Returns a table of the top lock names.
+
+        Args:
+            n (int, optional): The number of lock names. Defaults to 20.
+            sort_by (str, optional): See :py:meth:`report`. Defaults to "wait".
+
+        Returns:
+            str: The table.
+        """
+        rows = self.report(n, sort_by)
+        width = max([len("name")] + [len(r["name"]) for r in rows])
+        lines = [
+            f"Top {len(rows)} lock names by {sort_by}",
+            f"{'name':<{width}} {'attempts':>9} {'timeouts':>8} {'tl_fail%':>8} "
+            f"{'wait_total_s':>12} {'wait_p50_ms':>11} {'wait_p99_ms':>11} "
+            f"{'hold_p50_ms':>11} {'hold_p99_ms':>11}",
+        ]
+        for r in rows:
+            lines.append(f"{r['name']:<{width}} {r['attempts']:>9} "
+                         f"{r['timeouts']:>8} "
+                         f"{r['try_lock_failure_rate'] * 100:>8.1f} "
+                         f"{r['total_wait_seconds']:>12.3f} "
+                         f"{r['wait']['p50_ms']:>11.3f} "
+                         f"{r['wait']['p99_ms']:>11.3f} "
+                         f"{r['hold']['p50_ms']:>11.3f} "
+                         f"{r['hold']['p99_ms']:>11.3f}")
+        return "\n".join(lines)
+
+    def dump(self,
+             file: Optional[TextIO] = None,
+             n: int = 20,
+             sort_by: str = "wait") -> None:
+        """
+        Writes the report table to a file.
+
+        Args:
+            file (TextIO, optional): The file. Defaults to sys.stderr.
+            n (int, optional): The number of lock names. Defaults to 20.
+            sort_by (str, optional): See :py:meth:`report`. Defaults to "wait".
+
+        Returns:
+            None
+        """
+        print(self.format_report(n, sort_by),
+              file=file if file is not None else sys.stderr,
+              flush=True)
+
+    def install_signal_handler(self,
+                               signum: Optional[int] = None,
+                               file: Optional[TextIO] = None,
+                               n: int = 20,
+                               sort_by: str = "wait") -> Any:
+        """
+        Dumps the report whenever the process receives a signal. Must be called from the main
+        thread. The report is written by a short-lived thread, because the signal may interrupt
+        the main thread while it holds the profiler's lock.
+
+        Args:
+            signum (int, optional): The signal. Defaults to SIGUSR2.
+            file (TextIO, optional): The file to write to. Defaults to sys.stderr.
+            n (int, optional): The number of lock names. Defaults to 20.
+            sort_by (str, optional): See :py:meth:`report`. Defaults to "wait".
+
+        Returns:
+            The previous handler of the signal.
+        """
+        if signum is None:
+            signum = signal.SIGUSR2
+
+        def handler(*_: Any) -> None:
+            threading.Thread(target=self.dump,
+                             args=(file, n, sort_by),
+                             name="ldlm-profiler-dump",
+                             daemon=True).start()
+
+        return signal.signal(signum, handler)
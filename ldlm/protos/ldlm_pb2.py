@@ -28,29 +28,57 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nldlm.proto\x12\x04ldlm\"7\n\x05\x45rror\x12\x1d\n\x04\x63ode\x18\x01 \x01(\x0e\x32\x0f.ldlm.ErrorCode\x12\x0f\n\x07message\x18\x02 \x01(\t\"\xaf\x01\n\x0bLockRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12!\n\x14wait_timeout_seconds\x18\x03 \x01(\x05H\x00\x88\x01\x01\x12!\n\x14lock_timeout_seconds\x18\x64 \x01(\x05H\x01\x88\x01\x01\x12\x11\n\x04size\x18\x04 \x01(\x05H\x02\x88\x01\x01\x42\x17\n\x15_wait_timeout_secondsB\x17\n\x15_lock_timeout_secondsB\x07\n\x05_size\"v\n\x0eTryLockRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12!\n\x14lock_timeout_seconds\x18\x64 \x01(\x05H\x00\x88\x01\x01\x12\x11\n\x04size\x18\x04 \x01(\x05H\x01\x88\x01\x01\x42\x17\n\x15_lock_timeout_secondsB\x07\n\x05_size\"d\n\x0cLockResponse\x12\x0e\n\x06locked\x18\x01 \x01(\x08\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x0b\n\x03key\x18\x03 \x01(\t\x12\x1f\n\x05\x65rror\x18\x04 \x01(\x0b\x32\x0b.ldlm.ErrorH\x00\x88\x01\x01\x42\x08\n\x06_error\"*\n\rUnlockRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0b\n\x03key\x18\x02 \x01(\t\"[\n\x0eUnlockResponse\x12\x10\n\x08unlocked\x18\x01 \x01(\x08\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x1f\n\x05\x65rror\x18\x03 \x01(\x0b\x32\x0b.ldlm.ErrorH\x00\x88\x01\x01\x42\x08\n\x06_error\"G\n\x0cRenewRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0b\n\x03key\x18\x02 \x01(\t\x12\x1c\n\x14lock_timeout_seconds\x18\x64 \x01(\x05*\xb3\x01\n\tErrorCode\x12\x0b\n\x07Unknown\x10\x00\x12\x14\n\x10LockDoesNotExist\x10\x01\x12\x12\n\x0eInvalidLockKey\x10\x02\x12\x13\n\x0fLockWaitTimeout\x10\x03\x12\r\n\tNotLocked\x10\x04\x12 \n\x1cLockDoesNotExistOrInvalidKey\x10\x05\x12\x14\n\x10LockSizeMismatch\x10\x06\x12\x13\n\x0fInvalidLockSize\x10\x07\x32\xd8\x01\n\x04LDLM\x12/\n\x04Lock\x12\x11.ldlm.LockRequest\x1a\x12.ldlm.LockResponse\"\x00\x12\x35\n\x07TryLock\x12\x14.ldlm.TryLockRequest\x1a\x12.ldlm.LockResponse\"\x00\x12\x35\n\x06Unlock\x12\x13.ldlm.UnlockRequest\x1a\x14.ldlm.UnlockResponse\"\x00\x12\x31\n\x05Renew\x12\x12.ldlm.RenewRequest\x1a\x12.ldlm.LockResponse\"\x00\x62\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\nldlm.proto\x12\x04ldlm\"7\n\x05\x45rror\x12\x1d\n\x04\x63ode\x18\x01 \x01(\x0e\x32\x0f.ldlm.ErrorCode\x12\x0f\n\x07message\x18\x02 \x01(\t\"\xa5\x02\n\x0bLockRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12!\n\x14wait_timeout_seconds\x18\x03 \x01(\x05H\x00\x88\x01\x01\x12!\n\x14lock_timeout_seconds\x18\x64 \x01(\x05H\x01\x88\x01\x01\x12\x11\n\x04size\x18\x04 \x01(\x05H\x02\x88\x01\x01\x12\x10\n\x08lease_id\x18\x05 \x01(\t\x12\x1c\n\x0fwait_timeout_ms\x18\x06 \x01(\x05H\x03\x88\x01\x01\x12\x1c\n\x0flock_timeout_ms\x18\x07 \x01(\x05H\x04\x88\x01\x01\x42\x17\n\x15_wait_timeout_secondsB\x17\n\x15_lock_timeout_secondsB\x07\n\x05_sizeB\x12\n\x10_wait_timeout_msB\x12\n\x10_lock_timeout_ms\"\xba\x01\n\x0eTryLockRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12!\n\x14lock_timeout_seconds\x18\x64 \x01(\x05H\x00\x88\x01\x01\x12\x11\n\x04size\x18\x04 \x01(\x05H\x01\x88\x01\x01\x12\x10\n\x08lease_id\x18\x05 \x01(\t\x12\x1c\n\x0flock_timeout_ms\x18\x06 \x01(\x05H\x02\x88\x01\x01\x42\x17\n\x15_lock_timeout_secondsB\x07\n\x05_sizeB\x12\n\x10_lock_timeout_ms\"d\n\x0cLockResponse\x12\x0e\n\x06locked\x18\x01 \x01(\x08\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x0b\n\x03key\x18\x03 \x01(\t\x12\x1f\n\x05\x65rror\x18\x04 \x01(\x0b\x32\x0b.ldlm.ErrorH\x00\x88\x01\x01\x42\x08\n\x06_error\"*\n\rUnlockRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0b\n\x03key\x18\x02 \x01(\t\"[\n\x0eUnlockResponse\x12\x10\n\x08unlocked\x18\x01 \x01(\x08\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\x1f\n\x05\x65rror\x18\x03 \x01(\x0b\x32\x0b.ldlm.ErrorH\x00\x88\x01\x01\x42\x08\n\x06_error\"y\n\x0cRenewRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\x0b\n\x03key\x18\x02 \x01(\t\x12\x1c\n\x14lock_timeout_seconds\x18\x64 \x01(\x05\x12\x1c\n\x0flock_timeout_ms\x18\x03 \x01(\x05H\x00\x88\x01\x01\x42\x12\n\x10_lock_timeout_ms\"7\n\x10\x42\x61tchLockRequest\x12#\n\x08requests\x18\x01 \x03(\x0b\x32\x11.ldlm.LockRequest\"=\n\x13\x42\x61tchTryLockRequest\x12&\n\x08requests\x18\x01 \x03(\x0b\x32\x14.ldlm.TryLockRequest\"9\n\x11\x42\x61tchRenewRequest\x12$\n\x08requests\x18\x01 \x03(\x0b\x32\x12.ldlm.RenewRequest\";\n\x12\x42\x61tchUnlockRequest\x12%\n\x08requests\x18\x01 \x03(\x0b\x32\x13.ldlm.UnlockRequest\"e\n\x11\x42\x61tchLockResponse\x12%\n\tresponses\x18\x01 \x03(\x0b\x32\x12.ldlm.LockResponse\x12\x1f\n\x05\x65rror\x18\x02 \x01(\x0b\x32\x0b.ldlm.ErrorH\x00\x88\x01\x01\x42\x08\n\x06_error\"i\n\x13\x42\x61tchUnlockResponse\x12\'\n\tresponses\x18\x01 \x03(\x0b\x32\x14.ldlm.UnlockResponse\x12\x1f\n\x05\x65rror\x18\x02 \x01(\x0b\x32\x0b.ldlm.ErrorH\x00\x88\x01\x01\x42\x08\n\x06_error\"\xc1\x01\n\x0eSessionRequest\x12\x0b\n\x03tag\x18\x01 \x01(\x04\x12!\n\x04lock\x18\x02 \x01(\x0b\x32\x11.ldlm.LockRequestH\x00\x12(\n\x08try_lock\x18\x03 \x01(\x0b\x32\x14.ldlm.TryLockRequestH\x00\x12#\n\x05renew\x18\x04 \x01(\x0b\x32\x12.ldlm.RenewRequestH\x00\x12%\n\x06unlock\x18\x05 \x01(\x0b\x32\x13.ldlm.UnlockRequestH\x00\x42\t\n\x07request\"v\n\x0fSessionResponse\x12\x0b\n\x03tag\x18\x01 \x01(\x04\x12\"\n\x04lock\x18\x02 \x01(\x0b\x32\x12.ldlm.LockResponseH\x00\x12&\n\x06unlock\x18\x03 \x01(\x0b\x32\x14.ldlm.UnlockResponseH\x00\x42\n\n\x08response\"2\n\x11GrantLeaseRequest\x12\x1d\n\x15lease_timeout_seconds\x18\x01 \x01(\x05\"$\n\x10KeepAliveRequest\x12\x10\n\x08lease_id\x18\x01 \x01(\t\"&\n\x12RevokeLeaseRequest\x12\x10\n\x08lease_id\x18\x01 \x01(\t\"k\n\rLeaseResponse\x12\x10\n\x08lease_id\x18\x01 \x01(\t\x12\x1d\n\x15lease_timeout_seconds\x18\x02 \x01(\x05\x12\x1f\n\x05\x65rror\x18\x03 \x01(\x0b\x32\x0b.ldlm.ErrorH\x00\x88\x01\x01\x42\x08\n\x06_error\"\x1d\n\x0cWatchRequest\x12\r\n\x05names\x18\x01 \x03(\t\"\x1a\n\nWatchEvent\x12\x0c\n\x04name\x18\x01 \x01(\t*\xe3\x01\n\tErrorCode\x12\x0b\n\x07Unknown\x10\x00\x12\x14\n\x10LockDoesNotExist\x10\x01\x12\x12\n\x0eInvalidLockKey\x10\x02\x12\x13\n\x0fLockWaitTimeout\x10\x03\x12\r\n\tNotLocked\x10\x04\x12 \n\x1cLockDoesNotExistOrInvalidKey\x10\x05\x12\x14\n\x10LockSizeMismatch\x10\x06\x12\x13\n\x0fInvalidLockSize\x10\x07\x12\x15\n\x11LeaseDoesNotExist\x10\x08\x12\x17\n\x13InvalidLeaseTimeout\x10\t2\x91\x06\n\x04LDLM\x12/\n\x04Lock\x12\x11.ldlm.LockRequest\x1a\x12.ldlm.LockResponse\"\x00\x12\x35\n\x07TryLock\x12\x14.ldlm.TryLockRequest\x1a\x12.ldlm.LockResponse\"\x00\x12\x35\n\x06Unlock\x12\x13.ldlm.UnlockRequest\x1a\x14.ldlm.UnlockResponse\"\x00\x12\x31\n\x05Renew\x12\x12.ldlm.RenewRequest\x1a\x12.ldlm.LockResponse\"\x00\x12>\n\tBatchLock\x12\x16.ldlm.BatchLockRequest\x1a\x17.ldlm.BatchLockResponse\"\x00\x12\x44\n\x0c\x42\x61tchTryLock\x12\x19.ldlm.BatchTryLockRequest\x1a\x17.ldlm.BatchLockResponse\"\x00\x12@\n\nBatchRenew\x12\x17.ldlm.BatchRenewRequest\x1a\x17.ldlm.BatchLockResponse\"\x00\x12\x44\n\x0b\x42\x61tchUnlock\x12\x18.ldlm.BatchUnlockRequest\x1a\x19.ldlm.BatchUnlockResponse\"\x00\x12<\n\x07Session\x12\x14.ldlm.SessionRequest\x1a\x15.ldlm.SessionResponse\"\x00(\x01\x30\x01\x12<\n\nGrantLease\x12\x17.ldlm.GrantLeaseRequest\x1a\x13.ldlm.LeaseResponse\"\x00\x12:\n\tKeepAlive\x12\x16.ldlm.KeepAliveRequest\x1a\x13.ldlm.LeaseResponse\"\x00\x12>\n\x0bRevokeLease\x12\x18.ldlm.RevokeLeaseRequest\x1a\x13.ldlm.LeaseResponse\"\x00\x12\x31\n\x05Watch\x12\x12.ldlm.WatchRequest\x1a\x10.ldlm.WatchEvent\"\x00\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'ldlm_pb2', _globals)
 if not _descriptor._USE_C_DESCRIPTORS:
   DESCRIPTOR._loaded_options = None
-  _globals['_ERRORCODE']._serialized_start=688
-  _globals['_ERRORCODE']._serialized_end=867
+  _globals['_ERRORCODE']._serialized_start=1989
+  _globals['_ERRORCODE']._serialized_end=2216
   _globals['_ERROR']._serialized_start=20
   _globals['_ERROR']._serialized_end=75
   _globals['_LOCKREQUEST']._serialized_start=78
-  _globals['_LOCKREQUEST']._serialized_end=253
-  _globals['_TRYLOCKREQUEST']._serialized_start=255
-  _globals['_TRYLOCKREQUEST']._serialized_end=373
-  _globals['_LOCKRESPONSE']._serialized_start=375
-  _globals['_LOCKRESPONSE']._serialized_end=475
-  _globals['_UNLOCKREQUEST']._serialized_start=477
-  _globals['_UNLOCKREQUEST']._serialized_end=519
-  _globals['_UNLOCKRESPONSE']._serialized_start=521
-  _globals['_UNLOCKRESPONSE']._serialized_end=612
-  _globals['_RENEWREQUEST']._serialized_start=614
-  _globals['_RENEWREQUEST']._serialized_end=685
-  _globals['_LDLM']._serialized_start=870
-  _globals['_LDLM']._serialized_end=1086
+  _globals['_LOCKREQUEST']._serialized_end=371
+  _globals['_TRYLOCKREQUEST']._serialized_start=374
+  _globals['_TRYLOCKREQUEST']._serialized_end=560
+  _globals['_LOCKRESPONSE']._serialized_start=562
+  _globals['_LOCKRESPONSE']._serialized_end=662
+  _globals['_UNLOCKREQUEST']._serialized_start=664
+  _globals['_UNLOCKREQUEST']._serialized_end=706
+  _globals['_UNLOCKRESPONSE']._serialized_start=708
+  _globals['_UNLOCKRESPONSE']._serialized_end=799
+  _globals['_RENEWREQUEST']._serialized_start=801
+  _globals['_RENEWREQUEST']._serialized_end=922
+  _globals['_BATCHLOCKREQUEST']._serialized_start=924
+  _globals['_BATCHLOCKREQUEST']._serialized_end=979
+  _globals['_BATCHTRYLOCKREQUEST']._serialized_start=981
+  _globals['_BATCHTRYLOCKREQUEST']._serialized_end=1042
+  _globals['_BATCHRENEWREQUEST']._serialized_start=1044
+  _globals['_BATCHRENEWREQUEST']._serialized_end=1101
+  _globals['_BATCHUNLOCKREQUEST']._serialized_start=1103
+  _globals['_BATCHUNLOCKREQUEST']._serialized_end=1162
+  _globals['_BATCHLOCKRESPONSE']._serialized_start=1164
+  _globals['_BATCHLOCKRESPONSE']._serialized_end=1265
+  _globals['_BATCHUNLOCKRESPONSE']._serialized_start=1267
+  _globals['_BATCHUNLOCKRESPONSE']._serialized_end=1372
+  _globals['_SESSIONREQUEST']._serialized_start=1375
+  _globals['_SESSIONREQUEST']._serialized_end=1568
+  _globals['_SESSIONRESPONSE']._serialized_start=1570
+  _globals['_SESSIONRESPONSE']._serialized_end=1688
+  _globals['_GRANTLEASEREQUEST']._serialized_start=1690
+  _globals['_GRANTLEASEREQUEST']._serialized_end=1740
+  _globals['_KEEPALIVEREQUEST']._serialized_start=1742
+  _globals['_KEEPALIVEREQUEST']._serialized_end=1778
+  _globals['_REVOKELEASEREQUEST']._serialized_start=1780
+  _globals['_REVOKELEASEREQUEST']._serialized_end=1818
+  _globals['_LEASERESPONSE']._serialized_start=1820
+  _globals['_LEASERESPONSE']._serialized_end=1927
+  _globals['_WATCHREQUEST']._serialized_start=1929
+  _globals['_WATCHREQUEST']._serialized_end=1958
+  _globals['_WATCHEVENT']._serialized_start=1960
+  _globals['_WATCHEVENT']._serialized_end=1986
+  _globals['_LDLM']._serialized_start=2219
+  _globals['_LDLM']._serialized_end=3004
 # @@protoc_insertion_point(module_scope)
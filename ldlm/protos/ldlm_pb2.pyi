@@ -1,7 +1,8 @@
+from google.protobuf.internal import containers as _containers
 from google.protobuf.internal import enum_type_wrapper as _enum_type_wrapper
 from google.protobuf import descriptor as _descriptor
 from google.protobuf import message as _message
-from typing import ClassVar as _ClassVar, Mapping as _Mapping, Optional as _Optional, Union as _Union
+from typing import ClassVar as _ClassVar, Iterable as _Iterable, Mapping as _Mapping, Optional as _Optional, Union as _Union
 
 DESCRIPTOR: _descriptor.FileDescriptor
 
@@ -15,6 +16,8 @@ class ErrorCode(int, metaclass=_enum_type_wrapper.EnumTypeWrapper):
     LockDoesNotExistOrInvalidKey: _ClassVar[ErrorCode]
     LockSizeMismatch: _ClassVar[ErrorCode]
     InvalidLockSize: _ClassVar[ErrorCode]
+    LeaseDoesNotExist: _ClassVar[ErrorCode]
+    InvalidLeaseTimeout: _ClassVar[ErrorCode]
 Unknown: ErrorCode
 LockDoesNotExist: ErrorCode
 InvalidLockKey: ErrorCode
@@ -23,6 +26,8 @@ NotLocked: ErrorCode
 LockDoesNotExistOrInvalidKey: ErrorCode
 LockSizeMismatch: ErrorCode
 InvalidLockSize: ErrorCode
+LeaseDoesNotExist: ErrorCode
+InvalidLeaseTimeout: ErrorCode
 
 class Error(_message.Message):
     __slots__ = ("code", "message")
@@ -33,26 +38,36 @@ class Error(_message.Message):
     def __init__(self, code: _Optional[_Union[ErrorCode, str]] = ..., message: _Optional[str] = ...) -> None: ...
 
 class LockRequest(_message.Message):
-    __slots__ = ("name", "wait_timeout_seconds", "lock_timeout_seconds", "size")
+    __slots__ = ("name", "wait_timeout_seconds", "lock_timeout_seconds", "size", "lease_id", "wait_timeout_ms", "lock_timeout_ms")
     NAME_FIELD_NUMBER: _ClassVar[int]
     WAIT_TIMEOUT_SECONDS_FIELD_NUMBER: _ClassVar[int]
     LOCK_TIMEOUT_SECONDS_FIELD_NUMBER: _ClassVar[int]
     SIZE_FIELD_NUMBER: _ClassVar[int]
+    LEASE_ID_FIELD_NUMBER: _ClassVar[int]
+    WAIT_TIMEOUT_MS_FIELD_NUMBER: _ClassVar[int]
+    LOCK_TIMEOUT_MS_FIELD_NUMBER: _ClassVar[int]
     name: str
     wait_timeout_seconds: int
     lock_timeout_seconds: int
     size: int
-    def __init__(self, name: _Optional[str] = ..., wait_timeout_seconds: _Optional[int] = ..., lock_timeout_seconds: _Optional[int] = ..., size: _Optional[int] = ...) -> None: ...
+    lease_id: str
+    wait_timeout_ms: int
+    lock_timeout_ms: int
+    def __init__(self, name: _Optional[str] = ..., wait_timeout_seconds: _Optional[int] = ..., lock_timeout_seconds: _Optional[int] = ..., size: _Optional[int] = ..., lease_id: _Optional[str] = ..., wait_timeout_ms: _Optional[int] = ..., lock_timeout_ms: _Optional[int] = ...) -> None: ...
 
 class TryLockRequest(_message.Message):
-    __slots__ = ("name", "lock_timeout_seconds", "size")
+    __slots__ = ("name", "lock_timeout_seconds", "size", "lease_id", "lock_timeout_ms")
     NAME_FIELD_NUMBER: _ClassVar[int]
     LOCK_TIMEOUT_SECONDS_FIELD_NUMBER: _ClassVar[int]
     SIZE_FIELD_NUMBER: _ClassVar[int]
+    LEASE_ID_FIELD_NUMBER: _ClassVar[int]
+    LOCK_TIMEOUT_MS_FIELD_NUMBER: _ClassVar[int]
     name: str
     lock_timeout_seconds: int
     size: int
-    def __init__(self, name: _Optional[str] = ..., lock_timeout_seconds: _Optional[int] = ..., size: _Optional[int] = ...) -> None: ...
+    lease_id: str
+    lock_timeout_ms: int
+    def __init__(self, name: _Optional[str] = ..., lock_timeout_seconds: _Optional[int] = ..., size: _Optional[int] = ..., lease_id: _Optional[str] = ..., lock_timeout_ms: _Optional[int] = ...) -> None: ...
 
 class LockResponse(_message.Message):
     __slots__ = ("locked", "name", "key", "error")
@@ -85,11 +100,117 @@ class UnlockResponse(_message.Message):
     def __init__(self, unlocked: bool = ..., name: _Optional[str] = ..., error: _Optional[_Union[Error, _Mapping]] = ...) -> None: ...
 
 class RenewRequest(_message.Message):
-    __slots__ = ("name", "key", "lock_timeout_seconds")
+    __slots__ = ("name", "key", "lock_timeout_seconds", "lock_timeout_ms")
     NAME_FIELD_NUMBER: _ClassVar[int]
     KEY_FIELD_NUMBER: _ClassVar[int]
     LOCK_TIMEOUT_SECONDS_FIELD_NUMBER: _ClassVar[int]
+    LOCK_TIMEOUT_MS_FIELD_NUMBER: _ClassVar[int]
     name: str
     key: str
     lock_timeout_seconds: int
-    def __init__(self, name: _Optional[str] = ..., key: _Optional[str] = ..., lock_timeout_seconds: _Optional[int] = ...) -> None: ...
+    lock_timeout_ms: int
+    def __init__(self, name: _Optional[str] = ..., key: _Optional[str] = ..., lock_timeout_seconds: _Optional[int] = ..., lock_timeout_ms: _Optional[int] = ...) -> None: ...
+
+class BatchLockRequest(_message.Message):
+    __slots__ = ("requests",)
+    REQUESTS_FIELD_NUMBER: _ClassVar[int]
+    requests: _containers.RepeatedCompositeFieldContainer[LockRequest]
+    def __init__(self, requests: _Optional[_Iterable[_Union[LockRequest, _Mapping]]] = ...) -> None: ...
+
+class BatchTryLockRequest(_message.Message):
+    __slots__ = ("requests",)
+    REQUESTS_FIELD_NUMBER: _ClassVar[int]
+    requests: _containers.RepeatedCompositeFieldContainer[TryLockRequest]
+    def __init__(self, requests: _Optional[_Iterable[_Union[TryLockRequest, _Mapping]]] = ...) -> None: ...
+
+class BatchRenewRequest(_message.Message):
+    __slots__ = ("requests",)
+    REQUESTS_FIELD_NUMBER: _ClassVar[int]
+    requests: _containers.RepeatedCompositeFieldContainer[RenewRequest]
+    def __init__(self, requests: _Optional[_Iterable[_Union[RenewRequest, _Mapping]]] = ...) -> None: ...
+
+class BatchUnlockRequest(_message.Message):
+    __slots__ = ("requests",)
+    REQUESTS_FIELD_NUMBER: _ClassVar[int]
+    requests: _containers.RepeatedCompositeFieldContainer[UnlockRequest]
+    def __init__(self, requests: _Optional[_Iterable[_Union[UnlockRequest, _Mapping]]] = ...) -> None: ...
+
+class BatchLockResponse(_message.Message):
+    __slots__ = ("responses", "error")
+    RESPONSES_FIELD_NUMBER: _ClassVar[int]
+    ERROR_FIELD_NUMBER: _ClassVar[int]
+    responses: _containers.RepeatedCompositeFieldContainer[LockResponse]
+    error: Error
+    def __init__(self, responses: _Optional[_Iterable[_Union[LockResponse, _Mapping]]] = ..., error: _Optional[_Union[Error, _Mapping]] = ...) -> None: ...
+
+class BatchUnlockResponse(_message.Message):
+    __slots__ = ("responses", "error")
+    RESPONSES_FIELD_NUMBER: _ClassVar[int]
+    ERROR_FIELD_NUMBER: _ClassVar[int]
+    responses: _containers.RepeatedCompositeFieldContainer[UnlockResponse]
+    error: Error
+    def __init__(self, responses: _Optional[_Iterable[_Union[UnlockResponse, _Mapping]]] = ..., error: _Optional[_Union[Error, _Mapping]] = ...) -> None: ...
+
+class SessionRequest(_message.Message):
+    __slots__ = ("tag", "lock", "try_lock", "renew", "unlock")
+    TAG_FIELD_NUMBER: _ClassVar[int]
+    LOCK_FIELD_NUMBER: _ClassVar[int]
+    TRY_LOCK_FIELD_NUMBER: _ClassVar[int]
+    RENEW_FIELD_NUMBER: _ClassVar[int]
+    UNLOCK_FIELD_NUMBER: _ClassVar[int]
+    tag: int
+    lock: LockRequest
+    try_lock: TryLockRequest
+    renew: RenewRequest
+    unlock: UnlockRequest
+    def __init__(self, tag: _Optional[int] = ..., lock: _Optional[_Union[LockRequest, _Mapping]] = ..., try_lock: _Optional[_Union[TryLockRequest, _Mapping]] = ..., renew: _Optional[_Union[RenewRequest, _Mapping]] = ..., unlock: _Optional[_Union[UnlockRequest, _Mapping]] = ...) -> None: ...
+
+class SessionResponse(_message.Message):
+    __slots__ = ("tag", "lock", "unlock")
+    TAG_FIELD_NUMBER: _ClassVar[int]
+    LOCK_FIELD_NUMBER: _ClassVar[int]
+    UNLOCK_FIELD_NUMBER: _ClassVar[int]
+    tag: int
+    lock: LockResponse
+    unlock: UnlockResponse
+    def __init__(self, tag: _Optional[int] = ..., lock: _Optional[_Union[LockResponse, _Mapping]] = ..., unlock: _Optional[_Union[UnlockResponse, _Mapping]] = ...) -> None: ...
+
+class GrantLeaseRequest(_message.Message):
+    __slots__ = ("lease_timeout_seconds",)
+    LEASE_TIMEOUT_SECONDS_FIELD_NUMBER: _ClassVar[int]
+    lease_timeout_seconds: int
+    def __init__(self, lease_timeout_seconds: _Optional[int] = ...) -> None: ...
+
+class KeepAliveRequest(_message.Message):
+    __slots__ = ("lease_id",)
+    LEASE_ID_FIELD_NUMBER: _ClassVar[int]
+    lease_id: str
+    def __init__(self, lease_id: _Optional[str] = ...) -> None: ...
+
+class RevokeLeaseRequest(_message.Message):
+    __slots__ = ("lease_id",)
+    LEASE_ID_FIELD_NUMBER: _ClassVar[int]
+    lease_id: str
+    def __init__(self, lease_id: _Optional[str] = ...) -> None: ...
+
+class LeaseResponse(_message.Message):
+    __slots__ = ("lease_id", "lease_timeout_seconds", "error")
+    LEASE_ID_FIELD_NUMBER: _ClassVar[int]
+    LEASE_TIMEOUT_SECONDS_FIELD_NUMBER: _ClassVar[int]
+    ERROR_FIELD_NUMBER: _ClassVar[int]
+    lease_id: str
+    lease_timeout_seconds: int
+    error: Error
+    def __init__(self, lease_id: _Optional[str] = ..., lease_timeout_seconds: _Optional[int] = ..., error: _Optional[_Union[Error, _Mapping]] = ...) -> None: ...
+
+class WatchRequest(_message.Message):
+    __slots__ = ("names",)
+    NAMES_FIELD_NUMBER: _ClassVar[int]
+    names: _containers.RepeatedScalarFieldContainer[str]
+    def __init__(self, names: _Optional[_Iterable[str]] = ...) -> None: ...
+
+class WatchEvent(_message.Message):
+    __slots__ = ("name",)
+    NAME_FIELD_NUMBER: _ClassVar[int]
+    name: str
+    def __init__(self, name: _Optional[str] = ...) -> None: ...
@@ -73,6 +73,51 @@ class LDLMStub(object):
                 request_serializer=ldlm__pb2.RenewRequest.SerializeToString,
                 response_deserializer=ldlm__pb2.LockResponse.FromString,
                 _registered_method=True)
+        self.BatchLock = channel.unary_unary(
+                '/ldlm.LDLM/BatchLock',
+                request_serializer=ldlm__pb2.BatchLockRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.BatchLockResponse.FromString,
+                _registered_method=True)
+        self.BatchTryLock = channel.unary_unary(
+                '/ldlm.LDLM/BatchTryLock',
+                request_serializer=ldlm__pb2.BatchTryLockRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.BatchLockResponse.FromString,
+                _registered_method=True)
+        self.BatchRenew = channel.unary_unary(
+                '/ldlm.LDLM/BatchRenew',
+                request_serializer=ldlm__pb2.BatchRenewRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.BatchLockResponse.FromString,
+                _registered_method=True)
+        self.BatchUnlock = channel.unary_unary(
+                '/ldlm.LDLM/BatchUnlock',
+                request_serializer=ldlm__pb2.BatchUnlockRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.BatchUnlockResponse.FromString,
+                _registered_method=True)
+        self.Session = channel.stream_stream(
+                '/ldlm.LDLM/Session',
+                request_serializer=ldlm__pb2.SessionRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.SessionResponse.FromString,
+                _registered_method=True)
+        self.GrantLease = channel.unary_unary(
+                '/ldlm.LDLM/GrantLease',
+                request_serializer=ldlm__pb2.GrantLeaseRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.LeaseResponse.FromString,
+                _registered_method=True)
+        self.KeepAlive = channel.unary_unary(
+                '/ldlm.LDLM/KeepAlive',
+                request_serializer=ldlm__pb2.KeepAliveRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.LeaseResponse.FromString,
+                _registered_method=True)
+        self.RevokeLease = channel.unary_unary(
+                '/ldlm.LDLM/RevokeLease',
+                request_serializer=ldlm__pb2.RevokeLeaseRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.LeaseResponse.FromString,
+                _registered_method=True)
+        self.Watch = channel.unary_stream(
+                '/ldlm.LDLM/Watch',
+                request_serializer=ldlm__pb2.WatchRequest.SerializeToString,
+                response_deserializer=ldlm__pb2.WatchEvent.FromString,
+                _registered_method=True)
 
 
 class LDLMServicer(object):
@@ -102,6 +147,69 @@ class LDLMServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def BatchLock(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchTryLock(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchRenew(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def BatchUnlock(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Session(self, request_iterator, context):
+        """Multiplexes Lock, TryLock, Renew and Unlock requests on one long-lived stream. Each
+        request is handled as if it were sent in its own RPC. Lock requests still waiting when
+        the stream ends are abandoned.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GrantLease(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def KeepAlive(self, request, context):
+        """Restarts the lease timeout of a lease
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def RevokeLease(self, request, context):
+        """Ends a lease and releases the locks attached to it
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def Watch(self, request, context):
+        """Streams an event for each watched lock which is free when the stream starts, and then an
+        event each time a watched lock is released and becomes free. A lock is free if a TryLock
+        request for it would succeed; another client may still acquire it first. Watching a lock
+        does not queue a waiter for it.
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_LDLMServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -125,6 +233,51 @@ def add_LDLMServicer_to_server(servicer, server):
                     request_deserializer=ldlm__pb2.RenewRequest.FromString,
                     response_serializer=ldlm__pb2.LockResponse.SerializeToString,
             ),
+            'BatchLock': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchLock,
+                    request_deserializer=ldlm__pb2.BatchLockRequest.FromString,
+                    response_serializer=ldlm__pb2.BatchLockResponse.SerializeToString,
+            ),
+            'BatchTryLock': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchTryLock,
+                    request_deserializer=ldlm__pb2.BatchTryLockRequest.FromString,
+                    response_serializer=ldlm__pb2.BatchLockResponse.SerializeToString,
+            ),
+            'BatchRenew': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchRenew,
+                    request_deserializer=ldlm__pb2.BatchRenewRequest.FromString,
+                    response_serializer=ldlm__pb2.BatchLockResponse.SerializeToString,
+            ),
+            'BatchUnlock': grpc.unary_unary_rpc_method_handler(
+                    servicer.BatchUnlock,
+                    request_deserializer=ldlm__pb2.BatchUnlockRequest.FromString,
+                    response_serializer=ldlm__pb2.BatchUnlockResponse.SerializeToString,
+            ),
+            'Session': grpc.stream_stream_rpc_method_handler(
+                    servicer.Session,
+                    request_deserializer=ldlm__pb2.SessionRequest.FromString,
+                    response_serializer=ldlm__pb2.SessionResponse.SerializeToString,
+            ),
+            'GrantLease': grpc.unary_unary_rpc_method_handler(
+                    servicer.GrantLease,
+                    request_deserializer=ldlm__pb2.GrantLeaseRequest.FromString,
+                    response_serializer=ldlm__pb2.LeaseResponse.SerializeToString,
+            ),
+            'KeepAlive': grpc.unary_unary_rpc_method_handler(
+                    servicer.KeepAlive,
+                    request_deserializer=ldlm__pb2.KeepAliveRequest.FromString,
+                    response_serializer=ldlm__pb2.LeaseResponse.SerializeToString,
+            ),
+            'RevokeLease': grpc.unary_unary_rpc_method_handler(
+                    servicer.RevokeLease,
+                    request_deserializer=ldlm__pb2.RevokeLeaseRequest.FromString,
+                    response_serializer=ldlm__pb2.LeaseResponse.SerializeToString,
+            ),
+            'Watch': grpc.unary_stream_rpc_method_handler(
+                    servicer.Watch,
+                    request_deserializer=ldlm__pb2.WatchRequest.FromString,
+                    response_serializer=ldlm__pb2.WatchEvent.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'ldlm.LDLM', rpc_method_handlers)
@@ -242,3 +395,246 @@ class LDLM(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def BatchLock(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ldlm.LDLM/BatchLock',
+            ldlm__pb2.BatchLockRequest.SerializeToString,
+            ldlm__pb2.BatchLockResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchTryLock(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ldlm.LDLM/BatchTryLock',
+            ldlm__pb2.BatchTryLockRequest.SerializeToString,
+            ldlm__pb2.BatchLockResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchRenew(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ldlm.LDLM/BatchRenew',
+            ldlm__pb2.BatchRenewRequest.SerializeToString,
+            ldlm__pb2.BatchLockResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def BatchUnlock(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ldlm.LDLM/BatchUnlock',
+            ldlm__pb2.BatchUnlockRequest.SerializeToString,
+            ldlm__pb2.BatchUnlockResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Session(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/ldlm.LDLM/Session',
+            ldlm__pb2.SessionRequest.SerializeToString,
+            ldlm__pb2.SessionResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def GrantLease(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ldlm.LDLM/GrantLease',
+            ldlm__pb2.GrantLeaseRequest.SerializeToString,
+            ldlm__pb2.LeaseResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def KeepAlive(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ldlm.LDLM/KeepAlive',
+            ldlm__pb2.KeepAliveRequest.SerializeToString,
+            ldlm__pb2.LeaseResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def RevokeLease(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(
+            request,
+            target,
+            '/ldlm.LDLM/RevokeLease',
+            ldlm__pb2.RevokeLeaseRequest.SerializeToString,
+            ldlm__pb2.LeaseResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
+
+    @staticmethod
+    def Watch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(
+            request,
+            target,
+            '/ldlm.LDLM/Watch',
+            ldlm__pb2.WatchRequest.SerializeToString,
+            ldlm__pb2.WatchEvent.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -0,0 +1,552 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Session transport. Sends the Lock, TryLock, Renew and Unlock requests of a client on one
+long-lived Session stream rather than in a unary RPC each, which saves setting up an HTTP/2
+stream and sending call metadata for every operation.
+
+Enable it with the `transport` argument of the clients. If the server does not implement the
+Session RPC, the client falls back to unary RPCs.
+
+Examples:
+    >>> from ldlm import Client
+    >>>
+    >>> client = Client("ldlm-server:3144", transport="session")
+"""
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Future, InvalidStateError, TimeoutError as FutureTimeoutError
+import itertools
+import queue
+import threading
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+import grpc
+
+from ldlm.protos import ldlm_pb2 as pb
+from ldlm.protos import ldlm_pb2_grpc as ldlm_grpc
+
+# Session request field of each RPC
+_FIELDS: dict[str, str] = {
+    "Lock": "lock",
+    "TryLock": "try_lock",
+    "Renew": "renew",
+    "Unlock": "unlock",
+}
+
+
+class SessionError(grpc.RpcError):
+    """
+    The Session stream ended before the response to a request arrived, or the deadline of the
+    request expired. Whether the server handled the request is unknown, as with a unary RPC
+    which fails.
+    """
+
+    def __init__(self,
+                 error: Optional[BaseException],
+                 status: Optional[grpc.StatusCode] = None):
+        """
+        Args:
+            error (BaseException, optional): The error the stream failed with, or None if the
+                server ended it.
+            status (grpc.StatusCode, optional): The status code of a request which failed on
+                its own, e.g. DEADLINE_EXCEEDED, rather than with the stream.
+        """
+        if status is None:
+            super().__init__(f"session stream ended: {error!r}")
+        else:
+            super().__init__(f"session request failed: {status.name}")
+        self.error = error
+        self.status = status
+
+    def code(self) -> grpc.StatusCode:
+        """
+        Returns the status code of the request or the stream, or UNAVAILABLE if the server
+        ended the stream.
+
+        Returns:
+            grpc.StatusCode: The code.
+        """
+        return self.status or _status(self.error) or grpc.StatusCode.UNAVAILABLE
+
+    def details(self) -> str:
+        """
+        Returns a description of the error.
+
+        Returns:
+            str: The description.
+        """
+        return str(self)
+
+
+def _status(error: Optional[BaseException]) -> Optional[grpc.StatusCode]:
+    """
+    Returns the status code of a failed RPC, or None if it is not a gRPC error.
+    """
+    code = getattr(error, "code", None)
+    if isinstance(error, grpc.RpcError) and callable(code):
+        status = code()
+        if isinstance(status, grpc.StatusCode):
+            return status
+    return None
+
+
+def _granted(rpc_func: str, response: Any) -> bool:
+    """
+    Returns whether a response grants a lock.
+    """
+    return rpc_func in ("Lock", "TryLock") and response.locked
+
+
+def _expire(future: asyncio.Future) -> None:
+    """
+    Abandons a request of an :py:class:`AsyncSessionStub` whose deadline expired.
+    """
+    if not future.done():
+        future.set_exception(
+            SessionError(None, grpc.StatusCode.DEADLINE_EXCEEDED))
+
+
+class _Stream:  # pylint: disable=too-few-public-methods
+    """
+    A Session stream of a :py:class:`SessionStub` and its outstanding requests.
+    """
+
+    __slots__ = ("requests", "pending", "call")
+
+    def __init__(self) -> None:
+        # Requests to send. None ends the stream.
+        self.requests: queue.SimpleQueue = queue.SimpleQueue()
+
+        # Tag -> (future, RPC method, request) of each request awaiting its response
+        self.pending: dict[int, tuple[Future, str, Any]] = {}
+
+        self.call: Any = None
+
+    def __iter__(self) -> Iterator[pb.SessionRequest]:
+        while (request := self.requests.get()) is not None:
+            yield request
+
+
+class _SessionMethod:  # pylint: disable=too-few-public-methods
+    """
+    A stub method which sends its requests on the Session stream of a :py:class:`SessionStub`.
+    Like a gRPC multi-callable, it can be called or its `future()` method used.
+    """
+
+    __slots__ = ("_session", "_rpc_func")
+
+    def __init__(self, session: SessionStub, rpc_func: str):
+        self._session = session
+        self._rpc_func = rpc_func
+
+    def __call__(self,
+                 request: Any,
+                 metadata: Any = None,
+                 timeout: Optional[float] = None) -> Any:
+        session = self._session
+        if session.unsupported:
+            return session.unary[self._rpc_func](request,
+                                                 metadata=metadata,
+                                                 timeout=timeout)
+        future = session.send(self._rpc_func, request)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            # Abandon the request unless its response just arrived
+            if not future.cancel():
+                return future.result()
+            raise SessionError(None,
+                               grpc.StatusCode.DEADLINE_EXCEEDED) from None
+
+    def future(self, request: Any, metadata: Any = None) -> Any:
+        """
+        Sends a request and returns a future of its response.
+
+        Args:
+            request (Any): The request.
+            metadata (Any, optional): Call metadata, only used for unary RPCs.
+
+        Returns:
+            Future: The future.
+        """
+        session = self._session
+        if session.unsupported:
+            return session.unary[self._rpc_func].future(request,
+                                                        metadata=metadata)
+        return session.send(self._rpc_func, request)
+
+
+class SessionStub(ldlm_grpc.LDLMStub):  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    LDLMStub whose Lock, TryLock, Renew and Unlock methods send their requests on a Session
+    stream shared by all threads. The stream is opened on first use and reopened after it
+    fails; requests outstanding when it fails raise :py:class:`SessionError`.
+    """
+
+    def __init__(self, channel: grpc.Channel, metadata: Any = None):
+        """
+        Args:
+            channel (grpc.Channel): The channel.
+            metadata (Any, optional): Call metadata of the stream.
+        """
+        super().__init__(channel)
+        self._metadata = metadata
+        self._mutex = threading.Lock()
+        self._stream: Optional[_Stream] = None
+        self._tags = itertools.count(1)
+
+        self.unary: dict[str, Any] = {f: getattr(self, f) for f in _FIELDS}
+        """unary multi-callable of each session RPC"""
+
+        self.unsupported: bool = False
+        """whether the server does not implement the Session RPC"""
+
+        # pylint: disable=invalid-name
+        self.Lock = _SessionMethod(self, "Lock")
+        self.TryLock = _SessionMethod(self, "TryLock")
+        self.Renew = _SessionMethod(self, "Renew")
+        self.Unlock = _SessionMethod(self, "Unlock")
+
+    def send(self, rpc_func: str, request: Any) -> Future:
+        """
+        Sends a request on the stream.
+
+        Args:
+            rpc_func (str): The RPC method.
+            request (Any): The request.
+
+        Returns:
+            Future: The future of the response. Cancelling it abandons the request; a lock
+                granted to an abandoned request is released.
+        """
+        future: Future = Future()
+        with self._mutex:
+            if (stream := self._stream) is None:
+                stream = self._stream = self._open()
+            tag = next(self._tags)
+            stream.pending[tag] = (future, rpc_func, request)
+        stream.requests.put(
+            pb.SessionRequest(tag=tag, **{_FIELDS[rpc_func]: request}))
+        return future
+
+    def close(self) -> None:
+        """
+        Ends the stream. Requests outstanding on it raise :py:class:`SessionError`.
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            stream.requests.put(None)
+            stream.call.cancel()
+
+    def _open(self) -> _Stream:
+        """
+        Opens a stream. Must be called with self._mutex held.
+        """
+        stream = _Stream()
+        stream.call = self.Session(iter(stream), metadata=self._metadata)
+        threading.Thread(target=self._read,
+                         args=(stream,),
+                         name="ldlm-session",
+                         daemon=True).start()
+        return stream
+
+    def _read(self, stream: _Stream) -> None:
+        """
+        Receives the responses of a stream until it ends.
+        """
+        error: Optional[grpc.RpcError] = None
+        try:
+            for response in stream.call:
+                with self._mutex:
+                    entry = stream.pending.pop(response.tag, None)
+                if entry is None:
+                    continue
+                future, rpc_func, _ = entry
+                result = getattr(response, response.WhichOneof("response"))
+                try:
+                    future.set_result(result)
+                except InvalidStateError:
+                    # Abandoned
+                    if _granted(rpc_func, result):
+                        self._release(result)
+        except grpc.RpcError as e:
+            error = e
+
+        with self._mutex:
+            if self._stream is stream:
+                self._stream = None
+            if _status(error) == grpc.StatusCode.UNIMPLEMENTED:
+                self.unsupported = True
+            pending = list(stream.pending.values())
+            stream.pending.clear()
+        stream.requests.put(None)
+
+        for future, rpc_func, request in pending:
+            if self.unsupported:
+                # Nothing was sent to the server
+                self._resend(future, rpc_func, request)
+            elif not future.done():
+                future.set_exception(SessionError(error))
+
+    def _resend(self, future: Future, rpc_func: str, request: Any) -> None:
+        """
+        Sends a request of a stream the server does not implement as a unary RPC.
+        """
+
+        def done(call: Any) -> None:
+            if (e := call.exception()) is not None:
+                if not future.done():
+                    future.set_exception(e)
+                return
+            try:
+                future.set_result(call.result())
+            except InvalidStateError:
+                if _granted(rpc_func, call.result()):
+                    self._release(call.result())
+
+        self.unary[rpc_func].future(
+            request, metadata=self._metadata).add_done_callback(done)
+
+    def _release(self, r: pb.LockResponse) -> None:
+        """
+        Releases a lock granted to an abandoned request.
+        """
+        self.Unlock.future(pb.UnlockRequest(name=r.name, key=r.key),
+                           metadata=self._metadata)
+
+
+class _AsyncStream:  # pylint: disable=too-few-public-methods
+    """
+    A Session stream of an :py:class:`AsyncSessionStub` and its outstanding requests.
+    """
+
+    __slots__ = ("requests", "pending", "call", "reader")
+
+    def __init__(self) -> None:
+        # Requests to send. None ends the stream.
+        self.requests: asyncio.Queue = asyncio.Queue()
+
+        # Tag -> (future, RPC method, request) of each request awaiting its response
+        self.pending: dict[int, tuple[asyncio.Future, str, Any]] = {}
+
+        self.call: Any = None
+        self.reader: Optional[asyncio.Future] = None
+
+    async def iterate(self) -> AsyncIterator[pb.SessionRequest]:
+        """
+        Yields the requests to send.
+        """
+        while (request := await self.requests.get()) is not None:
+            yield request
+
+
+class _AsyncSessionMethod:  # pylint: disable=too-few-public-methods
+    """
+    A stub method which sends its requests on the Session stream of an
+    :py:class:`AsyncSessionStub`.
+    """
+
+    __slots__ = ("_session", "_rpc_func")
+
+    def __init__(self, session: AsyncSessionStub, rpc_func: str):
+        self._session = session
+        self._rpc_func = rpc_func
+
+    def __call__(self,
+                 request: Any,
+                 metadata: Any = None,
+                 timeout: Optional[float] = None) -> Awaitable:
+        session = self._session
+        if session.unsupported:
+            return session.unary[self._rpc_func](request,
+                                                 metadata=metadata,
+                                                 timeout=timeout)
+        # The future rather than a coroutine, so that the caller can tell whether the response
+        # arrived before it cancels the request
+        future = session.send_nowait(self._rpc_func, request)
+        if timeout is not None:
+            expiry = asyncio.get_running_loop().call_later(
+                timeout, _expire, future)
+            future.add_done_callback(lambda _: expiry.cancel())
+        return future
+
+
+class AsyncSessionStub(ldlm_grpc.LDLMStub):  # pylint: disable=too-few-public-methods,too-many-instance-attributes
+    """
+    LDLMStub for a grpc.aio channel whose Lock, TryLock, Renew and Unlock methods send their
+    requests on a Session stream shared by all tasks. The stream is opened on first use and
+    reopened after it fails; requests outstanding when it fails raise
+    :py:class:`SessionError`.
+    """
+
+    def __init__(self, channel: grpc.aio.Channel, metadata: Any = None):
+        """
+        Args:
+            channel (grpc.aio.Channel): The channel.
+            metadata (Any, optional): Call metadata of the stream.
+        """
+        super().__init__(channel)
+        self._metadata = metadata
+        self._stream: Optional[_AsyncStream] = None
+        self._tags = itertools.count(1)
+
+        # Tasks resending requests as unary RPCs
+        self._tasks: set[asyncio.Future] = set()
+
+        self.unary: dict[str, Any] = {f: getattr(self, f) for f in _FIELDS}
+        """unary multi-callable of each session RPC"""
+
+        self.unsupported: bool = False
+        """whether the server does not implement the Session RPC"""
+
+        # pylint: disable=invalid-name
+        self.Lock = _AsyncSessionMethod(self, "Lock")
+        self.TryLock = _AsyncSessionMethod(self, "TryLock")
+        self.Renew = _AsyncSessionMethod(self, "Renew")
+        self.Unlock = _AsyncSessionMethod(self, "Unlock")
+
+    def send_nowait(self, rpc_func: str, request: Any) -> asyncio.Future:
+        """
+        Sends a request on the stream.
+
+        Args:
+            rpc_func (str): The RPC method.
+            request (Any): The request.
+
+        Returns:
+            asyncio.Future: The future of the response. Cancelling it abandons the request; a
+                lock granted to an abandoned request is released.
+        """
+        if (stream := self._stream) is None:
+            stream = self._stream = self._open()
+        tag = next(self._tags)
+        future = asyncio.get_running_loop().create_future()
+        stream.pending[tag] = (future, rpc_func, request)
+        stream.requests.put_nowait(
+            pb.SessionRequest(tag=tag, **{_FIELDS[rpc_func]: request}))
+        return future
+
+    async def send(self, rpc_func: str, request: Any) -> Any:
+        """
+        Sends a request on the stream and waits for its response.
+
+        Args:
+            rpc_func (str): The RPC method.
+            request (Any): The request.
+
+        Returns:
+            Any: The response.
+        """
+        return await self.send_nowait(rpc_func, request)
+
+    async def close(self) -> None:
+        """
+        Ends the stream and waits for its reader to finish. Requests outstanding on it raise
+        :py:class:`SessionError`, and requests being resent as unary RPCs are cancelled.
+
+        Returns:
+            None
+        """
+        stream, self._stream = self._stream, None
+        tasks = list(self._tasks)
+        if stream is not None:
+            stream.requests.put_nowait(None)
+            stream.call.cancel()
+            assert stream.reader is not None
+            tasks.append(stream.reader)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _open(self) -> _AsyncStream:
+        """
+        Opens a stream.
+        """
+        stream = _AsyncStream()
+        stream.call = self.Session(stream.iterate(), metadata=self._metadata)
+        stream.reader = asyncio.ensure_future(self._read(stream))
+        return stream
+
+    async def _read(self, stream: _AsyncStream) -> None:
+        """
+        Receives the responses of a stream until it ends.
+        """
+        error: Optional[BaseException] = None
+        try:
+            async for response in stream.call:
+                entry = stream.pending.pop(response.tag, None)
+                if entry is None:
+                    continue
+                future, rpc_func, _ = entry
+                result = getattr(response, response.WhichOneof("response"))
+                if not future.done():
+                    future.set_result(result)
+                elif _granted(rpc_func, result):
+                    # Abandoned
+                    self._release(result)
+        except grpc.RpcError as e:
+            error = e
+        finally:
+            if self._stream is stream:
+                self._stream = None
+            if _status(error) == grpc.StatusCode.UNIMPLEMENTED:
+                self.unsupported = True
+            pending = list(stream.pending.values())
+            stream.pending.clear()
+            stream.requests.put_nowait(None)
+
+            for future, rpc_func, request in pending:
+                if self.unsupported:
+                    # Nothing was sent to the server
+                    self._track(self._resend(future, rpc_func, request))
+                elif not future.done():
+                    future.set_exception(SessionError(error))
+
+    async def _resend(self, future: asyncio.Future, rpc_func: str,
+                      request: Any) -> None:
+        """
+        Sends a request of a stream the server does not implement as a unary RPC.
+        """
+        try:
+            r = await self.unary[rpc_func](request, metadata=self._metadata)
+        except grpc.RpcError as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(r)
+        elif _granted(rpc_func, r):
+            self._release(r)
+
+    def _release(self, r: pb.LockResponse) -> None:
+        """
+        Releases a lock granted to an abandoned request.
+        """
+        self._track(self.Unlock(pb.UnlockRequest(name=r.name, key=r.key)))
+
+    def _track(self, aw: Awaitable) -> None:
+        """
+        Runs an awaitable in a task which is referenced until it completes. Its errors are
+        ignored.
+        """
+        task = asyncio.ensure_future(aw)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
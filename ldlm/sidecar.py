@@ -0,0 +1,602 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Local sidecar proxy. Many processes on a host share one connection to the LDLM server through
+a sidecar which serves the LDLM service on a Unix domain socket.
+
+Run `python -m ldlm.sidecar --help` for options. Clients created with `sidecar=True` connect to
+the sidecar if its socket exists, see :py:mod:`ldlm.base_client`.
+
+The sidecar forwards Lock, TryLock and Unlock requests to the server. Lock requests of
+processes waiting for the same lock are queued in the sidecar, so that at most one of them
+waits on the server at a time. The sidecar renews the locks it holds itself, with one batch
+Renew RPC for all locks which are due. Renew requests of processes only restart the timeout
+of a lock in the sidecar: a lock whose process stops renewing it, e.g. because the process
+died, is released when its timeout expires. Other RPCs are not implemented, which clients
+handle by falling back to the RPCs above.
+
+The sidecar holds the server credentials on behalf of the processes which connect to it, so
+its socket is only accessible to its own user by default. Use `--socket-mode 660` to give the
+socket's group access too.
+
+Example:
+    python -m ldlm.sidecar --upstream ldlm.internal:3144 --socket /run/ldlm.sock
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+import stat
+import time
+from typing import Any, NoReturn, Optional
+
+import grpc
+
+from ldlm import exceptions
+from ldlm.base_client import TLSConfig, lock_timeout, log_extra, sidecar_socket_path
+from ldlm.client_aio import AsyncClient, AsyncLock
+from ldlm.protos import ldlm_pb2 as pb
+from ldlm.protos import ldlm_pb2_grpc as ldlm_grpc
+
+
+class _Held:  # pylint: disable=too-few-public-methods
+    """
+    A lock held by the sidecar for a process.
+    """
+
+    __slots__ = ("lock", "timeout_seconds", "renew_interval", "renew_at",
+                 "expiry")
+
+    def __init__(self, lock: AsyncLock, timeout_seconds: float,
+                 renew_interval: float):
+        self.lock = lock
+
+        # Lock timeout, or 0 if the lock does not expire
+        self.timeout_seconds: float = timeout_seconds
+
+        # Time between renews of the lock on the server, and when the next one is due
+        self.renew_interval: float = renew_interval
+        self.renew_at: float = time.monotonic() + renew_interval
+
+        # Releases the lock if the process does not renew it in time
+        self.expiry: Optional[asyncio.TimerHandle] = None
+
+
+class _Queue:  # pylint: disable=too-few-public-methods
+    """
+    The processes waiting for a lock. The one holding `turn` waits on the server.
+    """
+
+    __slots__ = ("turn", "waiters")
+
+    def __init__(self) -> None:
+        self.turn = asyncio.Lock()
+        self.waiters: int = 0
+
+
+def _wait_timeout(request: pb.LockRequest) -> Optional[float]:
+    """
+    Returns the requested wait timeout in seconds or None to wait indefinitely.
+    """
+    if request.HasField("wait_timeout_ms"):
+        return request.wait_timeout_ms / 1000 or None
+    return request.wait_timeout_seconds or None
+
+
+def _wait_timeout_response(name: str) -> pb.LockResponse:
+    """
+    Returns the response for a Lock request whose wait timeout expired.
+    """
+    return pb.LockResponse(
+        name=name,
+        error=pb.Error(code=pb.ErrorCode.LockWaitTimeout,
+                       message="lock wait timeout"),
+    )
+
+
+async def _abort(context: grpc.aio.ServicerContext,
+                 e: grpc.RpcError) -> NoReturn:
+    """
+    Ends an RPC with the status of the upstream RPC which failed.
+    """
+    code = e.code() if callable(getattr(e, "code", None)) else None
+    if not isinstance(code, grpc.StatusCode):
+        code = grpc.StatusCode.UNAVAILABLE
+    details = e.details() if callable(getattr(e, "details", None)) else ""
+    await context.abort(code, details or str(e))
+    raise AssertionError("unreachable")  # pragma: no cover
+
+
+class SidecarServicer(ldlm_grpc.LDLMServicer):
+    """
+    LDLM service implementation which forwards requests to a server with an
+    :py:class:`ldlm.AsyncClient`. The client must not renew locks itself.
+    """
+
+    # pylint: disable=invalid-overridden-method
+
+    def __init__(self, client: AsyncClient):
+        """
+        Args:
+            client (AsyncClient): Client of the server, created with
+                `auto_renew_locks=False`.
+        """
+        self._client = client
+        self._logger = logging.getLogger("ldlm")
+
+        # Locks held for processes, keyed by (name, key)
+        self._held: dict[tuple[str, str], _Held] = {}
+
+        # Processes waiting for each lock
+        self._queues: dict[str, _Queue] = {}
+
+        # Woken when a lock is acquired so that the renewer can look at its renew time
+        self._renew_wakeup = asyncio.Event()
+        self._renewer: Optional[asyncio.Task] = None
+
+        # Background unlocks of expired locks
+        self._tasks: set[asyncio.Future] = set()
+
+    def _hold(self, lock: AsyncLock, timeout_seconds: float) -> None:
+        """
+        Records a lock acquired for a process.
+        """
+        held = _Held(
+            lock,
+            timeout_seconds,
+            self._client._renew_interval(timeout_seconds),  # pylint: disable=protected-access
+        )
+        self._held[(lock.name, lock.key)] = held
+        if timeout_seconds:
+            self._expire_after(held)
+            self._wake_renewer()
+
+    def _wake_renewer(self) -> None:
+        """
+        Starts the renewer if needed and wakes it up to look at a new renew time.
+        """
+        if self._renewer is None:
+            self._renewer = asyncio.ensure_future(self._renew())
+        self._renew_wakeup.set()
+
+    def _expire_after(self, held: _Held) -> None:
+        """
+        (Re)starts the timeout of a lock.
+        """
+        if held.expiry is not None:
+            held.expiry.cancel()
+        held.expiry = asyncio.get_running_loop().call_later(
+            held.timeout_seconds, self._expire, held)
+
+    def _expire(self, held: _Held) -> None:
+        """
+        Releases a lock whose process did not renew it in time.
+        """
+        lock = held.lock
+        if self._held.pop((lock.name, lock.key), None) is not held:
+            return
+        self._logger.warning("Lock `%s` was not renewed; releasing it",
+                             lock.name,
+                             extra=log_extra("sidecar.expired", lock.name))
+        task = asyncio.ensure_future(self._client.unlock(lock.name, lock.key))
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Future) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            self._logger.error("Failed to release an expired lock: %r",
+                               task.exception(),
+                               extra=log_extra("sidecar.expire_failed",
+                                               error=repr(task.exception())))
+
+    async def _renew(self) -> None:
+        """
+        Renews the locks held for processes on the server. Locks are renewed in one batch per
+        lock timeout when the first of them is due; locks which are due within half their
+        renew interval are renewed along with it.
+        """
+        while True:
+            now = time.monotonic()
+            due: dict[float, list[_Held]] = {}
+            for held in self._held.values():
+                if (held.timeout_seconds and held.lock.locked and
+                        held.renew_at - held.renew_interval / 2 <= now):
+                    due.setdefault(held.timeout_seconds, []).append(held)
+
+            for timeout_seconds, batch in due.items():
+                try:
+                    await self._client.renew_many([h.lock for h in batch],
+                                                  timeout_seconds)
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    # Locks which were not lost are retried soon
+                    for held in batch:
+                        if held.lock.locked:
+                            held.renew_at = now + min(held.renew_interval, 1)
+                    self._logger.error("Failed to renew locks: %r",
+                                       e,
+                                       extra=log_extra("sidecar.renew_failed",
+                                                       error=repr(e)))
+                else:
+                    for held in batch:
+                        held.renew_at = now + held.renew_interval
+
+            renew_at = min((h.renew_at
+                            for h in self._held.values()
+                            if h.timeout_seconds and h.lock.locked),
+                           default=None)
+            self._renew_wakeup.clear()
+            try:
+                await asyncio.wait_for(
+                    self._renew_wakeup.wait(),
+                    None if renew_at is None else max(
+                        0, renew_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                pass
+
+    def _queue(self, name: str) -> _Queue:
+        """
+        Returns the queue of processes waiting for a lock and joins it.
+        """
+        queue = self._queues.get(name)
+        if queue is None:
+            queue = self._queues[name] = _Queue()
+        queue.waiters += 1
+        return queue
+
+    def _leave(self, name: str, queue: _Queue) -> None:
+        """
+        Leaves the queue of processes waiting for a lock.
+        """
+        queue.waiters -= 1
+        if not queue.waiters:
+            del self._queues[name]
+
+    async def _lock(self, request: pb.LockRequest) -> pb.LockResponse:
+        """
+        Acquires a lock for a process, waiting for its turn among the processes waiting for
+        the same lock.
+        """
+        wait = _wait_timeout(request)
+        deadline = None if wait is None else time.monotonic() + wait
+        queue = self._queue(request.name)
+        try:
+            try:
+                await asyncio.wait_for(queue.turn.acquire(), wait)
+            except asyncio.TimeoutError:
+                return _wait_timeout_response(request.name)
+            try:
+                remaining = 0.0
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return _wait_timeout_response(request.name)
+                timeout_seconds = lock_timeout(request)
+                lock = await self._client.lock(
+                    request.name,
+                    wait_timeout_seconds=remaining,
+                    lock_timeout_seconds=timeout_seconds,
+                    size=request.size,
+                )
+            finally:
+                queue.turn.release()
+        finally:
+            self._leave(request.name, queue)
+
+        if not lock.locked:
+            return _wait_timeout_response(request.name)
+        self._hold(lock, timeout_seconds)
+        return pb.LockResponse(locked=True, name=lock.name, key=lock.key)
+
+    async def Lock(self, request: pb.LockRequest,
+                   context: grpc.aio.ServicerContext) -> pb.LockResponse:
+        try:
+            return await self._lock(request)
+        except grpc.RpcError as e:
+            await _abort(context, e)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if (error := exceptions.to_rpc_error(e)) is None:
+                raise
+            return pb.LockResponse(name=request.name, error=error)
+
+    async def TryLock(self, request: pb.TryLockRequest,
+                      context: grpc.aio.ServicerContext) -> pb.LockResponse:
+        timeout_seconds = lock_timeout(request)
+        try:
+            lock = await self._client.try_lock(
+                request.name,
+                lock_timeout_seconds=timeout_seconds,
+                size=request.size,
+            )
+        except grpc.RpcError as e:
+            await _abort(context, e)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if (error := exceptions.to_rpc_error(e)) is None:
+                raise
+            return pb.LockResponse(name=request.name, error=error)
+        if lock.locked:
+            self._hold(lock, timeout_seconds)
+        return pb.LockResponse(locked=lock.locked, name=lock.name, key=lock.key)
+
+    async def Unlock(self, request: pb.UnlockRequest,
+                     context: grpc.aio.ServicerContext) -> pb.UnlockResponse:
+        held = self._held.pop((request.name, request.key), None)
+        if held is not None and held.expiry is not None:
+            held.expiry.cancel()
+        try:
+            await self._client.unlock(request.name, request.key)
+        except grpc.RpcError as e:
+            await _abort(context, e)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            if (error := exceptions.to_rpc_error(e)) is None:
+                raise
+            return pb.UnlockResponse(name=request.name, error=error)
+        return pb.UnlockResponse(unlocked=True, name=request.name)
+
+    async def Renew(self, request: pb.RenewRequest,
+                    context: grpc.aio.ServicerContext) -> pb.LockResponse:
+        held = self._held.get((request.name, request.key))
+        if held is None:
+            # Not acquired through this sidecar
+            try:
+                lock = await self._client.renew(request.name, request.key,
+                                                lock_timeout(request))
+            except grpc.RpcError as e:
+                await _abort(context, e)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                if (error := exceptions.to_rpc_error(e)) is None:
+                    raise
+                return pb.LockResponse(name=request.name, error=error)
+            return pb.LockResponse(locked=lock.locked,
+                                   name=lock.name,
+                                   key=lock.key)
+
+        if not held.lock.locked:
+            # Lost on the server
+            self._held.pop((request.name, request.key), None)
+            if held.expiry is not None:
+                held.expiry.cancel()
+            return pb.LockResponse(
+                name=request.name,
+                error=pb.Error(code=pb.ErrorCode.LockDoesNotExistOrInvalidKey,
+                               message="lock does not exist or invalid key"),
+            )
+
+        timeout_seconds = lock_timeout(request)
+        if timeout_seconds != held.timeout_seconds:
+            held.timeout_seconds = timeout_seconds
+            held.renew_interval = self._client._renew_interval(  # pylint: disable=protected-access
+                timeout_seconds)
+            held.renew_at = time.monotonic()
+            if timeout_seconds:
+                self._wake_renewer()
+        if timeout_seconds:
+            self._expire_after(held)
+        elif held.expiry is not None:
+            held.expiry.cancel()
+            held.expiry = None
+        return pb.LockResponse(locked=True, name=request.name, key=request.key)
+
+    async def close(self) -> None:
+        """
+        Stops renewing locks and releases all locks held for processes.
+
+        Returns:
+            None
+        """
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        held = list(self._held.values())
+        self._held.clear()
+        for h in held:
+            if h.expiry is not None:
+                h.expiry.cancel()
+        if locks := [h.lock for h in held if h.lock.locked]:
+            try:
+                await self._client.unlock_many(locks)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                self._logger.error("Failed to release locks: %r",
+                                   e,
+                                   extra=log_extra("sidecar.release_failed",
+                                                   error=repr(e)))
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+class Sidecar:
+    """
+    A sidecar which serves the LDLM service on a Unix domain socket and forwards requests to an
+    LDLM server. It runs in the current event loop and must be created in it. Use as an async
+    context manager or call `start()` and `stop()`.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments, too-many-positional-arguments
+        self,
+        upstream: str,
+        socket_path: Optional[str] = None,
+        password: Optional[str] = None,
+        tls: Optional[TLSConfig] = None,
+        transport: str = "unary",
+        socket_mode: int = 0o600,
+    ):
+        """
+        Args:
+            upstream (str): The address of the server.
+            socket_path (str, optional): The path of the socket to listen on. Defaults to the
+                path clients look for the sidecar at. Its directory is created if it does not
+                exist.
+            password (str, optional): The password to use for authentication with the server.
+            tls (TLSConfig, optional): TLS configuration for the connection to the server.
+            transport (str, optional): The transport of the connection to the server, "unary"
+                or "session". See :py:mod:`ldlm.session`.
+            socket_mode (int, optional): The permissions of the socket. Defaults to 0o600
+                (only the user of the sidecar).
+        """
+        self.socket_path: str = socket_path or sidecar_socket_path()
+        """path of the socket the sidecar listens on"""
+
+        self._socket_mode: int = socket_mode
+
+        self.address: str = f"unix:{self.socket_path}"
+        """address to pass to an LDLM client"""
+
+        self._client = AsyncClient(upstream,
+                                   password=password,
+                                   tls=tls,
+                                   retries=0,
+                                   auto_renew_locks=False,
+                                   transport=transport)
+        self._servicer = SidecarServicer(self._client)
+        self._server: Optional[grpc.aio.Server] = None
+
+    async def start(self) -> Sidecar:
+        """
+        Starts the sidecar. A socket left behind by a sidecar which did not stop cleanly is
+        replaced.
+
+        Raises:
+            RuntimeError: If another sidecar is serving the socket.
+
+        Returns:
+            Sidecar: This sidecar.
+        """
+        os.makedirs(os.path.dirname(self.socket_path) or ".",
+                    mode=0o755,
+                    exist_ok=True)
+        try:
+            is_socket = stat.S_ISSOCK(os.stat(self.socket_path).st_mode)
+        except FileNotFoundError:
+            is_socket = False
+        if is_socket:
+            with socket.socket(socket.AF_UNIX) as probe:
+                try:
+                    probe.connect(self.socket_path)
+                except ConnectionRefusedError:
+                    os.unlink(self.socket_path)
+                else:
+                    raise RuntimeError(
+                        f"{self.socket_path} is in use by another sidecar")
+        self._server = grpc.aio.server()
+        ldlm_grpc.add_LDLMServicer_to_server(self._servicer, self._server)
+        # The socket is created with the permissions the umask allows, so it is never more
+        # accessible than socket_mode
+        umask = os.umask(~self._socket_mode & 0o777)
+        try:
+            self._server.add_insecure_port(self.address)
+        finally:
+            os.umask(umask)
+        await self._server.start()
+        return self
+
+    async def stop(self, grace: Optional[float] = None) -> None:
+        """
+        Stops the sidecar and releases the locks it holds.
+
+        Args:
+            grace (float, optional): Seconds to wait for outstanding RPCs to complete.
+                Defaults to None (abort them immediately).
+
+        Returns:
+            None
+        """
+        if self._server is not None:
+            await self._server.stop(grace)
+            self._server = None
+        await self._servicer.close()
+        await self._client.close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    async def serve(self) -> None:
+        """
+        Runs the sidecar until it is cancelled.
+
+        Returns:
+            None
+        """
+        await self.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop(grace=1)
+
+    async def __aenter__(self) -> Sidecar:
+        return await self.start()
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.stop()
+
+
+def _parse_args(argv: Optional[list[str]]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="python -m ldlm.sidecar",
+        description="Serve the LDLM service on a Unix domain socket for the "
+        "processes of this host.")
+    add = parser.add_argument
+    add("--upstream", required=True, help="server address")
+    add("--socket",
+        default=sidecar_socket_path(),
+        help="path of the socket to listen on")
+    add("--socket-mode",
+        type=lambda mode: int(mode, 8),
+        default=0o600,
+        help="permissions of the socket in octal (default: 600)")
+    add("--password", help="server password")
+    add("--tls-ca-file", help="CA certificate file. Enables TLS")
+    add("--tls-cert-file", help="client certificate file. Enables TLS")
+    add("--tls-key-file", help="client key file. Enables TLS")
+    add("--transport", choices=["unary", "session"], default="unary")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """
+    Command line entry point.
+
+    Args:
+        argv (list[str], optional): Command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        None
+    """
+    args = _parse_args(argv)
+    tls = None
+    if args.tls_ca_file or args.tls_cert_file or args.tls_key_file:
+        tls = TLSConfig(ca_file=args.tls_ca_file,
+                        cert_file=args.tls_cert_file,
+                        key_file=args.tls_key_file)
+    logging.basicConfig(level=logging.WARNING)
+
+    async def serve() -> None:
+        await Sidecar(args.upstream,
+                      socket_path=args.socket,
+                      password=args.password,
+                      tls=tls,
+                      transport=args.transport,
+                      socket_mode=args.socket_mode).serve()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
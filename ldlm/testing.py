@@ -0,0 +1,1204 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+# pylint: disable=too-many-lines
+"""
+In-process LDLM server for testing and benchmarking LDLM clients without an external service.
+
+Examples:
+    >>> from ldlm import Client
+    >>> from ldlm.testing import Server
+    >>>
+    >>> with Server() as server:
+    ...     client = Client(server.address)
+    ...     with client.lock_context("my_lock") as lock:
+    ...         print(lock.locked)
+    ...
+    True
+"""
+from __future__ import annotations
+
+import asyncio
+import collections
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import queue
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator, Optional, Sequence, Union
+import uuid
+
+import grpc
+
+from ldlm.protos import ldlm_pb2 as pb
+from ldlm.protos import ldlm_pb2_grpc as ldlm_grpc
+
+
+class _Waiter:  # pylint: disable=too-few-public-methods
+    """
+    A Lock request waiting for a lock to become available.
+    """
+
+    __slots__ = ("lock_timeout_seconds", "lease_id", "key", "_on_grant")
+
+    def __init__(self,
+                 lock_timeout_seconds: float,
+                 on_grant: Callable[[], None],
+                 lease_id: str = ""):
+        """
+        Args:
+            lock_timeout_seconds (float): The lock timeout to apply when the lock is granted.
+            on_grant (Callable[[], None]): Called, with the lock table's mutex held, when the
+                lock is granted to this waiter.
+            lease_id (str, optional): The lease to attach the lock to when it is granted.
+                Defaults to "" (no lease).
+        """
+        self.lock_timeout_seconds: float = lock_timeout_seconds
+        self.lease_id: str = lease_id
+
+        self.key: Optional[str] = None
+        """key of the lock once it has been granted"""
+
+        self._on_grant: Callable[[], None] = on_grant
+
+    def grant(self, key: str) -> None:
+        """
+        Grants the lock to this waiter.
+
+        Args:
+            key (str): The key of the granted lock.
+
+        Returns:
+            None
+        """
+        self.key = key
+        self._on_grant()
+
+
+class _LockState:  # pylint: disable=too-few-public-methods
+    """
+    State of a single named lock.
+    """
+
+    __slots__ = ("size", "holders", "waiters")
+
+    def __init__(self, size: int):
+        self.size: int = size
+
+        # key -> lease deadline (time.monotonic()), the id of the client lease the holder is
+        # attached to, or None if the lock does not expire
+        self.holders: dict[str, Union[float, str, None]] = {}
+
+        self.waiters: collections.deque[_Waiter] = collections.deque()
+
+
+class _Lease:  # pylint: disable=too-few-public-methods
+    """
+    State of a client lease granted by GrantLease.
+    """
+
+    __slots__ = ("timeout_seconds", "deadline", "locks")
+
+    def __init__(self, timeout_seconds: int, deadline: float):
+        self.timeout_seconds: int = timeout_seconds
+        self.deadline: float = deadline
+
+        # (name, key) of the holders attached to the lease
+        self.locks: set[tuple[str, str]] = set()
+
+
+def _error(code: pb.ErrorCode, message: str) -> pb.Error:
+    """
+    Creates an Error message.
+
+    Args:
+        code (pb.ErrorCode): The error code.
+        message (str): The error message.
+
+    Returns:
+        pb.Error: The error message.
+    """
+    return pb.Error(code=code, message=message)
+
+
+class LockTable:  # pylint: disable=too-many-instance-attributes
+    """
+    Thread-safe lock state shared by the RPC handlers of a server. Implements the semantics
+    described in ldlm.proto: sized locks with one key per holder, FIFO waiters, and leases that
+    expire unless renewed. Locks may also be attached to a client lease, which is kept alive
+    with one request for all of its locks.
+    """
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locks: dict[str, _LockState] = {}
+        self._leases: dict[str, _Lease] = {}
+
+        # Heap of (deadline, name, key). Entries for renewed or released locks are skipped when
+        # they are popped.
+        self._expiry: list[tuple[float, str, str]] = []
+
+        # Heap of (deadline, lease id). Entries for kept alive or revoked leases are skipped
+        # when they are popped.
+        self._lease_expiry: list[tuple[float, str]] = []
+
+        # name -> callbacks of Watch requests for the lock
+        self._watchers: dict[str, set[Callable[[str], None]]] = {}
+        self._expiry_cond = threading.Condition(self._mutex)
+        self._reaper: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _state(self, name: str, size: int) -> Union[_LockState, pb.Error]:
+        """
+        Returns the state of a lock, creating it if needed. Must be called with the mutex held.
+
+        Args:
+            name (str): The name of the lock.
+            size (int): The requested size of the lock.
+
+        Returns:
+            Union[_LockState, pb.Error]: The lock state or an error if the size is invalid.
+        """
+        if size < 1:
+            return _error(pb.ErrorCode.InvalidLockSize,
+                          f"invalid lock size {size}")
+
+        state = self._locks.get(name)
+        if state is None:
+            state = self._locks[name] = _LockState(size)
+        elif state.size != size:
+            if state.holders or state.waiters:
+                return _error(
+                    pb.ErrorCode.LockSizeMismatch,
+                    f"lock size mismatch: lock has size {state.size}",
+                )
+            state.size = size
+        return state
+
+    def _lease_error(self, lease_id: str) -> Optional[pb.Error]:
+        """
+        Returns an error if a client lease does not exist. Must be called with the mutex held.
+
+        Args:
+            lease_id (str): The lease id.
+
+        Returns:
+            Optional[pb.Error]: The error or None if the lease exists.
+        """
+        if lease_id not in self._leases:
+            return _error(pb.ErrorCode.LeaseDoesNotExist,
+                          "lease does not exist")
+        return None
+
+    def _grant(self,
+               name: str,
+               state: _LockState,
+               lock_timeout_seconds: float,
+               lease_id: str = "") -> str:
+        """
+        Adds a holder to a lock. Must be called with the mutex held.
+
+        Args:
+            name (str): The name of the lock.
+            state (_LockState): The state of the lock.
+            lock_timeout_seconds (float): The lease length in seconds or 0 for no lease.
+                Ignored if the holder is attached to a client lease.
+            lease_id (str, optional): The client lease to attach the holder to. Defaults to ""
+                (no lease).
+
+        Returns:
+            str: The key of the new holder.
+        """
+        key = str(uuid.uuid4())
+        if not lease_id:
+            state.holders[key] = self._set_lease(name, key,
+                                                 lock_timeout_seconds)
+        elif (lease := self._leases.get(lease_id)) is not None:
+            lease.locks.add((name, key))
+            state.holders[key] = lease_id
+        else:
+            # The lease expired while the request was waiting for the lock. Release the lock
+            # as soon as the reaper runs.
+            deadline = time.monotonic()
+            heapq.heappush(self._expiry, (deadline, name, key))
+            self._start_reaper()
+            state.holders[key] = deadline
+        return key
+
+    def _set_lease(self, name: str, key: str,
+                   lock_timeout_seconds: float) -> Optional[float]:
+        """
+        Schedules expiry of a holder's lease. Must be called with the mutex held.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the holder.
+            lock_timeout_seconds (float): The lease length in seconds or 0 for no lease.
+
+        Returns:
+            Optional[float]: The lease deadline or None if there is no lease.
+        """
+        if not lock_timeout_seconds:
+            return None
+
+        deadline = time.monotonic() + lock_timeout_seconds
+        heapq.heappush(self._expiry, (deadline, name, key))
+        self._start_reaper()
+        return deadline
+
+    def _start_reaper(self) -> None:
+        """
+        Starts the reaper thread if needed and wakes it up to look at a new expiry. Must be
+        called with the mutex held.
+
+        Returns:
+            None
+        """
+        if self._reaper is None:
+            self._reaper = threading.Thread(target=self._reap,
+                                            name="ldlm-lease-reaper",
+                                            daemon=True)
+            self._reaper.start()
+        self._expiry_cond.notify()
+
+    def _release(self, name: str, state: _LockState, key: str) -> None:
+        """
+        Removes a holder from a lock and grants the lock to waiters while there is capacity.
+        Must be called with the mutex held.
+
+        Args:
+            name (str): The name of the lock.
+            state (_LockState): The state of the lock.
+            key (str): The key of the holder.
+
+        Returns:
+            None
+        """
+        holder = state.holders.pop(key)
+        if isinstance(holder, str) and (lease :=
+                                        self._leases.get(holder)) is not None:
+            lease.locks.discard((name, key))
+        while state.waiters and len(state.holders) < state.size:
+            waiter = state.waiters.popleft()
+            waiter.grant(
+                self._grant(name, state, waiter.lock_timeout_seconds,
+                            waiter.lease_id))
+        if len(state.holders) < state.size:
+            for on_free in self._watchers.get(name, ()):
+                on_free(name)
+
+    def _end_lease(self, lease_id: str) -> None:
+        """
+        Removes a client lease and releases the locks attached to it. Must be called with the
+        mutex held.
+
+        Args:
+            lease_id (str): The lease id.
+
+        Returns:
+            None
+        """
+        lease = self._leases.pop(lease_id)
+        for name, key in lease.locks:
+            self._release(name, self._locks[name], key)
+
+    def _reap(self) -> None:
+        """
+        Reaper thread target. Releases holders whose leases have expired and the holders
+        attached to expired client leases.
+
+        Returns:
+            None
+        """
+        with self._expiry_cond:
+            while not self._closed:
+                now = time.monotonic()
+                while self._expiry and self._expiry[0][0] <= now:
+                    deadline, name, key = heapq.heappop(self._expiry)
+                    state = self._locks.get(name)
+                    if state is not None and state.holders.get(key) == deadline:
+                        self._release(name, state, key)
+                while self._lease_expiry and self._lease_expiry[0][0] <= now:
+                    deadline, lease_id = heapq.heappop(self._lease_expiry)
+                    lease = self._leases.get(lease_id)
+                    if lease is not None and lease.deadline == deadline:
+                        self._end_lease(lease_id)
+                wake = min(
+                    (h[0][0] for h in (self._expiry, self._lease_expiry) if h),
+                    default=None)
+                self._expiry_cond.wait(None if wake is None else wake - now)
+
+    def close(self) -> None:
+        """
+        Stops the lease reaper thread.
+
+        Returns:
+            None
+        """
+        with self._expiry_cond:
+            self._closed = True
+            self._expiry_cond.notify()
+        if self._reaper is not None:
+            self._reaper.join()
+
+    def try_lock(self,
+                 name: str,
+                 size: int,
+                 lock_timeout_seconds: float,
+                 lease_id: str = "") -> pb.LockResponse:
+        """
+        Acquires a lock if it is available.
+
+        Args:
+            name (str): The name of the lock.
+            size (int): The size of the lock.
+            lock_timeout_seconds (float): The lease length in seconds or 0 for no lease.
+            lease_id (str, optional): The client lease to attach the lock to. Defaults to ""
+                (no lease).
+
+        Returns:
+            pb.LockResponse: The response.
+        """
+        with self._mutex:
+            if lease_id and (error := self._lease_error(lease_id)) is not None:
+                return pb.LockResponse(name=name, error=error)
+            state = self._state(name, size)
+            if isinstance(state, pb.Error):
+                return pb.LockResponse(name=name, error=state)
+            if len(state.holders) < state.size and not state.waiters:
+                return pb.LockResponse(
+                    locked=True,
+                    name=name,
+                    key=self._grant(name, state, lock_timeout_seconds,
+                                    lease_id),
+                )
+            return pb.LockResponse(name=name, locked=False)
+
+    def lock(self, name: str, size: int,
+             waiter: _Waiter) -> Optional[pb.LockResponse]:
+        """
+        Acquires a lock if it is available, otherwise queues the waiter. The waiter's
+        `grant()` is called when the lock is granted to it.
+
+        Args:
+            name (str): The name of the lock.
+            size (int): The size of the lock.
+            waiter (_Waiter): The waiter to queue if the lock is not available.
+
+        Returns:
+            Optional[pb.LockResponse]: The response or None if the waiter was queued.
+        """
+        with self._mutex:
+            if waiter.lease_id and (error := self._lease_error(
+                    waiter.lease_id)) is not None:
+                return pb.LockResponse(name=name, error=error)
+            state = self._state(name, size)
+            if isinstance(state, pb.Error):
+                return pb.LockResponse(name=name, error=state)
+            if len(state.holders) < state.size and not state.waiters:
+                return pb.LockResponse(
+                    locked=True,
+                    name=name,
+                    key=self._grant(name, state, waiter.lock_timeout_seconds,
+                                    waiter.lease_id),
+                )
+            state.waiters.append(waiter)
+            return None
+
+    def withdraw(self, name: str, waiter: _Waiter) -> bool:
+        """
+        Removes a queued waiter.
+
+        Args:
+            name (str): The name of the lock.
+            waiter (_Waiter): The waiter.
+
+        Returns:
+            bool: True if the waiter was removed or False if it was already granted the lock.
+        """
+        with self._mutex:
+            if waiter.key is not None:
+                return False
+            self._locks[name].waiters.remove(waiter)
+            return True
+
+    def unlock(self, name: str, key: str) -> pb.UnlockResponse:
+        """
+        Releases a lock.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the holder.
+
+        Returns:
+            pb.UnlockResponse: The response.
+        """
+        with self._mutex:
+            state = self._locks.get(name)
+            if state is None:
+                return pb.UnlockResponse(
+                    name=name,
+                    error=_error(pb.ErrorCode.LockDoesNotExist,
+                                 "lock does not exist"),
+                )
+            if not state.holders:
+                return pb.UnlockResponse(
+                    name=name,
+                    error=_error(pb.ErrorCode.NotLocked, "lock is not locked"),
+                )
+            if key not in state.holders:
+                return pb.UnlockResponse(
+                    name=name,
+                    error=_error(pb.ErrorCode.InvalidLockKey,
+                                 "invalid lock key"),
+                )
+            self._release(name, state, key)
+            return pb.UnlockResponse(unlocked=True, name=name)
+
+    def renew(self, name: str, key: str,
+              lock_timeout_seconds: float) -> pb.LockResponse:
+        """
+        Renews the lease of a lock holder. Holders attached to a client lease are left
+        attached to it.
+
+        Args:
+            name (str): The name of the lock.
+            key (str): The key of the holder.
+            lock_timeout_seconds (float): The new lease length in seconds or 0 for no lease.
+
+        Returns:
+            pb.LockResponse: The response.
+        """
+        with self._mutex:
+            state = self._locks.get(name)
+            if state is None or key not in state.holders:
+                return pb.LockResponse(
+                    name=name,
+                    error=_error(
+                        pb.ErrorCode.LockDoesNotExistOrInvalidKey,
+                        "lock does not exist or invalid key",
+                    ),
+                )
+            if not isinstance(state.holders[key], str):
+                state.holders[key] = self._set_lease(name, key,
+                                                     lock_timeout_seconds)
+            return pb.LockResponse(locked=True, name=name, key=key)
+
+    def watch(
+        self,
+        names: Sequence[str],
+        on_free: Callable[[str], None],
+    ) -> None:
+        """
+        Starts watching locks. `on_free` is called, with the mutex held, for each of the locks
+        which is free now and then each time one of the locks is released and becomes free,
+        until `unwatch()` is called.
+
+        Args:
+            names (Sequence[str]): The names of the locks. Must not contain duplicates.
+            on_free (Callable[[str], None]): Called with the name of a free lock.
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            for name in names:
+                self._watchers.setdefault(name, set()).add(on_free)
+                state = self._locks.get(name)
+                if state is None or (len(state.holders) < state.size and
+                                     not state.waiters):
+                    on_free(name)
+
+    def unwatch(
+        self,
+        names: Sequence[str],
+        on_free: Callable[[str], None],
+    ) -> None:
+        """
+        Stops watching locks.
+
+        Args:
+            names (Sequence[str]): The names passed to `watch()`.
+            on_free (Callable[[str], None]): The callback passed to `watch()`.
+
+        Returns:
+            None
+        """
+        with self._mutex:
+            for name in names:
+                watchers = self._watchers[name]
+                watchers.discard(on_free)
+                if not watchers:
+                    del self._watchers[name]
+
+    def grant_lease(self, lease_timeout_seconds: int) -> pb.LeaseResponse:
+        """
+        Grants a client lease.
+
+        Args:
+            lease_timeout_seconds (int): The time in seconds after which the lease expires
+                unless it is kept alive.
+
+        Returns:
+            pb.LeaseResponse: The response.
+        """
+        if lease_timeout_seconds < 1:
+            return pb.LeaseResponse(
+                error=_error(pb.ErrorCode.InvalidLeaseTimeout,
+                             f"invalid lease timeout {lease_timeout_seconds}"))
+        lease_id = str(uuid.uuid4())
+        with self._mutex:
+            self._leases[lease_id] = _Lease(lease_timeout_seconds, 0.0)
+            self._keep_alive(lease_id)
+        return pb.LeaseResponse(lease_id=lease_id,
+                                lease_timeout_seconds=lease_timeout_seconds)
+
+    def _keep_alive(self, lease_id: str) -> None:
+        """
+        Restarts the timeout of a client lease. Must be called with the mutex held.
+
+        Args:
+            lease_id (str): The id of an existing lease.
+
+        Returns:
+            None
+        """
+        lease = self._leases[lease_id]
+        lease.deadline = time.monotonic() + lease.timeout_seconds
+        heapq.heappush(self._lease_expiry, (lease.deadline, lease_id))
+        self._start_reaper()
+
+    def keep_alive(self, lease_id: str) -> pb.LeaseResponse:
+        """
+        Restarts the timeout of a client lease.
+
+        Args:
+            lease_id (str): The lease id.
+
+        Returns:
+            pb.LeaseResponse: The response.
+        """
+        with self._mutex:
+            if (error := self._lease_error(lease_id)) is not None:
+                return pb.LeaseResponse(lease_id=lease_id, error=error)
+            self._keep_alive(lease_id)
+            return pb.LeaseResponse(
+                lease_id=lease_id,
+                lease_timeout_seconds=self._leases[lease_id].timeout_seconds)
+
+    def revoke_lease(self, lease_id: str) -> pb.LeaseResponse:
+        """
+        Ends a client lease and releases the locks attached to it.
+
+        Args:
+            lease_id (str): The lease id.
+
+        Returns:
+            pb.LeaseResponse: The response.
+        """
+        with self._mutex:
+            if (error := self._lease_error(lease_id)) is not None:
+                return pb.LeaseResponse(lease_id=lease_id, error=error)
+            self._end_lease(lease_id)
+            return pb.LeaseResponse(lease_id=lease_id)
+
+
+def _size(request: Union[pb.LockRequest, pb.TryLockRequest]) -> int:
+    """
+    Returns the requested lock size, defaulting to 1 when unspecified.
+    """
+    return request.size if request.HasField("size") else 1
+
+
+def _wait_timeout(request: pb.LockRequest) -> Optional[float]:
+    """
+    Returns the requested wait timeout in seconds or None to wait indefinitely.
+    """
+    if request.HasField("wait_timeout_ms"):
+        return request.wait_timeout_ms / 1000 or None
+    return request.wait_timeout_seconds or None
+
+
+def _lock_timeout(
+    request: Union[pb.LockRequest, pb.TryLockRequest,
+                   pb.RenewRequest]) -> float:
+    """
+    Returns the requested lock timeout in seconds or 0 for no timeout.
+    """
+    if request.HasField("lock_timeout_ms"):
+        return request.lock_timeout_ms / 1000
+    return request.lock_timeout_seconds
+
+
+def _wait_timeout_response(name: str) -> pb.LockResponse:
+    """
+    Returns the response for a Lock request whose wait timeout expired.
+    """
+    return pb.LockResponse(
+        name=name,
+        error=_error(pb.ErrorCode.LockWaitTimeout, "lock wait timeout"),
+    )
+
+
+def _session_response(table: LockTable,
+                      request: pb.SessionRequest) -> pb.SessionResponse:
+    """
+    Handles a TryLock, Renew or Unlock request received on a Session stream.
+    """
+    kind = request.WhichOneof("request")
+    if kind == "try_lock":
+        t = request.try_lock
+        return pb.SessionResponse(tag=request.tag,
+                                  lock=table.try_lock(t.name, _size(t),
+                                                      _lock_timeout(t),
+                                                      t.lease_id))
+    if kind == "renew":
+        return pb.SessionResponse(tag=request.tag,
+                                  lock=table.renew(
+                                      request.renew.name, request.renew.key,
+                                      _lock_timeout(request.renew)))
+    if kind == "unlock":
+        return pb.SessionResponse(tag=request.tag,
+                                  unlock=table.unlock(request.unlock.name,
+                                                      request.unlock.key))
+    return pb.SessionResponse(tag=request.tag)
+
+
+def _authorized(context: grpc.ServicerContext, password: Optional[str]) -> bool:
+    """
+    Returns whether the request carries the server's password, if it has one.
+    """
+    if password is None:
+        return True
+    return ("authorization", password) in tuple(context.invocation_metadata())
+
+
+class LDLMServicer(ldlm_grpc.LDLMServicer):
+    """
+    LDLM service implementation for a grpc.Server.
+    """
+
+    def __init__(self, table: LockTable, password: Optional[str] = None):
+        """
+        Args:
+            table (LockTable): The lock state.
+            password (str, optional): Password clients must present. Defaults to None.
+        """
+        self._table = table
+        self._password = password
+
+    def _authorize(self, context: grpc.ServicerContext) -> None:
+        if not _authorized(context, self._password):
+            context.abort(grpc.StatusCode.UNAUTHENTICATED, "invalid password")
+
+    def _lock_all(self, requests: Sequence[pb.LockRequest],
+                  context: grpc.ServicerContext) -> list[pb.LockResponse]:
+        """
+        Acquires locks, waiting for them concurrently.
+        """
+        started = time.monotonic()
+        granted = threading.Event()
+        waiters = []
+        responses: list[Optional[pb.LockResponse]] = []
+        for request in requests:
+            waiter = _Waiter(_lock_timeout(request), granted.set,
+                             request.lease_id)
+            waiters.append(waiter)
+            responses.append(
+                self._table.lock(request.name, _size(request), waiter))
+
+        # Wake up if the client goes away
+        context.add_callback(granted.set)
+        for i, request in enumerate(requests):
+            if responses[i] is not None:
+                continue
+            waiter = waiters[i]
+            timeout = _wait_timeout(request)
+            deadline = None if timeout is None else started + timeout
+            while waiter.key is None and context.is_active():
+                remaining = None if deadline is None else deadline - time.monotonic(
+                )
+                if remaining is not None and remaining <= 0:
+                    break
+                granted.wait(remaining)
+                granted.clear()
+            if self._table.withdraw(request.name, waiter):
+                responses[i] = _wait_timeout_response(request.name)
+            else:
+                assert waiter.key is not None
+                responses[i] = pb.LockResponse(locked=True,
+                                               name=request.name,
+                                               key=waiter.key)
+
+        if not context.is_active():
+            for r in responses:
+                if r is not None and r.locked:
+                    self._table.unlock(r.name, r.key)
+        return responses  # type: ignore[return-value]
+
+    def Lock(self, request: pb.LockRequest,
+             context: grpc.ServicerContext) -> pb.LockResponse:
+        self._authorize(context)
+        return self._lock_all([request], context)[0]
+
+    def TryLock(self, request: pb.TryLockRequest,
+                context: grpc.ServicerContext) -> pb.LockResponse:
+        self._authorize(context)
+        return self._table.try_lock(request.name, _size(request),
+                                    _lock_timeout(request), request.lease_id)
+
+    def Unlock(self, request: pb.UnlockRequest,
+               context: grpc.ServicerContext) -> pb.UnlockResponse:
+        self._authorize(context)
+        return self._table.unlock(request.name, request.key)
+
+    def Renew(self, request: pb.RenewRequest,
+              context: grpc.ServicerContext) -> pb.LockResponse:
+        self._authorize(context)
+        return self._table.renew(request.name, request.key,
+                                 _lock_timeout(request))
+
+    def Session(
+        self,
+        request_iterator: Iterator[pb.SessionRequest],
+        context: grpc.ServicerContext,
+    ) -> Iterator[pb.SessionResponse]:
+        self._authorize(context)
+        responses: queue.SimpleQueue = queue.SimpleQueue()
+        waiting = [0]
+        waiting_cond = threading.Condition()
+
+        def lock(request: pb.SessionRequest) -> None:
+            try:
+                r = self._lock_all([request.lock], context)[0]
+                responses.put(pb.SessionResponse(tag=request.tag, lock=r))
+            finally:
+                with waiting_cond:
+                    waiting[0] -= 1
+                    waiting_cond.notify_all()
+
+        def read() -> None:
+            try:
+                for request in request_iterator:
+                    if request.WhichOneof("request") != "lock":
+                        responses.put(_session_response(self._table, request))
+                        continue
+                    # Lock requests wait in their own threads so that they do not hold up
+                    # the rest of the stream
+                    with waiting_cond:
+                        waiting[0] += 1
+                    threading.Thread(target=lock, args=(request,),
+                                     daemon=True).start()
+            except grpc.RpcError:
+                pass  # The client went away
+            finally:
+                with waiting_cond:
+                    waiting_cond.wait_for(lambda: waiting[0] == 0)
+                responses.put(None)
+
+        threading.Thread(target=read, daemon=True).start()
+        while (response := responses.get()) is not None:
+            yield response
+
+    def BatchLock(self, request: pb.BatchLockRequest,
+                  context: grpc.ServicerContext) -> pb.BatchLockResponse:
+        self._authorize(context)
+        return pb.BatchLockResponse(
+            responses=self._lock_all(request.requests, context))
+
+    def BatchTryLock(self, request: pb.BatchTryLockRequest,
+                     context: grpc.ServicerContext) -> pb.BatchLockResponse:
+        self._authorize(context)
+        return pb.BatchLockResponse(responses=[
+            self._table.try_lock(r.name, _size(r), _lock_timeout(r), r.lease_id)
+            for r in request.requests
+        ])
+
+    def BatchRenew(self, request: pb.BatchRenewRequest,
+                   context: grpc.ServicerContext) -> pb.BatchLockResponse:
+        self._authorize(context)
+        return pb.BatchLockResponse(responses=[
+            self._table.renew(r.name, r.key, _lock_timeout(r))
+            for r in request.requests
+        ])
+
+    def BatchUnlock(self, request: pb.BatchUnlockRequest,
+                    context: grpc.ServicerContext) -> pb.BatchUnlockResponse:
+        self._authorize(context)
+        return pb.BatchUnlockResponse(responses=[
+            self._table.unlock(r.name, r.key) for r in request.requests
+        ])
+
+    def GrantLease(self, request: pb.GrantLeaseRequest,
+                   context: grpc.ServicerContext) -> pb.LeaseResponse:
+        self._authorize(context)
+        return self._table.grant_lease(request.lease_timeout_seconds)
+
+    def KeepAlive(self, request: pb.KeepAliveRequest,
+                  context: grpc.ServicerContext) -> pb.LeaseResponse:
+        self._authorize(context)
+        return self._table.keep_alive(request.lease_id)
+
+    def RevokeLease(self, request: pb.RevokeLeaseRequest,
+                    context: grpc.ServicerContext) -> pb.LeaseResponse:
+        self._authorize(context)
+        return self._table.revoke_lease(request.lease_id)
+
+    def Watch(self, request: pb.WatchRequest,
+              context: grpc.ServicerContext) -> Iterator[pb.WatchEvent]:
+        self._authorize(context)
+        events: queue.SimpleQueue = queue.SimpleQueue()
+        on_free = events.put
+        names = list(dict.fromkeys(request.names))
+        self._table.watch(names, on_free)
+        # Wake up if the client goes away
+        context.add_callback(lambda: events.put(None))
+        try:
+            while (name := events.get()) is not None:
+                yield pb.WatchEvent(name=name)
+        finally:
+            self._table.unwatch(names, on_free)
+
+
+class AsyncLDLMServicer(ldlm_grpc.LDLMServicer):
+    """
+    LDLM service implementation for a grpc.aio.Server.
+    """
+
+    # pylint: disable=invalid-overridden-method
+
+    def __init__(self, table: LockTable, password: Optional[str] = None):
+        """
+        Args:
+            table (LockTable): The lock state.
+            password (str, optional): Password clients must present. Defaults to None.
+        """
+        self._table = table
+        self._password = password
+
+    async def _authorize(self, context: grpc.aio.ServicerContext) -> None:
+        if not _authorized(context, self._password):
+            await context.abort(grpc.StatusCode.UNAUTHENTICATED,
+                                "invalid password")
+
+    async def _lock(self, request: pb.LockRequest) -> pb.LockResponse:
+        """
+        Acquires a lock.
+        """
+        loop = asyncio.get_running_loop()
+        granted = asyncio.Event()
+
+        def on_grant() -> None:
+            loop.call_soon_threadsafe(granted.set)
+
+        waiter = _Waiter(_lock_timeout(request), on_grant, request.lease_id)
+        if (r := self._table.lock(request.name, _size(request),
+                                  waiter)) is not None:
+            return r
+
+        try:
+            await asyncio.wait_for(granted.wait(), _wait_timeout(request))
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            # The client went away. Release the lock if it was granted anyway.
+            if not self._table.withdraw(request.name, waiter):
+                assert waiter.key is not None
+                self._table.unlock(request.name, waiter.key)
+            raise
+
+        if self._table.withdraw(request.name, waiter):
+            return _wait_timeout_response(request.name)
+        assert waiter.key is not None
+        return pb.LockResponse(locked=True, name=request.name, key=waiter.key)
+
+    async def Lock(self, request: pb.LockRequest,
+                   context: grpc.aio.ServicerContext) -> pb.LockResponse:
+        await self._authorize(context)
+        return await self._lock(request)
+
+    async def TryLock(self, request: pb.TryLockRequest,
+                      context: grpc.aio.ServicerContext) -> pb.LockResponse:
+        await self._authorize(context)
+        return self._table.try_lock(request.name, _size(request),
+                                    _lock_timeout(request), request.lease_id)
+
+    async def Unlock(self, request: pb.UnlockRequest,
+                     context: grpc.aio.ServicerContext) -> pb.UnlockResponse:
+        await self._authorize(context)
+        return self._table.unlock(request.name, request.key)
+
+    async def Renew(self, request: pb.RenewRequest,
+                    context: grpc.aio.ServicerContext) -> pb.LockResponse:
+        await self._authorize(context)
+        return self._table.renew(request.name, request.key,
+                                 _lock_timeout(request))
+
+    async def Session(
+        self,
+        request_iterator: AsyncIterator[pb.SessionRequest],
+        context: grpc.aio.ServicerContext,
+    ) -> AsyncIterator[pb.SessionResponse]:
+        await self._authorize(context)
+        responses: asyncio.Queue = asyncio.Queue()
+        waiting: set[asyncio.Future] = set()
+
+        async def lock(request: pb.SessionRequest) -> None:
+            r = await self._lock(request.lock)
+            responses.put_nowait(pb.SessionResponse(tag=request.tag, lock=r))
+
+        async def read() -> None:
+            try:
+                async for request in request_iterator:
+                    if request.WhichOneof("request") != "lock":
+                        responses.put_nowait(
+                            _session_response(self._table, request))
+                        continue
+                    task = asyncio.ensure_future(lock(request))
+                    waiting.add(task)
+                    task.add_done_callback(waiting.discard)
+                if waiting:
+                    await asyncio.wait(set(waiting))
+            finally:
+                responses.put_nowait(None)
+
+        reader = asyncio.ensure_future(read())
+        try:
+            while (response := await responses.get()) is not None:
+                yield response
+        finally:
+            # The client went away. Waiting Lock requests release their locks if they are
+            # granted anyway; release the locks which were granted but not sent.
+            reader.cancel()
+            for task in waiting:
+                task.cancel()
+            while not responses.empty():
+                r = responses.get_nowait()
+                if r is not None and r.lock.locked:
+                    self._table.unlock(r.lock.name, r.lock.key)
+
+    async def BatchLock(
+            self, request: pb.BatchLockRequest,
+            context: grpc.aio.ServicerContext) -> pb.BatchLockResponse:
+        await self._authorize(context)
+        tasks = [asyncio.ensure_future(self._lock(r)) for r in request.requests]
+        try:
+            return pb.BatchLockResponse(responses=await asyncio.gather(*tasks))
+        except asyncio.CancelledError:
+            # The client went away. Release the locks which were granted.
+            for task in tasks:
+                if (task.done() and not task.cancelled() and
+                        task.exception() is None and task.result().locked):
+                    self._table.unlock(task.result().name, task.result().key)
+            raise
+
+    async def BatchTryLock(
+            self, request: pb.BatchTryLockRequest,
+            context: grpc.aio.ServicerContext) -> pb.BatchLockResponse:
+        await self._authorize(context)
+        return pb.BatchLockResponse(responses=[
+            self._table.try_lock(r.name, _size(r), _lock_timeout(r), r.lease_id)
+            for r in request.requests
+        ])
+
+    async def BatchRenew(
+            self, request: pb.BatchRenewRequest,
+            context: grpc.aio.ServicerContext) -> pb.BatchLockResponse:
+        await self._authorize(context)
+        return pb.BatchLockResponse(responses=[
+            self._table.renew(r.name, r.key, _lock_timeout(r))
+            for r in request.requests
+        ])
+
+    async def BatchUnlock(
+            self, request: pb.BatchUnlockRequest,
+            context: grpc.aio.ServicerContext) -> pb.BatchUnlockResponse:
+        await self._authorize(context)
+        return pb.BatchUnlockResponse(responses=[
+            self._table.unlock(r.name, r.key) for r in request.requests
+        ])
+
+    async def GrantLease(self, request: pb.GrantLeaseRequest,
+                         context: grpc.aio.ServicerContext) -> pb.LeaseResponse:
+        await self._authorize(context)
+        return self._table.grant_lease(request.lease_timeout_seconds)
+
+    async def KeepAlive(self, request: pb.KeepAliveRequest,
+                        context: grpc.aio.ServicerContext) -> pb.LeaseResponse:
+        await self._authorize(context)
+        return self._table.keep_alive(request.lease_id)
+
+    async def RevokeLease(
+            self, request: pb.RevokeLeaseRequest,
+            context: grpc.aio.ServicerContext) -> pb.LeaseResponse:
+        await self._authorize(context)
+        return self._table.revoke_lease(request.lease_id)
+
+    async def Watch(
+        self,
+        request: pb.WatchRequest,
+        context: grpc.aio.ServicerContext,
+    ) -> AsyncIterator[pb.WatchEvent]:
+        await self._authorize(context)
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+
+        def on_free(name: str) -> None:
+            loop.call_soon_threadsafe(events.put_nowait, name)
+
+        names = list(dict.fromkeys(request.names))
+        self._table.watch(names, on_free)
+        try:
+            while True:
+                yield pb.WatchEvent(name=await events.get())
+        finally:
+            self._table.unwatch(names, on_free)
+
+
+def _add_port(server: Union[grpc.Server, grpc.aio.Server],
+              credentials: Optional[grpc.ServerCredentials]) -> int:
+    """
+    Binds a server to an ephemeral localhost port.
+
+    Returns:
+        int: The port number.
+    """
+    if credentials is not None:
+        return server.add_secure_port("localhost:0", credentials)
+    return server.add_insecure_port("localhost:0")
+
+
+class Server:
+    """
+    An LDLM server which runs in background threads of the current process and listens on an
+    ephemeral localhost port. Use as a context manager or call `start()` and `stop()`.
+    """
+
+    def __init__(
+        self,
+        password: Optional[str] = None,
+        credentials: Optional[grpc.ServerCredentials] = None,
+        max_workers: int = 256,
+    ):
+        """
+        Args:
+            password (str, optional): Password clients must present. Defaults to None.
+            credentials (grpc.ServerCredentials, optional): TLS credentials. Defaults to None
+                (no TLS).
+            max_workers (int, optional): Size of the RPC handler thread pool. Each blocked Lock
+                request occupies a thread. Defaults to 256.
+        """
+        self.table: LockTable = LockTable()
+        """lock state of the server"""
+
+        self._server = grpc.server(ThreadPoolExecutor(max_workers=max_workers))
+        ldlm_grpc.add_LDLMServicer_to_server(LDLMServicer(self.table, password),
+                                             self._server)
+
+        self.port: int = _add_port(self._server, credentials)
+        """port the server listens on"""
+
+        self.address: str = f"localhost:{self.port}"
+        """address to pass to an LDLM client"""
+
+    def start(self) -> Server:
+        """
+        Starts the server.
+
+        Returns:
+            Server: This server.
+        """
+        self._server.start()
+        return self
+
+    def stop(self, grace: Optional[float] = None) -> None:
+        """
+        Stops the server.
+
+        Args:
+            grace (float, optional): Seconds to wait for outstanding RPCs to complete.
+                Defaults to None (abort them immediately).
+
+        Returns:
+            None
+        """
+        self._server.stop(grace).wait()
+        self.table.close()
+
+    def __enter__(self) -> Server:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+class AsyncServer:
+    """
+    An LDLM server which runs in the current event loop and listens on an ephemeral localhost
+    port. It must be created in the event loop it runs in. Use as an async context manager or
+    call `start()` and `stop()`.
+    """
+
+    def __init__(
+        self,
+        password: Optional[str] = None,
+        credentials: Optional[grpc.ServerCredentials] = None,
+    ):
+        """
+        Args:
+            password (str, optional): Password clients must present. Defaults to None.
+            credentials (grpc.ServerCredentials, optional): TLS credentials. Defaults to None
+                (no TLS).
+        """
+        self.table: LockTable = LockTable()
+        """lock state of the server"""
+
+        self._server = grpc.aio.server()
+        ldlm_grpc.add_LDLMServicer_to_server(
+            AsyncLDLMServicer(self.table, password), self._server)
+
+        self.port: int = _add_port(self._server, credentials)
+        """port the server listens on"""
+
+        self.address: str = f"localhost:{self.port}"
+        """address to pass to an LDLM client"""
+
+    async def start(self) -> AsyncServer:
+        """
+        Starts the server.
+
+        Returns:
+            AsyncServer: This server.
+        """
+        await self._server.start()
+        return self
+
+    async def stop(self, grace: Optional[float] = None) -> None:
+        """
+        Stops the server.
+
+        Args:
+            grace (float, optional): Seconds to wait for outstanding RPCs to complete.
+                Defaults to None (abort them immediately).
+
+        Returns:
+            None
+        """
+        await self._server.stop(grace)
+        self.table.close()
+
+    async def __aenter__(self) -> AsyncServer:
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
@@ -0,0 +1,277 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Lock lifecycle tracing. Pass a :py:class:`Tracer` as the `tracer` parameter of an LDLM client
+to get spans for lock operations:
+
+* `ldlm.lock` for each `lock_context()` / `try_lock_context()`, covering acquisition, the
+  body of the context and release
+* `ldlm.acquire` for each `lock()` / `try_lock()` call, including the time spent waiting
+* `ldlm.rpc.<Method>` for each RPC attempt, including retried attempts
+* `ldlm.renew` for each renew, including automatic renews
+* `ldlm.release` for each unlock
+
+Spans are tagged with `ldlm.lock.name`, `ldlm.lock.size` and outcome attributes such as
+`ldlm.lock.acquired` and `ldlm.rpc.code`. Use :py:class:`OpenTelemetryTracer` to export spans
+with OpenTelemetry, which is not a dependency of this package and must be installed
+separately. `ldlm.lock` and `ldlm.acquire` spans started without an enclosing ldlm span are
+children of the current OpenTelemetry span, so lock contention shows up on the critical path
+of the traced request.
+
+Examples:
+    >>> from ldlm import Client
+    >>> from ldlm.tracing import OpenTelemetryTracer
+    >>>
+    >>> client = Client("ldlm-server:3144", tracer=OpenTelemetryTracer())
+    >>> with client.lock_context("my_lock") as lock:
+    ...     pass
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+from typing import Any, Iterator, Optional
+
+# The innermost active ldlm span of the current thread or task
+_current_span: ContextVar[Optional[Span]] = ContextVar("ldlm_current_span",
+                                                       default=None)
+
+
+class Span:
+    """
+    A span started by a :py:class:`Tracer`. The default implementation does nothing.
+    """
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """
+        Sets an attribute of the span.
+
+        Args:
+            key (str): The attribute name.
+            value (Any): The attribute value. A str, bool, int or float.
+        """
+
+    def record_exception(self, exc: BaseException) -> None:
+        """
+        Records an exception raised during the span and marks the span as failed.
+
+        Args:
+            exc (BaseException): The exception.
+        """
+
+    def end(self) -> None:
+        """
+        Ends the span.
+        """
+
+
+class Tracer:  # pylint: disable=too-few-public-methods
+    """
+    Creates spans for an LDLM client. Subclass this to adapt a tracing library; the default
+    implementation creates spans which do nothing.
+    """
+
+    def start_span(  # pylint: disable=unused-argument
+            self, name: str, parent: Optional[Span],
+            attributes: dict[str, Any]) -> Span:
+        """
+        Starts a span.
+
+        Args:
+            name (str): The span name.
+            parent (Span, optional): The enclosing ldlm span, or None if there is none.
+            attributes (dict[str, Any]): Initial attributes of the span.
+
+        Returns:
+            Span: The started span.
+        """
+        return Span()
+
+
+def current_span() -> Optional[Span]:
+    """
+    Returns the innermost active ldlm span of the current thread or asyncio task.
+
+    Returns:
+        Span: The span, or None if there is none.
+    """
+    return _current_span.get()
+
+
+@contextmanager
+def start_as_current_span(tracer: Tracer, name: str,
+                          attributes: dict[str, Any]) -> Iterator[Span]:
+    """
+    Context manager which starts a span as a child of the current ldlm span, makes it the
+    current span while the context is active and ends it on exit. An exception raised in the
+    context is recorded on the span.
+
+    Args:
+        tracer (Tracer): The tracer to start the span with.
+        name (str): The span name.
+        attributes (dict[str, Any]): Initial attributes of the span.
+
+    Yields:
+        Span: The span.
+    """
+    parent = _current_span.get()
+    span = tracer.start_span(name, parent, attributes)
+    _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        # Restore rather than reset a token; generator based context managers may be closed
+        # from a different context than the one they were entered in.
+        _current_span.set(parent)
+        span.end()
+
+
+class RecordedSpan(Span):
+    """
+    A span recorded by :py:class:`RecordingTracer`.
+    """
+
+    def __init__(self, tracer: RecordingTracer, name: str,
+                 parent: Optional[RecordedSpan], attributes: dict[str, Any]):
+        self.name: str = name
+        """span name"""
+
+        self.parent: Optional[RecordedSpan] = parent
+        """parent span"""
+
+        self.attributes: dict[str, Any] = dict(attributes)
+        """span attributes"""
+
+        self.exception: Optional[BaseException] = None
+        """exception recorded on the span"""
+
+        self.start: float = time.perf_counter()
+        """time.perf_counter() value when the span started"""
+
+        self.end_time: Optional[float] = None
+        """time.perf_counter() value when the span ended"""
+
+        self._tracer = tracer
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.exception = exc
+
+    def end(self) -> None:
+        self.end_time = time.perf_counter()
+        self._tracer.record(self)
+
+    @property
+    def duration(self) -> Optional[float]:
+        """
+        The duration of the span in seconds, or None if it has not ended.
+        """
+        if self.end_time is None:
+            return None
+        return self.end_time - self.start
+
+
+class RecordingTracer(Tracer):
+    """
+    A tracer which keeps finished spans in memory. Useful in tests and for debugging.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.spans: list[RecordedSpan] = []
+        """finished spans in the order they ended"""
+
+    def start_span(self, name: str, parent: Optional[Span],
+                   attributes: dict[str, Any]) -> RecordedSpan:
+        return RecordedSpan(
+            self,
+            name,
+            parent if isinstance(parent, RecordedSpan) else None,
+            attributes,
+        )
+
+    def record(self, span: RecordedSpan) -> None:
+        """
+        Adds a finished span.
+
+        Args:
+            span (RecordedSpan): The span.
+        """
+        with self._lock:
+            self.spans.append(span)
+
+
+class _OpenTelemetrySpan(Span):
+    """
+    Adapts an OpenTelemetry span.
+    """
+
+    __slots__ = ("otel_span", "_status")
+
+    def __init__(self, otel_span: Any, status: Any):
+        self.otel_span = otel_span
+        self._status = status
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.otel_span.set_attribute(key, value)
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.otel_span.record_exception(exc)
+        self.otel_span.set_status(
+            self._status.Status(self._status.StatusCode.ERROR, repr(exc)))
+
+    def end(self) -> None:
+        self.otel_span.end()
+
+
+class OpenTelemetryTracer(Tracer):  # pylint: disable=too-few-public-methods
+    """
+    A tracer which creates OpenTelemetry spans. Requires the `opentelemetry-api` package.
+    """
+
+    def __init__(self, tracer: Any = None):
+        """
+        Args:
+            tracer (opentelemetry.trace.Tracer, optional): The OpenTelemetry tracer to use.
+                Defaults to the tracer named "ldlm" from the global tracer provider.
+
+        Raises:
+            ImportError: If OpenTelemetry is not installed.
+        """
+        # pylint: disable=import-outside-toplevel
+        from opentelemetry import trace
+
+        self._trace = trace
+        self._tracer = tracer if tracer is not None else trace.get_tracer(
+            "ldlm")
+
+    def start_span(self, name: str, parent: Optional[Span],
+                   attributes: dict[str, Any]) -> Span:
+        # Without an ldlm parent, the current OpenTelemetry context is the parent
+        context = None
+        if isinstance(parent, _OpenTelemetrySpan):
+            context = self._trace.set_span_in_context(parent.otel_span)
+        return _OpenTelemetrySpan(
+            self._tracer.start_span(name,
+                                    context=context,
+                                    attributes=attributes),
+            self._trace,
+        )
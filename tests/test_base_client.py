@@ -12,15 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+from datetime import timedelta
+import time
+
 from grpc import Channel, ChannelCredentials
 import pytest
 from unittest import mock
 
+from ldlm import AsyncClient, Client, exceptions
 from ldlm.base_client import (
     readfile,
     BaseClient,
+    ClientStub,
+    PreparedRenew,
     TLSConfig,
+    WAIT_DEADLINE_SLACK_SECONDS,
+    lock_timeout,
+    rpc_deadline,
+    set_lock_timeout,
+    wait_deadline,
 )
+from ldlm.protos import ldlm_pb2 as pb2
+from ldlm.protos import ldlm_pb2_grpc as pb2_grpc
+from ldlm.testing import LDLMServicer, Server
 
 
 class MockedClient(BaseClient):
@@ -49,7 +64,7 @@ class TestTLSConfig:
         """
         Don't make extra calls to the mocked channel that we want to assert calls for
         """
-        with mock.patch("ldlm.base_client.ldlm_grpc.LDLMStub"):
+        with mock.patch("ldlm.base_client.ClientStub"):
             yield
 
     @pytest.fixture
@@ -112,3 +127,342 @@ class TestTLSConfig:
         assert c._create_channel.mock_calls == [
             mock.call("ldlm-server:3144", mock_creds.return_value),
         ]
+
+
+class TestPreparedRenew:
+
+    def test_request(self):
+        prepared = PreparedRenew("mylock", "mykey", 30)
+        assert prepared.name == "mylock"
+        expected = pb2.RenewRequest(name="mylock",
+                                    key="mykey",
+                                    lock_timeout_seconds=30)
+        assert prepared.message() == expected
+        assert pb2.RenewRequest.FromString(prepared.request) == expected
+
+    def test_parse(self):
+        prepared = PreparedRenew("mylock", "mykey", 30)
+        renewed = pb2.LockResponse(name="mylock", key="mykey", locked=True)
+        with mock.patch.object(pb2.LockResponse, "FromString") as from_string:
+            r = prepared.parse(renewed.SerializeToString())
+        from_string.assert_not_called()
+        assert r.locked
+        assert not r.HasField("error")
+
+        failed = pb2.LockResponse(
+            name="mylock",
+            error=pb2.Error(code=pb2.ErrorCode.LockDoesNotExistOrInvalidKey))
+        assert prepared.parse(failed.SerializeToString()) == failed
+
+    def test_rpc_callable(self):
+        c = MockedClient("ldlm-server:3144")
+        prepared = PreparedRenew("mylock", "mykey", 30)
+        c._stub = ClientStub(mock.MagicMock())
+        method, request, parse = c._rpc_callable("Renew", prepared)
+        assert method is c._stub.RenewRaw
+        assert request is prepared.request
+        assert parse == prepared.parse
+
+        message = pb2.UnlockRequest(name="mylock", key="mykey")
+        assert c._rpc_callable("Unlock",
+                               message) == (c._stub.Unlock, message, None)
+
+        # Stubs which only accept messages
+        c._stub = mock.MagicMock()
+        method, request, parse = c._rpc_callable("Renew", prepared)
+        assert method is c._stub.Renew
+        assert request == prepared.message()
+        assert parse is None
+
+
+class TestTimeouts:
+
+    def test_whole_seconds(self):
+        """
+        Test that whole second timeouts are sent as before.
+        """
+        c = MockedClient("ldlm-server:3144", lock_timeout_seconds=30)
+        r = c._lock_request("mylock", timedelta(seconds=10), None, 0)
+        assert r == pb2.LockRequest(name="mylock",
+                                    wait_timeout_seconds=10,
+                                    lock_timeout_seconds=30)
+        assert wait_deadline(r) is None
+        assert rpc_deadline(r) is None
+        assert lock_timeout(r) == 30
+
+    @pytest.mark.parametrize("timeout,seconds,ms", [
+        (0.05, 1, 50),
+        (0.3, 1, 300),
+        (1.5, 2, 1500),
+        (0.0001, 1, 1),
+        (timedelta(milliseconds=500), 1, 500),
+    ])
+    def test_milliseconds(self, timeout, seconds, ms):
+        c = MockedClient("ldlm-server:3144")
+        r = c._lock_request("mylock", timeout, timeout, 0)
+        assert r == pb2.LockRequest(name="mylock",
+                                    wait_timeout_seconds=seconds,
+                                    wait_timeout_ms=ms,
+                                    lock_timeout_seconds=seconds,
+                                    lock_timeout_ms=ms)
+        assert lock_timeout(r) == ms / 1000
+        assert wait_deadline(r) == ms / 1000 + WAIT_DEADLINE_SLACK_SECONDS
+        assert rpc_deadline(r) == seconds + WAIT_DEADLINE_SLACK_SECONDS
+
+        r = pb2.RenewRequest(name="mylock", key="mykey")
+        set_lock_timeout(r, timeout)
+        assert r.lock_timeout_seconds == seconds
+        assert r.lock_timeout_ms == ms
+        assert PreparedRenew("mylock", "mykey", timeout).message() == r
+
+    @pytest.mark.parametrize("timeout,interval", [
+        (600, 570),
+        (40, 10),
+        (10, 10),
+        (5, 2.5),
+        (0.5, 0.25),
+    ])
+    def test_renew_interval(self, timeout, interval):
+        c = MockedClient("ldlm-server:3144")
+        assert c._renew_interval(timeout) == interval
+
+
+class TestPreparedRenewServer:
+
+    def test_auto_renew(self, server):
+        client = Client(server.address, retries=0)
+        client.min_renew_interval_seconds = 0.1
+        with client.lock_context("test_auto_renew", lock_timeout_seconds=1):
+            time.sleep(1.5)
+            assert not client.try_lock("test_auto_renew")
+
+        # A failed renew stops the timer
+        l = client.lock("test_auto_renew", lock_timeout_seconds=1)
+        server.table.unlock("test_auto_renew", l.key)
+        client._lock_timers["test_auto_renew", l.key].join(timeout=5)
+        with pytest.raises(exceptions.LockDoesNotExistOrInvalidKeyError):
+            client._renew_prepared(PreparedRenew(l.name, l.key, 1))
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_auto_renew_async(self, server):
+        client = AsyncClient(server.address, retries=0)
+        client.min_renew_interval_seconds = 0.1
+        async with client.lock_context("test_auto_renew_async",
+                                       lock_timeout_seconds=1):
+            await asyncio.sleep(1.5)
+            assert not await client.try_lock("test_auto_renew_async")
+        await client.close()
+
+
+class TestBatch:
+
+    @pytest.fixture
+    def client(self, server):
+        c = Client(server.address, retries=0)
+        yield c
+        c.close()
+
+    def test_lock_many(self, client):
+        other = client.lock("test_lock_many_c")
+        with mock.patch.object(client,
+                               "_rpc_with_retry",
+                               wraps=client._rpc_with_retry) as rpc:
+            locks = client.lock_many(
+                ["test_lock_many_a", "test_lock_many_b", "test_lock_many_c"] *
+                2,
+                wait_timeout_seconds=1)
+            assert [c.args[0] for c in rpc.mock_calls] == ["BatchLock"]
+        assert [l.name for l in locks] == [
+            "test_lock_many_a", "test_lock_many_b", "test_lock_many_c"
+        ]
+        assert [l.locked for l in locks] == [True, True, False]
+
+        client.unlock_many(locks[:2] + [other])
+        assert all(
+            client.try_lock_many(["test_lock_many_a", "test_lock_many_c"]))
+
+    def test_max_batch_size(self, client):
+        client.max_batch_size = 2
+        names = [f"test_max_batch_size_{i}" for i in range(5)]
+        with mock.patch.object(client,
+                               "_rpc_with_retry",
+                               wraps=client._rpc_with_retry) as rpc:
+            locks = client.try_lock_many(names)
+            client.unlock_many(locks)
+        assert [c.args[0] for c in rpc.mock_calls
+               ] == ["BatchTryLock"] * 3 + ["BatchUnlock"] * 3
+        assert [l.name for l in locks] == names
+        assert all(locks)
+
+    def test_acquire_error(self, client):
+        """
+        Test that locks acquired by a batch are released if a request fails.
+        """
+        client.try_lock("test_acquire_error_b", size=2)
+        with pytest.raises(exceptions.LockSizeMismatchError):
+            client.try_lock_many(
+                ["test_acquire_error_a", "test_acquire_error_b"])
+        assert client.try_lock("test_acquire_error_a")
+
+    def test_renew_many(self, client, server):
+        locks = client.lock_many(["test_renew_many_a", "test_renew_many_b"],
+                                 lock_timeout_seconds=60)
+        assert set(client._lock_timers) >= {(l.name, l.key) for l in locks}
+        server.table.unlock("test_renew_many_b", locks[1].key)
+
+        assert client.renew_many(locks, 60) == [locks[1]]
+        assert locks[0].locked
+        assert not locks[1].locked
+        assert ("test_renew_many_b", locks[1].key) not in client._lock_timers
+        client.unlock_many(locks[:1])
+
+    def test_unlock_many_error(self, client):
+        locks = client.try_lock_many(
+            ["test_unlock_many_error_a", "test_unlock_many_error_b"])
+        locks[0].unlock()
+        with pytest.raises(exceptions.NotLockedError):
+            client.unlock_many(locks)
+        assert client.try_lock("test_unlock_many_error_b")
+
+    def test_unimplemented(self):
+        """
+        Test that the client falls back to unary RPCs if the server does not implement the
+        batch RPCs.
+        """
+        base = pb2_grpc.LDLMServicer
+        with mock.patch.multiple(LDLMServicer,
+                                 BatchLock=base.BatchLock,
+                                 BatchTryLock=base.BatchTryLock,
+                                 BatchRenew=base.BatchRenew,
+                                 BatchUnlock=base.BatchUnlock):
+            with Server() as s:
+                client = Client(s.address, retries=0)
+                locks = client.try_lock_many(["a", "b"])
+                assert all(locks)
+                assert client.lock_many(["a", "c"], wait_timeout_seconds=1)[1]
+                assert client.renew_many(locks, 10) == []
+                client.unlock_many(locks)
+                assert client._unsupported_batch_rpcs == {
+                    "Lock", "TryLock", "Renew", "Unlock"
+                }
+                client.close()
+
+    @pytest.mark.asyncio
+    async def test_async(self, server):
+        client = AsyncClient(server.address, retries=0)
+        other = await client.lock("test_async_c")
+        locks = await client.lock_many(
+            ["test_async_a", "test_async_b", "test_async_c"],
+            wait_timeout_seconds=1,
+            lock_timeout_seconds=60)
+        assert [l.locked for l in locks] == [True, True, False]
+        assert await client.try_lock_many(["test_async_a"]) == [mock.ANY]
+        assert not (await client.try_lock_many(["test_async_a"]))[0]
+
+        server.table.unlock("test_async_b", locks[1].key)
+        assert await client.renew_many(locks[:2], 60) == [locks[1]]
+        assert ("test_async_b", locks[1].key) not in client._lock_timers
+
+        await client.unlock_many([locks[0], other])
+        assert all(await client.try_lock_many(["test_async_a", "test_async_c"]))
+        await client.close()
+
+    @pytest.mark.asyncio
+    async def test_async_unimplemented(self):
+        base = pb2_grpc.LDLMServicer
+        with mock.patch.multiple(LDLMServicer,
+                                 BatchLock=base.BatchLock,
+                                 BatchTryLock=base.BatchTryLock,
+                                 BatchRenew=base.BatchRenew,
+                                 BatchUnlock=base.BatchUnlock):
+            with Server() as s:
+                client = AsyncClient(s.address, retries=0)
+                locks = await client.lock_many(["a", "b"])
+                assert all(locks)
+                assert await client.renew_many(locks, 10) == []
+                await client.unlock_many(locks)
+                assert all(await client.try_lock_many(["a", "b"]))
+                assert client._unsupported_batch_rpcs == {
+                    "Lock", "TryLock", "Renew", "Unlock"
+                }
+                await client.close()
+
+
+class TestLease:
+
+    @pytest.fixture
+    def client(self, server):
+        c = Client(server.address, retries=0, lease_timeout_seconds=1)
+        c.min_renew_interval_seconds = 0.2
+        yield c
+        c.close()
+
+    def test_lease(self, client, server):
+        with mock.patch.object(client,
+                               "_rpc_with_retry",
+                               wraps=client._rpc_with_retry) as rpc:
+            locks = [
+                client.lock("test_lease_a", lock_timeout_seconds=1),
+                client.try_lock("test_lease_b", lock_timeout_seconds=1),
+            ] + client.try_lock_many(["test_lease_c", "test_lease_d"])
+            assert all(locks)
+            assert not client._lock_timers
+            time.sleep(1.5)
+            methods = [c.args[0] for c in rpc.mock_calls]
+
+        assert methods[:4] == ["GrantLease", "Lock", "TryLock", "BatchTryLock"]
+        assert set(methods[4:]) == {"KeepAlive"}
+        assert not server.table.try_lock("test_lease_a", 1, 0).locked
+
+        # Closing the client revokes its lease
+        locks[0].unlock()
+        client.close()
+        for name in ("test_lease_a", "test_lease_b", "test_lease_c"):
+            assert server.table.try_lock(name, 1, 0).locked
+
+    def test_lease_lost(self, client, server):
+        assert client.try_lock("test_lease_lost_a")
+        lease_id = client._lease_id
+        server.table.revoke_lease(lease_id)
+        client._lease_keeper.join(timeout=5)
+
+        assert client.try_lock("test_lease_lost_b")
+        assert client._lease_id != lease_id
+        assert client._lease_keeper.is_alive()
+
+    def test_unimplemented(self):
+        """
+        Test that the client renews each lock if the server does not implement leases.
+        """
+        with mock.patch.object(LDLMServicer, "GrantLease",
+                               pb2_grpc.LDLMServicer.GrantLease):
+            with Server() as s:
+                client = Client(s.address, retries=0, lease_timeout_seconds=10)
+                l = client.lock("test_unimplemented", lock_timeout_seconds=60)
+                assert l.locked
+                assert ("test_unimplemented", l.key) in client._lock_timers
+                assert not client._lease_timeout_seconds
+                l.unlock()
+                client.close()
+
+    @pytest.mark.asyncio
+    async def test_async(self, server):
+        client = AsyncClient(server.address, retries=0, lease_timeout_seconds=1)
+        client.min_renew_interval_seconds = 0.2
+        locks = await asyncio.gather(
+            client.lock("test_lease_async_a", lock_timeout_seconds=1),
+            client.try_lock("test_lease_async_b", lock_timeout_seconds=1))
+        assert all(locks)
+        assert not client._lock_timers
+        await asyncio.sleep(1.5)
+        assert not server.table.try_lock("test_lease_async_a", 1, 0).locked
+
+        lease_id = client._lease_id
+        server.table.revoke_lease(lease_id)
+        await asyncio.wait_for(client._lease_keeper, 5)
+        assert await client.lock_many(["test_lease_async_a"])
+        assert client._lease_id != lease_id
+
+        await client.close()
+        assert server.table.try_lock("test_lease_async_a", 1, 0).locked
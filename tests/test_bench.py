@@ -0,0 +1,75 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import json
+
+import pytest
+
+from ldlm import bench
+from ldlm.bench import BenchConfig
+
+
+class TestBench:
+
+    @pytest.mark.parametrize("mode", ["threads", "asyncio"])
+    def test_run(self, server, mode):
+        out = io.StringIO()
+        report = bench.run(
+            BenchConfig(address=server.address,
+                        mode=mode,
+                        concurrency=4,
+                        duration_seconds=0.5,
+                        interval_seconds=0.2,
+                        keys=3,
+                        distribution="zipf",
+                        hold_ms=1,
+                        hold_distribution="exponential",
+                        try_lock_ratio=0.5,
+                        key_prefix=f"test_run_{mode}_",
+                        seed=1),
+            out=out,
+        )
+        assert report["acquired"] > 0
+        assert not report["errors"]
+        assert report["acquire_latency"]["count"] == (report["acquired"] +
+                                                      report["not_acquired"])
+        assert report["release_latency"]["count"] == report["acquired"]
+        assert "ops/s" in out.getvalue()
+        assert server.table.try_lock(f"test_run_{mode}_0", 1, 0).locked
+
+    def test_errors_are_counted(self):
+        report = bench.run(BenchConfig(address="localhost:1",
+                                       concurrency=2,
+                                       duration_seconds=0.3,
+                                       interval_seconds=0),
+                           out=None)
+        assert report["acquired"] == 0
+        assert sum(report["errors"].values()) > 0
+
+    def test_invalid_config(self):
+        with pytest.raises(ValueError):
+            bench.run(BenchConfig(distribution="pareto"), out=None)
+
+    def test_main(self, server, tmp_path):
+        output = tmp_path / "report.json"
+        bench.main([
+            "--address", server.address, "--duration", "0.3", "--interval", "0",
+            "--key-prefix", "test_main_", "--password", "secret", "--output",
+            str(output)
+        ])
+        report = json.loads(output.read_text())
+        assert report["acquired"] > 0
+        assert report["config"]["key_prefix"] == "test_main_"
+        assert "password" not in report["config"]
@@ -14,14 +14,19 @@
 
 import pytest
 from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
 import time
 import uuid
 
+import grpc
 from grpc._channel import _InactiveRpcError
 from frozendict import frozendict
 
 from ldlm import Client, TLSConfig, exceptions
 from ldlm.client import Lock
+from ldlm.metrics import InMemoryMetrics
 from ldlm.protos import ldlm_pb2 as pb2
 
 
@@ -500,6 +505,151 @@ class TestRenew:
         ] * times
 
 
+class FakeFuture:
+    """
+    Minimal stand-in for a completed grpc.Future
+    """
+
+    def __init__(self, result=None, error=None):
+        self._result = result
+        self._error = error
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    def add_done_callback(self, fn):
+        fn(self)
+
+
+class TestTryLockAny:
+
+    @pytest.fixture
+    def free(self):
+        """
+        Fixture which returns the set of lock names the mocked server will grant.
+        """
+        return set()
+
+    @pytest.fixture
+    def client(self, free):
+        client = MockedClient(address="ldlm-server:3144")
+        client._stub.TryLock = mock.MagicMock(
+            side_effect=lambda req, metadata: pb2.LockResponse(
+                locked=req.name in free,
+                name=req.name,
+                key=f"{req.name}-key",
+            ))
+        client._stub.Unlock.future = mock.MagicMock(
+            side_effect=lambda req, metadata: FakeFuture(
+                pb2.UnlockResponse(unlocked=True, name=req.name)))
+        return client
+
+    def test_acquires_k(self, client, free):
+        """
+        Test that try_lock_any() returns the first k free locks and stops issuing requests.
+        """
+        free.update({"b", "d", "e", "f"})
+        locks = client.try_lock_any(["a", "b", "c", "d", "e", "f"],
+                                    k=2,
+                                    max_concurrency=1)
+
+        assert [l.name for l in locks] == ["b", "d"]
+        assert all(l.locked for l in locks)
+        assert [c.args[0].name for c in client._stub.TryLock.mock_calls
+               ] == ["a", "b", "c", "d"]
+        assert client._stub.Unlock.future.mock_calls == []
+
+    def test_releases_extras(self, client, free):
+        """
+        Test that locks acquired by outstanding requests after k locks are held are released.
+        """
+        free.update({"a", "b", "c"})
+        locks = client.try_lock_any(["a", "b", "c", "d"],
+                                    k=1,
+                                    max_concurrency=3)
+
+        # The attempts complete in any order
+        assert len(locks) == 1 and locks[0].name in free
+        assert sorted(
+            c.args[0].name for c in client._stub.Unlock.future.mock_calls
+        ) == sorted(free - {locks[0].name})
+
+    def test_not_enough_free(self, client, free):
+        """
+        Test that fewer than k locks are returned if there are not enough free locks.
+        """
+        free.add("c")
+        locks = client.try_lock_any(["a", "b", "c"], k=2)
+        assert [l.name for l in locks] == ["c"]
+
+    def test_auto_renew(self, client, free):
+        """
+        Test that renew timers are started for returned locks only.
+        """
+        free.update({"a", "b"})
+        with mock.patch.object(client, "_start_renew") as sr_mock:
+            locks = client.try_lock_any(["a", "b"],
+                                        k=1,
+                                        lock_timeout_seconds=30,
+                                        max_concurrency=2)
+
+        assert sr_mock.mock_calls == [mock.call(locks[0], 30)]
+        assert mock.call(
+            pb2.TryLockRequest(name=locks[0].name, lock_timeout_seconds=30),
+            metadata=None,
+        ) in client._stub.TryLock.mock_calls
+
+    def test_error_releases_all(self, client, free):
+        """
+        Test that an error response releases every acquired lock before being raised.
+        """
+        free.update({"a", "b"})
+        client._stub.TryLock.side_effect = [
+            pb2.LockResponse(locked=True, name="a", key="a-key"),
+            pb2.LockResponse(error=pb2.Error(
+                code=pb2.ErrorCode.LockSizeMismatch)),
+        ]
+
+        with pytest.raises(exceptions.LockSizeMismatchError):
+            client.try_lock_any(["a", "b", "c"], k=3, max_concurrency=1)
+
+        assert client._stub.Unlock.future.mock_calls == [
+            mock.call(pb2.UnlockRequest(name="a", key="a-key"), metadata=None),
+        ]
+
+    def test_retries_and_metrics(self, client):
+        """
+        Test that TryLock RPCs are retried and recorded like those of try_lock().
+        """
+
+        class Unavailable(_InactiveRpcError):
+
+            def __init__(self):
+                pass
+
+            def _repr(self) -> str:
+                return "Unavailable"
+
+            def code(self):
+                return grpc.StatusCode.UNAVAILABLE
+
+        client._stub.TryLock.side_effect = [
+            Unavailable(),
+            pb2.LockResponse(locked=True, name="a", key="a-key"),
+        ]
+        client._retry_delay_seconds = 0
+        client._metrics = InMemoryMetrics()
+
+        locks = client.try_lock_any(["a"])
+        assert [l.name for l in locks] == ["a"]
+        assert len(client._stub.TryLock.mock_calls) == 2
+        snapshot = client._metrics.snapshot()
+        assert snapshot["rpc_retries"] == {"TryLock": 1}
+        assert snapshot["rpc_codes"]["TryLock"]["OK"] == 1
+
+
 class TestUnlock:
 
     @pytest.mark.parametrize(
@@ -532,9 +682,28 @@ class TestUnlock:
         """
         l = client.lock("mylock", lock_timeout_seconds=40)
 
-        assert "mylock" in client._lock_timers
+        assert ("mylock", l.key) in client._lock_timers
         client.unlock("mylock", l.key)
-        assert "mylock" not in client._lock_timers
+        assert ("mylock", l.key) not in client._lock_timers
+
+    def test_renew_timers_per_holder(self, client):
+        """
+        Test that each holder of a lock of size > 1 gets its own renew timer, and unlocking one
+        leaves the other's timer running.
+        """
+        l1 = client.lock("mylock", size=2, lock_timeout_seconds=40)
+        l2 = client.lock("mylock", size=2, lock_timeout_seconds=40)
+
+        t1 = client._lock_timers["mylock", l1.key]
+        t2 = client._lock_timers["mylock", l2.key]
+        assert t1 is not t2
+        l1.unlock()
+        t1.join(timeout=5)
+        assert not t1.is_alive()
+        assert client._lock_timers == {("mylock", l2.key): t2}
+        assert t2.is_alive()
+        l2.unlock()
+        assert client._lock_timers == {}
 
 
 class TestRpcWithRetry:
@@ -634,7 +803,7 @@ class TestCreateChannel:
         """
         Don't make extra calls to the mocked channel that we want to assert calls for
         """
-        with mock.patch("ldlm.base_client.ldlm_grpc.LDLMStub"):
+        with mock.patch("ldlm.base_client.ClientStub"):
             yield
 
     @pytest.fixture
@@ -672,6 +841,122 @@ class TestCreateChannel:
         ]
 
 
+class FakeServerStub:
+    """
+    Thread-safe in-memory stand-in for the LDLM server stub. Only size 1 locks are supported.
+    """
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.locks = {}
+        self.renews = 0
+
+    def Lock(self, req, metadata=None):
+        with self.cond:
+            self.cond.wait_for(lambda: req.name not in self.locks)
+            key = str(uuid.uuid4())
+            self.locks[req.name] = key
+            return pb2.LockResponse(locked=True, name=req.name, key=key)
+
+    def Renew(self, req, metadata=None):
+        with self.cond:
+            self.renews += 1
+            if self.locks.get(req.name) != req.key:
+                return pb2.LockResponse(
+                    name=req.name,
+                    error=pb2.Error(
+                        code=pb2.ErrorCode.LockDoesNotExistOrInvalidKey))
+            return pb2.LockResponse(locked=True, name=req.name, key=req.key)
+
+    def Unlock(self, req, metadata=None):
+        with self.cond:
+            if self.locks.get(req.name) != req.key:
+                return pb2.UnlockResponse(
+                    name=req.name,
+                    error=pb2.Error(code=pb2.ErrorCode.InvalidLockKey))
+            del self.locks[req.name]
+            self.cond.notify_all()
+            return pb2.UnlockResponse(unlocked=True, name=req.name)
+
+
+class TestThreadSafety:
+
+    def test_shared_client_stress(self):
+        """
+        Test a single client shared by many threads locking, renewing and unlocking a small set
+        of lock names concurrently.
+        """
+        client = Client("ldlm-server:3144")
+        client._stub = FakeServerStub()
+        client.min_renew_interval_seconds = 0.001
+
+        holders = {f"lock{i}": 0 for i in range(8)}
+        violations = []
+
+        def work(n):
+            name = f"lock{n % len(holders)}"
+            for _ in range(20):
+                with client.lock_context(name, lock_timeout_seconds=10) as l:
+                    assert l.locked
+                    holders[name] += 1
+                    if holders[name] != 1:  # pragma: no cover
+                        violations.append(name)
+                    time.sleep(0.002)
+                    holders[name] -= 1
+
+        with ThreadPoolExecutor(max_workers=64) as pool:
+            list(pool.map(work, range(64)))
+
+        assert violations == []
+        assert client._stub.locks == {}
+        assert client._stub.renews > 0
+        assert client._lock_timers == {}
+        client.close()
+
+    def test_replace_stopped_timer(self, client):
+        """
+        Test that a renew timer which stopped because renewing failed does not prevent the lock
+        from being renewed after it is acquired again.
+        """
+        client.min_renew_interval_seconds = 0.001
+        client._stub.Renew.side_effect = exceptions.LockDoesNotExistOrInvalidKeyError(
+            "")
+
+        l = client.lock("mylock", lock_timeout_seconds=10)
+        client._lock_timers["mylock", l.key].join(timeout=5)
+        assert not client._lock_timers["mylock", l.key].is_alive()
+
+        client._stub.Renew.side_effect = client.get_renew_lock_response
+        l = client.lock("mylock", lock_timeout_seconds=10)
+        assert client._lock_timers["mylock", l.key].is_alive()
+        l.unlock()
+
+
+class TestLogging:
+
+    def test_structured_events(self, client, caplog):
+        caplog.set_level(logging.DEBUG, logger="ldlm")
+        client.lock("mylock").unlock()
+
+        events = [(r.ldlm_event, r.ldlm_lock_name) for r in caplog.records]
+        assert events == [
+            ("lock.wait", "mylock"),
+            ("lock.response", "mylock"),
+            ("unlock", "mylock"),
+            ("unlock.response", "mylock"),
+        ]
+        assert caplog.records[1].ldlm_locked is True
+        assert caplog.records[1].getMessage() == (
+            "Lock response from server for `mylock`: locked=True")
+
+    def test_disabled_logging_does_not_format(self, client, caplog):
+        caplog.set_level(logging.WARNING, logger="ldlm")
+        with mock.patch("ldlm.client.log_extra") as log_extra:
+            client.try_lock("mylock").unlock()
+        log_extra.assert_not_called()
+        assert not caplog.records
+
+
 class TestClose:
 
     def test_close(self):
@@ -16,14 +16,16 @@ import pytest
 from unittest import mock
 import asyncio
 import contextlib
+import threading
 import uuid
 
 from grpc._channel import _InactiveRpcError
 from frozendict import frozendict
 
-from ldlm import AsyncClient, TLSConfig
+from ldlm import AsyncClient, TLSConfig, exceptions
 from ldlm.protos import ldlm_pb2 as pb2
 from ldlm.client_aio import AsyncLock
+from ldlm.testing import AsyncServer
 
 
 class aclosing(contextlib.AbstractAsyncContextManager):
@@ -540,6 +542,113 @@ class TestRenew:
                 )] * times)
 
 
+@pytest.mark.asyncio
+class TestTryLockAny:
+
+    @pytest.fixture
+    def free(self):
+        """
+        Fixture which returns the set of lock names the mocked server will grant.
+        """
+        return set()
+
+    @pytest.fixture
+    def client(self, free):
+        client = MockedAsyncClient(address="ldlm-server:3144")
+        client._stub.TryLock = mock.AsyncMock(
+            side_effect=lambda req, metadata: pb2.LockResponse(
+                locked=req.name in free,
+                name=req.name,
+                key=f"{req.name}-key",
+            ))
+        return client
+
+    async def test_acquires_k(self, client, free):
+        """
+        Test that try_lock_any() returns k free locks and stops issuing requests.
+        """
+        free.update({"b", "d", "e", "f"})
+        locks = await client.try_lock_any(["a", "b", "c", "d", "e", "f"],
+                                          k=2,
+                                          max_concurrency=1)
+
+        assert [l.name for l in locks] == ["b", "d"]
+        assert [c.args[0].name for c in client._stub.TryLock.mock_calls
+               ] == ["a", "b", "c", "d"]
+        assert client._stub.Unlock.mock_calls == []
+
+    async def test_releases_extras(self, client, free):
+        """
+        Test that locks acquired by outstanding requests after k locks are held are released.
+        """
+        free.update({"a", "b", "c"})
+        locks = await client.try_lock_any(["a", "b", "c", "d"],
+                                          k=1,
+                                          max_concurrency=3)
+
+        assert len(locks) == 1
+        assert sorted(
+            c.args[0].name
+            for c in client._stub.Unlock.mock_calls) == sorted({"a", "b", "c"} -
+                                                               {locks[0].name})
+
+    async def test_not_enough_free(self, client, free):
+        """
+        Test that fewer than k locks are returned if there are not enough free locks.
+        """
+        free.add("c")
+        locks = await client.try_lock_any(["a", "b", "c"], k=2)
+        assert [l.name for l in locks] == ["c"]
+
+    async def test_error_releases_all(self, client, free):
+        """
+        Test that an error response releases every acquired lock before being raised.
+        """
+        client._stub.TryLock.side_effect = [
+            pb2.LockResponse(locked=True, name="a", key="a-key"),
+            pb2.LockResponse(error=pb2.Error(
+                code=pb2.ErrorCode.LockSizeMismatch)),
+        ]
+
+        with pytest.raises(exceptions.LockSizeMismatchError):
+            await client.try_lock_any(["a", "b"], k=2, max_concurrency=1)
+
+        assert client._stub.Unlock.mock_calls == [
+            mock.call(pb2.UnlockRequest(name="a", key="a-key"), metadata=None),
+        ]
+
+    async def test_cancelled_releases_acquired(self, client, free):
+        """
+        Test that cancelling try_lock_any() releases the locks acquired so far and cancels the
+        requests which are outstanding.
+        """
+        outstanding = asyncio.get_running_loop().create_future()
+
+        async def granted(req):
+            return pb2.LockResponse(locked=True,
+                                    name=req.name,
+                                    key=f"{req.name}-key")
+
+        client._stub.TryLock = mock.Mock(
+            side_effect=lambda req, metadata=None: outstanding
+            if req.name == "c" else granted(req))
+
+        task = asyncio.create_task(client.try_lock_any(["a", "b", "c"], k=3))
+        while len(client._held) < 2:
+            await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert outstanding.cancelled()
+        assert sorted(
+            c.args[0].name for c in client._stub.Unlock.mock_calls) == [
+                "a", "b"
+            ]
+        assert not client._held
+
+
 @pytest.mark.asyncio
 class TestUnlock:
 
@@ -573,9 +682,399 @@ class TestUnlock:
         """
         l = await client.lock("mylock", lock_timeout_seconds=40)
 
-        assert "mylock" in client._lock_timers
+        assert ("mylock", l.key) in client._lock_timers
         await client.unlock("mylock", l.key)
-        assert "mylock" not in client._lock_timers
+        assert ("mylock", l.key) not in client._lock_timers
+
+    async def test_renew_timers_per_holder(self, client):
+        """
+        Test that each holder of a lock of size > 1 gets its own renew timer, and unlocking one
+        leaves the other's timer running.
+        """
+        l1 = await client.lock("mylock", size=2, lock_timeout_seconds=40)
+        l2 = await client.lock("mylock", size=2, lock_timeout_seconds=40)
+
+        t1 = client._lock_timers["mylock", l1.key]
+        t2 = client._lock_timers["mylock", l2.key]
+        assert t1 is not t2
+        await l1.unlock()
+        await asyncio.sleep(0)
+        assert not t1.is_alive()
+        assert client._lock_timers == {("mylock", l2.key): t2}
+        assert t2.is_alive()
+        await l2.unlock()
+        assert client._lock_timers == {}
+
+    async def test_replace_stopped_timer(self, client):
+        """
+        Test that a renew timer which stopped because renewing failed does not prevent the lock
+        from being renewed after it is acquired again with the same key.
+        """
+        client.lock_response = pb2.LockResponse(locked=True,
+                                                name="mylock",
+                                                key="k")
+        l = await client.lock("mylock", lock_timeout_seconds=40)
+        timer = client._lock_timers["mylock", l.key]
+        timer.task.cancel()
+        await asyncio.sleep(0)
+        assert not timer.is_alive()
+
+        await client.lock("mylock", lock_timeout_seconds=40)
+        assert client._lock_timers["mylock", "k"] is not timer
+        assert client._lock_timers["mylock", "k"].is_alive()
+        await l.unlock()
+
+
+@pytest.mark.asyncio
+class TestAcquireAsAvailable:
+
+    @pytest.fixture
+    def releases(self):
+        """
+        Fixture which returns a dict of lock name -> asyncio.Event. Lock RPCs for these names
+        block until the event is set.
+        """
+        return {}
+
+    @pytest.fixture
+    def client(self, releases):
+        client = MockedAsyncClient(address="ldlm-server:3144")
+
+        async def lock(req, metadata=None):
+            if req.name in releases:
+                await releases[req.name].wait()
+            return pb2.LockResponse(locked=True,
+                                    name=req.name,
+                                    key=f"{req.name}-key")
+
+        client._stub.Lock = mock.AsyncMock(side_effect=lock)
+        return client
+
+    async def test_yields_as_acquired(self, client, releases):
+        """
+        Test that locks are yielded in the order in which they are acquired.
+        """
+        releases.update(a=asyncio.Event(), b=asyncio.Event())
+
+        got = []
+        async with aclosing(client.acquire_as_available(["a", "b",
+                                                         "c"])) as locks:
+            async for l in locks:
+                got.append(l.name)
+                if l.name == "c":
+                    releases["b"].set()
+                elif l.name == "b":
+                    releases["a"].set()
+
+        assert got == ["c", "b", "a"]
+        assert client._stub.Unlock.mock_calls == []
+
+    async def test_limit_cancels_remaining(self, client, releases):
+        """
+        Test that reaching the limit cancels the requests of the remaining locks.
+        """
+        releases.update(a=asyncio.Event(), b=asyncio.Event())
+
+        async with aclosing(
+                client.acquire_as_available(["a", "b", "c"], limit=1)) as locks:
+            got = [l.name async for l in locks]
+        assert got == ["c"]
+
+        releases["a"].set()
+        releases["b"].set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert client._stub.Unlock.mock_calls == []
+        assert not client._background_tasks
+
+    async def test_consumer_stops(self, client):
+        """
+        Test that locks acquired but not yielded are released when the consumer stops iterating.
+        """
+        async with aclosing(client.acquire_as_available(["a", "b",
+                                                         "c"])) as locks:
+            async for l in locks:
+                break
+
+        assert sorted(
+            c.args[0].name
+            for c in client._stub.Unlock.mock_calls) == sorted({"a", "b", "c"} -
+                                                               {l.name})
+
+    async def test_limit_server(self):
+        """
+        Test that no requests stay queued on a real server once the limit is reached.
+        """
+        names = [f"test_acquire_as_available_{i}" for i in range(10)]
+        async with AsyncServer() as server:
+            client = AsyncClient(server.address, retries=0)
+            held = [await client.lock(name) for name in names[1:]]
+
+            async with aclosing(client.acquire_as_available(names,
+                                                            limit=1)) as locks:
+                got = [l.name async for l in locks]
+            assert got == names[:1]
+
+            for _ in range(100):
+                if not any(server.table._locks[n].waiters for n in names):
+                    break
+                await asyncio.sleep(0.01)
+            assert not any(server.table._locks[n].waiters for n in names)
+
+            # Releasing the held locks does not grant them to abandoned requests
+            for l in held:
+                await l.unlock()
+            assert not any(server.table._locks[n].holders for n in names[1:])
+            await client.close()
+
+    async def test_wait_timeouts_skipped(self, client):
+        """
+        Test that locks which could not be acquired are not yielded.
+        """
+        client._stub.Lock = mock.AsyncMock(
+            side_effect=lambda req, metadata: pb2.LockResponse(
+                locked=req.name == "b",
+                name=req.name,
+                key="foo",
+            ))
+
+        got = [
+            l.name
+            async for l in client.acquire_as_available(["a", "b", "c"],
+                                                       wait_timeout_seconds=1)
+        ]
+        assert got == ["b"]
+
+
+@pytest.mark.asyncio
+class TestCancellation:
+
+    @pytest.fixture
+    def rpc_started(self):
+        return asyncio.Event()
+
+    @pytest.fixture
+    def grant(self):
+        return asyncio.Event()
+
+    @pytest.fixture
+    def late_grant(self, rpc_started, grant):
+        """
+        Fixture which returns an RPC side effect that blocks until `grant` is set, then returns
+        a granted lock. Like a real gRPC call, it raises CancelledError if it is cancelled.
+        """
+
+        async def rpc(req, metadata=None):
+            rpc_started.set()
+            await grant.wait()
+            return pb2.LockResponse(locked=True, name=req.name, key="late")
+
+        return rpc
+
+    @staticmethod
+    async def started(stub_method):
+        """
+        Returns the future standing in for the gRPC call of a stub method once it is called.
+        """
+        while not stub_method.called:
+            await asyncio.sleep(0)
+        return stub_method.return_value
+
+    async def test_lock_cancelled_cancels_rpc(self, client):
+        """
+        Test that the Lock RPC of a task awaiting lock() is cancelled with the task.
+        """
+        client._stub.Lock = mock.Mock(
+            return_value=asyncio.get_running_loop().create_future())
+
+        task = asyncio.create_task(client.lock("mylock"))
+        call = await self.started(client._stub.Lock)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert call.cancelled()
+
+        for _ in range(5):
+            await asyncio.sleep(0)
+        assert client._stub.Unlock.mock_calls == []
+        assert not client._background_tasks
+
+    async def test_lock_cancelled_releases_late_grant(self, client):
+        """
+        Test that a lock granted as the task awaiting lock() is cancelled is released.
+        """
+        client._stub.Lock = mock.Mock(
+            return_value=asyncio.get_running_loop().create_future())
+
+        task = asyncio.create_task(client.lock("mylock"))
+        call = await self.started(client._stub.Lock)
+        call.set_result(pb2.LockResponse(locked=True, name="mylock",
+                                         key="late"))
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # Let the background release run
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        assert client._stub.Unlock.mock_calls == [
+            mock.call(pb2.UnlockRequest(name="mylock", key="late"),
+                      metadata=None),
+        ]
+        assert not client._held
+        assert not client._background_tasks
+
+    async def test_try_lock_cancelled_releases_grant(self, client):
+        """
+        Test that a lock granted as the task awaiting try_lock() is cancelled is released.
+        """
+        client._stub.TryLock = mock.Mock(
+            return_value=asyncio.get_running_loop().create_future())
+
+        task = asyncio.create_task(client.try_lock("mylock"))
+        call = await self.started(client._stub.TryLock)
+        call.set_result(pb2.LockResponse(locked=True, name="mylock",
+                                         key="late"))
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        assert client._stub.Unlock.mock_calls == [
+            mock.call(pb2.UnlockRequest(name="mylock", key="late"),
+                      metadata=None),
+        ]
+
+    async def test_lock_cancelled_not_granted(self, client, rpc_started):
+        """
+        Test that nothing is released when a cancelled Lock RPC was never granted.
+        """
+
+        timed_out = asyncio.Event()
+
+        async def lock(req, metadata=None):
+            rpc_started.set()
+            await timed_out.wait()
+            return pb2.LockResponse(locked=False, name=req.name)
+
+        client._stub.Lock = mock.AsyncMock(side_effect=lock)
+
+        task = asyncio.create_task(client.lock("mylock"))
+        await rpc_started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        timed_out.set()
+        for _ in range(3):
+            await asyncio.sleep(0)
+
+        assert client._stub.Unlock.mock_calls == []
+
+    async def test_lock_context_cancelled_during_acquire(self, client):
+        """
+        Test that cancelling a task while lock_context() is acquiring the lock does not leak it.
+        """
+        client._stub.Lock = mock.Mock(
+            return_value=asyncio.get_running_loop().create_future())
+
+        async def worker():
+            async with client.lock_context("mylock"):
+                pass  # pragma: no cover
+
+        task = asyncio.create_task(worker())
+        call = await self.started(client._stub.Lock)
+        call.set_result(pb2.LockResponse(locked=True, name="mylock",
+                                         key="late"))
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        assert client._stub.Unlock.mock_calls == [
+            mock.call(pb2.UnlockRequest(name="mylock", key="late"),
+                      metadata=None),
+        ]
+
+    async def test_lock_many_cancelled_releases_late_grants(
+            self, client, late_grant, rpc_started, grant):
+        """
+        Test that locks granted after the task awaiting lock_many() is cancelled are released.
+        """
+        client._stub.Lock = mock.AsyncMock(side_effect=late_grant)
+
+        task = asyncio.create_task(client.lock_many(["a", "b"]))
+        await rpc_started.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        grant.set()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert not client._background_tasks
+
+        assert sorted(
+            c.args[0].name for c in client._stub.Unlock.mock_calls) == [
+                "a", "b"
+            ]
+
+    @pytest.mark.parametrize("cancel", ["task", "timeout"])
+    async def test_lock_cancelled_server(self, cancel):
+        """
+        Test that a Lock RPC whose caller was cancelled does not stay queued on a real server.
+        """
+        async with AsyncServer() as server:
+            holder = AsyncClient(server.address, retries=0)
+            waiter = AsyncClient(server.address)
+            l = await holder.lock("test_lock_cancelled_server")
+            state = server.table._locks["test_lock_cancelled_server"]
+
+            for _ in range(20):
+                if cancel == "timeout":
+                    with pytest.raises(asyncio.TimeoutError):
+                        await asyncio.wait_for(
+                            waiter.lock("test_lock_cancelled_server"), 0.05)
+                    continue
+                task = asyncio.create_task(
+                    waiter.lock("test_lock_cancelled_server"))
+                while not state.waiters:
+                    await asyncio.sleep(0.01)
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+            for _ in range(100):
+                if not state.waiters:
+                    break
+                await asyncio.sleep(0.01)
+            assert not state.waiters
+
+            await l.unlock()
+            r = server.table.try_lock("test_lock_cancelled_server", 1, 0)
+            assert r.locked
+            await holder.close()
+            await waiter.close()
+
+    async def test_lock_context_cancelled_while_held(self, client):
+        """
+        Test that cancelling a task inside a lock_context() body releases the lock.
+        """
+        entered = asyncio.Event()
+
+        async def worker():
+            async with client.lock_context("mylock") as l:
+                entered.set()
+                await asyncio.Event().wait()
+
+        task = asyncio.create_task(worker())
+        await entered.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert len(client._stub.Unlock.mock_calls) == 1
 
 
 @pytest.mark.asyncio
@@ -674,7 +1173,7 @@ class TestCreateChannel:
         """
         Don't make extra calls to the mocked channel that we want to assert calls for
         """
-        with mock.patch("ldlm.base_client.ldlm_grpc.LDLMStub"):
+        with mock.patch("ldlm.client_aio.ClientStub"):
             yield
 
     @pytest.fixture
@@ -692,19 +1191,28 @@ class TestCreateChannel:
         with mock.patch("ldlm.client.grpc.aio.insecure_channel") as m:
             yield m
 
-    def test_with_ssl_config(self, mock_secure_chan, mock_insecure_chan,
-                             mock_creds):
+    @pytest.mark.asyncio
+    async def test_with_ssl_config(self, mock_secure_chan, mock_insecure_chan,
+                                   mock_creds):
         tls = TLSConfig()
-        c = MockedAsyncClient("ldlm-server:3144", tls=tls)
+        c = AsyncClient("ldlm-server:3144", tls=tls)
+
+        # Channels are created on first use
+        assert mock_secure_chan.mock_calls == []
+        c._loop_channel()
 
         assert mock_secure_chan.mock_calls == [
             mock.call("ldlm-server:3144", mock_creds.return_value),
         ]
         assert mock_insecure_chan.mock_calls == []
 
-    def test_no_ssl_config(self, mock_secure_chan, mock_insecure_chan,
-                           mock_creds):
-        c = MockedAsyncClient("ldlm-server:3144", tls=None)
+    @pytest.mark.asyncio
+    async def test_no_ssl_config(self, mock_secure_chan, mock_insecure_chan,
+                                 mock_creds):
+        c = AsyncClient("ldlm-server:3144", tls=None)
+
+        assert mock_insecure_chan.mock_calls == []
+        c._loop_channel()
 
         assert mock_secure_chan.mock_calls == []
         assert mock_insecure_chan.mock_calls == [
@@ -712,6 +1220,128 @@ class TestCreateChannel:
         ]
 
 
+class TestLoopChannels:
+
+    def test_no_event_loop_required(self):
+        """
+        Test that a client can be created outside of an event loop.
+        """
+        c = AsyncClient("ldlm-server:3144")
+        assert len(c._loop_channels) == 0
+
+    @pytest.mark.asyncio
+    async def test_cached_per_loop(self):
+        """
+        Test that the channel for an event loop is created once.
+        """
+        c = AsyncClient("ldlm-server:3144")
+        assert c._loop_channel() is c._loop_channel()
+        assert c._stub is c._loop_channel()[1]
+        await c.close()
+        assert len(c._loop_channels) == 0
+
+    def test_many_loops(self):
+        """
+        Test that event loops in different threads each get their own channel, and that the
+        channels of closed event loops are closed and dropped.
+        """
+        c = AsyncClient("ldlm-server:3144")
+        channels = []
+
+        async def use_client():
+            channels.append(c._loop_channel()[0])
+            await asyncio.sleep(0)
+
+        threads = [
+            threading.Thread(target=asyncio.run, args=(use_client(),))
+            for _ in range(4)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(channels) == 4
+        assert len(set(map(id, channels))) == 4
+
+        async def count_channels():
+            c._loop_channel()
+            return len(c._loop_channels)
+
+        # Only the running event loop's channel remains
+        assert asyncio.run(count_channels()) == 1
+        assert all(channel._channel.closed() for channel in channels)
+
+    def test_close_closed_loops(self):
+        """
+        Test that close() closes the channels of closed event loops.
+        """
+        c = AsyncClient("ldlm-server:3144")
+
+        async def get_channel():
+            return c._loop_channel()[0]
+
+        channel = asyncio.run(get_channel())
+        assert not channel._channel.closed()
+        asyncio.run(c.close())
+        assert channel._channel.closed()
+        assert not c._loop_channels
+
+    @pytest.mark.asyncio
+    async def test_close_other_loop(self):
+        """
+        Test that close() closes channels created in event loops running in other threads.
+        """
+        c = AsyncClient("ldlm-server:3144")
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+
+            async def get_channel():
+                return c._loop_channel()[0]
+
+            other = await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(get_channel(), loop))
+            with mock.patch.object(other, "close") as close_mock:
+                await c.close()
+            assert close_mock.mock_calls == [mock.call()]
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    @pytest.mark.asyncio
+    async def test_cancel_other_loop_renew(self):
+        """
+        Test that the renew task of a lock acquired in an event loop running in another thread
+        is cancelled in that thread.
+        """
+        c = MockedAsyncClient("ldlm-server:3144")
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+
+            async def lock():
+                return await c.lock("mylock", lock_timeout_seconds=60)
+
+            l = await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(lock(), loop))
+            task = c._lock_timers["mylock", l.key].task
+            with mock.patch.object(loop,
+                                   "call_soon_threadsafe",
+                                   wraps=loop.call_soon_threadsafe) as call:
+                await c.close(grace_seconds=0)
+            assert call.mock_calls == [mock.call(task.cancel)]
+            await asyncio.sleep(0.1)
+            assert task.cancelled()
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+
 @pytest.mark.asyncio
 class TestClosing:
 
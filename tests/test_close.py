@@ -0,0 +1,273 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import atexit
+import gc
+import os
+import signal
+import threading
+import time
+from unittest import mock
+import weakref
+
+import grpc
+import pytest
+
+from ldlm import AsyncClient, Client, LockHandle
+
+# Nothing listens on this port
+UNREACHABLE = "127.0.0.1:1"
+
+
+def is_free(server, name):
+    r = server.table.try_lock(name, 1, 0)
+    if r.locked:
+        server.table.unlock(name, r.key)
+    return r.locked
+
+
+class TestClose:
+
+    def test_releases_locks(self, server):
+        client = Client(server.address, retries=0)
+        a = client.lock("test_close_a", lock_timeout_seconds=600)
+        b, c = client.try_lock_many(["test_close_b", "test_close_c"])
+        c.unlock()
+        timers = list(client._lock_timers.values())
+        client.close()
+
+        assert not client._lock_timers
+        assert not any(timer.is_alive() for timer in timers)
+        assert not client._held
+        assert a.locked and b.locked
+        for name in ("test_close_a", "test_close_b"):
+            assert is_free(server, name)
+        # Closing again is a no-op
+        client.close()
+
+    def test_no_grace(self, server):
+        client = Client(server.address, retries=0)
+        l = client.lock("test_close_no_grace", lock_timeout_seconds=600)
+        client.close(grace_seconds=0)
+        assert not client._lock_timers
+        assert not is_free(server, "test_close_no_grace")
+        server.table.unlock("test_close_no_grace", l.key)
+
+    def test_unreachable(self):
+        client = Client(UNREACHABLE, retry_delay_seconds=0.1)
+        client.adopt(LockHandle("test_close_unreachable", "key"))
+        start = time.monotonic()
+        client.close(grace_seconds=0.5)
+        assert time.monotonic() - start < 2
+
+    def test_close_at_exit(self, server, monkeypatch):
+        registered = []
+        monkeypatch.setattr(atexit, "register",
+                            lambda *args: registered.append(args))
+        received = []
+        previous = signal.signal(signal.SIGUSR1,
+                                 lambda signum, _: received.append(signum))
+        try:
+            client = Client(server.address, retries=0)
+            client.close_at_exit(grace_seconds=1, signals=[signal.SIGUSR1])
+            [(_, ref, grace_seconds)] = registered
+            assert ref() is client
+            assert grace_seconds == 1
+
+            client.lock("test_close_at_exit", lock_timeout_seconds=600)
+            signal.raise_signal(signal.SIGUSR1)
+            assert received == [signal.SIGUSR1]
+            assert is_free(server, "test_close_at_exit")
+            assert client._closed
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+    def test_close_at_exit_collected(self, server, monkeypatch):
+        """
+        Test that close_at_exit does not keep the client alive.
+        """
+        registered = []
+        monkeypatch.setattr(atexit, "register",
+                            lambda *args: registered.append(args))
+        client = Client(server.address, retries=0)
+        client.close_at_exit()
+        ref = weakref.ref(client)
+        del client
+        gc.collect()
+        assert ref() is None
+
+        [(close, *args)] = registered
+        close(*args)
+
+    def test_close_at_exit_interrupted_lock(self, server, monkeypatch):
+        """
+        Test that the signal handler does not deadlock when the code it interrupts holds a
+        lock which closing waits for.
+        """
+        monkeypatch.setattr(atexit, "register", lambda *args: None)
+        received = []
+        previous = signal.signal(signal.SIGUSR1,
+                                 lambda signum, _: received.append(signum))
+        try:
+            client = Client(server.address, retries=0)
+            client.close_at_exit(grace_seconds=0.2, signals=[signal.SIGUSR1])
+            l = client.lock("test_close_interrupted", lock_timeout_seconds=600)
+            start = time.monotonic()
+            with client._lock_timers_lock:
+                signal.raise_signal(signal.SIGUSR1)
+                assert received == [signal.SIGUSR1]
+                assert time.monotonic() - start < 3
+
+            while not client._closed:
+                assert time.monotonic() - start < 3
+                time.sleep(0.05)
+            # The grace period expired before the lock could be released
+            assert not is_free(server, "test_close_interrupted")
+            server.table.unlock("test_close_interrupted", l.key)
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+    def test_acquired_while_closing(self, server):
+        client = Client(server.address, retries=0)
+        client.lock("test_close_first", lock_timeout_seconds=600)
+        unlock_all = client._unlock_all
+        late = []
+
+        def acquire_and_unlock_all(locks):
+            # Another thread acquires a lock while the client is closing
+            if not late:
+                late.append(
+                    client.try_lock("test_close_late",
+                                    lock_timeout_seconds=600))
+            return unlock_all(locks)
+
+        client._unlock_all = acquire_and_unlock_all
+        client.close()
+
+        assert late[0].locked
+        assert not client._lock_timers
+        for name in ("test_close_first", "test_close_late"):
+            assert is_free(server, name)
+
+
+@pytest.mark.asyncio
+class TestAsyncClose:
+
+    async def test_releases_locks(self, server):
+        client = AsyncClient(server.address, retries=0)
+        await client.lock("test_async_close_a", lock_timeout_seconds=600)
+        await client.try_lock_many(["test_async_close_b"])
+        tasks = [timer.task for timer in client._lock_timers.values()]
+        await client.aclose()
+
+        assert not client._lock_timers
+        await asyncio.sleep(0)
+        assert all(task.done() for task in tasks)
+        assert not client._held
+        for name in ("test_async_close_a", "test_async_close_b"):
+            assert is_free(server, name)
+
+    async def test_unreachable(self):
+        client = AsyncClient(UNREACHABLE, retry_delay_seconds=0.1)
+        await client.adopt(LockHandle("test_async_close_unreachable", "key"))
+        start = time.monotonic()
+        await client.close(grace_seconds=0.5)
+        assert time.monotonic() - start < 2
+
+    async def test_acquired_while_closing(self, server):
+        client = AsyncClient(server.address, retries=0)
+        await client.lock("test_async_close_first", lock_timeout_seconds=600)
+        unlock_all = client._unlock_all
+        late = []
+
+        async def acquire_and_unlock_all(locks):
+            # Another task acquires a lock while the client is closing
+            if not late:
+                late.append(await client.try_lock("test_async_close_late",
+                                                  lock_timeout_seconds=600))
+            return await unlock_all(locks)
+
+        client._unlock_all = acquire_and_unlock_all
+        await client.close()
+
+        assert late[0].locked
+        assert not client._lock_timers
+        for name in ("test_async_close_first", "test_async_close_late"):
+            assert is_free(server, name)
+
+    async def test_concurrent_close(self, server):
+        client = AsyncClient(server.address, retries=0)
+        await client.lock("test_async_close_concurrent",
+                          lock_timeout_seconds=600)
+        with mock.patch.object(client, "_unlock_all",
+                               wraps=client._unlock_all) as unlock_all:
+            await asyncio.gather(client.close(), client.close())
+        assert len(unlock_all.mock_calls) == 1
+        assert is_free(server, "test_async_close_concurrent")
+
+    async def test_lease_other_loop(self, server):
+        """
+        Test that the lease keepalive started in an event loop running in another thread is
+        cancelled in that thread.
+        """
+        client = AsyncClient(server.address,
+                             retries=0,
+                             lease_timeout_seconds=60)
+        loop = asyncio.new_event_loop()
+        thread = threading.Thread(target=loop.run_forever)
+        thread.start()
+        try:
+            await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(
+                    client.lock("test_async_close_lease_loop"), loop))
+            keeper = client._lease_keeper
+            with mock.patch.object(loop,
+                                   "call_soon_threadsafe",
+                                   wraps=loop.call_soon_threadsafe) as call:
+                await client.close(grace_seconds=0)
+            assert mock.call(keeper.cancel) in call.mock_calls
+            await asyncio.sleep(0.1)
+            assert keeper.cancelled()
+            # Revoking the lease released its lock
+            assert is_free(server, "test_async_close_lease_loop")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    async def test_no_retries_after_close(self):
+        client = AsyncClient(UNREACHABLE, retry_delay_seconds=0.1)
+        task = asyncio.create_task(client.try_lock("test_async_close_retry"))
+        await asyncio.sleep(0.3)
+        await client.close()
+        with pytest.raises(grpc.RpcError):
+            await asyncio.wait_for(task, 2)
+
+    async def test_close_on_signals(self, server, monkeypatch):
+        raised = []
+        monkeypatch.setattr(signal, "raise_signal", raised.append)
+        client = AsyncClient(server.address, retries=0)
+        client.close_on_signals([signal.SIGUSR1], grace_seconds=1)
+        await client.lock("test_async_close_on_signals",
+                          lock_timeout_seconds=600)
+
+        os.kill(os.getpid(), signal.SIGUSR1)
+        start = time.monotonic()
+        while not raised:
+            assert time.monotonic() - start < 3
+            await asyncio.sleep(0.05)
+        assert raised == [signal.SIGUSR1]
+        assert is_free(server, "test_async_close_on_signals")
+        assert signal.getsignal(signal.SIGUSR1) == signal.SIG_DFL
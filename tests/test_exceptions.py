@@ -26,6 +26,8 @@ from ldlm.protos import ldlm_pb2 as pb2
     (5, exceptions.LockDoesNotExistOrInvalidKeyError),
     (6, exceptions.LockSizeMismatchError),
     (7, exceptions.InvalidLockSizeError),
+    (8, exceptions.LeaseDoesNotExistError),
+    (9, exceptions.InvalidLeaseTimeoutError),
 ])
 def test_exceptions(code, exception_cls):
     ex = exceptions.from_rpc_error(pb2.Error(code=code))
@@ -37,3 +39,9 @@ def test_unknown_exception():
     ex = exceptions.from_rpc_error(pb2.Error(code=22))
     assert isinstance(ex, exceptions.LDLMError)
     assert ex.RPC_CODE == 0
+
+
+def test_to_rpc_error():
+    error = pb2.Error(code=6, message="lock size mismatch")
+    assert exceptions.to_rpc_error(exceptions.from_rpc_error(error)) == error
+    assert exceptions.to_rpc_error(ValueError("foo")) is None
@@ -0,0 +1,130 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent.futures import ProcessPoolExecutor
+import dataclasses
+import multiprocessing
+import pickle
+import time
+
+import pytest
+
+from ldlm import AsyncClient, Client, LockHandle, exceptions
+from ldlm.metrics import InMemoryMetrics
+
+
+def adopt_and_unlock(address, handle):
+    client = Client(address, retries=0)
+    lock = client.adopt(handle)
+    lock.unlock()
+    client.close()
+    return lock.key
+
+
+class TestHandoff:
+
+    def test_handoff(self, server):
+        sender = Client(server.address, retries=0)
+        l = sender.lock("test_handoff", lock_timeout_seconds=600, size=2)
+        handle = l.handoff()
+        assert not l.locked
+        assert ("test_handoff", l.key) not in sender._lock_timers
+        assert handle.name == "test_handoff"
+        assert handle.key == l.key
+        assert handle.size == 2
+        assert handle.lock_timeout_seconds == 600
+        assert handle.deadline == pytest.approx(time.time() + 600, abs=5)
+        with pytest.raises(RuntimeError):
+            l.handoff()
+
+        metrics = InMemoryMetrics()
+        receiver = Client(server.address, retries=0, metrics=metrics)
+        adopted = receiver.adopt(pickle.loads(pickle.dumps(handle)))
+        assert adopted.locked
+        assert adopted.key == l.key
+        assert adopted.size == 2
+        assert ("test_handoff", l.key) in receiver._lock_timers
+        # A recently renewed lock is adopted without any RPC
+        assert not metrics.snapshot()["rpc_codes"]
+
+        adopted.unlock()
+        assert receiver.try_lock("test_handoff", size=2)
+        sender.close()
+        receiver.close()
+
+    def test_adopt_renews(self, server):
+        metrics = InMemoryMetrics()
+        client = Client(server.address, retries=0, metrics=metrics)
+        l = client.lock("test_adopt_renews", lock_timeout_seconds=600)
+        handle = dataclasses.replace(l.handoff(), deadline=time.time() + 5)
+        adopted = client.adopt(handle)
+        assert metrics.snapshot()["rpc_codes"]["Renew"] == {"OK": 1}
+        adopted.unlock()
+
+        with pytest.raises(exceptions.LockDoesNotExistOrInvalidKeyError):
+            client.adopt(handle)
+        client.close()
+
+    def test_no_timeout(self, server):
+        client = Client(server.address, retries=0)
+        handle = client.lock("test_handoff_no_timeout").handoff()
+        assert handle.deadline is None
+        adopted = client.adopt(handle)
+        assert not client._lock_timers
+        adopted.unlock()
+        client.close()
+
+    def test_process_pool(self, server):
+        client = Client(server.address, retries=0)
+        l = client.lock("test_handoff_process_pool", lock_timeout_seconds=600)
+        with ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            assert pool.submit(adopt_and_unlock, server.address,
+                               l.handoff()).result() == l.key
+        assert client.try_lock("test_handoff_process_pool")
+        client.close()
+
+    def test_lease(self, server):
+        client = Client(server.address, retries=0, lease_timeout_seconds=60)
+        l = client.lock("test_handoff_lease")
+        with pytest.raises(RuntimeError):
+            l.handoff()
+        with pytest.raises(RuntimeError):
+            client.adopt(LockHandle("test_handoff_lease", l.key))
+        l.unlock()
+        client.close()
+
+
+@pytest.mark.asyncio
+class TestAsyncHandoff:
+
+    async def test_handoff(self, server):
+        sender = AsyncClient(server.address, retries=0)
+        l = await sender.lock("test_async_handoff", lock_timeout_seconds=600)
+        handle = await l.handoff()
+        assert not l.locked
+        assert ("test_async_handoff", l.key) not in sender._lock_timers
+        assert handle.deadline == pytest.approx(time.time() + 600, abs=5)
+
+        receiver = AsyncClient(server.address, retries=0)
+        adopted = await receiver.adopt(pickle.loads(pickle.dumps(handle)))
+        assert adopted.key == l.key
+        assert ("test_async_handoff", l.key) in receiver._lock_timers
+        await adopted.unlock()
+
+        stale = dataclasses.replace(handle, deadline=None)
+        with pytest.raises(exceptions.LockDoesNotExistOrInvalidKeyError):
+            await receiver.adopt(stale)
+        await sender.close()
+        await receiver.close()
@@ -0,0 +1,94 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import re
+import subprocess
+import sys
+
+import pytest
+
+import ldlm
+
+# Cumulative import time of the ldlm package itself, in microseconds. Generous so that slow CI
+# machines pass; a regression to eager imports of grpc and the protobuf modules costs far more.
+IMPORT_BUDGET_US = 30_000
+
+
+def run_python(code: str, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *args, "-c", code],
+                          capture_output=True,
+                          text=True,
+                          check=True)
+
+
+def loaded_modules(code: str) -> set[str]:
+    out = run_python(code +
+                     "\nimport json, sys\nprint(json.dumps(list(sys.modules)))")
+    return set(json.loads(out.stdout.splitlines()[-1]))
+
+
+class TestLazyImport:
+
+    def test_import_is_light(self):
+        modules = loaded_modules("import ldlm")
+        assert "grpc" not in modules
+        assert "ldlm.protos.ldlm_pb2" not in modules
+        assert "ldlm.client" not in modules
+        assert "ldlm.client_aio" not in modules
+
+    def test_sync_client_does_not_import_async_client(self):
+        modules = loaded_modules("from ldlm import Client, Lock, TLSConfig")
+        assert "ldlm.client" in modules
+        assert "ldlm.client_aio" not in modules
+
+    def test_async_client_does_not_import_sync_client(self):
+        modules = loaded_modules("from ldlm import AsyncClient, AsyncLock")
+        assert "ldlm.client_aio" in modules
+        assert "ldlm.client" not in modules
+
+    def test_client_imports_features_when_used(self):
+        features = {
+            "ldlm.journal", "ldlm.metrics", "ldlm.session", "ldlm.tracing",
+            "mmap"
+        }
+        modules = loaded_modules("from ldlm import Client, AsyncClient\n"
+                                 "Client('localhost:1').close()")
+        assert not modules & features
+
+        modules = loaded_modules(
+            "from ldlm import Client\n"
+            "Client('localhost:1', transport='session').close()")
+        assert "ldlm.session" in modules
+
+    def test_import_time_budget(self):
+        stderr = run_python("import ldlm", "-X", "importtime").stderr
+        [cumulative] = [
+            int(m.group(1))
+            for m in re.finditer(r"\|\s*(\d+) \| ldlm$", stderr, re.MULTILINE)
+        ]
+        assert cumulative < IMPORT_BUDGET_US
+
+    def test_exports(self):
+        from ldlm import client, client_aio, base_client
+        assert ldlm.Client is client.Client
+        assert ldlm.Lock is client.Lock
+        assert ldlm.AsyncClient is client_aio.AsyncClient
+        assert ldlm.AsyncLock is client_aio.AsyncLock
+        assert ldlm.TLSConfig is base_client.TLSConfig
+        assert ldlm.LockHandle is base_client.LockHandle
+        assert set(ldlm.__all__) <= set(dir(ldlm))
+
+        with pytest.raises(AttributeError):
+            ldlm.NotAnExport
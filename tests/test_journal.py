@@ -0,0 +1,190 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+
+from ldlm import AsyncClient, Client
+from ldlm.journal import JournalEntry, LockJournal
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "journal")
+
+
+def crash(client):
+    """
+    Abandons a client's locks as if its process had died.
+    """
+    for timer in client._lock_timers.values():
+        timer.cancel()
+    client._lock_timers.clear()
+    client._held.clear()
+    client._journal.close()
+
+
+class TestLockJournal:
+
+    def test_entries(self, path):
+        journal = LockJournal(path, capacity=2)
+        journal.add("a", "key-a", 0, 60)
+        journal.add("b", "key-b", 2, 0.5)
+        assert len(journal) == 2
+
+        # The journal is full
+        journal.add("c", "key-c", 0, 60)
+        # Entries are replaced by name and key
+        journal.add("a", "key-a", 0, 30)
+        # Only the entry with the same key is removed
+        journal.remove("b", "key-c")
+        journal.close()
+
+        journal = LockJournal(path)
+        assert journal.entries() == [
+            JournalEntry("a", "key-a", 0, 30),
+            JournalEntry("b", "key-b", 2, 0.5),
+        ]
+        journal.remove("a", "key-a")
+        journal.add("c", "key-c", 0, 0)
+        assert [e.name for e in journal.entries()] == ["c", "b"]
+        journal.close()
+
+    def test_multiple_holders(self, path):
+        journal = LockJournal(path)
+        journal.add("pool", "k1", 2, 60)
+        journal.add("pool", "k2", 2, 60)
+        assert len(journal) == 2
+        journal.close()
+
+        journal = LockJournal(path)
+        assert journal.entries() == [
+            JournalEntry("pool", "k1", 2, 60),
+            JournalEntry("pool", "k2", 2, 60),
+        ]
+        journal.remove("pool", "k1")
+        assert journal.entries() == [JournalEntry("pool", "k2", 2, 60)]
+        journal.close()
+
+    def test_too_long(self, path):
+        journal = LockJournal(path, slot_size=64)
+        journal.add("x" * 100, "key", 0, 0)
+        assert not journal.entries()
+        journal.close()
+
+    def test_exclusive(self, path):
+        journal = LockJournal(path)
+        with pytest.raises(RuntimeError):
+            LockJournal(path)
+        journal.close()
+        LockJournal(path).close()
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / "journal"
+        path.write_bytes(b"not a journal")
+        with pytest.raises(ValueError):
+            LockJournal(str(path))
+
+
+class TestClientJournal:
+
+    def test_release(self, server, path):
+        client = Client(server.address, retries=0, journal=LockJournal(path))
+        client.lock("test_journal_release_a", lock_timeout_seconds=600)
+        _, c = client.try_lock_many(
+            ["test_journal_release_b", "test_journal_release_c"],
+            lock_timeout_seconds=600)
+        c.unlock()
+        assert [e.name for e in client._journal.entries()
+               ] == ["test_journal_release_a", "test_journal_release_b"]
+        crash(client)
+
+        restarted = Client(server.address, retries=0, journal=LockJournal(path))
+        assert restarted.recover_locks() == []
+        assert not restarted._journal.entries()
+        assert restarted.try_lock("test_journal_release_a")
+        assert restarted.try_lock("test_journal_release_b")
+        restarted.close()
+        client.close()
+
+    def test_adopt(self, server, path):
+        client = Client(server.address, retries=0, journal=LockJournal(path))
+        l = client.lock("test_journal_adopt", lock_timeout_seconds=600)
+        lost = client.lock("test_journal_adopt_lost")
+        crash(client)
+        server.table.unlock("test_journal_adopt_lost", lost.key)
+
+        restarted = Client(server.address, retries=0, journal=LockJournal(path))
+        [adopted] = restarted.recover_locks(adopt=True)
+        assert adopted.name == "test_journal_adopt"
+        assert adopted.key == l.key
+        assert ("test_journal_adopt", l.key) in restarted._lock_timers
+        assert [e.name for e in restarted._journal.entries()
+               ] == ["test_journal_adopt"]
+        adopted.unlock()
+        assert not restarted._journal.entries()
+        restarted.close()
+        client.close()
+
+    def test_multiple_holders(self, server, path):
+        client = Client(server.address, retries=0, journal=LockJournal(path))
+        client.lock("test_journal_pool", size=2, lock_timeout_seconds=600)
+        client.lock("test_journal_pool", size=2, lock_timeout_seconds=600)
+        crash(client)
+
+        restarted = Client(server.address, retries=0, journal=LockJournal(path))
+        assert restarted.recover_locks() == []
+        assert not restarted._journal.entries()
+        assert restarted.try_lock("test_journal_pool", size=2)
+        restarted.close()
+        client.close()
+
+    def test_lost(self, server, path):
+        client = Client(server.address, retries=0, journal=LockJournal(path))
+        l = client.lock("test_journal_lost", lock_timeout_seconds=600)
+        server.table.unlock("test_journal_lost", l.key)
+        assert client.renew_many([l], 600) == [l]
+        assert not client._journal.entries()
+        client.close()
+
+    def test_no_journal(self, server):
+        client = Client(server.address, retries=0)
+        with pytest.raises(RuntimeError):
+            client.recover_locks()
+        client.close()
+
+
+@pytest.mark.asyncio
+class TestAsyncClientJournal:
+
+    async def test_recover(self, server, path):
+        client = AsyncClient(server.address,
+                             retries=0,
+                             journal=LockJournal(path))
+        await client.lock("test_async_journal_a", lock_timeout_seconds=600)
+        await client.try_lock("test_async_journal_b", lock_timeout_seconds=600)
+        await (await client.lock("test_async_journal_c")).unlock()
+        crash(client)
+
+        restarted = AsyncClient(server.address,
+                                retries=0,
+                                journal=LockJournal(path))
+        adopted = await restarted.recover_locks(adopt=True)
+        assert sorted(l.name for l in adopted) == [
+            "test_async_journal_a", "test_async_journal_b"
+        ]
+        await restarted.unlock_many(adopted)
+        assert not restarted._journal.entries()
+        assert await restarted.try_lock("test_async_journal_a")
+        await restarted.close()
+        await client.close()
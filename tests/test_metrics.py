@@ -0,0 +1,335 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import multiprocessing
+import os
+import random
+import time
+import urllib.request
+
+import pytest
+
+from ldlm import AsyncClient, Client, exceptions
+from ldlm.metrics import InMemoryMetrics, LatencyHistogram, MetricsSink, SharedMemoryMetrics, serve_prometheus
+
+
+class TestLatencyHistogram:
+
+    def test_percentiles(self):
+        h = LatencyHistogram()
+        values = [random.uniform(0.0001, 2) for _ in range(10000)]
+        for v in values:
+            h.record(v)
+        values.sort()
+
+        assert h.count == 10000
+        assert h.max == values[-1]
+        assert h.mean() == pytest.approx(sum(values) / len(values))
+        for q in (0.5, 0.9, 0.99, 0.999):
+            assert h.percentile(q) == pytest.approx(values[int(q * 10000) - 1],
+                                                    rel=0.04)
+
+    def test_small_and_huge_values(self):
+        h = LatencyHistogram()
+        h.record(0)
+        h.record(0.000005)
+        h.record(10**7)
+        assert h.percentile(0.01) == 0.0000005
+        assert h.percentile(1) == 10**7
+
+    def test_empty(self):
+        h = LatencyHistogram()
+        assert h.percentile(0.99) == 0
+        assert h.mean() == 0
+        assert not h.buckets()
+
+    def test_merge_and_since(self):
+        a = LatencyHistogram()
+        b = LatencyHistogram()
+        a.record(0.001)
+        b.record(0.002)
+        b.record(0.003)
+
+        earlier = a.copy()
+        a.merge(b)
+        assert a.count == 3
+        assert a.max == 0.003
+        assert a.since(earlier).count == 2
+        assert sum(c for _, c in a.since(earlier).buckets()) == 2
+
+    def test_cumulative_counts(self):
+        h = LatencyHistogram()
+        for v in (0.001, 0.002, 0.02, 5):
+            h.record(v)
+        assert h.cumulative_counts([0.0005, 0.0015, 0.01, 1,
+                                    10]) == [0, 1, 2, 3, 4]
+
+
+class RecordingSink(MetricsSink):
+
+    def __init__(self):
+        self.calls = []
+
+    def rpc_completed(self, method, seconds, code):
+        self.calls.append(("rpc_completed", method, code))
+
+    def rpc_retried(self, method):
+        self.calls.append(("rpc_retried", method))
+
+    def lock_acquired(self, name, wait_seconds, try_lock=False):
+        self.calls.append(("lock_acquired", name))
+
+    def lock_not_acquired(self, name, wait_seconds, try_lock=False):
+        self.calls.append(("lock_not_acquired", name))
+
+    def lock_released(self, name, held_seconds):
+        self.calls.append(("lock_released", name))
+
+    def lock_renewed(self, name, lag_seconds):
+        self.calls.append(("lock_renewed", name))
+
+    def lock_lost(self, name):
+        self.calls.append(("lock_lost", name))
+
+
+class TestClientMetrics:
+
+    def test_lock_lifecycle(self, server):
+        sink = RecordingSink()
+        client = Client(server.address, retries=0, metrics=sink)
+
+        l = client.lock("test_lock_lifecycle")
+        assert not client.try_lock("test_lock_lifecycle")
+        l.unlock()
+        with pytest.raises(exceptions.NotLockedError):
+            l.unlock()
+
+        assert sink.calls == [
+            ("rpc_completed", "Lock", "OK"),
+            ("lock_acquired", "test_lock_lifecycle"),
+            ("rpc_completed", "TryLock", "OK"),
+            ("lock_not_acquired", "test_lock_lifecycle"),
+            ("rpc_completed", "Unlock", "OK"),
+            ("lock_released", "test_lock_lifecycle"),
+            ("rpc_completed", "Unlock", "NotLocked"),
+        ]
+        client.close()
+
+    def test_wait_timeout(self, server):
+        metrics = InMemoryMetrics()
+        client = Client(server.address, retries=0, metrics=metrics)
+        l = client.lock("test_wait_timeout")
+        assert not client.lock("test_wait_timeout", wait_timeout_seconds=1)
+        l.unlock()
+
+        snapshot = metrics.snapshot()
+        assert snapshot["rpc_codes"]["Lock"] == {"OK": 1, "LockWaitTimeout": 1}
+        assert snapshot["not_acquired_wait"]["count"] == 1
+        assert snapshot["not_acquired_wait"]["p50_ms"] >= 900
+        assert snapshot["hold"]["p50_ms"] >= 900
+        assert snapshot["open_locks"] == 0
+        client.close()
+
+    def test_retries(self):
+        sink = RecordingSink()
+        client = Client("localhost:1",
+                        retries=2,
+                        retry_delay_seconds=0,
+                        metrics=sink)
+        with pytest.raises(Exception):
+            client.try_lock("test_retries")
+
+        assert sink.calls == [
+            ("rpc_completed", "TryLock", "UNAVAILABLE"),
+            ("rpc_retried", "TryLock"),
+            ("rpc_completed", "TryLock", "UNAVAILABLE"),
+            ("rpc_retried", "TryLock"),
+            ("rpc_completed", "TryLock", "UNAVAILABLE"),
+        ]
+        client.close()
+
+    def test_renew_and_lost(self, server):
+        metrics = InMemoryMetrics()
+        client = Client(server.address, retries=0, metrics=metrics)
+        client.min_renew_interval_seconds = 0.2
+
+        l = client.lock("test_renew_and_lost", lock_timeout_seconds=10)
+        time.sleep(0.5)
+        assert metrics.snapshot()["renew_lag"]["count"] >= 1
+        assert metrics.snapshot()["open_locks"] == 1
+
+        server.table.unlock("test_renew_and_lost", l.key)
+        time.sleep(0.5)
+        snapshot = metrics.snapshot()
+        assert snapshot["locks_lost"] == 1
+        assert snapshot["open_locks"] == 0
+        client.close()
+
+    def test_try_lock_any(self, server):
+        metrics = InMemoryMetrics()
+        client = Client(server.address, retries=0, metrics=metrics)
+        locks = client.try_lock_any(
+            [f"test_try_lock_any_{i}" for i in range(8)],
+            k=2,
+            max_concurrency=8)
+        assert metrics.snapshot()["open_locks"] == 2
+        for l in locks:
+            l.unlock()
+        snapshot = metrics.snapshot()
+        assert snapshot["open_locks"] == 0
+        assert snapshot["acquire_wait"]["count"] == snapshot["hold"]["count"]
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_async_client(self, server):
+        sink = RecordingSink()
+        client = AsyncClient(server.address, retries=0, metrics=sink)
+        client.min_renew_interval_seconds = 0.2
+
+        l = await client.lock("test_async_client", lock_timeout_seconds=10)
+        assert not await client.try_lock("test_async_client")
+        await asyncio.sleep(0.3)
+        await l.unlock()
+
+        assert sink.calls == [
+            ("rpc_completed", "Lock", "OK"),
+            ("lock_acquired", "test_async_client"),
+            ("rpc_completed", "TryLock", "OK"),
+            ("lock_not_acquired", "test_async_client"),
+            ("rpc_completed", "Renew", "OK"),
+            ("lock_renewed", "test_async_client"),
+            ("rpc_completed", "Unlock", "OK"),
+            ("lock_released", "test_async_client"),
+        ]
+        await client.close()
+
+
+class TestInMemoryMetrics:
+
+    def test_prometheus_text(self):
+        metrics = InMemoryMetrics()
+        metrics.rpc_completed("Lock", 0.002, "OK")
+        metrics.rpc_completed("Lock", 0.2, "UNAVAILABLE")
+        metrics.rpc_retried("Lock")
+        metrics.lock_acquired("a", 0.003)
+        metrics.lock_released("a", 1.5)
+        metrics.lock_acquired("b", 0.003)
+
+        text = metrics.prometheus_text()
+        lines = text.splitlines()
+        assert "# TYPE ldlm_client_rpc_duration_seconds histogram" in lines
+        assert 'ldlm_client_rpc_duration_seconds_bucket{method="Lock",le="0.001"} 0' in lines
+        assert 'ldlm_client_rpc_duration_seconds_bucket{method="Lock",le="0.0025"} 1' in lines
+        assert 'ldlm_client_rpc_duration_seconds_bucket{method="Lock",le="+Inf"} 2' in lines
+        assert 'ldlm_client_rpc_duration_seconds_count{method="Lock"} 2' in lines
+        assert 'ldlm_client_rpcs_total{method="Lock",code="UNAVAILABLE"} 1' in lines
+        assert 'ldlm_client_rpc_retries_total{method="Lock"} 1' in lines
+        assert 'ldlm_client_lock_wait_seconds_count{result="acquired"} 2' in lines
+        assert 'ldlm_client_lock_hold_seconds_bucket{le="1"} 0' in lines
+        assert 'ldlm_client_lock_hold_seconds_bucket{le="2.5"} 1' in lines
+        assert "ldlm_client_open_locks 1" in lines
+        assert text.endswith("\n")
+
+    def test_serve_prometheus(self):
+        metrics = InMemoryMetrics()
+        metrics.lock_acquired("a", 0.001)
+        server = serve_prometheus(metrics, port=0, addr="localhost")
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(
+                    f"http://localhost:{port}/metrics") as r:
+                body = r.read().decode()
+            assert "ldlm_client_open_locks 1" in body
+        finally:
+            server.shutdown()
+
+
+def _record_in_child(metrics):
+    metrics.rpc_completed("Lock", 0.004, "OK")
+    metrics.lock_acquired("a", 0.004)
+    os._exit(0)
+
+
+class TestSharedMemoryMetrics:
+
+    def test_processes(self, tmp_path):
+        path = str(tmp_path / "metrics")
+        metrics = SharedMemoryMetrics(path, processes=4)
+        metrics.rpc_completed("Lock", 0.002, "OK")
+        metrics.rpc_retried("Lock")
+        metrics.lock_acquired("a", 0.002)
+
+        # Workers forked after the sink was created record into their own regions
+        ctx = multiprocessing.get_context("fork")
+        for _ in range(3):
+            p = ctx.Process(target=_record_in_child, args=(metrics,))
+            p.start()
+            p.join()
+            assert p.exitcode == 0
+
+        snapshot = SharedMemoryMetrics(path).snapshot()
+        assert snapshot["rpc_codes"] == {"Lock": {"OK": 4}}
+        assert snapshot["rpc_retries"] == {"Lock": 1}
+        assert snapshot["rpc_latency"]["Lock"]["count"] == 4
+        assert snapshot["rpc_latency"]["Lock"]["max_ms"] == 4
+        assert snapshot["acquire_wait"]["count"] == 4
+        # Only the running process has open locks
+        assert snapshot["open_locks"] == 1
+
+        # Regions of exited processes are reused and keep their counters
+        p = ctx.Process(target=_record_in_child, args=(metrics,))
+        p.start()
+        p.join()
+        assert metrics.snapshot()["rpc_codes"] == {"Lock": {"OK": 5}}
+        assert 'ldlm_client_rpcs_total{method="Lock",code="OK"} 5' in \
+            metrics.prometheus_text().splitlines()
+        metrics.close()
+
+    def test_name_overflow(self, tmp_path):
+        metrics = SharedMemoryMetrics(str(tmp_path / "metrics"),
+                                      methods=3,
+                                      codes=2)
+        for method in ("Lock", "Unlock", "Renew", "TryLock"):
+            metrics.rpc_completed(method, 0.001, method)
+        assert metrics.snapshot()["rpc_codes"] == {
+            "Lock": {
+                "Lock": 1
+            },
+            "Unlock": {
+                "other": 1
+            },
+            "other": {
+                "other": 2
+            },
+        }
+        metrics.close()
+
+    def test_client(self, server, tmp_path):
+        metrics = SharedMemoryMetrics(str(tmp_path / "metrics"))
+        client = Client(server.address, retries=0, metrics=metrics)
+        with client.lock_context("test_shared_memory_metrics"):
+            assert metrics.snapshot()["open_locks"] == 1
+        snapshot = metrics.snapshot()
+        assert snapshot["open_locks"] == 0
+        assert snapshot["hold"]["count"] == 1
+        assert set(snapshot["rpc_codes"]) == {"Lock", "Unlock"}
+        client.close()
+        metrics.close()
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / "metrics"
+        path.write_bytes(b"not metrics")
+        with pytest.raises(ValueError):
+            SharedMemoryMetrics(str(path))
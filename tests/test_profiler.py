@@ -0,0 +1,179 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import os
+import random
+import signal
+import time
+
+import pytest
+
+from ldlm import AsyncClient, Client
+from ldlm.metrics import InMemoryMetrics, MultiSink
+from ldlm.profiler import ContentionProfiler
+
+
+class TestContentionProfiler:
+
+    def test_stats(self):
+        p = ContentionProfiler()
+        p.lock_acquired("a", 0.5)
+        p.lock_not_acquired("a", 1.0)
+        p.lock_acquired("a", 0.01, try_lock=True)
+        p.lock_not_acquired("a", 0.01, try_lock=True)
+        p.lock_released("a", 2)
+        p.lock_lost("a")
+        p.lock_released("unknown", 2)
+        p.lock_acquired("b", 0.1)
+
+        a, b = p.report(sort_by="wait")
+        assert a["name"] == "a"
+        assert a["attempts"] == 4
+        assert a["attempts_error"] == 0
+        assert a["acquired"] == 2
+        assert a["timeouts"] == 1
+        assert a["try_locks"] == 2
+        assert a["try_lock_failure_rate"] == 0.5
+        assert a["lost"] == 1
+        assert a["total_wait_seconds"] == pytest.approx(1.52)
+        assert a["wait"]["count"] == 4
+        assert a["hold"]["count"] == 1
+        assert b["name"] == "b"
+
+    def test_sort_keys(self):
+        p = ContentionProfiler()
+        for _ in range(3):
+            p.lock_acquired("many", 0.001)
+        p.lock_not_acquired("slow", 5)
+        p.lock_not_acquired("busy", 0.001, try_lock=True)
+        p.lock_acquired("long", 0.001)
+        p.lock_released("long", 60)
+
+        def top(sort_by):
+            return p.report(n=1, sort_by=sort_by)[0]["name"]
+
+        assert top("attempts") == "many"
+        assert top("wait") == "slow"
+        assert top("timeouts") == "slow"
+        assert top("try_lock_failures") == "busy"
+        assert top("hold") == "long"
+
+        with pytest.raises(ValueError):
+            p.report(sort_by="nope")
+
+    def test_bounded_heavy_hitters(self):
+        """
+        Test that hot names are found among many cold ones while memory stays bounded.
+        """
+        p = ContentionProfiler(capacity=20)
+        rng = random.Random(1)
+        for i in range(20000):
+            if i % 4 == 0:
+                p.lock_acquired(f"hot-{rng.randrange(5)}", 0.001)
+            else:
+                p.lock_acquired(f"cold-{i}", 0.001)
+
+        assert len(p._table) == 20
+        assert len(p._heap) == 20
+        top = p.report(n=5, sort_by="attempts")
+        assert {r["name"] for r in top} == {f"hot-{i}" for i in range(5)}
+        for r in top:
+            # Space-Saving never underestimates
+            assert 800 <= r["attempts"] <= 1200 + r["attempts_error"]
+
+    def test_format_and_dump(self):
+        p = ContentionProfiler()
+        p.lock_acquired("a_lock_name", 0.5)
+        text = p.format_report()
+        assert text.splitlines()[0] == "Top 1 lock names by wait"
+        assert "a_lock_name" in text.splitlines()[2]
+
+        out = io.StringIO()
+        p.dump(out, sort_by="attempts")
+        assert "Top 1 lock names by attempts" in out.getvalue()
+
+        p.reset()
+        assert not p.report()
+
+    @pytest.mark.skipif(not hasattr(signal, "SIGUSR2"), reason="no SIGUSR2")
+    def test_signal_handler(self):
+        p = ContentionProfiler()
+        p.lock_acquired("test_signal_handler", 0.5)
+        out = io.StringIO()
+        previous = p.install_signal_handler(file=out)
+        try:
+            # The signal arrives while the main thread holds the profiler's lock
+            with p._lock:
+                os.kill(os.getpid(), signal.SIGUSR2)
+                time.sleep(0.1)
+                assert not out.getvalue()
+            start = time.monotonic()
+            while not out.getvalue():
+                assert time.monotonic() - start < 5
+                time.sleep(0.01)
+        finally:
+            signal.signal(signal.SIGUSR2, previous)
+        assert "test_signal_handler" in out.getvalue()
+
+    def test_attach_detach(self, server):
+        client = Client(server.address, retries=0)
+        p = ContentionProfiler()
+
+        p.attach(client)
+        assert client.metrics is p
+        held = client.lock("test_attach_detach")
+        assert not client.try_lock("test_attach_detach")
+        assert not client.lock("test_attach_detach", wait_timeout_seconds=1)
+        held.unlock()
+
+        [r] = p.report()
+        assert r["name"] == "test_attach_detach"
+        assert r["attempts"] == 3
+        assert r["timeouts"] == 1
+        assert r["try_lock_failures"] == 1
+        assert r["hold"]["count"] == 1
+
+        p.detach(client)
+        assert client.metrics is None
+        client.try_lock("test_attach_detach").unlock()
+        assert p.report()[0]["attempts"] == 3
+
+        metrics = InMemoryMetrics()
+        client.metrics = metrics
+        p.attach(client)
+        p.attach(client)
+        assert isinstance(client.metrics, MultiSink)
+        assert client.metrics.sinks == (metrics, p)
+        client.try_lock("test_attach_detach").unlock()
+        assert metrics.snapshot()["hold"]["count"] == 1
+        assert p.report()[0]["attempts"] == 4
+
+        p.detach(client)
+        assert client.metrics is metrics
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_async_client(self, server):
+        client = AsyncClient(server.address, retries=0)
+        p = ContentionProfiler()
+        p.attach(client)
+        held = await client.lock("test_async_client")
+        assert not await client.try_lock("test_async_client")
+        await held.unlock()
+
+        [r] = p.report()
+        assert r["attempts"] == 2
+        assert r["try_lock_failure_rate"] == 1.0
+        await client.close()
@@ -0,0 +1,203 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from unittest import mock
+
+import grpc
+import pytest
+
+from ldlm import AsyncClient, Client, exceptions
+from ldlm.protos import ldlm_pb2 as pb2
+from ldlm.protos import ldlm_pb2_grpc as pb2_grpc
+from ldlm.session import AsyncSessionStub, SessionError, SessionStub
+from ldlm.testing import AsyncServer, LDLMServicer, Server
+
+
+@pytest.fixture
+def client(server):
+    c = Client(server.address, retries=0, transport="session")
+    yield c
+    c.close()
+
+
+def test_invalid_transport():
+    with pytest.raises(ValueError):
+        Client("localhost:1", transport="foo")
+
+
+class TestSession:
+
+    def test_operations(self, client):
+        assert isinstance(client._stub, SessionStub)
+        with mock.patch.dict(client._stub.unary, {
+                "Lock": None,
+                "TryLock": None,
+                "Renew": None,
+                "Unlock": None
+        }):
+            l = client.lock("test_operations", lock_timeout_seconds=60)
+            assert l.locked
+            assert not client.try_lock("test_operations")
+            l.renew(60)
+            with pytest.raises(exceptions.InvalidLockKeyError):
+                client.unlock("test_operations", "foo")
+            l.unlock()
+            assert client.try_lock("test_operations")
+
+    def test_out_of_order(self, client):
+        """
+        Test that a waiting Lock request does not hold up other requests on the stream.
+        """
+        l = client.lock("test_out_of_order")
+        threading.Timer(0.5, l.unlock).start()
+        waiter = client._stub.Lock.future(
+            pb2.LockRequest(name="test_out_of_order"))
+
+        assert client.try_lock("test_out_of_order_2")
+        assert not waiter.done()
+        assert waiter.result(timeout=5).locked
+
+    def test_concurrent(self, client):
+        with ThreadPoolExecutor(16) as pool:
+            results = list(
+                pool.map(lambda i: client.try_lock(f"test_concurrent_{i % 50}"),
+                         range(200)))
+        assert sum(1 for l in results if l) == 50
+        assert len({l.key for l in results if l}) == 50
+
+    def test_abandoned(self, client, server):
+        """
+        Test that a lock granted to an abandoned request is released.
+        """
+        l = client.lock("test_abandoned")
+        future = client._stub.Lock.future(pb2.LockRequest(name="test_abandoned"))
+        assert future.cancel()
+        l.unlock()
+        time.sleep(0.3)
+        assert client.try_lock("test_abandoned")
+
+    def test_stream_failure(self):
+        server = Server().start()
+        client = Client(server.address, retries=0, transport="session")
+        assert client.try_lock("test_stream_failure")
+        future = client._stub.Lock.future(
+            pb2.LockRequest(name="test_stream_failure"))
+        server.stop()
+        with pytest.raises(SessionError) as e:
+            future.result(timeout=5)
+        assert e.value.code() in (grpc.StatusCode.UNAVAILABLE,
+                                  grpc.StatusCode.CANCELLED)
+        client.close()
+
+    def test_password(self):
+        with Server(password="secret") as s:
+            client = Client(s.address,
+                            password="secret",
+                            retries=0,
+                            transport="session")
+            assert client.try_lock("test_password")
+            client.close()
+
+            client = Client(s.address, retries=0, transport="session")
+            with pytest.raises(SessionError) as e:
+                client.try_lock("test_password")
+            assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+            client.close()
+
+    def test_unimplemented(self):
+        """
+        Test that the client falls back to unary RPCs if the server does not implement the
+        Session RPC.
+        """
+        with mock.patch.object(LDLMServicer, "Session",
+                               pb2_grpc.LDLMServicer.Session):
+            with Server() as s:
+                client = Client(s.address, retries=0, transport="session")
+                l = client.lock("test_unimplemented")
+                assert l.locked
+                assert client._stub.unsupported
+                assert not client.try_lock("test_unimplemented")
+                l.unlock()
+                client.close()
+
+
+@pytest.mark.asyncio
+class TestAsyncSession:
+
+    async def test_operations(self, server):
+        client = AsyncClient(server.address, retries=0, transport="session")
+        assert isinstance(client._stub, AsyncSessionStub)
+        l = await client.lock("test_async_operations", lock_timeout_seconds=60)
+        assert l.locked
+        assert not await client.try_lock("test_async_operations")
+        await l.renew(60)
+
+        waiter = asyncio.create_task(
+            client.lock("test_async_operations", wait_timeout_seconds=5))
+        await asyncio.sleep(0.2)
+        assert await client.try_lock("test_async_operations_2")
+        await l.unlock()
+        assert (await waiter).locked
+        await client.close()
+
+    async def test_close(self, server):
+        """
+        Test that closing the client ends the Session stream, failing its outstanding requests,
+        and leaves no tasks pending.
+        """
+        other = server.table.try_lock("test_async_close", 1, 0)
+        client = AsyncClient(server.address, retries=0, transport="session")
+        await client.try_lock("test_async_close_2")
+        waiter = asyncio.create_task(client.lock("test_async_close"))
+        await asyncio.sleep(0.2)
+        reader = client._stub._stream.reader
+        await client.close()
+        assert reader.done()
+        with pytest.raises(SessionError):
+            await waiter
+        # Tasks of gRPC's own which finish the call
+        await asyncio.sleep(0.1)
+        assert asyncio.all_tasks() == {asyncio.current_task()}
+        server.table.unlock("test_async_close", other.key)
+
+    async def test_cancelled(self):
+        """
+        Test that a lock granted to a cancelled request is released.
+        """
+        async with AsyncServer() as s:
+            client = AsyncClient(s.address, retries=0, transport="session")
+            l = await client.lock("test_cancelled")
+            waiter = asyncio.create_task(client.lock("test_cancelled"))
+            await asyncio.sleep(0.2)
+            waiter.cancel()
+            await l.unlock()
+            await asyncio.sleep(0.3)
+            assert await client.try_lock("test_cancelled")
+            await client.close()
+
+    async def test_unimplemented(self):
+        with mock.patch.object(LDLMServicer, "Session",
+                               pb2_grpc.LDLMServicer.Session):
+            with Server() as s:
+                client = AsyncClient(s.address, retries=0, transport="session")
+                l = await client.lock("test_async_unimplemented")
+                assert l.locked
+                assert client._stub.unsupported
+                assert not await client.try_lock("test_async_unimplemented")
+                await l.unlock()
+                await client.close()
@@ -0,0 +1,201 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import socket
+import stat
+import time
+
+import pytest
+
+from ldlm import AsyncClient, Client, exceptions
+from ldlm.base_client import (DEFAULT_SIDECAR_DIR, SIDECAR_SOCKET_ENV,
+                              SIDECAR_SOCKET_NAME, SIDECAR_UID_ENV,
+                              find_sidecar, sidecar_socket_path)
+from ldlm.sidecar import Sidecar
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / "sidecar.sock")
+
+
+def test_find_sidecar(socket_path, monkeypatch):
+    monkeypatch.setenv(SIDECAR_SOCKET_ENV, socket_path)
+    assert find_sidecar() is None
+    client = Client("ldlm-server:3144", sidecar=True)
+    assert client._address == "ldlm-server:3144"
+    client.close()
+
+    with socket.socket(socket.AF_UNIX) as s:
+        s.bind(socket_path)
+        assert find_sidecar() == f"unix:{socket_path}"
+        client = Client("ldlm-server:3144", sidecar=True)
+        assert client._address == f"unix:{socket_path}"
+        client.close()
+        client = Client("ldlm-server:3144")
+        assert client._address == "ldlm-server:3144"
+        client.close()
+
+        # The password is not sent to the sidecar
+        client = Client("ldlm-server:3144", password="secret", sidecar=True)
+        assert client._metadata is None
+        client.close()
+
+
+def test_find_sidecar_owner(socket_path, monkeypatch):
+    monkeypatch.setenv(SIDECAR_SOCKET_ENV, socket_path)
+    with socket.socket(socket.AF_UNIX) as s:
+        s.bind(socket_path)
+        assert find_sidecar(uid=os.getuid() + 1) is None
+        monkeypatch.setenv(SIDECAR_UID_ENV, str(os.getuid() + 1))
+        assert find_sidecar() is None
+        client = Client("ldlm-server:3144", sidecar=True)
+        assert client._address == "ldlm-server:3144"
+        client.close()
+        monkeypatch.setenv(SIDECAR_UID_ENV, str(os.getuid()))
+        assert find_sidecar() == f"unix:{socket_path}"
+
+
+def test_sidecar_socket_path(tmp_path, monkeypatch):
+    monkeypatch.delenv(SIDECAR_SOCKET_ENV, raising=False)
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert sidecar_socket_path() == str(tmp_path / SIDECAR_SOCKET_NAME)
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    assert sidecar_socket_path() == os.path.join(DEFAULT_SIDECAR_DIR,
+                                                 SIDECAR_SOCKET_NAME)
+
+
+@pytest.mark.asyncio
+class TestSidecar:
+
+    async def test_socket_mode(self, server, tmp_path):
+        socket_path = str(tmp_path / "run" / "sidecar.sock")
+        async with Sidecar(server.address,
+                           socket_path=socket_path,
+                           socket_mode=0o660):
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o660
+
+    async def test_stale_socket(self, server, socket_path):
+        stale = socket.socket(socket.AF_UNIX)
+        stale.bind(socket_path)
+        stale.close()
+        async with Sidecar(server.address, socket_path=socket_path) as sidecar:
+            client = AsyncClient(sidecar.address, retries=0)
+            assert await client.try_lock("test_sidecar_stale_socket")
+            await client.close()
+
+    async def test_in_use(self, server, socket_path):
+        async with Sidecar(server.address, socket_path=socket_path) as sidecar:
+            with pytest.raises(RuntimeError):
+                await Sidecar(server.address, socket_path=socket_path).start()
+            client = AsyncClient(sidecar.address, retries=0)
+            assert await client.try_lock("test_sidecar_in_use")
+            await client.close()
+
+    async def test_operations(self, server, socket_path):
+        async with Sidecar(server.address, socket_path=socket_path) as sidecar:
+            assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+            client = AsyncClient(sidecar.address, retries=0)
+            l = await client.lock("test_sidecar_operations",
+                                  lock_timeout_seconds=60)
+            assert l.locked
+            assert "test_sidecar_operations" in server.table._locks
+            assert not await client.try_lock("test_sidecar_operations")
+            assert not await client.lock("test_sidecar_operations",
+                                         wait_timeout_seconds=0.1)
+            await l.renew(60)
+            with pytest.raises(exceptions.InvalidLockKeyError):
+                await client.unlock("test_sidecar_operations", "foo")
+            await l.unlock()
+            assert await client.try_lock("test_sidecar_operations", size=2)
+            with pytest.raises(exceptions.LockSizeMismatchError):
+                await client.try_lock("test_sidecar_operations")
+            await client.close()
+        assert not os.path.exists(socket_path)
+
+        # Stopping the sidecar released its locks
+        assert not server.table._locks["test_sidecar_operations"].holders
+
+    async def test_sync_client(self, server, socket_path):
+        async with Sidecar(server.address, socket_path=socket_path) as sidecar:
+
+            def run():
+                client = Client(sidecar.address, retries=0)
+                l = client.lock("test_sidecar_sync")
+                assert l.locked
+                assert not client.try_lock("test_sidecar_sync")
+                l.unlock()
+                client.close()
+
+            await asyncio.get_running_loop().run_in_executor(None, run)
+
+    async def test_coalesced_waiters(self, server, socket_path):
+        async with Sidecar(server.address, socket_path=socket_path) as sidecar:
+            clients = [
+                AsyncClient(sidecar.address, retries=0) for _ in range(3)
+            ]
+            l = await clients[0].lock("test_sidecar_waiters")
+            waiters = [
+                asyncio.create_task(c.lock("test_sidecar_waiters"))
+                for c in clients[1:]
+            ]
+            await asyncio.sleep(0.3)
+            # Only one of the waiting processes waits on the server
+            assert len(server.table._locks["test_sidecar_waiters"].waiters) == 1
+
+            await l.unlock()
+            done, _ = await asyncio.wait(waiters,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            first = done.pop().result()
+            assert first.locked
+            await first.unlock()
+            for waiter in waiters:
+                if not waiter.done():
+                    await (await waiter).unlock()
+            for c in clients:
+                await c.close()
+
+    async def test_expiry(self, server, socket_path):
+        """
+        Test that the sidecar renews a lock while its process renews it, and releases it when
+        its process stops.
+        """
+        async with Sidecar(server.address, socket_path=socket_path) as sidecar:
+            client = AsyncClient(sidecar.address, retries=0)
+            client.min_renew_interval_seconds = 0.2
+            l = await client.lock("test_sidecar_expiry", lock_timeout_seconds=1)
+            await asyncio.sleep(1.5)
+            assert not server.table.try_lock("test_sidecar_expiry", 1, 0).locked
+
+            # The process stops renewing the lock
+            client._lock_timers.pop((l.name, l.key)).cancel()
+            start = time.monotonic()
+            while not server.table.try_lock("test_sidecar_expiry", 1, 1).locked:
+                assert time.monotonic() - start < 3
+                await asyncio.sleep(0.1)
+            await client.close()
+
+    async def test_lost(self, server, socket_path):
+        async with Sidecar(server.address, socket_path=socket_path) as sidecar:
+            client = AsyncClient(sidecar.address,
+                                 retries=0,
+                                 auto_renew_locks=False)
+            l = await client.lock("test_sidecar_lost", lock_timeout_seconds=1)
+            server.table.unlock("test_sidecar_lost", l.key)
+            await asyncio.sleep(0.8)
+            with pytest.raises(exceptions.LockDoesNotExistOrInvalidKeyError):
+                await l.renew(1)
+            await client.close()
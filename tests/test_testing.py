@@ -0,0 +1,467 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+import time
+
+import grpc
+import pytest
+
+from ldlm import AsyncClient, Client, exceptions
+from ldlm.protos import ldlm_pb2 as pb2
+from ldlm.protos import ldlm_pb2_grpc as pb2_grpc
+from ldlm.testing import AsyncServer, Server
+
+
+@pytest.fixture
+def client(server):
+    c = Client(server.address, retries=0, auto_renew_locks=False)
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def stub(server):
+    with grpc.insecure_channel(server.address) as channel:
+        yield pb2_grpc.LDLMStub(channel)
+
+
+class TestServer:
+
+    def test_lock_unlock(self, client):
+        l = client.lock("test_lock_unlock")
+        assert l.locked
+        assert l.key
+        assert not client.try_lock("test_lock_unlock")
+        l.unlock()
+        assert client.try_lock("test_lock_unlock")
+
+    def test_wait_timeout(self, client):
+        assert client.lock("test_wait_timeout")
+        start = time.monotonic()
+        l = client.lock("test_wait_timeout", wait_timeout_seconds=1)
+        assert not l.locked
+        assert time.monotonic() - start >= 1
+
+    def test_blocking_wait(self, client, server):
+        """
+        Test that a blocked Lock request is granted when the lock is released.
+        """
+        l = client.lock("test_blocking_wait")
+        result = []
+        t = threading.Thread(target=lambda: result.append(
+            client.lock("test_blocking_wait", wait_timeout_seconds=10)))
+        t.start()
+
+        time.sleep(0.2)
+        assert not result
+        l.unlock()
+        t.join()
+        assert result[0].locked
+        assert result[0].key != l.key
+
+    def test_size(self, client):
+        locks = [client.try_lock("test_size", size=2) for _ in range(3)]
+        assert [l.locked for l in locks] == [True, True, False]
+
+        with pytest.raises(exceptions.LockSizeMismatchError):
+            client.try_lock("test_size", size=3)
+
+        for l in locks[:2]:
+            l.unlock()
+
+        # The size of an unlocked lock may change
+        assert client.try_lock("test_size", size=3)
+
+    def test_invalid_size(self, stub):
+        r = stub.TryLock(pb2.TryLockRequest(name="test_invalid_size", size=0))
+        assert r.error.code == pb2.ErrorCode.InvalidLockSize
+
+    def test_unlock_errors(self, client):
+        with pytest.raises(exceptions.LockDoesNotExistError):
+            client.unlock("test_unlock_errors", "foo")
+
+        l = client.lock("test_unlock_errors")
+        with pytest.raises(exceptions.InvalidLockKeyError):
+            client.unlock("test_unlock_errors", "foo")
+
+        l.unlock()
+        with pytest.raises(exceptions.NotLockedError):
+            client.unlock("test_unlock_errors", l.key)
+
+    def test_renew(self, client):
+        with pytest.raises(exceptions.LockDoesNotExistOrInvalidKeyError):
+            client.renew("test_renew", "foo", 10)
+
+        l = client.lock("test_renew", lock_timeout_seconds=1)
+        time.sleep(0.6)
+        assert client.renew("test_renew", l.key, 1).locked
+        time.sleep(0.6)
+
+        # Would have expired without the renew
+        assert not client.try_lock("test_renew")
+
+    def test_lease_expiry(self, client):
+        """
+        Test that an expired lease releases the lock and grants it to a waiter.
+        """
+        l = client.lock("test_lease_expiry", lock_timeout_seconds=1)
+        start = time.monotonic()
+        l2 = client.lock("test_lease_expiry", wait_timeout_seconds=5)
+        assert l2.locked
+        assert 0.9 < time.monotonic() - start < 3
+
+        with pytest.raises(exceptions.LockDoesNotExistOrInvalidKeyError):
+            client.renew("test_lease_expiry", l.key, 10)
+
+    def test_millisecond_timeouts(self, stub):
+        """
+        Test that millisecond timeouts take precedence over second timeouts.
+        """
+        r = stub.Lock(
+            pb2.LockRequest(name="test_millisecond_timeouts",
+                            lock_timeout_seconds=10,
+                            lock_timeout_ms=300))
+        assert r.locked
+
+        start = time.monotonic()
+        r2 = stub.Lock(
+            pb2.LockRequest(name="test_millisecond_timeouts",
+                            wait_timeout_seconds=10,
+                            wait_timeout_ms=100))
+        assert r2.error.code == pb2.ErrorCode.LockWaitTimeout
+        assert time.monotonic() - start < 0.5
+
+        # The lock expires after 300ms
+        r2 = stub.Lock(
+            pb2.LockRequest(name="test_millisecond_timeouts",
+                            wait_timeout_seconds=5))
+        assert r2.locked
+        assert time.monotonic() - start < 1
+
+        r2 = stub.Renew(
+            pb2.RenewRequest(name="test_millisecond_timeouts",
+                             key=r2.key,
+                             lock_timeout_seconds=1,
+                             lock_timeout_ms=100))
+        assert r2.locked
+        time.sleep(0.3)
+        assert stub.TryLock(
+            pb2.TryLockRequest(name="test_millisecond_timeouts")).locked
+
+    def test_client_lease(self, stub):
+        """
+        Test that the locks attached to a client lease are kept until the lease expires.
+        """
+        r = stub.GrantLease(pb2.GrantLeaseRequest(lease_timeout_seconds=1))
+        assert r.lease_timeout_seconds == 1
+        lease_id = r.lease_id
+
+        held = stub.Lock(
+            pb2.LockRequest(name="test_client_lease_1",
+                            lock_timeout_seconds=1,
+                            lease_id=lease_id))
+        assert held.locked
+        assert stub.TryLock(
+            pb2.TryLockRequest(name="test_client_lease_2",
+                               lease_id=lease_id)).locked
+
+        # A lock attached to the lease ignores its own lock timeout
+        for _ in range(3):
+            time.sleep(0.5)
+            assert not stub.KeepAlive(
+                pb2.KeepAliveRequest(lease_id=lease_id)).HasField("error")
+        assert stub.Renew(
+            pb2.RenewRequest(name="test_client_lease_1",
+                             key=held.key,
+                             lock_timeout_seconds=1)).locked
+        assert not stub.TryLock(
+            pb2.TryLockRequest(name="test_client_lease_1")).locked
+
+        # A waiter attached to the lease is granted the lock when it is released
+        waiter = stub.Lock.future(
+            pb2.LockRequest(name="test_client_lease_1", lease_id=lease_id))
+        stub.Unlock(pb2.UnlockRequest(name="test_client_lease_1", key=held.key))
+        assert waiter.result(timeout=5).locked
+
+        time.sleep(1.5)
+        assert stub.TryLock(
+            pb2.TryLockRequest(name="test_client_lease_1")).locked
+        assert stub.TryLock(
+            pb2.TryLockRequest(name="test_client_lease_2")).locked
+        r = stub.KeepAlive(pb2.KeepAliveRequest(lease_id=lease_id))
+        assert r.error.code == pb2.ErrorCode.LeaseDoesNotExist
+
+    def test_revoke_lease(self, stub):
+        lease_id = stub.GrantLease(
+            pb2.GrantLeaseRequest(lease_timeout_seconds=60)).lease_id
+        kept = stub.TryLock(
+            pb2.TryLockRequest(name="test_revoke_lease_1", lease_id=lease_id))
+        released = stub.TryLock(
+            pb2.TryLockRequest(name="test_revoke_lease_2", lease_id=lease_id))
+        assert kept.locked and released.locked
+        stub.Unlock(
+            pb2.UnlockRequest(name="test_revoke_lease_2", key=released.key))
+        assert stub.TryLock(
+            pb2.TryLockRequest(name="test_revoke_lease_2",
+                               lock_timeout_seconds=60)).locked
+
+        assert not stub.RevokeLease(
+            pb2.RevokeLeaseRequest(lease_id=lease_id)).HasField("error")
+        assert stub.TryLock(
+            pb2.TryLockRequest(name="test_revoke_lease_1")).locked
+        # The lock detached by Unlock is not released again
+        assert not stub.TryLock(
+            pb2.TryLockRequest(name="test_revoke_lease_2")).locked
+
+        r = stub.RevokeLease(pb2.RevokeLeaseRequest(lease_id=lease_id))
+        assert r.error.code == pb2.ErrorCode.LeaseDoesNotExist
+
+    def test_lease_errors(self, stub):
+        r = stub.GrantLease(pb2.GrantLeaseRequest(lease_timeout_seconds=0))
+        assert r.error.code == pb2.ErrorCode.InvalidLeaseTimeout
+
+        r = stub.Lock(pb2.LockRequest(name="test_lease_errors", lease_id="foo"))
+        assert r.error.code == pb2.ErrorCode.LeaseDoesNotExist
+        r = stub.TryLock(
+            pb2.TryLockRequest(name="test_lease_errors", lease_id="foo"))
+        assert r.error.code == pb2.ErrorCode.LeaseDoesNotExist
+
+    def test_watch(self, client, stub):
+        l = client.lock("test_watch_a")
+        call = stub.Watch(
+            pb2.WatchRequest(names=["test_watch_a", "test_watch_b"]))
+        assert next(call).name == "test_watch_b"
+
+        l2 = client.lock("test_watch_b")
+        l.unlock()
+        assert next(call).name == "test_watch_a"
+        l2.unlock()
+        assert next(call).name == "test_watch_b"
+        call.cancel()
+
+    def test_watch_waiters(self, client, server, stub):
+        """
+        Test that releasing a lock which is granted to a waiter does not send an event.
+        """
+        l = client.lock("test_watch_waiters")
+        waiter = stub.Lock.future(pb2.LockRequest(name="test_watch_waiters"))
+        time.sleep(0.2)
+        call = stub.Watch(pb2.WatchRequest(names=["test_watch_waiters"]))
+        l.unlock()
+        l2 = waiter.result(timeout=5)
+        client.unlock("test_watch_waiters", l2.key)
+        assert next(call).name == "test_watch_waiters"
+        call.cancel()
+        time.sleep(0.2)
+        assert "test_watch_waiters" not in server.table._watchers
+
+    def test_password(self):
+        with Server(password="secret") as s:
+            with pytest.raises(grpc.RpcError) as e:
+                Client(s.address, retries=0).try_lock("test_password")
+            assert e.value.code() == grpc.StatusCode.UNAUTHENTICATED
+
+            assert Client(s.address, password="secret",
+                          retries=0).try_lock("test_password")
+
+    def test_cancelled_waiter(self, client, server, stub):
+        """
+        Test that a waiter whose client goes away does not hold the lock.
+        """
+        l = client.lock("test_cancelled_waiter")
+        future = stub.Lock.future(pb2.LockRequest(name="test_cancelled_waiter"))
+        time.sleep(0.2)
+        future.cancel()
+        time.sleep(0.2)
+
+        l.unlock()
+        assert client.try_lock("test_cancelled_waiter")
+
+    def test_batch(self, client, stub):
+        r = stub.BatchTryLock(
+            pb2.BatchTryLockRequest(requests=[
+                pb2.TryLockRequest(name="test_batch_a"),
+                pb2.TryLockRequest(name="test_batch_b", size=0),
+                pb2.TryLockRequest(name="test_batch_a"),
+            ]))
+        a, invalid, locked = r.responses
+        assert a.locked
+        assert invalid.error.code == pb2.ErrorCode.InvalidLockSize
+        assert not locked.locked
+
+        r = stub.BatchRenew(
+            pb2.BatchRenewRequest(requests=[
+                pb2.RenewRequest(
+                    name="test_batch_a", key=a.key, lock_timeout_seconds=10),
+                pb2.RenewRequest(
+                    name="test_batch_a", key="foo", lock_timeout_seconds=10),
+            ]))
+        assert [x.locked for x in r.responses] == [True, False]
+        assert (r.responses[1].error.code ==
+                pb2.ErrorCode.LockDoesNotExistOrInvalidKey)
+
+        r = stub.BatchUnlock(
+            pb2.BatchUnlockRequest(requests=[
+                pb2.UnlockRequest(name="test_batch_a", key=a.key),
+                pb2.UnlockRequest(name="test_batch_b", key="foo"),
+            ]))
+        assert r.responses[0].unlocked
+        assert r.responses[1].error.code == pb2.ErrorCode.LockDoesNotExist
+        assert client.try_lock("test_batch_a")
+
+    def test_batch_lock(self, client, stub):
+        """
+        Test that the Lock requests of a batch wait concurrently.
+        """
+        l1 = client.lock("test_batch_lock_1")
+        l2 = client.lock("test_batch_lock_2")
+        threading.Timer(0.5, l2.unlock).start()
+
+        start = time.monotonic()
+        r = stub.BatchLock(
+            pb2.BatchLockRequest(requests=[
+                pb2.LockRequest(name="test_batch_lock_1",
+                                wait_timeout_seconds=1),
+                pb2.LockRequest(name="test_batch_lock_2",
+                                wait_timeout_seconds=1),
+                pb2.LockRequest(name="test_batch_lock_3",
+                                wait_timeout_seconds=1),
+            ]))
+        assert 0.9 < time.monotonic() - start < 1.5
+        timed_out, granted, free = r.responses
+        assert timed_out.error.code == pb2.ErrorCode.LockWaitTimeout
+        assert granted.locked and granted.key != l2.key
+        assert free.locked
+        l1.unlock()
+
+    def test_batch_lock_cancelled(self, client, stub):
+        """
+        Test that the locks of a cancelled BatchLock request are released.
+        """
+        l = client.lock("test_batch_lock_cancelled_1")
+        future = stub.BatchLock.future(
+            pb2.BatchLockRequest(requests=[
+                pb2.LockRequest(name="test_batch_lock_cancelled_1"),
+                pb2.LockRequest(name="test_batch_lock_cancelled_2"),
+            ]))
+        time.sleep(0.2)
+        assert not client.try_lock("test_batch_lock_cancelled_2")
+        future.cancel()
+        time.sleep(0.2)
+
+        l.unlock()
+        assert client.try_lock("test_batch_lock_cancelled_1")
+        assert client.try_lock("test_batch_lock_cancelled_2")
+
+
+@pytest.mark.asyncio
+class TestAsyncServer:
+
+    async def test_lock_unlock(self):
+        async with AsyncServer() as s:
+            client = AsyncClient(s.address, retries=0)
+            l = await client.lock("test_lock_unlock")
+            assert l.locked
+            assert not await client.try_lock("test_lock_unlock")
+            await l.unlock()
+            assert await client.try_lock("test_lock_unlock")
+            await client.close()
+
+    async def test_waiters(self):
+        async with AsyncServer() as s:
+            client = AsyncClient(s.address, retries=0)
+            l = await client.lock("test_waiters")
+
+            waiter = asyncio.create_task(
+                client.lock("test_waiters", wait_timeout_seconds=10))
+            timed_out = await client.lock("test_waiters",
+                                          wait_timeout_seconds=1)
+            assert not timed_out.locked
+            assert not waiter.done()
+
+            await l.unlock()
+            assert (await waiter).locked
+            await client.close()
+
+    async def test_cancelled_waiter(self):
+        """
+        Test that a cancelled Lock request does not hold the lock.
+        """
+        async with AsyncServer() as s:
+            client = AsyncClient(s.address, retries=0)
+            l = await client.lock("test_cancelled_waiter")
+
+            waiter = asyncio.create_task(client.lock("test_cancelled_waiter"))
+            await asyncio.sleep(0.2)
+            waiter.cancel()
+            await asyncio.sleep(0.2)
+
+            await l.unlock()
+            assert await client.try_lock("test_cancelled_waiter")
+            await client.close()
+
+    async def test_batch_lock(self):
+        async with AsyncServer() as s:
+            client = AsyncClient(s.address, retries=0)
+            l = await client.lock("test_batch_lock_1")
+
+            async with grpc.aio.insecure_channel(s.address) as channel:
+                stub = pb2_grpc.LDLMStub(channel)
+                call = stub.BatchLock(
+                    pb2.BatchLockRequest(requests=[
+                        pb2.LockRequest(name="test_batch_lock_1"),
+                        pb2.LockRequest(name="test_batch_lock_2"),
+                    ]))
+                await asyncio.sleep(0.2)
+                await l.unlock()
+                r = await call
+                assert [x.locked for x in r.responses] == [True, True]
+
+                r = await stub.BatchUnlock(
+                    pb2.BatchUnlockRequest(requests=[
+                        pb2.UnlockRequest(name=x.name, key=x.key)
+                        for x in r.responses
+                    ]))
+                assert [x.unlocked for x in r.responses] == [True, True]
+
+                # Granted locks are released when the request is cancelled
+                l = await client.lock("test_batch_lock_1")
+                call = stub.BatchLock(
+                    pb2.BatchLockRequest(requests=[
+                        pb2.LockRequest(name="test_batch_lock_1"),
+                        pb2.LockRequest(name="test_batch_lock_2"),
+                    ]))
+                await asyncio.sleep(0.2)
+                call.cancel()
+                await asyncio.sleep(0.2)
+                assert await client.try_lock("test_batch_lock_2")
+            await client.close()
+
+    async def test_watch(self):
+        async with AsyncServer() as s:
+            client = AsyncClient(s.address, retries=0)
+            l = await client.lock("test_watch_a")
+            async with grpc.aio.insecure_channel(s.address) as channel:
+                stub = pb2_grpc.LDLMStub(channel)
+                call = stub.Watch(
+                    pb2.WatchRequest(names=["test_watch_a", "test_watch_b"]))
+                assert (await call.read()).name == "test_watch_b"
+                await l.unlock()
+                assert (await call.read()).name == "test_watch_a"
+                call.cancel()
+                await asyncio.sleep(0.2)
+                assert not s.table._watchers
+            await client.close()
@@ -0,0 +1,165 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from datetime import timedelta
+import logging
+import time
+from unittest import mock
+
+import pytest
+
+from ldlm import AsyncClient, Client
+from ldlm.testing import Server
+
+
+@pytest.fixture
+def legacy():
+    """
+    A server which does not support millisecond timeouts.
+    """
+    with mock.patch("ldlm.testing._wait_timeout",
+                    lambda r: r.wait_timeout_seconds or None), mock.patch(
+                        "ldlm.testing._lock_timeout",
+                        lambda r: r.lock_timeout_seconds):
+        with Server() as s:
+            yield s
+
+
+class TestTimeouts:
+
+    def test_wait_timeout(self, server):
+        client = Client(server.address, retries=0)
+        assert client.lock("test_wait_timeout")
+        start = time.monotonic()
+        assert not client.lock("test_wait_timeout", wait_timeout_seconds=0.05)
+        assert not client.lock("test_wait_timeout",
+                               wait_timeout_seconds=timedelta(milliseconds=50))
+        assert time.monotonic() - start < 0.5
+        client.close()
+
+    def test_lock_timeout(self, server):
+        client = Client(server.address, retries=0, auto_renew_locks=False)
+        assert client.try_lock("test_lock_timeout", lock_timeout_seconds=0.2)
+        start = time.monotonic()
+        assert client.lock("test_lock_timeout", wait_timeout_seconds=5)
+        assert time.monotonic() - start < 0.5
+        client.close()
+
+    def test_auto_renew(self, server):
+        client = Client(server.address, retries=0)
+        with client.lock_context(
+                "test_auto_renew",
+                lock_timeout_seconds=timedelta(milliseconds=300)):
+            time.sleep(1)
+            assert not client.try_lock("test_auto_renew")
+        client.close()
+
+    @pytest.mark.parametrize("transport", ["unary", "session"])
+    def test_deadline(self, legacy, transport):
+        """
+        Test that the client enforces sub-second wait timeouts on servers which do not support
+        millisecond timeouts.
+        """
+        client = Client(legacy.address, retries=0, transport=transport)
+        l = client.lock("test_deadline")
+        start = time.monotonic()
+        assert not client.lock("test_deadline", wait_timeout_seconds=0.1)
+        assert time.monotonic() - start < 0.5
+        assert not client.wait_until_free("test_deadline",
+                                          wait_timeout_seconds=0.1)
+
+        # Grants to the abandoned requests are released
+        l.unlock()
+        deadline = time.monotonic() + 3
+        while not client.try_lock("test_deadline"):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        client.close()
+
+    def test_late_grant(self, legacy, caplog):
+        caplog.set_level(logging.WARNING, logger="ldlm")
+        client = Client(legacy.address, retries=0)
+        l = client.lock("test_late_grant")
+        assert not client.lock("test_late_grant", wait_timeout_seconds=0.1)
+        l.unlock()
+
+        deadline = time.monotonic() + 3
+        while not [
+                r for r in caplog.records
+                if r.ldlm_event == "lock.release_cancelled"
+        ]:
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        assert client.try_lock("test_late_grant")
+        client.close()
+
+
+@pytest.mark.asyncio
+class TestAsyncTimeouts:
+
+    async def test_timeouts(self, server):
+        client = AsyncClient(server.address, retries=0, auto_renew_locks=False)
+        assert await client.try_lock("test_async_timeouts",
+                                     lock_timeout_seconds=0.2)
+        start = time.monotonic()
+        assert not await client.lock("test_async_timeouts",
+                                     wait_timeout_seconds=0.05)
+        assert await client.lock("test_async_timeouts",
+                                 wait_timeout_seconds=timedelta(seconds=5))
+        assert time.monotonic() - start < 0.5
+        await client.close()
+
+    @pytest.mark.parametrize("transport", ["unary", "session"])
+    async def test_deadline(self, legacy, transport):
+        client = AsyncClient(legacy.address, retries=0, transport=transport)
+        l = await client.lock("test_async_deadline")
+        start = time.monotonic()
+        assert not await client.lock("test_async_deadline",
+                                     wait_timeout_seconds=0.1)
+        assert time.monotonic() - start < 0.5
+
+        # Grants to the abandoned request are released
+        await l.unlock()
+        deadline = time.monotonic() + 3
+        while not await client.try_lock("test_async_deadline"):
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+        await client.close()
+
+    @pytest.mark.parametrize("transport", ["unary", "session"])
+    async def test_deadline_cancels_request(self, legacy, transport):
+        """
+        Test that a Lock request is cancelled when the client stops waiting for it, so that it
+        does not stay queued on the server. The session transport can not cancel requests; a
+        lock granted to an abandoned request is released instead.
+        """
+        client = AsyncClient(legacy.address, retries=0, transport=transport)
+        l = await client.lock("test_async_deadline_cancels")
+        assert not await client.lock("test_async_deadline_cancels",
+                                     wait_timeout_seconds=0.1)
+        state = legacy.table._locks["test_async_deadline_cancels"]
+        if transport == "unary":
+            # Before the server's wait timeout of one second expires
+            deadline = time.monotonic() + 0.3
+            while state.waiters:
+                assert time.monotonic() < deadline
+                await asyncio.sleep(0.01)
+
+        await l.unlock()
+        deadline = time.monotonic() + 3
+        while not await client.try_lock("test_async_deadline_cancels"):
+            assert time.monotonic() < deadline
+            await asyncio.sleep(0.05)
+        await client.close()
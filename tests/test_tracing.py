@@ -0,0 +1,193 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+
+import grpc
+import pytest
+
+from ldlm import AsyncClient, Client, exceptions
+from ldlm.tracing import RecordingTracer, current_span
+
+
+def tree(spans):
+    """
+    Returns (name, parent name) pairs for spans in the order they ended.
+    """
+    return [(s.name, s.parent.name if s.parent else None) for s in spans]
+
+
+class TestClientTracing:
+
+    def test_lock_context(self, server):
+        tracer = RecordingTracer()
+        client = Client(server.address, retries=0, tracer=tracer)
+
+        with client.lock_context("test_lock_context", size=2) as lock:
+            assert lock.locked
+            assert current_span().name == "ldlm.lock"
+        assert current_span() is None
+
+        assert tree(tracer.spans) == [
+            ("ldlm.rpc.Lock", "ldlm.acquire"),
+            ("ldlm.acquire", "ldlm.lock"),
+            ("ldlm.rpc.Unlock", "ldlm.release"),
+            ("ldlm.release", "ldlm.lock"),
+            ("ldlm.lock", None),
+        ]
+        lock_span = tracer.spans[-1]
+        assert lock_span.attributes == {
+            "ldlm.lock.name": "test_lock_context",
+            "ldlm.lock.size": 2,
+            "ldlm.lock.acquired": True,
+        }
+        assert tracer.spans[1].attributes["ldlm.lock.method"] == "lock"
+        assert tracer.spans[0].attributes["ldlm.rpc.code"] == "OK"
+        assert tracer.spans[0].attributes["ldlm.rpc.attempt"] == 1
+        assert all(s.duration <= lock_span.duration for s in tracer.spans)
+        client.close()
+
+    def test_contention(self, server):
+        tracer = RecordingTracer()
+        client = Client(server.address, retries=0, tracer=tracer)
+        held = client.lock("test_contention")
+        tracer.spans.clear()
+
+        with client.try_lock_context("test_contention") as lock:
+            assert not lock
+        with client.lock_context("test_contention",
+                                 wait_timeout_seconds=1) as lock:
+            assert not lock
+
+        assert tree(tracer.spans) == [
+            ("ldlm.rpc.TryLock", "ldlm.acquire"),
+            ("ldlm.acquire", "ldlm.lock"),
+            ("ldlm.lock", None),
+            ("ldlm.rpc.Lock", "ldlm.acquire"),
+            ("ldlm.acquire", "ldlm.lock"),
+            ("ldlm.lock", None),
+        ]
+        assert tracer.spans[2].attributes["ldlm.lock.acquired"] is False
+        assert tracer.spans[3].attributes["ldlm.rpc.code"] == "LockWaitTimeout"
+        assert isinstance(tracer.spans[3].exception,
+                          exceptions.LockWaitTimeoutError)
+        assert tracer.spans[4].attributes["ldlm.lock.acquired"] is False
+        assert tracer.spans[4].duration >= 1
+        held.unlock()
+        client.close()
+
+    def test_body_exception(self, server):
+        tracer = RecordingTracer()
+        client = Client(server.address, retries=0, tracer=tracer)
+        with pytest.raises(ValueError):
+            with client.lock_context("test_body_exception"):
+                raise ValueError("oops")
+        assert tracer.spans[-1].name == "ldlm.lock"
+        assert isinstance(tracer.spans[-1].exception, ValueError)
+        assert client.try_lock("test_body_exception")
+        client.close()
+
+    def test_retries(self):
+        tracer = RecordingTracer()
+        client = Client("localhost:1",
+                        retries=1,
+                        retry_delay_seconds=0,
+                        tracer=tracer)
+        with pytest.raises(grpc.RpcError):
+            client.try_lock("test_retries")
+
+        assert tree(tracer.spans) == [
+            ("ldlm.rpc.TryLock", "ldlm.acquire"),
+            ("ldlm.rpc.TryLock", "ldlm.acquire"),
+            ("ldlm.acquire", None),
+        ]
+        assert [s.attributes["ldlm.rpc.attempt"] for s in tracer.spans[:2]
+               ] == [1, 2]
+        assert tracer.spans[0].attributes["ldlm.rpc.code"] == "UNAVAILABLE"
+        assert tracer.spans[2].exception is not None
+        client.close()
+
+    def test_renew(self, server):
+        tracer = RecordingTracer()
+        client = Client(server.address, retries=0, tracer=tracer)
+        client.min_renew_interval_seconds = 0.2
+
+        with client.lock_context("test_renew", lock_timeout_seconds=10):
+            time.sleep(0.3)
+
+        assert ("ldlm.renew", "ldlm.lock") in tree(tracer.spans)
+        assert ("ldlm.rpc.Renew", "ldlm.renew") in tree(tracer.spans)
+        client.close()
+
+    @pytest.mark.asyncio
+    async def test_async_client(self, server):
+        tracer = RecordingTracer()
+        client = AsyncClient(server.address, retries=0, tracer=tracer)
+        client.min_renew_interval_seconds = 0.2
+
+        async with client.lock_context("test_async_client",
+                                       lock_timeout_seconds=10) as lock:
+            assert lock.locked
+            await asyncio.sleep(0.3)
+        assert current_span() is None
+
+        assert tree(tracer.spans) == [
+            ("ldlm.rpc.Lock", "ldlm.acquire"),
+            ("ldlm.acquire", "ldlm.lock"),
+            ("ldlm.rpc.Renew", "ldlm.renew"),
+            ("ldlm.renew", "ldlm.lock"),
+            ("ldlm.rpc.Unlock", "ldlm.release"),
+            ("ldlm.release", "ldlm.lock"),
+            ("ldlm.lock", None),
+        ]
+        await client.close()
+
+
+class TestOpenTelemetry:
+
+    def test_spans(self, server):
+        pytest.importorskip("opentelemetry.sdk")
+        # pylint: disable=import-outside-toplevel
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+        from opentelemetry.trace import StatusCode
+
+        from ldlm.tracing import OpenTelemetryTracer
+
+        exporter = InMemorySpanExporter()
+        provider = TracerProvider()
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+        otel_tracer = provider.get_tracer("test")
+        client = Client(server.address,
+                        retries=0,
+                        tracer=OpenTelemetryTracer(otel_tracer))
+
+        with otel_tracer.start_as_current_span("request"):
+            with client.lock_context("test_spans"):
+                pass
+            with pytest.raises(exceptions.NotLockedError):
+                client.unlock("test_spans", "foo")
+
+        spans = {s.name: s for s in exporter.get_finished_spans()}
+        assert spans["ldlm.lock"].parent.span_id == spans[
+            "request"].context.span_id
+        assert spans["ldlm.acquire"].parent.span_id == spans[
+            "ldlm.lock"].context.span_id
+        assert spans["ldlm.rpc.Lock"].parent.span_id == spans[
+            "ldlm.acquire"].context.span_id
+        assert spans["ldlm.lock"].attributes["ldlm.lock.name"] == "test_spans"
+        assert spans["ldlm.release"].status.status_code == StatusCode.ERROR
+        client.close()
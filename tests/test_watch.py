@@ -0,0 +1,156 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import threading
+import time
+from unittest import mock
+
+import grpc
+import pytest
+
+from ldlm import AsyncClient, Client
+from ldlm.protos import ldlm_pb2_grpc as pb2_grpc
+from ldlm.testing import LDLMServicer, Server
+
+
+@pytest.fixture
+def client(server):
+    c = Client(server.address, retries=0)
+    yield c
+    c.close()
+
+
+@pytest.fixture
+def unimplemented():
+    with mock.patch.object(LDLMServicer, "Watch", pb2_grpc.LDLMServicer.Watch):
+        with Server() as s:
+            yield s
+
+
+class TestWatch:
+
+    def test_watch(self, client):
+        l = client.lock("test_watch_a")
+        events = client.watch(["test_watch_a", "test_watch_b", "test_watch_a"])
+        assert next(events) == "test_watch_b"
+        t = threading.Timer(0.2, l.unlock)
+        t.start()
+        assert next(events) == "test_watch_a"
+        events.close()
+        t.join()
+
+    def test_wait_until_free(self, client, server):
+        l = client.lock("test_wait_until_free")
+        assert not client.wait_until_free("test_wait_until_free",
+                                          wait_timeout_seconds=1)
+
+        t = threading.Timer(0.2, l.unlock)
+        t.start()
+        assert client.wait_until_free("test_wait_until_free",
+                                      wait_timeout_seconds=5)
+        t.join()
+        assert client.try_lock("test_wait_until_free")
+        # Waiting does not queue a waiter
+        assert not server.table._locks["test_wait_until_free"].waiters
+
+    def test_wait_until_free_unimplemented(self, unimplemented):
+        client = Client(unimplemented.address, retries=0)
+        l = client.lock("test_wait_until_free")
+        assert not client.wait_until_free("test_wait_until_free",
+                                          wait_timeout_seconds=1)
+        assert not client._watch_supported
+
+        t = threading.Timer(0.2, l.unlock)
+        t.start()
+        assert client.wait_until_free("test_wait_until_free")
+        t.join()
+        assert client.try_lock("test_wait_until_free")
+        client.close()
+
+    def test_watch_unimplemented(self, unimplemented):
+        client = Client(unimplemented.address, retries=0)
+        with pytest.raises(grpc.RpcError) as e:
+            next(client.watch(["test_watch"]))
+        assert e.value.code() == grpc.StatusCode.UNIMPLEMENTED
+        client.close()
+
+
+async def unlock_later(lock):
+    await asyncio.sleep(0.2)
+    await lock.unlock()
+
+
+@pytest.mark.asyncio
+class TestAsyncWatch:
+
+    async def test_watch(self, server):
+        client = AsyncClient(server.address, retries=0)
+        l = await client.lock("test_async_watch_a")
+        events = client.watch(["test_async_watch_a", "test_async_watch_b"])
+        assert await events.__anext__() == "test_async_watch_b"
+        unlock = asyncio.create_task(unlock_later(l))
+        assert await events.__anext__() == "test_async_watch_a"
+        await events.aclose()
+        await unlock
+        await client.close()
+
+    async def test_wait_until_free(self, server):
+        client = AsyncClient(server.address, retries=0)
+        l = await client.lock("test_async_wait_until_free")
+        assert not await client.wait_until_free("test_async_wait_until_free",
+                                                wait_timeout_seconds=1)
+        waiter = asyncio.create_task(
+            client.wait_until_free("test_async_wait_until_free"))
+        await asyncio.sleep(0.2)
+        assert not waiter.done()
+        await l.unlock()
+        assert await waiter
+        await client.close()
+
+    async def test_acquire_when_free(self, server):
+        client = AsyncClient(server.address, retries=0)
+        names = [f"test_acquire_when_free_{i}" for i in range(3)]
+        held = [await client.lock(name) for name in names[:2]]
+
+        locks = client.acquire_when_free(names, limit=2)
+        assert (await locks.__anext__()).name == names[2]
+        start = time.monotonic()
+        unlock = asyncio.create_task(unlock_later(held[1]))
+        assert (await locks.__anext__()).name == names[1]
+        assert time.monotonic() - start >= 0.1
+        await unlock
+        with pytest.raises(StopAsyncIteration):
+            await locks.__anext__()
+
+        # The wait timeout ends the iteration
+        locks = client.acquire_when_free(names[:1], wait_timeout_seconds=1)
+        assert [l async for l in locks] == []
+        await client.close()
+
+    async def test_unimplemented(self, unimplemented):
+        client = AsyncClient(unimplemented.address, retries=0)
+        l = await client.lock("test_async_unimplemented_a")
+        assert not await client.wait_until_free("test_async_unimplemented_a",
+                                                wait_timeout_seconds=1)
+        assert not client._watch_supported
+
+        locks = [
+            lock async for lock in client.acquire_when_free(
+                ["test_async_unimplemented_a", "test_async_unimplemented_b"],
+                wait_timeout_seconds=1)
+        ]
+        assert [lock.name for lock in locks] == ["test_async_unimplemented_b"]
+        await l.unlock()
+        await client.close()